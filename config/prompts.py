@@ -52,7 +52,7 @@ Please generate {num_events} potential events, replying in the following XML for
             <effect target="character_relation" value="0.2"/>
             <!-- Other effects -->
         </effects>
-        <narrative_template>The narrative template for this event in the novel, using {character_name} as a placeholder</narrative_template>
+        <narrative_template>The narrative template for this event in the novel, using {{character_name}} as a placeholder</narrative_template>
     </event>
     <!-- More events -->
 </events>
@@ -68,6 +68,7 @@ CHAPTER_GENERATION_PROMPT = """
 </novel_info>
 <outline>{outline}</outline>
 <previous_summary>{previous_summary}</previous_summary>
+<related_passages>{related_passages}</related_passages>
 <focus_characters>
 {character_info}
 </focus_characters>
@@ -89,6 +90,21 @@ Please generate complete chapter content, replying in the following XML format:
 </output_format>
 """
 
+SUMMARY_COMPRESSION_PROMPT = """
+<task>Please condense the following {scope} of the novel into one coherent summary of no more than {max_words} words, keeping key plot developments, changes in character relationships and unresolved threads.</task>
+<novel_info>
+    <title>{title}</title>
+    <genre>{genre}</genre>
+</novel_info>
+<summaries>
+{summaries}
+</summaries>
+<output_format>
+Please reply in the following XML format:
+<summary>Condensed summary</summary>
+</output_format>
+"""
+
 OUTLINE_GENERATION_PROMPT = """
 <task>Please generate a complete story outline for a novel in the {genre} genre.</task>
 <novel_info>
@@ -0,0 +1,142 @@
+# core/body_store.py - 章节正文存储
+
+import os
+import zlib
+from collections import OrderedDict
+from typing import List, Optional
+from .models import LazyText, Novel
+
+# 常驻内存的正文章数（最近读取的章节）
+BODY_CACHE_SIZE = 32
+
+def bodies_path_for(path: str, generation: int) -> str:
+    """小说文件对应的第generation代正文存储文件路径"""
+    return f"{path}.bodies.{generation}"
+
+class ChapterBody(LazyText):
+    """正文存储中的一章正文：偏移、UTF-8字节数和CRC32"""
+    __slots__ = ("store", "offset", "length", "crc")
+    
+    def __init__(self, store: "BodyStore", offset: int, length: int, crc: int):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.crc = crc
+    
+    def load(self) -> str:
+        return self.store.read(self)
+
+class BodyStore:
+    """章节正文存储 - 只追加的正文文件，带最近读取正文的LRU缓存
+    
+    存档中每章只记录正文在文件中的位置，正文在首次读取时加载，内存中最多保留cache_size章。
+    修改过的正文保存时追加到文件末尾，旧正文成为无效数据；无效数据多于有效数据时
+    整理到下一代文件，旧文件在存档写入成功后删除，中途崩溃时旧存档仍指向完整的旧文件。
+    """
+    
+    def __init__(self, path: str, base: str, cache_size: int = BODY_CACHE_SIZE):
+        self.path = path
+        self.base = os.path.abspath(base)  # 所属小说文件
+        self.cache_size = cache_size
+        self.cache: "OrderedDict[int, str]" = OrderedDict()  # 偏移 -> 正文
+        self.retired: List[str] = []  # 已被新一代替换、待删除的文件
+        self.loads = 0  # 从文件读取正文的次数
+        self._file = None
+    
+    @classmethod
+    def create(cls, base: str, cache_size: int = BODY_CACHE_SIZE) -> "BodyStore":
+        """为小说文件新建一代正文存储（使用第一个未被占用的代号）"""
+        generation = 0
+        while os.path.exists(bodies_path_for(base, generation)):
+            generation += 1
+        path = bodies_path_for(base, generation)
+        open(path, "ab").close()
+        return cls(path, base, cache_size)
+    
+    def size(self) -> int:
+        """文件字节数（含无效数据）"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+    
+    def read(self, ref: ChapterBody) -> str:
+        """读取一章正文，先查缓存"""
+        text = self.cache.get(ref.offset)
+        if text is not None:
+            self.cache.move_to_end(ref.offset)
+            return text
+        
+        if self._file is None:
+            self._file = open(self.path, "rb")
+        self._file.seek(ref.offset)
+        data = self._file.read(ref.length)
+        if len(data) != ref.length or zlib.crc32(data) != ref.crc:
+            raise OSError(f"章节正文损坏或缺失: {self.path} (偏移{ref.offset})")
+        
+        text = data.decode("utf-8")
+        self.loads += 1
+        self.remember(ref.offset, text)
+        return text
+    
+    def remember(self, offset: int, text: str):
+        """放入缓存，超出容量时淘汰最久未读取的正文"""
+        self.cache[offset] = text
+        self.cache.move_to_end(offset)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+    
+    def append(self, texts: List[str]) -> List[ChapterBody]:
+        """追加写入多章正文，返回它们的引用"""
+        refs = []
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            for text in texts:
+                data = text.encode("utf-8")
+                f.write(data)
+                refs.append(ChapterBody(self, offset, len(data), zlib.crc32(data)))
+                offset += len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return refs
+    
+    def close(self):
+        """关闭读取用的文件句柄"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def store_chapter_bodies(novel: Novel, base: str) -> BodyStore:
+    """把尚未写入存储的章节正文追加到小说文件(base)的正文存储，章节改为引用存储中的正文
+    
+    另存为其他文件或无效数据多于有效数据时，有效正文写入新一代存储，原存储记入retired。
+    """
+    store = novel.body_store
+    refs = [chapter.content_ref() for chapter in novel.chapters]
+    
+    if store is None or store.base != os.path.abspath(base):
+        store = BodyStore.create(base)
+    else:
+        live = sum(ref.length for ref in refs if ref is not None and ref.store is store)
+        if store.size() - live > live:
+            retired = store.retired + [store.path]
+            store = BodyStore.create(base, store.cache_size)
+            store.retired = retired
+    
+    pending = [(chapter, chapter.content) for chapter, ref in zip(novel.chapters, refs)
+               if (ref is None or ref.store is not store) and chapter.content]
+    for (chapter, text), ref in zip(pending, store.append([text for _, text in pending])):
+        chapter.content = ref
+        store.remember(ref.offset, text)
+    
+    if novel.body_store is not None and novel.body_store is not store:
+        novel.body_store.close()
+    novel.body_store = store
+    return store
+
+def remove_retired_bodies(novel: Novel):
+    """删除已被新一代替换的正文存储文件，应在引用新存储的存档写入后调用"""
+    store = novel.body_store
+    if store is None:
+        return
+    for path in store.retired:
+        if os.path.exists(path):
+            os.remove(path)
+    store.retired.clear()
\ No newline at end of file
@@ -0,0 +1,97 @@
+# core/change_journal.py - 小说变更日志
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 变更对象类型和操作
+CHANGE_KINDS = {"character": "角色", "event": "事件", "outline": "大纲", "chapter": "章节", "context": "上下文"}
+CHANGE_ACTIONS = {"add": "新增", "update": "修改", "delete": "删除"}
+
+@dataclass(frozen=True)
+class Change:
+    """一条变更：对象类型、操作、对象ID和变化的字段
+    
+    章节以章节ID为对象（删除章节时后续章节编号减一，不另行记录）；
+    上下文以"global"或章节号为对象。
+    """
+    seq: int
+    kind: str
+    action: str
+    target: str = ""
+    fields: Tuple[str, ...] = ()
+    
+    def describe(self) -> str:
+        """可读的描述，如"章节chapter_1a2b3c4d 修改: content" """
+        text = f"{CHANGE_KINDS.get(self.kind, self.kind)}{self.target} {CHANGE_ACTIONS.get(self.action, self.action)}"
+        return f"{text}: {', '.join(self.fields)}" if self.fields else text
+
+class ChangeJournal:
+    """小说的变更日志 - 管理器的每次修改记录一条变更，供保存、检索索引和导出等增量更新
+    
+    消费方可以订阅（每条变更即时回调），也可以打开游标，分批取出上次以来的变更；
+    所有游标都已取出的变更即被丢弃，没有游标时不保留变更。
+    """
+    
+    def __init__(self):
+        self.seq = 0  # 最后一条变更的序号
+        self.saved_seq = 0  # 最近一次保存时的序号
+        self.entries: List[Change] = []
+        self.cursors: Dict[str, int] = {}  # 消费方 -> 已取出的最后序号
+        self.subscribers: List[Callable[[Change], None]] = []
+    
+    @property
+    def dirty(self) -> bool:
+        """上次保存后是否有修改"""
+        return self.seq != self.saved_seq
+    
+    def mark_saved(self, seq: Optional[int] = None):
+        """记录已保存；seq为保存内容对应的序号（后台保存快照之后的修改仍未保存），默认为当前序号"""
+        self.saved_seq = self.seq if seq is None else seq
+    
+    def record(self, kind: str, action: str, target: str = "", fields: Tuple[str, ...] = ()) -> Change:
+        """记录一条变更并通知订阅者"""
+        self.seq += 1
+        change = Change(self.seq, kind, action, str(target), tuple(fields))
+        if self.cursors:
+            self.entries.append(change)
+        for callback in list(self.subscribers):
+            callback(change)
+        return change
+    
+    def subscribe(self, callback: Callable[[Change], None]) -> Callable[[], None]:
+        """订阅变更，返回取消订阅的函数"""
+        self.subscribers.append(callback)
+        return lambda: self.subscribers.remove(callback) if callback in self.subscribers else None
+    
+    def open_cursor(self, name: str):
+        """打开游标，之后的变更会保留到该消费方取出为止"""
+        self.cursors.setdefault(name, self.seq)
+    
+    def close_cursor(self, name: str):
+        """关闭游标"""
+        self.cursors.pop(name, None)
+        self._trim()
+    
+    def pending(self, name: str) -> List[Change]:
+        """游标之后的变更（不移动游标）"""
+        start = self.cursors.get(name, self.seq)
+        return [change for change in self.entries if change.seq > start]
+    
+    def drain(self, name: str) -> List[Change]:
+        """取出游标之后的变更并移动游标，未打开的游标先打开"""
+        if name not in self.cursors:
+            self.open_cursor(name)
+            return []
+        changes = self.pending(name)
+        self.cursors[name] = self.seq
+        self._trim()
+        return changes
+    
+    def _trim(self):
+        """丢弃所有游标都已取出的变更"""
+        if not self.cursors:
+            self.entries.clear()
+            return
+        oldest = min(self.cursors.values())
+        if self.entries and self.entries[0].seq <= oldest:
+            self.entries = [change for change in self.entries if change.seq > oldest]
\ No newline at end of file
@@ -0,0 +1,475 @@
+# core/chapter_index.py - 章节倒排索引
+
+import math
+import json
+import sys
+import zlib
+import re
+import base64
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# 参与索引的章节字段
+INDEX_FIELDS = ("title", "summary", "content")
+
+# 全文检索时各字段的权重
+FIELD_BOOST = {"title": 3.0, "summary": 1.5, "content": 1.0}
+
+# 查询中的引号短语或空白分隔的词
+_QUERY_PATTERN = re.compile(r'"([^"]+)"|“([^”]+)”|(\S+)')
+
+def parse_query(query: str) -> List[str]:
+    """解析查询：引号括起的短语视为一个整体，其余按空白切分"""
+    return [next(group for group in match.groups() if group)
+            for match in _QUERY_PATTERN.finditer(query)]
+
+def is_cjk(char: str) -> bool:
+    """是否为中日韩文字"""
+    code = ord(char)
+    return (0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or
+            0x3040 <= code <= 0x30FF or 0xAC00 <= code <= 0xD7AF or
+            0x20000 <= code <= 0x2FFFF)
+
+def tokenize(text: str) -> List[Tuple[str, int]]:
+    """分词：中日韩文字按重叠二元组切分（孤立单字保留为一元），其余按字母数字单词切分，
+    返回(词项, 字符偏移)列表"""
+    tokens = []
+    i = 0
+    length = len(text)
+    while i < length:
+        char = text[i]
+        if is_cjk(char):
+            j = i
+            while j < length and is_cjk(text[j]):
+                j += 1
+            if j - i == 1:
+                tokens.append((char, i))
+            else:
+                for k in range(i, j - 1):
+                    tokens.append((text[k:k + 2], k))
+            i = j
+        elif char.isalnum():
+            j = i
+            while j < length and text[j].isalnum() and not is_cjk(text[j]):
+                j += 1
+            tokens.append((text[i:j].lower(), i))
+            i = j
+        else:
+            i += 1
+    return tokens
+
+def split_passages(text: str, passage_chars: int) -> List[Tuple[int, int]]:
+    """按段落边界将文本切分为约passage_chars长的段，返回(起始, 结束)偏移"""
+    passages = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(length, start + passage_chars)
+        if end < length:
+            # 尽量在换行或句号处断开
+            cut = max(text.rfind("\n", start + passage_chars // 2, end),
+                      text.rfind("。", start + passage_chars // 2, end))
+            if cut > start:
+                end = cut + 1
+        passages.append((start, end))
+        start = end
+    return passages
+
+def field_crc(chapter, field: str) -> int:
+    """字段内容的CRC32，尚未加载的正文直接取存储中记录的校验值"""
+    if field == "content":
+        ref = chapter.content_ref()
+        if ref is not None:
+            return ref.crc
+    return zlib.crc32((getattr(chapter, field) or "").encode("utf-8"))
+
+def chapter_fingerprint(chapter) -> int:
+    """章节可索引内容的指纹，用于检测索引是否过期（不需要加载正文）"""
+    data = ":".join(str(field_crc(chapter, field)) for field in INDEX_FIELDS)
+    return zlib.crc32(data.encode("ascii"))
+
+class ChapterIndex:
+    """章节倒排索引 - 以段落为文档单位，支持增量更新和BM25排序
+    
+    倒排表按词项保存递增的文档ID数组和对应词频数组；删除的文档先记为墓碑，
+    累积到一定比例后统一压缩。
+    """
+    
+    def __init__(self, novel_id: str = "", passage_chars: int = 300, k1: float = 1.2, b: float = 0.75):
+        self.novel_id = novel_id
+        self.passage_chars = passage_chars
+        self.k1 = k1
+        self.b = b
+        
+        self.docs: Dict[int, Tuple[str, str, int, int]] = {}  # 文档ID -> (章节ID, 字段, 起始, 结束)
+        self.chapter_docs: Dict[str, List[int]] = {}  # 章节ID -> 文档ID列表
+        self.fingerprints: Dict[str, int] = {}  # 章节ID -> 内容指纹
+        self.postings: Dict[str, Tuple[array, array]] = {}  # 词项 -> (文档ID数组, 词频数组)
+        self.char_terms: Dict[str, Set[str]] = {}  # 汉字 -> 含该字的二元组词项（运行时，加载时重建）
+        self.words: Set[str] = set()  # 字母数字词项，短语两端的不完整单词在其中匹配（运行时，加载时重建）
+        self.deleted: Set[int] = set()
+        self.next_doc_id = 0
+        self.total_length = 0
+        self.dirty = False  # 自上次保存后是否有变化
+    
+    def __len__(self):
+        return len(self.docs)
+    
+    def index_chapter(self, chapter):
+        """索引或重新索引一个章节"""
+        fingerprint = chapter_fingerprint(chapter)
+        if self.fingerprints.get(chapter.id) == fingerprint:
+            return
+        
+        self.remove_chapter(chapter.id)
+        
+        doc_ids = []
+        for field in INDEX_FIELDS:
+            text = getattr(chapter, field) or ""
+            # 整个字段一起分词，跨越段落边界的词项（如边界两侧的二元组）归入其起点所在的段落
+            tokens = tokenize(text)
+            i = 0
+            for start, end in split_passages(text, self.passage_chars):
+                j = i
+                while j < len(tokens) and tokens[j][1] < end:
+                    j += 1
+                doc_id = self._add_doc(chapter.id, field, start, end, Counter(term for term, _ in tokens[i:j]))
+                doc_ids.append(doc_id)
+                i = j
+        
+        self.chapter_docs[chapter.id] = doc_ids
+        self.fingerprints[chapter.id] = fingerprint
+        self.dirty = True
+    
+    def _add_doc(self, chapter_id: str, field: str, start: int, end: int, terms: Counter) -> int:
+        """添加一个段落文档，terms为段落的词频"""
+        doc_id = self.next_doc_id
+        self.next_doc_id += 1
+        
+        for term, tf in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = (array("I"), array("H"))
+                self.postings[term] = posting
+                self._link_term(term)
+            posting[0].append(doc_id)
+            posting[1].append(min(tf, 65535))
+        
+        self.docs[doc_id] = (chapter_id, field, start, end)
+        self.total_length += end - start
+        return doc_id
+    
+    def _link_term(self, term: str):
+        """记录二元组中各汉字到词项的映射，查询中的孤立汉字经此定位相关词项；字母数字词项记入单词表"""
+        if len(term) == 2 and is_cjk(term[0]):
+            for char in set(term):
+                self.char_terms.setdefault(char, set()).add(term)
+        elif not is_cjk(term[0]):
+            self.words.add(term)
+    
+    def _unlink_term(self, term: str):
+        """移除词项在单字映射或单词表中的记录"""
+        if len(term) == 2 and is_cjk(term[0]):
+            for char in set(term):
+                terms = self.char_terms.get(char)
+                if terms is not None:
+                    terms.discard(term)
+                    if not terms:
+                        del self.char_terms[char]
+        else:
+            self.words.discard(term)
+    
+    def remove_chapter(self, chapter_id: str):
+        """从索引中移除章节"""
+        doc_ids = self.chapter_docs.pop(chapter_id, None)
+        self.fingerprints.pop(chapter_id, None)
+        if not doc_ids:
+            return
+        
+        for doc_id in doc_ids:
+            _, _, start, end = self.docs.pop(doc_id)
+            self.total_length -= end - start
+            self.deleted.add(doc_id)
+        self.dirty = True
+        
+        if len(self.deleted) > 64 and len(self.deleted) > len(self.docs) // 4:
+            self.compact()
+    
+    def compact(self):
+        """清除倒排表中已删除文档的条目"""
+        deleted = self.deleted
+        for term in list(self.postings):
+            doc_ids, tfs = self.postings[term]
+            keep = [i for i, doc_id in enumerate(doc_ids) if doc_id not in deleted]
+            if not keep:
+                del self.postings[term]
+                self._unlink_term(term)
+            elif len(keep) < len(doc_ids):
+                self.postings[term] = (array("I", (doc_ids[i] for i in keep)),
+                                       array("H", (tfs[i] for i in keep)))
+        self.deleted = set()
+    
+    def sync(self, novel) -> int:
+        """使索引与小说章节一致，只重新索引内容变化的章节，返回更新的章节数"""
+        self.novel_id = novel.id
+        changed = 0
+        current_ids = set()
+        for chapter in novel.chapters:
+            current_ids.add(chapter.id)
+            if self.fingerprints.get(chapter.id) != chapter_fingerprint(chapter):
+                self.index_chapter(chapter)
+                changed += 1
+        
+        for chapter_id in [cid for cid in self.chapter_docs if cid not in current_ids]:
+            self.remove_chapter(chapter_id)
+            changed += 1
+        
+        return changed
+    
+    def _idf(self, df: int) -> float:
+        """BM25逆文档频率"""
+        n = len(self.docs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+    
+    def search(self, query: str, top_k: int = 5, max_terms: int = 32,
+               exclude_chapters: Optional[Iterable[str]] = None,
+               fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """BM25检索，返回得分最高的段落: {chapter_id, field, start, end, score}"""
+        if not self.docs:
+            return []
+        
+        # 只保留区分度最高的若干词项，长查询也能保持毫秒级
+        terms = {t for term, _ in tokenize(query) for t in self._term_group(term)}
+        terms = sorted(terms, key=lambda t: (len(self.postings[t][0]), t))[:max_terms]
+        if not terms:
+            return []
+        
+        exclude = set(exclude_chapters or ())
+        fields = set(fields) if fields else None
+        avgdl = self.total_length / len(self.docs) or 1.0
+        
+        scores: Dict[int, float] = {}
+        for term in terms:
+            doc_ids, tfs = self.postings[term]
+            idf = self._idf(len(doc_ids))
+            for doc_id, tf in zip(doc_ids, tfs):
+                doc = self.docs.get(doc_id)
+                if doc is None:
+                    continue
+                length = doc[3] - doc[2]
+                score = idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avgdl))
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        
+        results = []
+        for doc_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            chapter_id, field, start, end = self.docs[doc_id]
+            if chapter_id in exclude or (fields is not None and field not in fields):
+                continue
+            results.append({"chapter_id": chapter_id, "field": field, "start": start, "end": end, "score": score})
+            if len(results) >= top_k:
+                break
+        return results
+    
+    def _posting_tf(self, term: str, doc_id: int) -> int:
+        """二分查找词项在文档中的词频，不存在时返回0"""
+        doc_ids, tfs = self.postings[term]
+        i = bisect_left(doc_ids, doc_id)
+        if i < len(doc_ids) and doc_ids[i] == doc_id:
+            return tfs[i]
+        return 0
+    
+    def _term_group(self, term: str, open_start: bool = False, open_end: bool = False) -> List[str]:
+        """索引中可能对应查询词项的全部词项
+        
+        查询中孤立的汉字（如"3号"、"A君"中的字）在正文中通常位于二元组内，展开为含该字的所有二元组及其一元本身。
+        open_start/open_end表示字母数字词项位于短语开头/结尾，正文中该端可能还连着其他字母数字（如"ell"之于"hello"），
+        展开为单词表中以其结尾/开头/包含它的词项。
+        """
+        if len(term) == 1 and is_cjk(term):
+            group = sorted(self.char_terms.get(term, ()))
+            if term in self.postings:
+                group.append(term)
+            return group
+        if is_cjk(term[0]) or not (open_start or open_end):
+            return [term] if term in self.postings else []
+        if open_start and open_end:
+            return sorted(word for word in self.words if term in word)
+        if open_start:
+            return sorted(word for word in self.words if word.endswith(term))
+        return sorted(word for word in self.words if word.startswith(term))
+    
+    def _candidate_docs(self, phrase: str) -> Tuple[Optional[List[int]], List[List[str]]]:
+        """返回包含短语最稀有词项组中任一词项的文档，及短语的词项组（按倒排表总长度排序）
+        
+        短语没有可索引的词项（如只有标点）时文档为None，需在全部字段中核对。
+        """
+        groups = []
+        for term, offset in tokenize(phrase):
+            group = self._term_group(term, offset == 0, offset + len(term) == len(phrase))
+            if group not in groups:
+                groups.append(group)
+        if not groups:
+            return None, []
+        if not all(groups):
+            return [], []
+        
+        groups.sort(key=lambda group: (sum(len(self.postings[t][0]) for t in group), group))
+        doc_ids = sorted({d for t in groups[0] for d in self.postings[t][0]})
+        return [d for d in doc_ids if d in self.docs], groups
+    
+    def _candidate_fields(self, phrase: str) -> Tuple[Dict[Tuple[str, str], List[int]], List[str]]:
+        """返回可能包含短语的字段{(章节ID, 字段): 字段的全部文档}及短语的词项
+        
+        短语可能跨越段落边界，因此按字段求交集：从最稀有词项组所在的字段出发，
+        保留其余每个词项组都出现在该字段某个段落中的字段，开销只取决于最短的倒排表。
+        """
+        doc_ids, groups = self._candidate_docs(phrase)
+        fields: Dict[Tuple[str, str], List[int]] = {}
+        if doc_ids is None:
+            for chapter_id, docs in self.chapter_docs.items():
+                for doc_id in docs:
+                    fields.setdefault((chapter_id, self.docs[doc_id][1]), []).append(doc_id)
+            return fields, []
+        
+        for doc_id in doc_ids:
+            chapter_id, field, _, _ = self.docs[doc_id]
+            key = (chapter_id, field)
+            if key not in fields:
+                fields[key] = [d for d in self.chapter_docs[chapter_id] if self.docs[d][1] == field]
+        
+        if len(groups) > 1:
+            fields = {key: docs for key, docs in fields.items()
+                      if all(any(self._posting_tf(t, d) for t in group for d in docs) for group in groups[1:])}
+        return fields, list(dict.fromkeys(t for group in groups for t in group))
+    
+    def find(self, query: str, get_text: Callable[[str, str], str],
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """全文检索：查询中的每个词或短语都须出现在章节中（不区分大小写）
+        
+        索引只用于筛选候选字段，get_text(章节ID, 字段)返回字段原文，在全文中核对短语并定位匹配位置，
+        跨越段落边界的短语同样能匹配；短语没有可索引的词项（如标点）时逐个字段核对原文。
+        返回按相关度排序的章节: {chapter_id, score, matches: [{field, start, end}]}；
+        得分为包含匹配起点的段落的BM25得分之和。
+        """
+        phrases = [p.lower() for p in parse_query(query)]
+        if not phrases or not self.docs:
+            return []
+        
+        avgdl = self.total_length / len(self.docs) or 1.0
+        chapter_scores: Optional[Dict[str, float]] = None
+        chapter_matches: Dict[str, List[Dict[str, Any]]] = {}
+        
+        for phrase in phrases:
+            fields, terms = self._candidate_fields(phrase)
+            idfs = {term: self._idf(len(self.postings[term][0])) for term in terms}
+            scores: Dict[str, float] = {}
+            
+            for (chapter_id, field), docs in fields.items():
+                if chapter_scores is not None and chapter_id not in chapter_scores:
+                    continue
+                
+                # 在字段原文中核对短语
+                text = get_text(chapter_id, field).lower()
+                offsets = []
+                position = text.find(phrase)
+                while position != -1:
+                    offsets.append(position)
+                    position = text.find(phrase, position + 1)
+                if not offsets:
+                    continue
+                
+                # 字段的段落按起点排列，取包含各匹配起点的段落计分
+                docs = sorted(docs, key=lambda d: self.docs[d][2])
+                starts = [self.docs[d][2] for d in docs]
+                matched_docs = {docs[max(0, bisect_right(starts, offset) - 1)] for offset in offsets}
+                score = 0.0
+                for doc_id in matched_docs:
+                    _, _, start, end = self.docs[doc_id]
+                    norm = self.k1 * (1 - self.b + self.b * (end - start) / avgdl)
+                    score += sum(idfs[t] * tf * (self.k1 + 1) / (tf + norm)
+                                 for t in terms for tf in [self._posting_tf(t, doc_id)] if tf)
+                scores[chapter_id] = scores.get(chapter_id, 0.0) + score * FIELD_BOOST.get(field, 1.0)
+                
+                for offset in offsets:
+                    chapter_matches.setdefault(chapter_id, []).append({
+                        "field": field,
+                        "start": offset,
+                        "end": offset + len(phrase)
+                    })
+            
+            if chapter_scores is None:
+                chapter_scores = scores
+            else:
+                chapter_scores = {cid: chapter_scores[cid] + score for cid, score in scores.items()}
+            if not chapter_scores:
+                return []
+        
+        ranked = sorted(chapter_scores.items(), key=lambda item: item[1], reverse=True)
+        if limit is not None:
+            ranked = ranked[:limit]
+        
+        field_order = {field: i for i, field in enumerate(INDEX_FIELDS)}
+        return [{
+            "chapter_id": chapter_id,
+            "score": score,
+            "matches": sorted(chapter_matches[chapter_id], key=lambda m: (field_order[m["field"]], m["start"]))
+        } for chapter_id, score in ranked]
+    
+    def save(self, path: str):
+        """保存索引到文件"""
+        if self.deleted:
+            self.compact()
+        
+        data = {
+            "version": 3,
+            "byteorder": sys.byteorder,
+            "novel_id": self.novel_id,
+            "passage_chars": self.passage_chars,
+            "next_doc_id": self.next_doc_id,
+            "docs": {str(doc_id): list(doc) for doc_id, doc in self.docs.items()},
+            "chapter_docs": self.chapter_docs,
+            "fingerprints": self.fingerprints,
+            "postings": {
+                term: [base64.b64encode(doc_ids.tobytes()).decode("ascii"),
+                       base64.b64encode(tfs.tobytes()).decode("ascii")]
+                for term, (doc_ids, tfs) in self.postings.items()
+            }
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        self.dirty = False
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["ChapterIndex"]:
+        """从文件加载索引，格式不兼容时返回None"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        
+        if data.get("version") != 3 or data.get("byteorder") != sys.byteorder:
+            return None
+        
+        index = cls(novel_id=data["novel_id"], passage_chars=data["passage_chars"])
+        index.next_doc_id = data["next_doc_id"]
+        index.docs = {int(doc_id): tuple(doc) for doc_id, doc in data["docs"].items()}
+        index.chapter_docs = data["chapter_docs"]
+        index.fingerprints = data["fingerprints"]
+        index.total_length = sum(doc[3] - doc[2] for doc in index.docs.values())
+        for term, (doc_bytes, tf_bytes) in data["postings"].items():
+            doc_ids = array("I")
+            doc_ids.frombytes(base64.b64decode(doc_bytes))
+            tfs = array("H")
+            tfs.frombytes(base64.b64decode(tf_bytes))
+            index.postings[term] = (doc_ids, tfs)
+            index._link_term(term)
+        return index
+
+def get_chapter_index(novel) -> ChapterIndex:
+    """获取小说的章节索引，不存在或不属于该小说时全量构建"""
+    index = novel.index
+    if index is None or index.novel_id != novel.id:
+        index = ChapterIndex(novel.id)
+        index.sync(novel)
+        novel.index = index
+    return index
\ No newline at end of file
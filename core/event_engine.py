@@ -1,59 +1,257 @@
 # core/event_engine.py - 事件引擎
 
+import heapq
 import random
-from typing import List, Dict, Any
+from bisect import bisect_right
+from typing import List, Dict, Any, Optional, Set, Tuple
 from .models import Novel, Character, Event
+from .relationship_matrix import get_relationship_matrix
+
+# 可求值的触发类型：类型 -> 说明
+# character_relation: 任一角色间存在该类型的关系
+# character: 存在该名称(或ID)的角色
+# trait: 任一角色具有该特质，或该项性格值不低于TRAIT_THRESHOLD
+# chapter: 即将生成的章节号不小于该值
+TRIGGER_TYPES = ("character_relation", "character", "trait", "chapter")
+
+# 性格值达到该阈值时视为具有同名特质
+TRAIT_THRESHOLD = 0.5
+
+def normalize_trigger_value(value: Any) -> str:
+    """触发值的规范形式"""
+    return str(value).strip().lower()
+
+class TriggerIndex:
+    """触发条件索引 - 从(触发类型, 触发值)映射到事件，只有触发条件可能满足的事件才参与评分
+    
+    同一类型的多个取值之间为“或”，不同类型之间为“且”；未知类型不构成限制，
+    没有可求值触发条件的事件视为无条件事件。
+    """
+    
+    def __init__(self, novel_id: str = ""):
+        self.novel_id = novel_id
+        self.by_key: Dict[Tuple[str, str], Set[str]] = {}  # (类型, 值) -> 事件ID集合
+        self.event_keys: Dict[str, List[Tuple[str, str]]] = {}  # 事件ID -> 其索引键
+        self.required: Dict[str, int] = {}  # 事件ID -> 需满足的触发类型数
+        self.chapter_keys: List[int] = []  # 章节触发阈值（升序）
+        self.chapter_events: List[str] = []  # 与chapter_keys对应的事件ID
+        self.unconditional: List[str] = []  # 无条件事件
+        self._unconditional_pos: Dict[str, int] = {}  # 事件ID -> 在unconditional中的位置
+        self.version = 0  # 每次增删事件时递增，供评分器判断打包的特征是否过期
+    
+    def __len__(self):
+        return len(self.required) + len(self.unconditional)
+    
+    def add_event(self, event: Event):
+        """索引事件（已存在时先移除旧条目）"""
+        self.remove_event(event.id)
+        self.version += 1
+        
+        keys = []
+        required = 0
+        for trigger_type, values in (event.triggers or {}).items():
+            if trigger_type not in TRIGGER_TYPES:
+                continue
+            if trigger_type == "chapter":
+                try:
+                    threshold = int(values[0] if isinstance(values, list) else values)
+                except (TypeError, ValueError, IndexError):
+                    continue
+                position = bisect_right(self.chapter_keys, threshold)
+                self.chapter_keys.insert(position, threshold)
+                self.chapter_events.insert(position, event.id)
+            else:
+                for value in values if isinstance(values, list) else [values]:
+                    key = (trigger_type, normalize_trigger_value(value))
+                    self.by_key.setdefault(key, set()).add(event.id)
+                    keys.append(key)
+            required += 1
+        
+        if required:
+            self.required[event.id] = required
+            self.event_keys[event.id] = keys
+        else:
+            self._unconditional_pos[event.id] = len(self.unconditional)
+            self.unconditional.append(event.id)
+    
+    def remove_event(self, event_id: str):
+        """从索引中移除事件"""
+        self.version += 1
+        position = self._unconditional_pos.pop(event_id, None)
+        if position is not None:
+            # 与末尾交换后删除
+            last = self.unconditional.pop()
+            if last != event_id:
+                self.unconditional[position] = last
+                self._unconditional_pos[last] = position
+            return
+        
+        if self.required.pop(event_id, None) is None:
+            return
+        
+        for key in self.event_keys.pop(event_id):
+            ids = self.by_key.get(key)
+            if ids is not None:
+                ids.discard(event_id)
+                if not ids:
+                    del self.by_key[key]
+        
+        if event_id in self.chapter_events:
+            position = self.chapter_events.index(event_id)
+            del self.chapter_keys[position]
+            del self.chapter_events[position]
+    
+    def rebuild(self, novel: Novel):
+        """根据事件库全量重建"""
+        version = self.version
+        self.__init__(novel.id)
+        self.version = version + 1
+        for event in novel.events_library.values():
+            self.add_event(event)
+    
+    def satisfied(self, facts: Set[Tuple[str, str]], chapter_number: int) -> Dict[str, int]:
+        """返回触发条件全部满足的有条件事件: 事件ID -> 满足的触发类型数"""
+        matched: Dict[str, Set[str]] = {}
+        for key in facts:
+            for event_id in self.by_key.get(key, ()):
+                matched.setdefault(event_id, set()).add(key[0])
+        
+        for event_id in self.chapter_events[:bisect_right(self.chapter_keys, chapter_number)]:
+            matched.setdefault(event_id, set()).add("chapter")
+        
+        # 事实和事件ID都是集合，按事件ID排序使结果顺序（及随机数的消耗顺序）与哈希种子无关
+        return {event_id: len(matched[event_id]) for event_id in sorted(matched)
+                if len(matched[event_id]) >= self.required[event_id]}
+
+def get_trigger_index(novel: Novel) -> TriggerIndex:
+    """获取小说的触发条件索引，不存在或与事件库不一致时重建"""
+    index = novel.trigger_index
+    if index is None or index.novel_id != novel.id or len(index) != len(novel.events_library):
+        index = TriggerIndex()
+        index.rebuild(novel)
+        novel.trigger_index = index
+    return index
 
 class EventEngine:
     """事件引擎 - 负责选择和触发事件"""
     
+    def __init__(self, recent_window: int = 3, recent_penalty: float = 1.0, scorer=None):
+        self.recent_window = recent_window  # 最近多少章用过的事件会被降权
+        self.recent_penalty = recent_penalty
+        self.scorer = scorer  # 可选的整体评分器（如VectorizedEventScorer），未设置时逐个评分
+    
     def select_events_for_chapter(self, novel: Novel, max_events: int = 3) -> List[Event]:
         """为当前章节选择合适的事件"""
-        # 选择潜在事件
-        potential_events = list(novel.events_library.values())
-        
-        if not potential_events:
+        if not novel.events_library:
             return []
         
-        # 过滤和评分事件
-        scored_events = []
-        for event in potential_events:
-            score = self._calculate_event_score(event, novel)
+        index = get_trigger_index(novel)
+        satisfied = index.satisfied(self.current_facts(novel), novel.current_chapter + 1)
+        
+        if self.scorer is not None:
+            event_ids = self.scorer.select(novel, index, satisfied, novel.current_chapter + 1, max_events)
+            return [novel.events_library[event_id] for event_id in event_ids]
+        
+        recent = self._recent_events(novel)
+        rng = novel.rng("events")
+        
+        # 只对触发条件满足的事件评分
+        scored = []
+        for event_id, matched in satisfied.items():
+            score = self._calculate_event_score(novel.events_library[event_id], novel, rng, matched, event_id in recent)
             if score > 0:
-                scored_events.append((event, score))
+                scored.append((score, event_id))
+        
+        # 无条件事件的分数只差随机项，抽取足够的样本即可代表整体
+        pool = index.unconditional
+        if len(scored) < max_events and pool:
+            sample_size = min(len(pool), max_events + len(recent))
+            for event_id in rng.sample(pool, sample_size):
+                score = self._calculate_event_score(novel.events_library[event_id], novel, rng, 0, event_id in recent)
+                if score > 0:
+                    scored.append((score, event_id))
         
-        # 按分数排序并选择前几个
-        scored_events.sort(key=lambda x: x[1], reverse=True)
-        num_events = min(len(scored_events), max_events)
+        # 堆选前k个
+        return [novel.events_library[event_id] for _, event_id in heapq.nlargest(max_events, scored)]
+    
+    def current_facts(self, novel: Novel) -> Set[Tuple[str, str]]:
+        """当前故事状态下成立的(触发类型, 触发值)"""
+        facts = set()
+        for char in novel.characters.values():
+            facts.add(("character", normalize_trigger_value(char.name)))
+            facts.add(("character", normalize_trigger_value(char.id)))
+            for trait in char.traits:
+                facts.add(("trait", normalize_trigger_value(trait.name)))
+            for name, value in char.personality.items():
+                if value >= TRAIT_THRESHOLD:
+                    facts.add(("trait", normalize_trigger_value(name)))
         
-        return [event for event, _ in scored_events[:num_events]]
+        # 关系类型直接从关系矩阵读取，未安装numpy时逐个遍历
+        matrix = get_relationship_matrix(novel)
+        if matrix is not None:
+            rel_types = matrix.relationship_types()
+        else:
+            rel_types = [rel.relationship_type for char in novel.characters.values()
+                         for rel in char.relationships.values()]
+        for rel_type in rel_types:
+            facts.add(("character_relation", normalize_trigger_value(rel_type)))
+        return facts
+    
+    def _recent_events(self, novel: Novel) -> Set[str]:
+        """最近几章用过的事件"""
+        recent = set()
+        for chapter in novel.chapters[-self.recent_window:] if self.recent_window > 0 else []:
+            recent.update(chapter.events)
+        return recent
     
-    def _calculate_event_score(self, event: Event, novel: Novel) -> float:
+    def _calculate_event_score(self, event: Event, novel: Novel, rng: random.Random,
+                               matched_triggers: int = 0, recently_used: bool = False) -> float:
         """计算事件的适合度分数"""
-        # 示例评分逻辑，可以根据需要扩展
         score = 1.0  # 基础分
         
+        # 触发条件越具体越优先
+        score += 0.5 * matched_triggers
+        
+        # 避免连续重复同一事件
+        if recently_used:
+            score -= self.recent_penalty
+        
         # 添加一些随机性
-        score += random.uniform(0, 0.5)
+        score += rng.uniform(0, 0.5)
         
         return score
     
     def apply_event_effects(self, event: Event, novel: Novel, affected_characters: List[Character]):
-        """应用事件的效果"""
-        for effect in event.effects:
-            # 解析效果类型和值
-            effect_type = effect.get("target")
-            effect_value = effect.get("value", 0.0)
-            
-            if effect_type == "character_relation":
-                # 更新角色关系
+        """应用事件的效果：每个关系效果依次一次作用于所有受影响角色两两之间的关系
+        
+        效果按顺序逐个施加并各自截断到[-1, 1]（先+0.8再-0.5与合并为+0.3的结果不同），每个效果记录一条历史。
+        """
+        relation_effects = [effect for effect in event.effects if effect.get("target") == "character_relation"]
+        if not relation_effects or len(affected_characters) < 2:
+            return
+        
+        description = f"事件'{event.name}'影响了关系"
+        chapter = novel.upcoming_chapter()
+        
+        matrix = get_relationship_matrix(novel)
+        for effect in relation_effects:
+            effect_value = float(effect.get("value", 0.0))
+            if matrix is not None:
+                # 向量化更新，每个效果只记录一条历史
+                matrix.apply_group_effect([char.id for char in affected_characters], "受事件影响",
+                                          effect_value, description, event.id, chapter)
+            else:
+                # 未安装numpy时逐对更新
                 for i, char1 in enumerate(affected_characters):
                     for char2 in affected_characters[i+1:]:
-                        char1.update_relationship(
-                            char2.id, "受事件影响", float(effect_value),
-                            f"事件'{event.name}'影响了关系"
-                        )
-                        char2.update_relationship(
-                            char1.id, "受事件影响", float(effect_value),
-                            f"事件'{event.name}'影响了关系"
-                        )
\ No newline at end of file
+                        for source, target in ((char1, char2), (char2, char1)):
+                            novel.history_archive.extend(source.update_relationship(
+                                target.id, "受事件影响", effect_value, description, chapter, novel.history_limit))
+        
+        # 只重新读取受影响角色之间的关系边（延迟导入，focus_selector依赖本模块）
+        from .focus_selector import get_character_graph
+        graph = get_character_graph(novel)
+        char_ids = [char.id for char in affected_characters]
+        for char in affected_characters:
+            graph.update_edges(char, char_ids)
+            novel.record_change("character", "update", char.id, ("relationships",))
\ No newline at end of file
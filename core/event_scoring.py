@@ -0,0 +1,282 @@
+# core/event_scoring.py - 向量化事件评分
+
+from typing import Any, Dict, List, Optional, Sequence, Union
+from .models import Novel
+from .event_engine import TriggerIndex, normalize_trigger_value
+from .reference_index import get_reference_index
+from .relationship_matrix import get_relationship_matrix
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 特征名称，顺序与权重向量一致
+FEATURES = (
+    "bias",                # 常数项
+    "trigger_match",       # 满足的触发类型数
+    "relation_strength",   # 触发关系类型在当前角色间的平均强度
+    "personality",         # 触发特质在角色中的最高性格值
+    "effect_magnitude",    # 事件效果绝对值之和
+    "recency",             # 最近使用程度，越近越接近1
+    "usage",               # 累计使用次数的对数
+    "noise"                # 随机项
+)
+
+# 评分器在变更日志上的游标名
+JOURNAL_CURSOR = "event_scoring"
+
+DEFAULT_WEIGHTS = {
+    "bias": 1.0,
+    "trigger_match": 0.5,
+    "relation_strength": 0.3,
+    "personality": 0.3,
+    "effect_magnitude": 0.2,
+    "recency": -1.0,
+    "usage": -0.1,
+    "noise": 0.5
+}
+
+class VectorizedEventScorer:
+    """向量化事件评分器 - 将事件特征与当前小说状态打包为NumPy数组，一次计算整个事件库的分数
+    
+    分数为特征矩阵与权重向量的乘积；事件特征只在事件库变化时重新打包，
+    各事件的使用次数和最近使用章节按变更日志增量更新，关系类型的平均强度按关系矩阵的版本缓存。
+    随机项取自小说的随机数生成器，设置种子时可复现。
+    """
+    
+    def __init__(self, weights: Optional[Union[Dict[str, float], Sequence[float]]] = None,
+                 recent_window: int = 3):
+        if np is None:
+            raise ValueError("未安装numpy包")
+        
+        self.recent_window = max(1, recent_window)  # 最近使用特征的衰减尺度(章)
+        self.weights = np.array([DEFAULT_WEIGHTS[name] for name in FEATURES], dtype=float)
+        if weights is not None:
+            self.set_weights(weights)
+        
+        self._packed: Optional[Dict[str, Any]] = None
+        self._packed_key = None
+        self._strengths_key = None
+        self._strengths: Optional["np.ndarray"] = None
+    
+    def set_weights(self, weights: Union[Dict[str, float], Sequence[float]]):
+        """设置权重：按特征名称的字典（未给出的保持不变）或与FEATURES等长的序列"""
+        if isinstance(weights, dict):
+            unknown = set(weights) - set(FEATURES)
+            if unknown:
+                raise ValueError(f"未知的评分特征: {', '.join(sorted(unknown))}")
+            for name, value in weights.items():
+                self.weights[FEATURES.index(name)] = float(value)
+        else:
+            vector = np.asarray(weights, dtype=float)
+            if vector.shape != (len(FEATURES),):
+                raise ValueError(f"权重向量长度应为{len(FEATURES)}")
+            self.weights = vector.copy()
+    
+    def get_weights(self) -> Dict[str, float]:
+        """获取当前权重"""
+        return {name: float(value) for name, value in zip(FEATURES, self.weights)}
+    
+    def _pack(self, novel: Novel, index: TriggerIndex) -> Dict[str, Any]:
+        """打包事件的静态特征，事件库未变化时复用"""
+        key = (id(index), index.version)
+        if self._packed is not None and self._packed_key == key:
+            return self._packed
+        
+        event_ids = list(novel.events_library)
+        relation_types: Dict[str, int] = {}
+        traits: Dict[str, int] = {}
+        relation_idx = np.full(len(event_ids), -1, dtype=np.int64)
+        trait_idx = np.full(len(event_ids), -1, dtype=np.int64)
+        effect_magnitude = np.zeros(len(event_ids))
+        unconditional = np.zeros(len(event_ids), dtype=bool)
+        
+        for row, event_id in enumerate(event_ids):
+            event = novel.events_library[event_id]
+            triggers = event.triggers or {}
+            
+            relation = triggers.get("character_relation")
+            if relation:
+                value = normalize_trigger_value(relation[0] if isinstance(relation, list) else relation)
+                relation_idx[row] = relation_types.setdefault(value, len(relation_types))
+            
+            trait = triggers.get("trait")
+            if trait:
+                value = normalize_trigger_value(trait[0] if isinstance(trait, list) else trait)
+                trait_idx[row] = traits.setdefault(value, len(traits))
+            
+            for effect in event.effects:
+                try:
+                    effect_magnitude[row] += abs(float(effect.get("value", 0.0)))
+                except (TypeError, ValueError):
+                    pass
+        
+        row_of = {event_id: row for row, event_id in enumerate(event_ids)}
+        unconditional[[row_of[event_id] for event_id in index.unconditional if event_id in row_of]] = True
+        
+        # 改为跟踪另一部小说时释放原变更日志上的游标
+        if self._packed is not None and self._packed["journal"] is not novel.journal:
+            self._packed["journal"].close_cursor(JOURNAL_CURSOR)
+        
+        self._packed = {
+            "event_ids": event_ids,
+            "row_of": row_of,
+            "relation_types": relation_types,
+            "traits": traits,
+            "relation_idx": relation_idx,
+            "trait_idx": trait_idx,
+            "effect_magnitude": effect_magnitude,
+            "unconditional": unconditional,
+            "journal": novel.journal
+        }
+        self._packed_key = key
+        self._count_usage(novel, self._packed)
+        return self._packed
+    
+    def _count_usage(self, novel: Novel, packed: Dict[str, Any]):
+        """全量统计各事件的使用次数和最近使用的章节，并把变更日志游标移到当前位置"""
+        row_of = packed["row_of"]
+        n = len(packed["event_ids"])
+        usage = np.zeros(n)
+        last_used = np.full(n, -np.inf)
+        chapter_rows: Dict[str, List[int]] = {}
+        for chapter in novel.chapters:
+            rows = [row_of[event_id] for event_id in chapter.events if event_id in row_of]
+            chapter_rows[chapter.id] = rows
+            if rows:
+                np.add.at(usage, rows, 1)
+                last_used[rows] = np.maximum(last_used[rows], chapter.number)
+        
+        packed["usage"] = usage
+        packed["last_used"] = last_used
+        packed["chapter_rows"] = chapter_rows  # 章节ID -> 已计入的事件行
+        novel.journal.drain(JOURNAL_CURSOR)
+    
+    def _sync_usage(self, novel: Novel, packed: Dict[str, Any]):
+        """按上次同步以来的章节变更增量更新使用次数和最近使用章节
+        
+        新增或修改的章节先减去原先计入的事件再加上当前事件；删除章节会使后续章节重新编号，此时全量统计。
+        """
+        changes = [change for change in novel.journal.drain(JOURNAL_CURSOR) if change.kind == "chapter"]
+        if not changes:
+            return
+        if any(change.action == "delete" for change in changes):
+            self._count_usage(novel, packed)
+            return
+        
+        references = get_reference_index(novel)
+        row_of, usage, last_used = packed["row_of"], packed["usage"], packed["last_used"]
+        event_ids, chapter_rows = packed["event_ids"], packed["chapter_rows"]
+        for chapter_id in dict.fromkeys(change.target for change in changes):
+            chapter = references.chapters.get(chapter_id)
+            old_rows = chapter_rows.pop(chapter_id, [])
+            rows = [row_of[event_id] for event_id in chapter.events if event_id in row_of] if chapter else []
+            np.subtract.at(usage, old_rows, 1)
+            np.add.at(usage, rows, 1)
+            if chapter is not None:
+                chapter_rows[chapter_id] = rows
+                last_used[rows] = np.maximum(last_used[rows], chapter.number)
+            
+            # 不再引用某事件的章节若是其最近使用的章节，从引用索引中重新取最近的一章
+            for row in set(old_rows) - set(rows):
+                used = references.chapters_with_event(event_ids[row])
+                last_used[row] = used[-1].number if used else -np.inf
+    
+    def _relation_strengths(self, novel: Novel, relation_types: Dict[str, int]) -> "np.ndarray":
+        """各关系类型的当前平均强度，末位为无关系触发的事件补0；关系矩阵未变化时复用上次结果"""
+        matrix = get_relationship_matrix(novel)
+        key = (matrix, matrix.version, relation_types)
+        if self._strengths is not None and self._strengths_key == key:
+            return self._strengths
+        
+        size = len(matrix.ids)
+        present = matrix.present[:size, :size]
+        types = matrix.types[:size, :size][present]
+        strengths = matrix.strength[:size, :size][present]
+        
+        totals = np.zeros(len(relation_types) + 1)
+        counts = np.zeros(len(relation_types) + 1)
+        if len(types):
+            # 每种关系类型只归一化一次
+            names, inverse = np.unique(types, return_inverse=True)
+            slot_of = np.array([relation_types.get(normalize_trigger_value(name), -1) for name in names],
+                               dtype=np.int64)
+            slots = slot_of[inverse]
+            valid = slots >= 0
+            totals += np.bincount(slots[valid], weights=strengths[valid], minlength=len(totals))
+            counts += np.bincount(slots[valid], minlength=len(counts))
+        
+        self._strengths = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+        self._strengths_key = key
+        return self._strengths
+    
+    def _trait_values(self, novel: Novel, traits: Dict[str, int]) -> "np.ndarray":
+        """各特质在角色中的最高性格值（具有同名特质记为1），末位补0"""
+        values = np.zeros(len(traits) + 1)
+        for char in novel.characters.values():
+            for name, value in char.personality.items():
+                slot = traits.get(normalize_trigger_value(name))
+                if slot is not None:
+                    values[slot] = max(values[slot], float(value))
+            for trait in char.traits:
+                slot = traits.get(normalize_trigger_value(trait.name))
+                if slot is not None:
+                    values[slot] = 1.0
+        return values
+    
+    def feature_matrix(self, novel: Novel, index: TriggerIndex, satisfied: Dict[str, int],
+                       chapter_number: int) -> "np.ndarray":
+        """构建(事件数, 特征数)的特征矩阵"""
+        packed = self._pack(novel, index)
+        row_of = packed["row_of"]
+        n = len(packed["event_ids"])
+        
+        matched = np.zeros(n)
+        if satisfied:
+            rows = np.fromiter((row_of[event_id] for event_id in satisfied), dtype=np.int64, count=len(satisfied))
+            matched[rows] = np.fromiter(satisfied.values(), dtype=float, count=len(satisfied))
+        
+        # 事件使用次数和最近使用的章节
+        self._sync_usage(novel, packed)
+        usage, last_used = packed["usage"], packed["last_used"]
+        
+        relation_strength = self._relation_strengths(novel, packed["relation_types"])[packed["relation_idx"]]
+        personality = self._trait_values(novel, packed["traits"])[packed["trait_idx"]]
+        recency = np.exp(-(chapter_number - last_used) / self.recent_window)
+        
+        return np.column_stack([
+            np.ones(n),
+            matched,
+            relation_strength,
+            personality,
+            packed["effect_magnitude"],
+            recency,
+            np.log1p(usage),
+            np.random.default_rng(novel.rng("event_noise").getrandbits(64)).random(n)
+        ])
+    
+    def score(self, novel: Novel, index: TriggerIndex, satisfied: Dict[str, int],
+              chapter_number: int) -> "np.ndarray":
+        """计算全部事件的分数，触发条件不满足的事件为负无穷（行顺序同事件库）"""
+        packed = self._pack(novel, index)
+        scores = self.feature_matrix(novel, index, satisfied, chapter_number) @ self.weights
+        
+        eligible = packed["unconditional"].copy()
+        if satisfied:
+            eligible[[packed["row_of"][event_id] for event_id in satisfied]] = True
+        scores[~eligible] = -np.inf
+        return scores
+    
+    def select(self, novel: Novel, index: TriggerIndex, satisfied: Dict[str, int],
+               chapter_number: int, max_events: int) -> List[str]:
+        """选出分数最高且为正的至多max_events个事件ID"""
+        packed = self._pack(novel, index)
+        if not packed["event_ids"] or max_events <= 0:
+            return []
+        
+        scores = self.score(novel, index, satisfied, chapter_number)
+        k = min(max_events, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [packed["event_ids"][row] for row in top if scores[row] > 0]
\ No newline at end of file
@@ -0,0 +1,266 @@
+# core/focus_selector.py - 焦点角色选择
+
+import heapq
+import math
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from .models import Novel, Character, Chapter, Event
+from .event_engine import normalize_trigger_value
+
+FOCUS_WEIGHTS = {
+    "centrality": 1.0,   # 加权度中心性（相对全书最高值）
+    "involvement": 1.5,  # 与本章事件的关联
+    "staleness": 0.8,    # 距上次出场的时间
+    "cohesion": 0.6,     # 与已选焦点角色的关系
+    "noise": 0.3         # 随机项
+}
+
+def edge_weight(strength: float) -> int:
+    """关系边的权重：每条关系计1，再加上强度的绝对值；以千分之一为单位取整，
+    中心性增量累加与全量重建的结果完全一致，续写时的选择不受浮点误差影响"""
+    return 1000 + round(abs(float(strength)) * 1000)
+
+class CharacterGraph:
+    """角色关系图 - 以Character.relationships为边维护加权度中心性、出场记录和事件参与情况
+    
+    关系、角色和章节变化时增量更新；中心性排名保存在有序列表中，
+    出场先后保存在有序字典中，取最核心或最久未出场的角色只需读取表头。
+    """
+    
+    def __init__(self, novel_id: str = ""):
+        self.novel_id = novel_id
+        self.edges: Dict[str, Dict[str, int]] = {}  # 角色ID -> {目标ID: 边权重}
+        self.inbound: Dict[str, Dict[str, int]] = {}  # 角色ID -> {来源ID: 边权重}
+        self.centrality: Dict[str, int] = {}  # 角色ID -> 出边与入边权重之和
+        self.ranked: List[Tuple[int, str]] = []  # (-中心性, 角色ID)，升序即中心性从高到低
+        self.names: Dict[str, str] = {}  # 角色ID -> 规范化名称
+        self.by_name: Dict[str, str] = {}  # 规范化名称 -> 角色ID
+        
+        self.last_seen: Dict[str, int] = {}  # 角色ID -> 最近作为焦点出场的章节
+        self.appearances = Counter()  # 角色ID -> 出场章节数
+        self.stale_order: "OrderedDict[str, None]" = OrderedDict()  # 按最近出场由早到晚，未出场的在前
+        self.event_cast: Dict[str, Counter] = {}  # 事件ID -> 与该事件同章出场的角色计数
+        self.recency_dirty = False  # 章节被修改或删除后需要重建出场记录
+    
+    def __len__(self) -> int:
+        return len(self.centrality)
+    
+    def _adjust(self, char_id: str, delta: int):
+        """调整角色的中心性并维护排名"""
+        if char_id not in self.centrality or not delta:
+            return
+        old = self.centrality[char_id]
+        del self.ranked[bisect_left(self.ranked, (-old, char_id))]
+        self.centrality[char_id] = old + delta
+        insort(self.ranked, (-(old + delta), char_id))
+    
+    def _set_edge(self, source: str, target: str, weight: Optional[int]):
+        """设置或删除(weight为None)一条关系边"""
+        old = self.edges.get(source, {}).get(target, 0)
+        if weight is None:
+            self.edges.get(source, {}).pop(target, None)
+            self.inbound.get(target, {}).pop(source, None)
+            weight = 0
+        else:
+            self.edges.setdefault(source, {})[target] = weight
+            self.inbound.setdefault(target, {})[source] = weight
+        self._adjust(source, weight - old)
+        self._adjust(target, weight - old)
+    
+    def add_character(self, character: Character):
+        """加入角色（未出场的角色排在最久未出场的位置）"""
+        if character.id not in self.centrality:
+            self.centrality[character.id] = 0
+            insort(self.ranked, (0, character.id))
+            self.stale_order[character.id] = None
+            self.stale_order.move_to_end(character.id, last=False)
+            # 已有角色指向该角色的关系此前未计入其中心性
+            self._adjust(character.id, sum(self.inbound.get(character.id, {}).values()))
+        self.update_character(character)
+    
+    def update_character(self, character: Character):
+        """重新读取角色的名称和全部出边"""
+        name = normalize_trigger_value(character.name)
+        if self.names.get(character.id) != name:
+            if self.by_name.get(self.names.get(character.id)) == character.id:
+                del self.by_name[self.names[character.id]]
+            self.names[character.id] = name
+            self.by_name[name] = character.id
+        
+        current = {target_id: edge_weight(rel.strength) for target_id, rel in character.relationships.items()
+                   if target_id != character.id}
+        for target_id in list(self.edges.get(character.id, {})):
+            if target_id not in current:
+                self._set_edge(character.id, target_id, None)
+        for target_id, weight in current.items():
+            self._set_edge(character.id, target_id, weight)
+    
+    def update_edges(self, character: Character, target_ids: Iterable[str]):
+        """只重新读取角色指向给定目标的关系"""
+        for target_id in target_ids:
+            if target_id == character.id:
+                continue
+            rel = character.relationships.get(target_id)
+            self._set_edge(character.id, target_id, None if rel is None else edge_weight(rel.strength))
+    
+    def remove_character(self, char_id: str):
+        """删除角色及其所有出边和入边"""
+        if char_id not in self.centrality:
+            return
+        for target_id in list(self.edges.get(char_id, {})):
+            self._set_edge(char_id, target_id, None)
+        for source_id in list(self.inbound.get(char_id, {})):
+            self._set_edge(source_id, char_id, None)
+        self.edges.pop(char_id, None)
+        self.inbound.pop(char_id, None)
+        
+        del self.ranked[bisect_left(self.ranked, (-self.centrality.pop(char_id), char_id))]
+        name = self.names.pop(char_id, None)
+        if self.by_name.get(name) == char_id:
+            del self.by_name[name]
+        self.stale_order.pop(char_id, None)
+        self.last_seen.pop(char_id, None)
+        self.appearances.pop(char_id, None)
+        # 已删除的角色不再占用事件同章出场角色的名额
+        for cast in self.event_cast.values():
+            cast.pop(char_id, None)
+    
+    def record_chapter(self, chapter: Chapter):
+        """记录新章节的焦点角色出场"""
+        for char_id in chapter.character_focus:
+            if char_id in self.stale_order:
+                self.last_seen[char_id] = max(self.last_seen.get(char_id, 0), chapter.number)
+                self.appearances[char_id] += 1
+                self.stale_order.move_to_end(char_id)
+        for event_id in chapter.events:
+            self.event_cast.setdefault(event_id, Counter()).update(chapter.character_focus)
+    
+    def rebuild_recency(self, novel: Novel):
+        """按现有章节重建出场记录"""
+        self.last_seen = {}
+        self.appearances = Counter()
+        self.event_cast = {}
+        # 未出场角色中后加入的在前，与逐个加入时的顺序一致
+        self.stale_order = OrderedDict.fromkeys(reversed(list(self.centrality)))
+        for chapter in novel.chapters:
+            self.record_chapter(chapter)
+        self.recency_dirty = False
+    
+    def rebuild(self, novel: Novel):
+        """从小说全量重建"""
+        self.__init__(novel.id)
+        for character in novel.characters.values():
+            self.add_character(character)
+        self.rebuild_recency(novel)
+    
+    def neighbours(self, char_id: str, limit: int) -> List[str]:
+        """关系最强的至多limit个相邻角色（出边和入边）"""
+        weights = dict(self.inbound.get(char_id, {}))
+        for target_id, weight in self.edges.get(char_id, {}).items():
+            weights[target_id] = max(weight, weights.get(target_id, 0))
+        return heapq.nlargest(limit, weights, key=weights.get)
+    
+    def link(self, char_id: str, others: Sequence[str]) -> float:
+        """角色与一组角色之间的关系紧密度"""
+        out = self.edges.get(char_id, {})
+        inbound = self.inbound.get(char_id, {})
+        return sum(max(out.get(other, 0), inbound.get(other, 0)) for other in others) / 2000.0
+    
+    def most_central(self, limit: int) -> List[str]:
+        return [char_id for _, char_id in self.ranked[:limit]]
+    
+    def most_stale(self, limit: int) -> List[str]:
+        return list(islice(self.stale_order, limit))
+    
+    def max_centrality(self) -> int:
+        return -self.ranked[0][0] if self.ranked else 0
+    
+    def staleness(self, char_id: str, chapter_number: int, window: int) -> float:
+        """距上次出场的时间，映射到[0, 1)，从未出场为1"""
+        last = self.last_seen.get(char_id)
+        if last is None:
+            return 1.0
+        return 1.0 - math.exp(-max(0, chapter_number - last) / window)
+
+def get_character_graph(novel: Novel) -> CharacterGraph:
+    """获取小说的角色关系图，不存在或与角色表不一致时重建"""
+    graph = novel.character_graph
+    if graph is None or graph.novel_id != novel.id or len(graph) != len(novel.characters):
+        graph = CharacterGraph(novel.id)
+        graph.rebuild(novel)
+        novel.character_graph = graph
+    elif graph.recency_dirty:
+        graph.rebuild_recency(novel)
+    return graph
+
+class FocusSelector:
+    """焦点角色选择器 - 综合中心性、事件参与和距上次出场的时间挑选焦点角色
+    
+    只对有限的候选角色评分：本章事件涉及的角色、上一章焦点角色的近邻、
+    最核心和最久未出场的若干角色，选择开销与角色总数无关。
+    """
+    
+    def __init__(self, weights: Optional[Dict[str, float]] = None, candidates: int = 8,
+                 neighbours: int = 4, recent_window: int = 5):
+        unknown = set(weights or {}) - set(FOCUS_WEIGHTS)
+        if unknown:
+            raise ValueError(f"未知的焦点权重: {', '.join(sorted(unknown))}")
+        self.weights = dict(FOCUS_WEIGHTS, **(weights or {}))
+        self.candidates = candidates  # 核心角色和久未出场角色各取的候选数
+        self.neighbours = neighbours  # 每个上一章焦点角色取的近邻数
+        self.recent_window = max(1, recent_window)  # 出场间隔的衰减尺度(章)
+    
+    def _candidates(self, novel: Novel, graph: CharacterGraph, events: Sequence[Event]) -> Dict[str, float]:
+        """候选角色及其与本章事件的关联度"""
+        involvement: Dict[str, float] = {}
+        for event in events:
+            # 触发条件中指定的角色（ID或名称）
+            values = (event.triggers or {}).get("character") or []
+            for value in values if isinstance(values, list) else [values]:
+                char_id = value if value in novel.characters else graph.by_name.get(normalize_trigger_value(value))
+                if char_id is not None:
+                    involvement[char_id] = involvement.get(char_id, 0.0) + 1.0
+            # 以往与该事件同章出场的角色
+            cast = graph.event_cast.get(event.id)
+            if cast:
+                common = cast.most_common(self.neighbours)
+                for char_id, count in common:
+                    involvement[char_id] = involvement.get(char_id, 0.0) + 0.5 * count / common[0][1]
+        
+        pool = dict(involvement)
+        previous = novel.chapters[-1].character_focus if novel.chapters else []
+        for char_id in previous:
+            pool.setdefault(char_id, 0.0)
+            for neighbour in graph.neighbours(char_id, self.neighbours):
+                pool.setdefault(neighbour, 0.0)
+        for char_id in graph.most_central(self.candidates) + graph.most_stale(self.candidates):
+            pool.setdefault(char_id, 0.0)
+        return {char_id: value for char_id, value in pool.items() if char_id in novel.characters}
+    
+    def select(self, novel: Novel, events: Sequence[Event] = ()) -> List[Character]:
+        """为下一章选择2-3个焦点角色，依次挑选得分最高者，已选角色的近邻获得加分"""
+        graph = get_character_graph(novel)
+        if not len(graph):
+            return []
+        
+        rng = novel.rng("focus")
+        num_focus = min(len(graph), rng.randint(2, 3))
+        chapter_number = novel.current_chapter + 1
+        top = graph.max_centrality() or 1
+        w = self.weights
+        
+        base = {}
+        for char_id, involvement in self._candidates(novel, graph, events).items():
+            base[char_id] = (w["centrality"] * graph.centrality[char_id] / top +
+                             w["involvement"] * involvement +
+                             w["staleness"] * graph.staleness(char_id, chapter_number, self.recent_window) +
+                             w["noise"] * rng.random())
+        
+        chosen: List[str] = []
+        while base and len(chosen) < num_focus:
+            best = max(base, key=lambda char_id: base[char_id] + w["cohesion"] * graph.link(char_id, chosen))
+            chosen.append(best)
+            del base[best]
+        return [novel.characters[char_id] for char_id in chosen]
\ No newline at end of file
@@ -0,0 +1,287 @@
+# core/llm_backends.py - LLM后端
+
+import os
+import re
+import random
+import asyncio
+import hashlib
+import json
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+async def _iter_chunks(text: str, size: int, delay: float = 0.0) -> AsyncIterator[str]:
+    """将文本按固定长度切分为异步片段"""
+    for i in range(0, len(text), size):
+        if delay > 0 and i > 0:
+            await asyncio.sleep(delay)
+        yield text[i:i + size]
+
+class LLMBackend(ABC):
+    """LLM后端基类 - 负责实际的补全请求，重试、缓存和限流由LLMInterface处理"""
+    
+    name = "base"
+    
+    @abstractmethod
+    async def acomplete(self, model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int, variant: int = 0,
+                        usage: Optional[Dict[str, int]] = None) -> str:
+        """获取完整响应
+        
+        variant用于区分提示相同但期望不同结果的请求（如连续生成多个角色），
+        支持种子的后端应将其混入随机源，其他后端可忽略。
+        能获得真实令牌数的后端将其写入usage(prompt_tokens/completion_tokens)。
+        """
+    
+    async def aopen_stream(self, model: str, messages: List[Dict[str, str]],
+                           temperature: float, max_tokens: int, variant: int = 0) -> AsyncIterator[str]:
+        """建立流式连接，返回文本片段的异步迭代器（连接阶段出错可由调用方重试）
+        
+        默认实现获取完整响应后一次性产出。
+        """
+        response = await self.acomplete(model, messages, temperature, max_tokens, variant)
+        return _iter_chunks(response, len(response) or 1)
+    
+    def list_models(self) -> List[str]:
+        """获取可用的模型列表"""
+        return []
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI后端"""
+    
+    name = "openai"
+    
+    def __init__(self, api_key: Optional[str] = None):
+        if openai is None:
+            raise ValueError("未安装openai包")
+        
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not self.api_key:
+            raise ValueError("未设置OPENAI_API_KEY环境变量")
+        
+        openai.api_key = self.api_key
+    
+    async def acomplete(self, model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int, variant: int = 0,
+                        usage: Optional[Dict[str, int]] = None) -> str:
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        if usage is not None and getattr(response, "usage", None):
+            usage["prompt_tokens"] = response.usage.prompt_tokens
+            usage["completion_tokens"] = response.usage.completion_tokens
+        return response.choices[0].message.content
+    
+    async def aopen_stream(self, model: str, messages: List[Dict[str, str]],
+                           temperature: float, max_tokens: int, variant: int = 0) -> AsyncIterator[str]:
+        response = await openai.ChatCompletion.acreate(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        return self._iter_deltas(response)
+    
+    async def _iter_deltas(self, response) -> AsyncIterator[str]:
+        """从流式响应中提取文本增量"""
+        async for chunk in response:
+            delta = chunk.choices[0].delta.get("content")
+            if delta:
+                yield delta
+    
+    def list_models(self) -> List[str]:
+        models = openai.Model.list()
+        return [model.id for model in models.data if "gpt" in model.id.lower()]
+
+# 假后端使用的词汇
+_FAKE_SURNAMES = "李王张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗"
+_FAKE_GIVEN = "云风雪月星辰明华清远山河静安宁思青白玉"
+_FAKE_TEXT = ("天色渐暗，远处的钟声回荡在山谷之间。他握紧手中的信，沉默良久。"
+              "她转身望向窗外，雨水沿着屋檐落下。往事如潮水般涌来，谁也没有开口。"
+              "城门外传来马蹄声，众人神色一变。这一夜注定无人入眠。")
+_FAKE_TRAITS = ["勇气", "智慧", "善良", "野心", "谨慎", "忠诚", "幽默"]
+_FAKE_RELATION_TYPES = ["朋友", "敌人", "盟友", "师徒", "恋人"]
+
+class FakeLLMBackend(LLMBackend):
+    """确定性的离线假后端 - 根据config/prompts.py中的提示类型生成合法XML，用于测试和基准测试
+    
+    相同的种子和提示总是得到相同的响应，与调用顺序和并发无关。
+    """
+    
+    name = "fake"
+    
+    def __init__(self, seed: int = 0, latency: float = 0.0, latency_jitter: float = 0.0,
+                 latency_distribution: str = "fixed", content_chars: int = 3000,
+                 stream_chunk_chars: int = 20, chunk_delay: float = 0.0):
+        self.seed = seed
+        self.latency = latency  # 平均延迟(秒)
+        self.latency_jitter = latency_jitter  # 延迟抖动(秒)，含义取决于分布
+        self.latency_distribution = latency_distribution  # fixed/uniform/normal/exponential
+        self.content_chars = content_chars  # 章节正文长度(字符)
+        self.stream_chunk_chars = max(1, stream_chunk_chars)
+        self.chunk_delay = chunk_delay  # 流式输出时每段的间隔(秒)
+        
+        self.request_count = 0
+    
+    def _rng(self, model: str, messages: List[Dict[str, str]], variant: int) -> random.Random:
+        """为请求创建独立的随机数生成器"""
+        digest = hashlib.sha256(json.dumps([model, messages, variant], ensure_ascii=False).encode("utf-8")).hexdigest()
+        return random.Random(f"{self.seed}:{digest}")
+    
+    def _sample_latency(self, rng: random.Random) -> float:
+        """按配置的分布采样延迟"""
+        if self.latency_distribution == "uniform":
+            value = rng.uniform(self.latency - self.latency_jitter, self.latency + self.latency_jitter)
+        elif self.latency_distribution == "normal":
+            value = rng.gauss(self.latency, self.latency_jitter)
+        elif self.latency_distribution == "exponential":
+            value = rng.expovariate(1.0 / self.latency) if self.latency > 0 else 0.0
+        else:
+            value = self.latency
+        return max(0.0, value)
+    
+    async def acomplete(self, model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int, variant: int = 0,
+                        usage: Optional[Dict[str, int]] = None) -> str:
+        rng = self._rng(model, messages, variant)
+        self.request_count += 1
+        
+        delay = self._sample_latency(rng)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        return self.render(messages[-1]["content"], rng)
+    
+    async def aopen_stream(self, model: str, messages: List[Dict[str, str]],
+                           temperature: float, max_tokens: int, variant: int = 0) -> AsyncIterator[str]:
+        # 采样的延迟即首个片段到达前的等待
+        response = await self.acomplete(model, messages, temperature, max_tokens, variant)
+        return _iter_chunks(response, self.stream_chunk_chars, self.chunk_delay)
+    
+    def list_models(self) -> List[str]:
+        return ["fake"]
+    
+    def render(self, prompt: str, rng: random.Random) -> str:
+        """根据提示类型生成响应"""
+        if "<summaries>" in prompt:
+            match = re.search(r"no more than (\d+) words", prompt)
+            length = int(match.group(1)) if match else 200
+            return f"<summary>{escape(self._text(rng, length))}</summary>"
+        if "<chapter>" in prompt:
+            return self._render_chapter(prompt, rng)
+        if "<events>" in prompt:
+            return self._render_events(prompt, rng)
+        if "<outline>" in prompt:
+            return self._render_outline(rng)
+        if "<character>" in prompt:
+            return self._render_character(rng)
+        return f"<response>{escape(self._text(rng, 200))}</response>"
+    
+    def _name(self, rng: random.Random) -> str:
+        return rng.choice(_FAKE_SURNAMES) + "".join(rng.choice(_FAKE_GIVEN) for _ in range(rng.randint(1, 2)))
+    
+    def _text(self, rng: random.Random, length: int, names: Optional[List[str]] = None) -> str:
+        """生成指定长度的伪正文，穿插给定的人名"""
+        parts = []
+        total = 0
+        sentences = [s + "。" for s in _FAKE_TEXT.split("。") if s]
+        while total < length:
+            sentence = rng.choice(sentences)
+            if names and rng.random() < 0.5:
+                sentence = rng.choice(names) + sentence.replace("他", "").replace("她", "", 1)
+            parts.append(sentence)
+            total += len(sentence)
+        return "".join(parts)[:length]
+    
+    def _render_character(self, rng: random.Random) -> str:
+        traits = "".join(
+            f'<trait name="{trait}">{rng.uniform(0, 1):.2f}</trait>'
+            for trait in rng.sample(_FAKE_TRAITS, 5)
+        )
+        goals = "".join(f"<goal>{escape(self._text(rng, 30))}</goal>" for _ in range(rng.randint(1, 3)))
+        return (
+            "<character>"
+            f"<name>{self._name(rng)}</name>"
+            f"<age>{rng.randint(16, 70)}</age>"
+            f"<gender>{rng.choice(['男', '女'])}</gender>"
+            f"<background>{escape(self._text(rng, 200))}</background>"
+            f"<appearance>{escape(self._text(rng, 60))}</appearance>"
+            f"<personality>{traits}</personality>"
+            f"<goals>{goals}</goals>"
+            "</character>"
+        )
+    
+    def _render_events(self, prompt: str, rng: random.Random) -> str:
+        match = re.search(r"generate (\d+) potential events", prompt)
+        num_events = int(match.group(1)) if match else 3
+        
+        events = []
+        for i in range(num_events):
+            events.append(
+                "<event>"
+                f"<id>event_{i + 1}</id>"
+                f"<name>{escape(self._text(rng, 8))}</name>"
+                f"<description>{escape(self._text(rng, 120))}</description>"
+                "<triggers>"
+                f'<trigger type="character_relation" value={quoteattr(rng.choice(_FAKE_RELATION_TYPES))}/>'
+                "</triggers>"
+                "<effects>"
+                f'<effect target="character_relation" value="{rng.uniform(-0.5, 0.5):.2f}"/>'
+                "</effects>"
+                f"<narrative_template>{escape(self._text(rng, 60))}</narrative_template>"
+                "</event>"
+            )
+        return f"<events>{''.join(events)}</events>"
+    
+    def _render_outline(self, rng: random.Random) -> str:
+        arcs = []
+        for name in ["Beginning", "Development", "Climax", "Ending"]:
+            key_events = "".join(f"<event>{escape(self._text(rng, 20))}</event>" for _ in range(2))
+            arcs.append(
+                "<arc>"
+                f"<name>{name}</name>"
+                f"<description>{escape(self._text(rng, 150))}</description>"
+                f"<key_events>{key_events}</key_events>"
+                "</arc>"
+            )
+        return f"<outline><overview>{escape(self._text(rng, 200))}</overview>{''.join(arcs)}</outline>"
+    
+    def _render_chapter(self, prompt: str, rng: random.Random) -> str:
+        # 从提示的焦点角色段落中提取人名，使正文提及这些角色
+        names = []
+        match = re.search(r"<focus_characters>(.*?)</focus_characters>", prompt, re.S)
+        if match:
+            for line in match.group(1).strip().splitlines():
+                name = line.split(":", 1)[0].strip()
+                if name:
+                    names.append(name)
+        
+        return (
+            "<chapter>"
+            f"<title>{escape(self._text(rng, 10))}</title>"
+            f"<content>{escape(self._text(rng, self.content_chars, names))}</content>"
+            f"<summary>{escape(self._text(rng, 150, names))}</summary>"
+            "</chapter>"
+        )
+
+def create_backend(name: Optional[str] = None, **kwargs) -> LLMBackend:
+    """按名称创建后端，名称默认取自LLM_BACKEND环境变量"""
+    name = (name or os.getenv("LLM_BACKEND") or "openai").lower()
+    if name == "fake":
+        if "seed" not in kwargs and os.getenv("LLM_FAKE_SEED"):
+            kwargs["seed"] = int(os.getenv("LLM_FAKE_SEED"))
+        if "latency" not in kwargs and os.getenv("LLM_FAKE_LATENCY"):
+            kwargs["latency"] = float(os.getenv("LLM_FAKE_LATENCY"))
+        return FakeLLMBackend(**kwargs)
+    if name == "openai":
+        return OpenAIBackend(**kwargs)
+    raise ValueError(f"未知的LLM后端: {name}")
\ No newline at end of file
@@ -0,0 +1,161 @@
+# core/llm_cache.py - LLM响应缓存
+
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+class LLMCache:
+    """持久化的LLM响应缓存 - 以(模型, 消息, 温度, 最大令牌数)的哈希为键，按LRU和容量上限淘汰"""
+    
+    def __init__(self, cache_dir: str = "cache/llm", max_entries: int = 1000,
+                 max_bytes: int = 100 * 1024 * 1024, ttl: Optional[float] = 7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl  # 过期时间(秒)，None表示永不过期
+        
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._index: Dict[str, List[float]] = {}  # key -> [最近访问时间, 文件大小]
+        self._total_bytes = 0
+        
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        
+        self._load_index()
+    
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                 variant: int = 0) -> str:
+        """根据请求参数计算缓存键"""
+        params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if variant:
+            params["variant"] = variant
+        payload = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        """缓存条目的文件路径"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+    
+    def _load_index(self):
+        """扫描缓存目录，重建访问索引"""
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+            except OSError:
+                continue
+            self._index[filename[:-5]] = [stat.st_mtime, stat.st_size]
+            self._total_bytes += stat.st_size
+    
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            
+            now = time.time()
+            if self.ttl is not None and now - data.get("created", 0) > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+            
+            # 更新最近访问时间（文件mtime同时用于跨进程的LRU）
+            entry[0] = now
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+            
+            self.hits += 1
+            return data["response"]
+    
+    def set(self, key: str, response: str, model: str = ""):
+        """写入缓存并按需淘汰"""
+        data = json.dumps({
+            "model": model,
+            "created": time.time(),
+            "response": response
+        }, ensure_ascii=False)
+        
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"写入LLM缓存失败: {e}")
+                return
+            
+            if key in self._index:
+                self._total_bytes -= self._index[key][1]
+            size = os.path.getsize(path)
+            self._index[key] = [time.time(), size]
+            self._total_bytes += size
+            
+            self._evict()
+    
+    def _evict(self):
+        """按最近最少使用顺序淘汰，直到满足条目数和容量上限"""
+        if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+        
+        for key in sorted(self._index, key=lambda k: self._index[k][0]):
+            if len(self._index) <= self.max_entries and self._total_bytes <= self.max_bytes:
+                break
+            self._remove(key)
+    
+    def _remove(self, key: str):
+        """删除缓存条目"""
+        entry = self._index.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._index):
+                self._remove(key)
+            self.hits = 0
+            self.misses = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._index),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
\ No newline at end of file
@@ -1,58 +1,218 @@
 # core/llm_interface.py - LLM接口
 
-import os
-import time
-import openai
-from typing import Any, Dict, Optional
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 from dotenv import load_dotenv
+from .llm_cache import LLMCache
+from .llm_backends import LLMBackend, create_backend
 
 # 加载环境变量
 load_dotenv()
 
+SYSTEM_PROMPT = "You are a creative novelist AI that generates structured novel content."
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算令牌数：中日韩字符约每字一个令牌，其余约每4个字符一个令牌"""
+    cjk = sum(1 for c in text if "\u3000" <= c <= "\u9fff" or "\uac00" <= c <= "\ud7af" or "\uff00" <= c <= "\uffef")
+    return cjk + (len(text) - cjk + 3) // 4
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """在同步代码中运行协程（供CLI等同步调用方使用）"""
+    return asyncio.run(coro)
+
+class LLMRequestExecutor:
+    """LLM请求执行器 - 限制同时进行中的请求数量，供所有管理器共享"""
+    
+    def __init__(self, llm: "LLMInterface", max_concurrency: int = 4):
+        self.llm = llm
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = None
+        self._loop = None
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """获取绑定到当前事件循环的信号量"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+    
+    def set_max_concurrency(self, max_concurrency: int):
+        """修改最大并发请求数（下一个事件循环中生效）"""
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = None
+        self._loop = None
+    
+    async def submit(self, prompt: str, temperature=0.7, max_tokens=2000, use_cache: bool = True,
+                     variant: int = 0) -> str:
+        """提交一个请求，在并发上限内执行"""
+        # 缓存命中时无需占用并发名额
+        cached = self.llm.get_cached_response(prompt, temperature, max_tokens, use_cache, variant)
+        if cached is not None:
+            return cached
+        
+        # 已确认未命中，直接请求（结果仍会写入缓存）
+        async with self._get_semaphore():
+            return await self.llm.agenerate_response(prompt, temperature=temperature, max_tokens=max_tokens,
+                                                     use_cache=False, variant=variant)
+    
+    async def stream(self, prompt: str, temperature=0.7, max_tokens=2000,
+                     use_cache: bool = True, variant: int = 0) -> AsyncIterator[str]:
+        """以流式方式提交请求，在整个流期间占用一个并发名额"""
+        cached = self.llm.get_cached_response(prompt, temperature, max_tokens, use_cache, variant)
+        if cached is not None:
+            yield cached
+            return
+        
+        async with self._get_semaphore():
+            async for chunk in self.llm.astream_response(prompt, temperature=temperature, max_tokens=max_tokens,
+                                                         use_cache=False, variant=variant):
+                yield chunk
+    
+    async def map(self, prompts: List[str], temperature=0.7, max_tokens=2000,
+                  return_exceptions: bool = False, use_cache: bool = True) -> List[Any]:
+        """并发执行多个请求，结果顺序与输入一致"""
+        tasks = [self.submit(prompt, temperature=temperature, max_tokens=max_tokens, use_cache=use_cache)
+                 for prompt in prompts]
+        return await asyncio.gather(*tasks, return_exceptions=return_exceptions)
+
 class LLMInterface:
     """LLM交互接口"""
     
-    def __init__(self, model="gpt-4"):
+    def __init__(self, model="gpt-4", max_concurrency: int = 4, cache: Optional[LLMCache] = None,
+                 backend: Optional[LLMBackend] = None):
         self.model = model
-        self.api_key = os.getenv("OPENAI_API_KEY")
         
-        if not self.api_key:
-            raise ValueError("未设置OPENAI_API_KEY环境变量")
+        # 实际执行请求的后端（默认按LLM_BACKEND环境变量选择，未设置时为OpenAI）
+        self.backend = backend or create_backend()
+        
+        # 共享的请求执行器
+        self.executor = LLMRequestExecutor(self, max_concurrency)
+        
+        # 响应缓存（None表示不缓存）
+        self.cache = cache
+        
+        # 累计用量统计
+        self.usage = {"requests": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        """构建对话消息"""
+        return [{"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}]
+    
+    def _cache_key(self, prompt: str, temperature, max_tokens, variant: int = 0) -> str:
+        """计算请求的缓存键"""
+        return LLMCache.make_key(self.model, self._build_messages(prompt), temperature, max_tokens, variant)
+    
+    def get_cached_response(self, prompt: str, temperature=0.7, max_tokens=2000,
+                            use_cache: bool = True, variant: int = 0) -> Optional[str]:
+        """查询缓存中的响应"""
+        if self.cache is None or not use_cache:
+            return None
+        cached = self.cache.get(self._cache_key(prompt, temperature, max_tokens, variant))
+        if cached is not None:
+            self.usage["cache_hits"] += 1
+        return cached
+    
+    async def agenerate_response(self, prompt: str, temperature=0.7, max_tokens=2000,
+                                 use_cache: bool = True, variant: int = 0) -> str:
+        """异步调用LLM获取响应，use_cache=False时跳过缓存读取
+        
+        variant区分提示相同但期望得到不同结果的请求，参与缓存键并传给后端。
+        """
+        cached = self.get_cached_response(prompt, temperature, max_tokens, use_cache, variant)
+        if cached is not None:
+            return cached
+        
+        response = await self._arequest(prompt, temperature, max_tokens, variant)
+        
+        # 即使跳过读取也写入缓存，保证缓存中是最新结果
+        if self.cache is not None:
+            self.cache.set(self._cache_key(prompt, temperature, max_tokens, variant), response, self.model)
+        
+        return response
+    
+    async def astream_response(self, prompt: str, temperature=0.7, max_tokens=2000,
+                               use_cache: bool = True, variant: int = 0) -> AsyncIterator[str]:
+        """异步流式获取响应，逐段产出文本；缓存命中时一次性产出完整响应"""
+        cached = self.get_cached_response(prompt, temperature, max_tokens, use_cache, variant)
+        if cached is not None:
+            yield cached
+            return
+        
+        # 仅在建立连接阶段重试，已开始输出后出错直接抛出
+        messages = self._build_messages(prompt)
+        stream = await self._with_retries(
+            lambda: self.backend.aopen_stream(self.model, messages, temperature, max_tokens, variant)
+        )
+        
+        chunks = []
+        async for delta in stream:
+            chunks.append(delta)
+            yield delta
         
-        openai.api_key = self.api_key
+        # 流式接口不返回用量，按文本估算
+        self._record_usage(messages, "".join(chunks), {})
+        
+        if self.cache is not None:
+            self.cache.set(self._cache_key(prompt, temperature, max_tokens, variant), "".join(chunks), self.model)
+    
+    async def _arequest(self, prompt: str, temperature, max_tokens, variant: int = 0) -> str:
+        """调用后端获取完整响应"""
+        messages = self._build_messages(prompt)
+        usage = {}
+        response = await self._with_retries(
+            lambda: self.backend.acomplete(self.model, messages, temperature, max_tokens, variant, usage)
+        )
+        self._record_usage(messages, response, usage)
+        return response
     
-    def generate_response(self, prompt: str, temperature=0.7, max_tokens=2000):
-        """调用OpenAI API获取响应"""
+    def _record_usage(self, messages: List[Dict[str, str]], response: str, usage: Dict[str, int]):
+        """累计用量，后端未提供令牌数时按文本估算"""
+        self.usage["requests"] += 1
+        self.usage["prompt_tokens"] += usage.get(
+            "prompt_tokens", sum(estimate_tokens(m["content"]) for m in messages))
+        self.usage["completion_tokens"] += usage.get("completion_tokens", estimate_tokens(response))
+    
+    def get_usage(self) -> Dict[str, int]:
+        """获取累计用量的快照"""
+        return dict(self.usage)
+    
+    async def _with_retries(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """执行后端请求，失败时重试"""
         retries = 3
         while retries > 0:
             try:
-                response = openai.ChatCompletion.create(
-                    model=self.model,
-                    messages=[{"role": "system", "content": "You are a creative novelist AI that generates structured novel content."},
-                              {"role": "user", "content": prompt}],
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-                return response.choices[0].message.content
+                return await request()
             except Exception as e:
                 print(f"API调用错误: {e}")
                 retries -= 1
                 if retries > 0:
                     print(f"尝试重新连接，剩余尝试次数: {retries}")
-                    time.sleep(2)
+                    await asyncio.sleep(2)
                 else:
                     raise Exception("无法连接到LLM API")
     
+    def generate_response(self, prompt: str, temperature=0.7, max_tokens=2000, use_cache: bool = True,
+                          variant: int = 0):
+        """调用LLM获取响应（同步封装）"""
+        return run_sync(self.agenerate_response(prompt, temperature=temperature, max_tokens=max_tokens,
+                                                use_cache=use_cache, variant=variant))
+    
     def set_model(self, model: str):
         """更改LLM模型"""
         self.model = model
         print(f"已切换到模型: {model}")
     
+    def set_max_concurrency(self, max_concurrency: int):
+        """更改最大并发请求数"""
+        self.executor.set_max_concurrency(max_concurrency)
+        print(f"最大并发请求数: {self.executor.max_concurrency}")
+    
     def get_available_models(self):
         """获取可用的模型列表"""
         try:
-            models = openai.Model.list()
-            return [model.id for model in models.data if "gpt" in model.id.lower()]
+            return self.backend.list_models()
         except Exception as e:
             print(f"获取模型列表失败: {e}")
             return ["gpt-4", "gpt-3.5-turbo"]
\ No newline at end of file
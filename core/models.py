@@ -1,12 +1,98 @@
 # core/models.py - 数据模型
 
 from dataclasses import dataclass, field, asdict
-from typing import List, Dict, Optional, Union, Tuple
+from collections.abc import Mapping
+from typing import Any, Iterable, Iterator, List, Dict, Optional, Union, Tuple
 import xml.etree.ElementTree as ET
-from datetime import datetime
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import os
+import sys
 import uuid
+import random
+from .change_journal import ChangeJournal
 
-@dataclass
+# 数量多的模型使用__slots__（Python 3.10起dataclass支持），旧版本退回普通dataclass
+SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+def intern_str(value: Any) -> Any:
+    """驻留反复出现的字符串（ID、关系类型、特质名、效果目标等），使各对象共享同一份，其他值原样返回"""
+    return sys.intern(value) if type(value) is str else value
+
+class LazyText(ABC):
+    """延迟加载的文本引用，读取所在字段时经load()取得实际文本"""
+    __slots__ = ()
+    
+    @abstractmethod
+    def load(self) -> str:
+        """取得实际文本"""
+
+class LazyField:
+    """数据类字段的描述符：字段可以保存LazyText引用，读取时透明加载，写入文本即替换引用"""
+    
+    def __init__(self, name: str, storage: Any):
+        self.name = name
+        self.storage = storage  # 原槽位描述符，非slots时为None（值保存在实例__dict__中）
+    
+    def raw(self, obj) -> Any:
+        """字段中实际保存的值（文本或LazyText引用），不触发加载"""
+        if self.storage is None:
+            return obj.__dict__.get(self.name, "")
+        return self.storage.__get__(obj, type(obj))
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = self.raw(obj)
+        # 已加载的文本最常见，先按类型判断，跳过抽象基类较慢的isinstance检查
+        if type(value) is str:
+            return value
+        return value.load() if isinstance(value, LazyText) else value
+    
+    def __set__(self, obj, value):
+        if self.storage is None:
+            obj.__dict__[self.name] = value
+        else:
+            self.storage.__set__(obj, value)
+
+def lazy_fields(*names: str):
+    """类装饰器（置于@dataclass之上）：将指定字段改为LazyField"""
+    def decorate(cls):
+        for name in names:
+            storage = cls.__dict__.get(name)
+            setattr(cls, name, LazyField(name, storage if hasattr(storage, "__set__") else None))
+        return cls
+    return decorate
+
+def new_id(prefix: str, rng: Optional[random.Random] = None) -> str:
+    """生成带前缀的短ID，提供随机数生成器时结果可复现"""
+    value = uuid.UUID(int=rng.getrandbits(128), version=4) if rng is not None else uuid.uuid4()
+    return f"{prefix}_{str(value)[:8]}"
+
+# 每对关系保留的原始历史记录条数，更早的记录按章节汇总
+HISTORY_LIMIT = 50
+
+def fold_history(summary: List[Dict[str, Any]], entries: Iterable[Dict[str, Any]]):
+    """将历史记录并入按章节的汇总（条数和强度净变化），未记录章节的计入第0章"""
+    by_chapter = {item["chapter"]: item for item in summary}
+    for entry in entries:
+        chapter = entry.get("chapter") or 0
+        item = by_chapter.get(chapter)
+        if item is None:
+            item = by_chapter[chapter] = {"chapter": chapter, "count": 0, "delta": 0.0}
+            summary.append(item)
+        item["count"] += 1
+        item["delta"] += entry.get("delta") or 0.0
+    summary.sort(key=lambda item: item["chapter"])
+
+def now_iso() -> str:
+    """当前时间；设置SOURCE_DATE_EPOCH环境变量时固定为该时间，用于生成可逐字节复现的存档"""
+    epoch = os.getenv("SOURCE_DATE_EPOCH")
+    if epoch:
+        return datetime.fromtimestamp(int(epoch), timezone.utc).replace(tzinfo=None).isoformat()
+    return datetime.now().isoformat()
+
+@dataclass(**SLOTS)
 class Trait:
     """角色特质"""
     id: str
@@ -14,32 +100,101 @@ class Trait:
     description: str
     impact: Dict[str, float] = field(default_factory=dict)  # 对其他属性的影响
     
+    def __post_init__(self):
+        self.name = intern_str(self.name)
+        self.impact = {intern_str(attr): value for attr, value in self.impact.items()}
+    
     @classmethod
-    def create(cls, name: str, description: str, impact: Dict[str, float] = None):
+    def create(cls, name: str, description: str, impact: Dict[str, float] = None,
+               rng: Optional[random.Random] = None):
         """创建新特质"""
         return cls(
-            id=f"trait_{str(uuid.uuid4())[:8]}",
+            id=new_id("trait", rng),
             name=name,
             description=description,
             impact=impact or {}
         )
 
-@dataclass
+class HistoryEntry(Mapping):
+    """关系历史记录 - 以槽位保存，按只读字典访问
+    
+    键为timestamp、description以及可选的chapter和delta（未记录时不出现）；
+    deepcopy（包括dataclasses.asdict）得到与原字典记录相同的dict。
+    """
+    
+    __slots__ = ("timestamp", "description", "chapter", "delta")
+    _optional = ("chapter", "delta")
+    
+    def __init__(self, timestamp: str, description: str, chapter: Optional[int] = None,
+                 delta: Optional[float] = None):
+        self.timestamp = timestamp
+        self.description = intern_str(description)
+        self.chapter = chapter
+        self.delta = delta
+    
+    @classmethod
+    def from_mapping(cls, entry: Mapping) -> "HistoryEntry":
+        """由字典记录构造（已是HistoryEntry时原样返回）"""
+        if isinstance(entry, cls):
+            return entry
+        return cls(entry["timestamp"], entry["description"], entry.get("chapter"), entry.get("delta"))
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in ("timestamp", "description") or (key in self._optional and getattr(self, key) is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+    
+    def __iter__(self) -> Iterator[str]:
+        yield "timestamp"
+        yield "description"
+        for key in self._optional:
+            if getattr(self, key) is not None:
+                yield key
+    
+    def __len__(self) -> int:
+        return 2 + sum(getattr(self, key) is not None for key in self._optional)
+    
+    def __deepcopy__(self, memo) -> Dict[str, Any]:
+        return dict(self)
+    
+    def __repr__(self):
+        return repr(dict(self))
+
+def history_entry(description: str, chapter: Optional[int] = None,
+                  delta: Optional[float] = None) -> HistoryEntry:
+    """构造一条关系历史记录"""
+    return HistoryEntry(now_iso(), description, chapter, delta)
+
+@dataclass(**SLOTS)
 class Relationship:
     """角色间关系"""
     target_id: str
     relationship_type: str  # 如：朋友、敌人、爱人等
     strength: float  # -1.0 到 1.0
-    history: List[Dict[str, str]] = field(default_factory=list)  # 关系历史，包含时间和事件描述
+    history: List[HistoryEntry] = field(default_factory=list)  # 关系历史，包含时间、事件描述、章节和强度变化
+    history_summary: List[Dict[str, Any]] = field(default_factory=list)  # 压缩后的早期历史：每章的条数和强度净变化
+    
+    def __post_init__(self):
+        self.target_id = intern_str(self.target_id)
+        self.relationship_type = intern_str(self.relationship_type)
+        self.history = [HistoryEntry.from_mapping(entry) for entry in self.history]
     
-    def add_history_entry(self, event_description: str):
-        """添加关系历史记录"""
-        self.history.append({
-            "timestamp": datetime.now().isoformat(),
-            "description": event_description
-        })
+    def add_history_entry(self, event_description: str, chapter: Optional[int] = None,
+                          delta: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """添加关系历史记录，超过limit条时压缩，返回被压缩的记录"""
+        self.history.append(history_entry(event_description, chapter, delta))
+        return self.compact_history(limit)
+    
+    def compact_history(self, limit: Optional[int]) -> List[Dict[str, Any]]:
+        """只保留最近limit条原始记录，更早的并入按章节的汇总，返回被压缩的记录"""
+        if limit is None or len(self.history) <= limit:
+            return []
+        folded = self.history[:len(self.history) - limit]
+        del self.history[:len(folded)]
+        fold_history(self.history_summary, folded)
+        return folded
 
-@dataclass
+@dataclass(**SLOTS)
 class Character:
     """角色模型"""
     id: str
@@ -56,11 +211,17 @@ class Character:
     goals: List[str] = field(default_factory=list)  # 角色目标
     notes: str = ""  # 用户备注
     
+    def __post_init__(self):
+        self.id = intern_str(self.id)
+        self.gender = intern_str(self.gender)
+        self.personality = {intern_str(attr): value for attr, value in self.personality.items()}
+    
     @classmethod
-    def create(cls, name: str, age: int, gender: str, background: str):
+    def create(cls, name: str, age: int, gender: str, background: str,
+               rng: Optional[random.Random] = None):
         """创建新角色"""
         return cls(
-            id=f"char_{str(uuid.uuid4())[:8]}",
+            id=new_id("char", rng),
             name=name,
             age=age,
             gender=gender,
@@ -74,11 +235,12 @@ class Character:
             if attr in self.personality:
                 self.personality[attr] += value
             else:
-                self.personality[attr] = value
+                self.personality[intern_str(attr)] = value
     
     def update_relationship(self, target_id: str, rel_type: str, 
-                           strength_change: float, event: str):
-        """更新与另一角色的关系"""
+                           strength_change: float, event: str, chapter: Optional[int] = None,
+                           history_limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """更新与另一角色的关系，返回因超出保留条数而被压缩的历史记录（附带source和target）"""
         if target_id not in self.relationships:
             self.relationships[target_id] = Relationship(
                 target_id=target_id,
@@ -87,10 +249,12 @@ class Character:
             )
         
         rel = self.relationships[target_id]
+        old_strength = rel.strength
         rel.strength = max(-1.0, min(1.0, rel.strength + strength_change))
         if rel.relationship_type != rel_type:
-            rel.relationship_type = rel_type
-        rel.add_history_entry(event)
+            rel.relationship_type = intern_str(rel_type)
+        folded = rel.add_history_entry(event, chapter, rel.strength - old_strength, history_limit)
+        return [dict(entry, source=self.id, target=target_id) for entry in folded]
     
     def to_dict(self):
         """转换为字典"""
@@ -100,7 +264,7 @@ class Character:
         """简要信息"""
         return f"{self.name}(ID:{self.id}): {self.age}岁, {self.gender}, 背景: {self.background[:100]}..."
 
-@dataclass
+@dataclass(**SLOTS)
 class Event:
     """事件模型"""
     id: str
@@ -112,11 +276,22 @@ class Event:
     user_editable: bool = True  # 是否由用户编辑
     notes: str = ""  # 用户备注
     
+    def __post_init__(self):
+        self.id = intern_str(self.id)
+        self.intern_strings()
+    
+    def intern_strings(self):
+        """驻留触发条件和效果中的字符串（解析器在创建后填充这两个字段，填充后应调用）"""
+        self.triggers = {intern_str(trigger_type): [intern_str(v) for v in value] if isinstance(value, list)
+                         else intern_str(value) for trigger_type, value in self.triggers.items()}
+        self.effects = [{intern_str(key): intern_str(value) for key, value in effect.items()}
+                        for effect in self.effects]
+    
     @classmethod
-    def create(cls, name: str, description: str):
+    def create(cls, name: str, description: str, rng: Optional[random.Random] = None):
         """创建新事件"""
         return cls(
-            id=f"event_{str(uuid.uuid4())[:8]}",
+            id=new_id("event", rng),
             name=name,
             description=description,
             triggers={},
@@ -147,10 +322,10 @@ class Outline:
     arcs: List[OutlineArc] = field(default_factory=list)
     
     @classmethod
-    def create(cls, overview: str):
+    def create(cls, overview: str, rng: Optional[random.Random] = None):
         """创建新大纲"""
         return cls(
-            id=f"outline_{str(uuid.uuid4())[:8]}",
+            id=new_id("outline", rng),
             overview=overview
         )
     
@@ -158,28 +333,38 @@ class Outline:
         """转换为字典"""
         return asdict(self)
 
-@dataclass
+@lazy_fields("content")
+@dataclass(**SLOTS)
 class Chapter:
-    """章节模型"""
+    """章节模型，正文可以是按需从正文存储加载的引用"""
     id: str
     number: int
     title: str
     events: List[str] = field(default_factory=list)  # 事件ID列表
     character_focus: List[str] = field(default_factory=list)  # 本章重点角色ID列表
-    content: str = ""  # 章节内容
+    content: str = ""  # 章节内容（可为LazyText引用，读取时加载）
     summary: str = ""  # 章节摘要
     user_edited: bool = False  # 是否由用户编辑
     notes: str = ""  # 用户备注
     
+    def __post_init__(self):
+        self.events = [intern_str(event_id) for event_id in self.events]
+        self.character_focus = [intern_str(char_id) for char_id in self.character_focus]
+    
     @classmethod
-    def create(cls, number: int, title: str):
+    def create(cls, number: int, title: str, rng: Optional[random.Random] = None):
         """创建新章节"""
         return cls(
-            id=f"chapter_{str(uuid.uuid4())[:8]}",
+            id=new_id("chapter", rng),
             number=number,
             title=title
         )
     
+    def content_ref(self) -> Optional[LazyText]:
+        """正文尚未加载时返回其引用，否则返回None"""
+        value = Chapter.content.raw(self)
+        return value if isinstance(value, LazyText) else None
+    
     def to_dict(self):
         """转换为字典"""
         return asdict(self)
@@ -201,6 +386,45 @@ class Context:
         """设置特定章节的上下文"""
         self.chapter_context[chapter_number] = context
 
+@dataclass
+class SummaryPyramid:
+    """分层摘要：章节摘要 → 卷摘要 → 全书摘要，使章节提示的长度不随章节数增长"""
+    volume_size: int = 10  # 每卷章节数
+    volumes: Dict[int, str] = field(default_factory=dict)  # 已完结卷的摘要，卷序号从0开始
+    book: str = ""  # 全书摘要
+    book_volumes: int = 0  # 全书摘要已涵盖的卷数
+    
+    def volume_of(self, chapter_number: int) -> int:
+        """章节所属的卷序号"""
+        return (chapter_number - 1) // self.volume_size
+    
+    def closed_volumes(self, chapter_count: int) -> int:
+        """给定章节数时已完结的卷数"""
+        return chapter_count // self.volume_size
+    
+    def volume_range(self, volume: int) -> Tuple[int, int]:
+        """卷包含的章节编号范围(含两端)"""
+        return volume * self.volume_size + 1, (volume + 1) * self.volume_size
+    
+    def invalidate_chapter(self, chapter_number: int):
+        """章节内容或摘要被修改，使所属卷和全书摘要失效"""
+        volume = self.volume_of(chapter_number)
+        self.volumes.pop(volume, None)
+        self._invalidate_book(volume)
+    
+    def invalidate_from(self, chapter_number: int):
+        """章节被删除导致后续章节重新编号，使该章及之后所有卷的摘要失效"""
+        volume = self.volume_of(chapter_number)
+        for index in [v for v in self.volumes if v >= volume]:
+            del self.volumes[index]
+        self._invalidate_book(volume)
+    
+    def _invalidate_book(self, volume: int):
+        """全书摘要涵盖了失效的卷时需要重建"""
+        if volume < self.book_volumes:
+            self.book = ""
+            self.book_volumes = 0
+
 @dataclass
 class Novel:
     """小说模型"""
@@ -215,22 +439,75 @@ class Novel:
     current_chapter: int = 0
     outline: Optional[Outline] = None
     context: Context = field(default_factory=Context)
-    creation_date: str = field(default_factory=lambda: datetime.now().isoformat())
-    last_modified: str = field(default_factory=lambda: datetime.now().isoformat())
+    summaries: SummaryPyramid = field(default_factory=SummaryPyramid)
+    index: Optional[Any] = field(default=None, repr=False, compare=False)  # 章节倒排索引(运行时，不写入XML)
+    trigger_index: Optional[Any] = field(default=None, repr=False, compare=False)  # 事件触发条件索引(运行时)
+    relationship_matrix: Optional[Any] = field(default=None, repr=False, compare=False)  # 关系矩阵(运行时)
+    character_graph: Optional[Any] = field(default=None, repr=False, compare=False)  # 角色关系图(运行时)
+    references: Optional[Any] = field(default=None, repr=False, compare=False)  # 章节引用的反向索引(运行时)
+    seed: Optional[int] = None  # 随机种子，未设置时随机决策不可复现
+    rng_draws: int = 0  # 已派生的随机数生成器个数，随存档保存以便续跑时复现
+    history_limit: Optional[int] = HISTORY_LIMIT  # 每对关系保留的原始历史条数，None表示不压缩
+    history_archived: int = 0  # 已写入历史归档文件的记录数
+    history_archive: List[Dict[str, Any]] = field(default_factory=list, repr=False, compare=False)  # 已压缩、待写入归档文件的历史记录(运行时)
+    history_archive_path: Optional[str] = field(default=None, repr=False, compare=False)  # 已归档记录所在的归档文件(运行时)
+    external_bodies: bool = False  # 章节正文是否保存在单独的正文存储文件中（按需加载）
+    body_store: Optional[Any] = field(default=None, repr=False, compare=False)  # 当前正文存储(运行时)
+    journal: ChangeJournal = field(default_factory=ChangeJournal, repr=False, compare=False)  # 变更日志(运行时)
+    incremental_save: bool = False  # 是否以增量存档日志保存（见utils.save_journal）
+    journal_batches: int = 0  # 已写入增量存档日志的批次数
+    save_journal: Optional[Any] = field(default=None, repr=False, compare=False)  # 增量存档日志的写入状态(运行时)
+    structure_only: bool = field(default=False, repr=False, compare=False)  # 加载时跳过了章节正文，不能保存(运行时)
+    database: Optional[Any] = field(default=None, repr=False, compare=False)  # 当前SQLite存储(运行时，见utils.novel_db)
+    creation_date: str = field(default_factory=now_iso)
+    last_modified: str = field(default_factory=now_iso)
     
     @classmethod
-    def create(cls, title: str, genre: str, setting: str):
-        """创建新小说"""
+    def create(cls, title: str, genre: str, setting: str, seed: Optional[int] = None):
+        """创建新小说，未指定种子时随机选取一个"""
+        if seed is None:
+            seed = random.randrange(2 ** 31)
         return cls(
-            id=f"novel_{str(uuid.uuid4())[:8]}",
+            id=new_id("novel", random.Random(f"{seed}:novel")),
             title=title,
             genre=genre,
-            setting=setting
+            setting=setting,
+            seed=seed
         )
     
+    def rng(self, purpose: str) -> random.Random:
+        """为一次随机决策派生独立的随机数生成器
+        
+        设置了种子时，第n次派生的结果只取决于(种子, n, 用途)，与进程和是否中途存档无关。
+        """
+        if self.seed is None:
+            return random.Random()
+        self.rng_draws += 1
+        return random.Random(f"{self.seed}:{self.rng_draws}:{purpose}")
+    
+    def compact_history(self):
+        """按保留条数压缩所有关系的历史，被压缩的记录进入待归档列表"""
+        for char in self.characters.values():
+            folded = False
+            for rel in char.relationships.values():
+                for entry in rel.compact_history(self.history_limit):
+                    self.history_archive.append(dict(entry, source=char.id, target=rel.target_id))
+                    folded = True
+            if folded:
+                self.journal.record("character", "update", char.id, ("relationships",))
+    
     def update_modified(self):
         """更新最后修改时间"""
-        self.last_modified = datetime.now().isoformat()
+        self.last_modified = now_iso()
+    
+    def record_change(self, kind: str, action: str, target: str = "", fields: Tuple[str, ...] = ()):
+        """在变更日志中记录一条修改（见core.change_journal）并更新最后修改时间"""
+        self.journal.record(kind, action, target, fields)
+        self.update_modified()
+    
+    def upcoming_chapter(self) -> int:
+        """即将生成的章节编号；事件效果和手动修改的关系都在该章生效，关系历史记录此章节号"""
+        return self.current_chapter + 1
     
     def to_dict(self):
         """转换为字典"""
@@ -1,22 +1,83 @@
 # core/narrative_generator.py - 叙事生成器
 
-from typing import List, Dict, Any
-from .llm_interface import LLMInterface
+from typing import Callable, List, Dict, Any, Optional
+from .llm_interface import LLMInterface, estimate_tokens, run_sync
 from .models import Novel, Character, Event, Chapter
+from .summarizer import Summarizer
+from .chapter_index import get_chapter_index
 from config.prompts import CHAPTER_GENERATION_PROMPT
+from utils.xml_utils import StreamingXMLFieldParser
+
+# 章节响应中需要提取的字段
+CHAPTER_FIELDS = ("title", "content", "summary")
+
+# 解析失败时的占位内容
+FALLBACK_CONTENT = "内容生成失败，请重试。"
 
 class NarrativeGenerator:
     """叙事生成器 - 负责生成小说内容"""
     
-    def __init__(self, llm_interface: LLMInterface):
+    def __init__(self, llm_interface: LLMInterface, summarizer: Optional[Summarizer] = None,
+                 history_budget: int = 1500, retrieval_budget: int = 800, retrieval_top_k: int = 6):
         self.llm = llm_interface
+        self.summarizer = summarizer  # 未设置时只使用上一章摘要作为前情
+        self.history_budget = history_budget  # 前情提要的令牌预算
+        self.retrieval_budget = retrieval_budget  # 相关段落的令牌预算，0表示不检索
+        self.retrieval_top_k = retrieval_top_k  # 最多引用的相关段落数
+    
+    def generate_chapter(self, novel: Novel, events: List[Event], focus_characters: List[Character],
+                         use_cache: bool = True, on_content: Optional[Callable[[str], None]] = None,
+                         on_field: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+        """生成章节内容，提供回调时以流式方式生成"""
+        return run_sync(self.agenerate_chapter(novel, events, focus_characters, use_cache,
+                                               on_content, on_field))
+    
+    async def agenerate_chapter(self, novel: Novel, events: List[Event], focus_characters: List[Character],
+                                use_cache: bool = True, on_content: Optional[Callable[[str], None]] = None,
+                                on_field: Optional[Callable[[str, str], None]] = None) -> Dict[str, str]:
+        """异步生成章节内容（经共享执行器限流）"""
+        if self.summarizer:
+            # 补全新完结卷的摘要，使前情提要保持在预算内
+            await self.summarizer.arefresh(novel, novel.current_chapter)
+        
+        prompt = self._build_chapter_prompt(novel, events, focus_characters)
+        
+        if on_content or on_field:
+            return await self._astream_chapter(prompt, novel.current_chapter + 1, use_cache,
+                                               on_content, on_field)
+        
+        response = await self.llm.executor.submit(prompt, max_tokens=4000, use_cache=use_cache)
+        return self._parse_chapter_response(response, novel.current_chapter + 1)
+    
+    async def _astream_chapter(self, prompt: str, chapter_number: int, use_cache: bool,
+                               on_content: Optional[Callable[[str], None]],
+                               on_field: Optional[Callable[[str, str], None]]) -> Dict[str, str]:
+        """流式生成章节：正文文本到达即回调，标题/摘要闭合即回调"""
+        def on_text(field: str, text: str):
+            if field == "content" and on_content:
+                on_content(text)
+        
+        parser = StreamingXMLFieldParser(CHAPTER_FIELDS, on_text=on_text, on_field=on_field)
+        chunks = []
+        async for chunk in self.llm.executor.stream(prompt, max_tokens=4000, use_cache=use_cache):
+            chunks.append(chunk)
+            parser.feed(chunk)
+        
+        values = parser.finish()
+        if all(field in values for field in CHAPTER_FIELDS):
+            return values
+        
+        # 增量解析未能取得完整字段时，退回到整体解析
+        return self._parse_chapter_response("".join(chunks), chapter_number)
     
-    def generate_chapter(self, novel: Novel, events: List[Event], focus_characters: List[Character]) -> Dict[str, str]:
-        """生成章节内容"""
+    def _build_chapter_prompt(self, novel: Novel, events: List[Event], focus_characters: List[Character]) -> str:
+        """构建章节生成提示"""
         # 提取章节相关信息
         chapter_number = novel.current_chapter + 1
         previous_summary = ""
-        if novel.chapters and novel.current_chapter > 0:
+        if self.summarizer:
+            previous_summary = self.summarizer.build_history(novel, chapter_number, self.history_budget)
+        elif novel.chapters and novel.current_chapter > 0:
             previous_summary = novel.chapters[novel.current_chapter - 1].summary
         
         # 获取大纲信息
@@ -49,22 +110,53 @@ class NarrativeGenerator:
         # 获取上下文
         context = novel.context.get_context_for_chapter(chapter_number)
         
+        related_passages = self.retrieve_passages(novel, events, focus_characters)
+        
         # 构建提示
-        prompt = CHAPTER_GENERATION_PROMPT.format(
+        return CHAPTER_GENERATION_PROMPT.format(
             chapter_number=chapter_number,
             title=novel.title,
             genre=novel.genre,
             setting=novel.setting,
             outline=outline,
             previous_summary=previous_summary,
+            related_passages=related_passages,
             character_info="\n".join(character_info),
             event_info="\n".join(event_info),
             context=context
         )
+    
+    def retrieve_passages(self, novel: Novel, events: List[Event], focus_characters: List[Character]) -> str:
+        """从已有章节中检索与焦点角色和事件相关的正文段落，按预算截取"""
+        if self.retrieval_budget <= 0 or not novel.chapters:
+            return ""
+        
+        query = " ".join([char.name for char in focus_characters] +
+                         [f"{event.name} {event.description}" for event in events])
+        if not query.strip():
+            return ""
         
-        # 调用LLM生成章节
-        response = self.llm.generate_response(prompt, max_tokens=4000)
+        chapters = {chapter.id: chapter for chapter in novel.chapters}
+        hits = get_chapter_index(novel).search(query, top_k=self.retrieval_top_k, fields=("content",))
         
+        passages = []
+        used = 0
+        for hit in hits:
+            chapter = chapters.get(hit["chapter_id"])
+            if chapter is None:
+                continue
+            text = f"第{chapter.number}章: {chapter.content[hit['start']:hit['end']].strip()}"
+            tokens = estimate_tokens(text)
+            if used + tokens > self.retrieval_budget:
+                continue
+            passages.append((chapter.number, hit["start"], text))
+            used += tokens
+        
+        # 按故事顺序排列
+        return "\n".join(text for _, _, text in sorted(passages))
+    
+    def _parse_chapter_response(self, response: str, chapter_number: int) -> Dict[str, str]:
+        """解析章节XML响应"""
         try:
             # 解析XML响应
             import xml.etree.ElementTree as ET
@@ -86,6 +178,6 @@ class NarrativeGenerator:
             # 返回基本结构
             return {
                 "title": f"第{chapter_number}章",
-                "content": "内容生成失败，请重试。",
+                "content": FALLBACK_CONTENT,
                 "summary": "章节解析错误。"
             }
\ No newline at end of file
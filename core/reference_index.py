@@ -0,0 +1,69 @@
+# core/reference_index.py - 章节引用的反向索引
+
+from typing import Dict, List, Tuple
+from .models import Novel, Chapter
+
+class ReferenceIndex:
+    """章节引用的反向索引 - 从事件ID和焦点角色ID映射到引用它们的章节
+    
+    以章节ID为键，章节重新编号不影响索引；删除事件或角色时只需处理引用它的章节。
+    角色的入向关系由角色关系图(CharacterGraph.inbound)维护。
+    """
+    
+    def __init__(self, novel_id: str = ""):
+        self.novel_id = novel_id
+        self.chapters: Dict[str, Chapter] = {}  # 章节ID -> 章节
+        self.event_chapters: Dict[str, Dict[str, None]] = {}  # 事件ID -> 引用它的章节ID（有序集合）
+        self.focus_chapters: Dict[str, Dict[str, None]] = {}  # 角色ID -> 以其为焦点的章节ID
+        self.indexed: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}  # 章节ID -> 已索引的(事件, 焦点角色)
+    
+    def __len__(self) -> int:
+        return len(self.chapters)
+    
+    def add_chapter(self, chapter: Chapter):
+        """索引章节的事件和焦点角色，已索引的章节按当前内容重新索引"""
+        self.remove_chapter(chapter.id)
+        self.chapters[chapter.id] = chapter
+        self.indexed[chapter.id] = (tuple(chapter.events), tuple(chapter.character_focus))
+        for event_id in chapter.events:
+            self.event_chapters.setdefault(event_id, {})[chapter.id] = None
+        for char_id in chapter.character_focus:
+            self.focus_chapters.setdefault(char_id, {})[chapter.id] = None
+    
+    def remove_chapter(self, chapter_id: str):
+        """移除章节的全部引用"""
+        self.chapters.pop(chapter_id, None)
+        event_ids, char_ids = self.indexed.pop(chapter_id, ((), ()))
+        for key, postings in ((event_ids, self.event_chapters), (char_ids, self.focus_chapters)):
+            for ref_id in key:
+                chapters = postings.get(ref_id)
+                if chapters is not None:
+                    chapters.pop(chapter_id, None)
+                    if not chapters:
+                        del postings[ref_id]
+    
+    def rebuild(self, novel: Novel):
+        """从小说全量重建"""
+        self.__init__(novel.id)
+        for chapter in novel.chapters:
+            self.add_chapter(chapter)
+    
+    def _chapters(self, chapter_ids: Dict[str, None]) -> List[Chapter]:
+        return sorted((self.chapters[chapter_id] for chapter_id in chapter_ids), key=lambda chapter: chapter.number)
+    
+    def chapters_with_event(self, event_id: str) -> List[Chapter]:
+        """使用了该事件的章节（按章节顺序）"""
+        return self._chapters(self.event_chapters.get(event_id, {}))
+    
+    def chapters_with_character(self, char_id: str) -> List[Chapter]:
+        """以该角色为焦点的章节（按章节顺序）"""
+        return self._chapters(self.focus_chapters.get(char_id, {}))
+
+def get_reference_index(novel: Novel) -> ReferenceIndex:
+    """获取小说的章节引用索引，不存在或与章节列表不一致时重建"""
+    index = novel.references
+    if index is None or index.novel_id != novel.id or len(index) != len(novel.chapters):
+        index = ReferenceIndex(novel.id)
+        index.rebuild(novel)
+        novel.references = index
+    return index
\ No newline at end of file
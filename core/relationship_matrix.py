@@ -0,0 +1,349 @@
+# core/relationship_matrix.py - 关系矩阵
+
+import heapq
+from collections.abc import MutableMapping
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+from .models import (Novel, Character, Relationship, HistoryEntry, now_iso, history_entry, fold_history,
+                     intern_str)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class RelationshipMatrix:
+    """关系矩阵 - 以角色ID为下标的稠密NumPy矩阵保存关系强度和类型
+    
+    对一组角色施加的事件效果是一次向量化更新，每个事件只记录一条历史，各对关系只保存其引用；
+    每对关系保留最近history_limit条历史，更早的并入按章节的汇总并移入archive。
+    挂接后角色的relationships替换为读写矩阵的RelationshipView，角色被删除（解除挂接）后其视图不再可用。
+    删除角色释放的槽位由之后新增的角色复用；关系按槽位的分配顺序遍历，与角色的加入顺序一致。
+    """
+    
+    def __init__(self, capacity: int = 16):
+        if np is None:
+            raise ValueError("未安装numpy包")
+        
+        self.ids: List[Optional[str]] = []  # 槽位 -> 角色ID，已释放的槽位为None
+        self.slots: Dict[str, int] = {}  # 角色ID -> 槽位
+        self.free: List[int] = []  # 已释放、待复用的槽位（最小堆）
+        self.rank = np.zeros(capacity, dtype=np.int64)  # 槽位的分配序号，决定关系的遍历顺序
+        self._next_rank = 0
+        self.strength = np.zeros((capacity, capacity))
+        self.present = np.zeros((capacity, capacity), dtype=bool)  # 关系是否存在
+        self.types = np.full((capacity, capacity), "", dtype=object)
+        
+        self.pair_history: Dict[tuple, List[Any]] = {}  # (源槽位, 目标槽位) -> [HistoryEntry 或 (事件记录ID, 强度变化)]
+        self.pair_summary: Dict[tuple, List[Dict[str, Any]]] = {}  # (源槽位, 目标槽位) -> 按章节的历史汇总
+        self.event_log: Dict[int, Dict[str, Any]] = {}  # 事件记录ID -> 事件级历史记录（不再被引用时删除）
+        self._next_record = 0
+        self.history_limit: Optional[int] = None  # 每对关系保留的原始历史条数
+        self.archive: List[Dict[str, Any]] = []  # 被压缩的历史记录（挂接小说后即Novel.history_archive）
+        self.attached: Dict[str, None] = {}  # 已挂接的角色ID
+        self.version = 0  # 关系强度、类型或存在性每次变化时递增，供派生数据判断缓存是否过期
+    
+    def slot(self, char_id: str) -> int:
+        """获取角色的槽位，不存在时优先复用已释放的槽位，否则新分配（容量不足时倍增）"""
+        slot = self.slots.get(char_id)
+        if slot is not None:
+            return slot
+        
+        if self.free:
+            slot = heapq.heappop(self.free)
+            self.ids[slot] = char_id
+        else:
+            slot = len(self.ids)
+            if slot >= self.strength.shape[0]:
+                self._grow(max(16, slot * 2))
+            self.ids.append(char_id)
+        self.slots[char_id] = slot
+        self.rank[slot] = self._next_rank
+        self._next_rank += 1
+        return slot
+    
+    def _grow(self, capacity: int):
+        """扩大矩阵容量"""
+        old = self.strength.shape[0]
+        strength = np.zeros((capacity, capacity))
+        present = np.zeros((capacity, capacity), dtype=bool)
+        types = np.full((capacity, capacity), "", dtype=object)
+        rank = np.zeros(capacity, dtype=np.int64)
+        strength[:old, :old] = self.strength
+        present[:old, :old] = self.present
+        types[:old, :old] = self.types
+        rank[:old] = self.rank
+        self.strength, self.present, self.types, self.rank = strength, present, types, rank
+    
+    def attach(self, character: Character):
+        """导入角色现有的关系，并将其relationships替换为矩阵视图"""
+        if isinstance(character.relationships, RelationshipView) and character.relationships.matrix is self:
+            return
+        existing = list(character.relationships.values())
+        view = RelationshipView(self, character.id)
+        self.slot(character.id)
+        self.attached[character.id] = None
+        for rel in existing:
+            view[rel.target_id] = rel
+        character.relationships = view
+    
+    def detach(self, char_id: str):
+        """角色被删除后清除其发出的关系；没有其他角色指向它时释放槽位供复用"""
+        self.attached.pop(char_id, None)
+        slot = self.slots.get(char_id)
+        if slot is None:
+            return
+        size = len(self.ids)
+        for target in np.flatnonzero(self.present[slot, :size]).tolist():
+            self.remove_relationship(slot, target)
+        
+        # 仍被其他角色的关系引用时保留槽位，否则复用后这些关系会指向新角色
+        if not self.present[:size, slot].any():
+            del self.slots[char_id]
+            self.ids[slot] = None
+            heapq.heappush(self.free, slot)
+    
+    def relationship_types(self) -> List[str]:
+        """当前存在的所有关系类型"""
+        size = len(self.ids)
+        return list(set(self.types[:size, :size][self.present[:size, :size]].tolist()))
+    
+    def set_relationship(self, source: int, target: int, rel_type: str, strength: float,
+                         history: Sequence[Dict[str, Any]] = (), summary: Sequence[Dict[str, Any]] = ()):
+        """设置一对关系（覆盖原有历史）"""
+        self.version += 1
+        self.present[source, target] = True
+        self.types[source, target] = intern_str(rel_type)
+        self.strength[source, target] = max(-1.0, min(1.0, strength))
+        for item in self.pair_history.pop((source, target), []):
+            self._release(item)
+        self.pair_history[(source, target)] = [HistoryEntry.from_mapping(entry) for entry in history]
+        self.pair_summary[(source, target)] = [dict(item) for item in summary]
+        self.compact_pair(source, target, self.history_limit)
+    
+    def remove_relationship(self, source: int, target: int):
+        """删除一对关系"""
+        self.version += 1
+        self.present[source, target] = False
+        self.types[source, target] = ""
+        self.strength[source, target] = 0.0
+        for item in self.pair_history.pop((source, target), []):
+            self._release(item)
+        self.pair_summary.pop((source, target), None)
+    
+    def _resolve(self, item: Any) -> HistoryEntry:
+        """将一对关系的历史项还原为历史记录"""
+        if isinstance(item, HistoryEntry):
+            return item
+        record = self.event_log[item[0]]
+        return HistoryEntry(record["timestamp"], record["description"], record["chapter"], item[1])
+    
+    def _release(self, item: Any):
+        """释放历史项对事件记录的引用"""
+        if not isinstance(item, HistoryEntry):
+            record = self.event_log[item[0]]
+            record["refs"] -= 1
+            if not record["refs"]:
+                del self.event_log[item[0]]
+    
+    def compact_pair(self, source: int, target: int, limit: Optional[int]):
+        """一对关系超出保留条数的早期历史并入按章节的汇总，并移入归档"""
+        items = self.pair_history.get((source, target))
+        if limit is None or items is None or len(items) <= limit:
+            return
+        overflow = items[:len(items) - limit]
+        del items[:len(overflow)]
+        folded = [self._resolve(item) for item in overflow]
+        for item in overflow:
+            self._release(item)
+        fold_history(self.pair_summary.setdefault((source, target), []), folded)
+        self.archive.extend(dict(entry, source=self.ids[source], target=self.ids[target]) for entry in folded)
+    
+    def _append(self, source: int, target: int, item: Any):
+        self.pair_history.setdefault((source, target), []).append(item)
+        self.compact_pair(source, target, self.history_limit)
+    
+    def add_pair_entry(self, source: int, target: int, description: str,
+                       chapter: Optional[int] = None, delta: Optional[float] = None):
+        """为一对关系追加历史记录"""
+        self._append(source, target, history_entry(description, chapter, delta))
+    
+    def history(self, source: int, target: int) -> List[HistoryEntry]:
+        """一对关系保留的原始历史（按发生顺序）"""
+        return [self._resolve(item) for item in self.pair_history.get((source, target), [])]
+    
+    def history_summary(self, source: int, target: int) -> List[Dict[str, Any]]:
+        """一对关系压缩后的按章节汇总"""
+        return [dict(item) for item in self.pair_summary.get((source, target), [])]
+    
+    def apply_group_effect(self, char_ids: Sequence[str], rel_type: str, delta: float,
+                           description: str, event_id: str = "", chapter: Optional[int] = None):
+        """对一组角色两两之间的关系施加同一强度变化，截断到[-1, 1]，只记录一条历史"""
+        slots = np.array([self.slot(char_id) for char_id in dict.fromkeys(char_ids)], dtype=np.int64)
+        if len(slots) < 2:
+            return
+        
+        self.version += 1
+        block = np.ix_(slots, slots)
+        off_diagonal = ~np.eye(len(slots), dtype=bool)
+        before = self.strength[block]
+        after = np.where(off_diagonal, np.clip(before + delta, -1.0, 1.0), before)
+        self.strength[block] = after
+        self.present[block] |= off_diagonal
+        types = self.types[block]
+        types[off_diagonal] = intern_str(rel_type)
+        self.types[block] = types
+        
+        # 事件记录只保存一份，各对关系引用它并记下截断后的实际变化
+        record_id = self._next_record
+        self._next_record += 1
+        slot_list = slots.tolist()
+        self.event_log[record_id] = {
+            "timestamp": now_iso(),
+            "description": intern_str(description),
+            "event_id": event_id,
+            "members": [self.ids[slot] for slot in slot_list],
+            "chapter": chapter,
+            "delta": delta,
+            "refs": len(slot_list) * (len(slot_list) - 1)
+        }
+        changes = (after - before).tolist()
+        for i, source in enumerate(slot_list):
+            for j, target in enumerate(slot_list):
+                if i != j:
+                    self._append(source, target, (record_id, changes[i][j]))
+
+class RelationshipProxy:
+    """矩阵中一对关系的视图，接口与Relationship一致
+    
+    历史和汇总以只读序列返回，直接修改会报错；追加历史需调用add_history_entry。
+    """
+    
+    __slots__ = ("_matrix", "_source", "_target", "target_id")
+    
+    def __init__(self, matrix: RelationshipMatrix, source: int, target: int):
+        self._matrix = matrix
+        self._source = source
+        self._target = target
+        self.target_id = matrix.ids[target]
+    
+    @property
+    def relationship_type(self) -> str:
+        return self._matrix.types[self._source, self._target]
+    
+    @relationship_type.setter
+    def relationship_type(self, value: str):
+        self._matrix.version += 1
+        self._matrix.types[self._source, self._target] = intern_str(value)
+    
+    @property
+    def strength(self) -> float:
+        return float(self._matrix.strength[self._source, self._target])
+    
+    @strength.setter
+    def strength(self, value: float):
+        self._matrix.version += 1
+        self._matrix.strength[self._source, self._target] = max(-1.0, min(1.0, value))
+    
+    @property
+    def history(self) -> Tuple[HistoryEntry, ...]:
+        return tuple(self._matrix.history(self._source, self._target))
+    
+    @property
+    def history_summary(self) -> Tuple[Mapping[str, Any], ...]:
+        return tuple(MappingProxyType(item) for item in self._matrix.pair_summary.get((self._source, self._target), []))
+    
+    def add_history_entry(self, event_description: str, chapter: Optional[int] = None,
+                          delta: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """添加关系历史记录（按矩阵的保留条数压缩，被压缩的记录由矩阵归档）"""
+        self._matrix.add_pair_entry(self._source, self._target, event_description, chapter, delta)
+        return []
+    
+    def compact_history(self, limit: Optional[int]) -> List[Dict[str, Any]]:
+        """按limit压缩历史（被压缩的记录由矩阵归档）"""
+        self._matrix.compact_pair(self._source, self._target, limit)
+        return []
+    
+    def to_relationship(self) -> Relationship:
+        """转换为独立的Relationship对象"""
+        return Relationship(target_id=self.target_id, relationship_type=self.relationship_type,
+                            strength=self.strength, history=list(self.history),
+                            history_summary=self._matrix.history_summary(self._source, self._target))
+    
+    def __repr__(self):
+        return (f"RelationshipProxy(target_id={self.target_id!r}, "
+                f"relationship_type={self.relationship_type!r}, strength={self.strength!r})")
+
+class RelationshipView(MutableMapping):
+    """某个角色在矩阵中的关系，兼容Character.relationships的字典接口"""
+    
+    def __init__(self, matrix: RelationshipMatrix, char_id: str):
+        self.matrix = matrix
+        self.char_id = char_id
+    
+    @property
+    def _source(self) -> int:
+        """角色的槽位，角色已解除挂接时抛出KeyError（不重新分配槽位）"""
+        slot = self.matrix.slots.get(self.char_id)
+        if slot is None or self.char_id not in self.matrix.attached:
+            raise KeyError(self.char_id)
+        return slot
+    
+    def __getitem__(self, target_id: str) -> RelationshipProxy:
+        target = self.matrix.slots.get(target_id)
+        if target is None or not self.matrix.present[self._source, target]:
+            raise KeyError(target_id)
+        return RelationshipProxy(self.matrix, self._source, target)
+    
+    def __setitem__(self, target_id: str, rel: Relationship):
+        self.matrix.set_relationship(self._source, self.matrix.slot(target_id), rel.relationship_type,
+                                     rel.strength, rel.history, rel.history_summary)
+    
+    def __delitem__(self, target_id: str):
+        target = self.matrix.slots.get(target_id)
+        if target is None or not self.matrix.present[self._source, target]:
+            raise KeyError(target_id)
+        self.matrix.remove_relationship(self._source, target)
+    
+    def __contains__(self, target_id: object) -> bool:
+        target = self.matrix.slots.get(target_id)
+        return target is not None and bool(self.matrix.present[self._source, target])
+    
+    def __iter__(self) -> Iterator[str]:
+        row = self.matrix.present[self._source, :len(self.matrix.ids)]
+        targets = np.flatnonzero(row)
+        targets = targets[np.argsort(self.matrix.rank[targets], kind="stable")]
+        return iter([self.matrix.ids[target] for target in targets.tolist()])
+    
+    def __len__(self) -> int:
+        return int(self.matrix.present[self._source, :len(self.matrix.ids)].sum())
+    
+    def __deepcopy__(self, memo) -> Dict[str, Dict[str, Any]]:
+        # dataclasses.asdict对非dict映射执行deepcopy，此处返回与原字段一致的字典结构
+        return {target_id: {"target_id": rel.target_id, "relationship_type": rel.relationship_type,
+                            "strength": rel.strength, "history": [dict(entry) for entry in rel.history],
+                            "history_summary": [dict(item) for item in rel.history_summary]}
+                for target_id, rel in self.items()}
+    
+    def __repr__(self):
+        return f"RelationshipView({dict(self.items())!r})"
+
+def get_relationship_matrix(novel: Novel) -> Optional[RelationshipMatrix]:
+    """获取小说的关系矩阵并挂接所有角色，未安装numpy时返回None"""
+    if np is None:
+        return None
+    
+    matrix = novel.relationship_matrix
+    if matrix is None:
+        matrix = RelationshipMatrix(max(16, len(novel.characters)))
+        novel.relationship_matrix = matrix
+    matrix.history_limit = novel.history_limit
+    matrix.archive = novel.history_archive
+    for char_id in [char_id for char_id in matrix.attached if char_id not in novel.characters]:
+        matrix.detach(char_id)
+    # 先按角色顺序分配槽位，关系的遍历顺序（即保存顺序）在重新加载后保持不变
+    for char_id in novel.characters:
+        matrix.slot(char_id)
+    for character in novel.characters.values():
+        matrix.attach(character)
+    return matrix
\ No newline at end of file
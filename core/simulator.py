@@ -0,0 +1,151 @@
+# core/simulator.py - 离线故事状态模拟
+
+import math
+import statistics
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+from .models import Novel
+from .event_engine import EventEngine
+from .event_scoring import VectorizedEventScorer
+
+# 关系强度直方图的分箱边界
+STRENGTH_BINS = [-1.0, -0.6, -0.2, 0.2, 0.6, 1.0]
+
+def simulate_run(xml_data: str, chapters: int, seed: int, event_scoring: str = "simple") -> Dict[str, Any]:
+    """不调用LLM推进一次故事状态，返回该次运行的原始统计（在工作进程中执行）"""
+    # 延迟导入，避免core依赖中间件和工具层
+    from middleware.chapter_manager import ChapterManager
+    from utils.xml_utils import xml_to_novel
+    
+    novel = xml_to_novel(xml_data)
+    novel.seed = seed
+    novel.rng_draws = 0
+    scorer = VectorizedEventScorer() if event_scoring == "vectorized" else None
+    engine = EventEngine(scorer=scorer)
+    manager = ChapterManager(None, engine)
+    
+    start = len(novel.chapters)
+    for _ in range(chapters):
+        # 与生成章节相同的选择流程，只是用空白章节代替LLM输出
+        focus_characters, events = manager._prepare_chapter(novel)
+        for event in events:
+            engine.apply_event_effects(event, novel, focus_characters)
+        manager._add_generated_chapter(novel, {"title": "", "content": "", "summary": ""},
+                                       events, focus_characters)
+    
+    event_usage = Counter()
+    focus = Counter()
+    for chapter in novel.chapters[start:]:
+        event_usage.update(chapter.events)
+        focus.update(chapter.character_focus)
+    
+    strengths = [rel.strength for char in novel.characters.values() for rel in char.relationships.values()]
+    return {"seed": seed, "strengths": strengths, "event_usage": dict(event_usage), "focus": dict(focus)}
+
+def _distribution(values: List[float]) -> Dict[str, Any]:
+    """数值分布的概要统计"""
+    if not values:
+        return {"count": 0}
+    
+    ordered = sorted(values)
+    quantiles = statistics.quantiles(ordered, n=10, method="inclusive") if len(ordered) > 1 else ordered * 9
+    histogram = {}
+    for low, high in zip(STRENGTH_BINS, STRENGTH_BINS[1:]):
+        label = f"[{low:.1f}, {high:.1f}{']' if high == STRENGTH_BINS[-1] else ')'}"
+        histogram[label] = sum(1 for v in ordered if low <= v < high or (high == STRENGTH_BINS[-1] and v == high))
+    
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "std": statistics.pstdev(ordered),
+        "min": ordered[0],
+        "p10": quantiles[0],
+        "p50": quantiles[4],
+        "p90": quantiles[8],
+        "max": ordered[-1],
+        "histogram": histogram
+    }
+
+class StorySimulator:
+    """离线故事模拟器 - 在多个随机种子下推进章节状态并汇总分布，用于调整事件库"""
+    
+    def __init__(self, chapters: int = 50, seeds: int = 20, max_workers: Optional[int] = None,
+                 event_scoring: str = "simple", base_seed: int = 0):
+        self.chapters = chapters  # 每次运行推进的章节数
+        self.seeds = seeds  # 运行次数（每次使用不同的种子）
+        self.max_workers = max_workers  # 进程数，1表示在当前进程中顺序执行
+        self.event_scoring = event_scoring  # simple/vectorized
+        self.base_seed = base_seed
+    
+    def run(self, novel: Novel) -> Dict[str, Any]:
+        """模拟一部小说，返回分布报告"""
+        return self.run_many([novel])[0]
+    
+    def run_many(self, novels: Sequence[Novel]) -> List[Dict[str, Any]]:
+        """模拟多部小说（如同一故事的多个事件库配置），所有运行共享一个进程池"""
+        from utils.xml_utils import novel_to_xml
+        
+        xml_list = [novel_to_xml(novel) for novel in novels]
+        seeds = [self.base_seed + i for i in range(self.seeds)]
+        jobs = [(xml_data, self.chapters, seed, self.event_scoring) for xml_data in xml_list for seed in seeds]
+        
+        if self.max_workers == 1:
+            results = [simulate_run(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                # 每个任务很短，分块提交以降低进程间通信开销
+                chunksize = max(1, len(jobs) // ((self.max_workers or 4) * 4))
+                results = list(pool.map(simulate_run, *zip(*jobs), chunksize=chunksize))
+        
+        return [self._report(novel, results[i * len(seeds):(i + 1) * len(seeds)])
+                for i, novel in enumerate(novels)]
+    
+    def _report(self, novel: Novel, runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """汇总多次运行的统计"""
+        strengths = [value for run in runs for value in run["strengths"]]
+        
+        event_totals = Counter()
+        event_runs = Counter()
+        focus_totals = Counter()
+        for run in runs:
+            event_totals.update(run["event_usage"])
+            event_runs.update(run["event_usage"].keys())
+            focus_totals.update(run["focus"])
+        
+        event_usage = {}
+        for event_id, event in novel.events_library.items():
+            event_usage[event_id] = {
+                "name": event.name,
+                "mean_uses": event_totals[event_id] / len(runs),
+                "run_share": event_runs[event_id] / len(runs)
+            }
+        
+        total_focus = sum(focus_totals.values()) or 1
+        character_focus = {}
+        for char_id, char in novel.characters.items():
+            character_focus[char_id] = {
+                "name": char.name,
+                "mean_chapters": focus_totals[char_id] / len(runs),
+                "share": focus_totals[char_id] / total_focus
+            }
+        
+        usage_values = [item["mean_uses"] for item in event_usage.values()]
+        return {
+            "title": novel.title,
+            "runs": len(runs),
+            "chapters": self.chapters,
+            "relationship_strength": _distribution(strengths),
+            "event_usage": dict(sorted(event_usage.items(), key=lambda item: item[1]["mean_uses"], reverse=True)),
+            "unused_events": sum(1 for value in usage_values if value == 0),
+            "event_usage_entropy": self._entropy(event_totals),
+            "character_focus": dict(sorted(character_focus.items(), key=lambda item: item[1]["share"], reverse=True))
+        }
+    
+    @staticmethod
+    def _entropy(counts: Counter) -> float:
+        """使用分布的香农熵(比特)，越高表示事件使用越均匀"""
+        total = sum(counts.values())
+        if not total:
+            return 0.0
+        return -sum(c / total * math.log2(c / total) for c in counts.values() if c)
\ No newline at end of file
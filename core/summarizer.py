@@ -0,0 +1,121 @@
+# core/summarizer.py - 分层摘要
+
+import asyncio
+import xml.etree.ElementTree as ET
+from typing import List, Tuple
+from .llm_interface import LLMInterface, estimate_tokens, run_sync
+from .models import Novel
+from config.prompts import SUMMARY_COMPRESSION_PROMPT
+
+class Summarizer:
+    """分层摘要维护器 - 卷完结时压缩章节摘要，全书摘要随卷增量更新，并按令牌预算组装历史"""
+    
+    def __init__(self, llm_interface: LLMInterface, volume_words: int = 300, book_words: int = 500):
+        self.llm = llm_interface
+        self.volume_words = volume_words  # 卷摘要字数上限
+        self.book_words = book_words  # 全书摘要字数上限
+    
+    def refresh(self, novel: Novel, chapter_count: int = None):
+        """补全缺失的卷摘要和全书摘要"""
+        return run_sync(self.arefresh(novel, chapter_count))
+    
+    async def arefresh(self, novel: Novel, chapter_count: int = None):
+        """补全前chapter_count章对应的卷摘要和全书摘要（默认全部章节）"""
+        pyramid = novel.summaries
+        if chapter_count is None:
+            chapter_count = len(novel.chapters)
+        closed = pyramid.closed_volumes(chapter_count)
+        
+        # 丢弃因删除章节而不再完结的卷
+        for volume in [v for v in pyramid.volumes if v >= closed]:
+            del pyramid.volumes[volume]
+        if pyramid.book_volumes > closed:
+            pyramid.book = ""
+            pyramid.book_volumes = 0
+        
+        # 卷摘要：每卷只在完结或失效后压缩一次，多卷失效时并发压缩
+        missing = [v for v in range(closed) if v not in pyramid.volumes]
+        results = await asyncio.gather(*[self._compress_volume(novel, v) for v in missing])
+        for volume, summary in zip(missing, results):
+            pyramid.volumes[volume] = summary
+        
+        # 全书摘要：在已有摘要的基础上并入新完结的卷
+        if pyramid.book_volumes < closed:
+            items = []
+            if pyramid.book:
+                items.append(f"第1-{pyramid.book_volumes * pyramid.volume_size}章: {pyramid.book}")
+            for volume in range(pyramid.book_volumes, closed):
+                start, end = pyramid.volume_range(volume)
+                items.append(f"第{start}-{end}章: {pyramid.volumes[volume]}")
+            pyramid.book = await self._compress(novel, "story summaries", items, self.book_words)
+            pyramid.book_volumes = closed
+    
+    async def _compress_volume(self, novel: Novel, volume: int) -> str:
+        """压缩一卷的章节摘要"""
+        start, end = novel.summaries.volume_range(volume)
+        items = [f"第{chapter.number}章: {chapter.summary}"
+                 for chapter in novel.chapters[start - 1:end] if chapter.summary]
+        return await self._compress(novel, "chapter summaries", items, self.volume_words)
+    
+    async def _compress(self, novel: Novel, scope: str, items: List[str], max_words: int) -> str:
+        """调用LLM压缩多段摘要，失败时退回到截断拼接"""
+        if not items:
+            return ""
+        
+        prompt = SUMMARY_COMPRESSION_PROMPT.format(
+            scope=scope,
+            max_words=max_words,
+            title=novel.title,
+            genre=novel.genre,
+            summaries="\n".join(items)
+        )
+        
+        try:
+            response = await self.llm.executor.submit(prompt, max_tokens=max_words * 2)
+            summary = ET.fromstring(response).text
+            if summary and summary.strip():
+                return summary.strip()
+        except Exception as e:
+            print(f"压缩摘要时出错: {e}")
+        
+        return " ".join(items)[:max_words]
+    
+    def build_history(self, novel: Novel, chapter_number: int, token_budget: int = 1500) -> str:
+        """为第chapter_number章组装前情提要，按相关性优先填入预算，再按时间顺序输出"""
+        pyramid = novel.summaries
+        previous = novel.chapters[:chapter_number - 1]
+        closed = pyramid.closed_volumes(len(previous))
+        
+        # 候选项: (优先级, 时间顺序键, 文本)
+        candidates: List[Tuple[int, Tuple[int, int], str]] = []
+        
+        # 未完结卷中的章节摘要，越近越优先
+        open_chapters = [c for c in previous[closed * pyramid.volume_size:] if c.summary]
+        for rank, chapter in enumerate(reversed(open_chapters)):
+            candidates.append((rank, (2, chapter.number), f"第{chapter.number}章: {chapter.summary}"))
+        
+        offset = len(open_chapters)
+        
+        # 最近一卷摘要，其次全书摘要，再次更早的卷摘要
+        closed_volumes = [v for v in range(closed) if pyramid.volumes.get(v)]
+        if closed_volumes:
+            latest = closed_volumes[-1]
+            start, end = pyramid.volume_range(latest)
+            candidates.append((offset, (1, latest), f"第{start}-{end}章: {pyramid.volumes[latest]}"))
+        # 全书摘要涵盖了本章之后的卷时不使用（如重新生成较早的章节）
+        if pyramid.book and 1 < pyramid.book_volumes <= closed:
+            candidates.append((offset + 1, (0, 0), f"前情梗概: {pyramid.book}"))
+        for rank, volume in enumerate(reversed(closed_volumes[:-1])):
+            start, end = pyramid.volume_range(volume)
+            candidates.append((offset + 2 + rank, (1, volume), f"第{start}-{end}章: {pyramid.volumes[volume]}"))
+        
+        selected = []
+        used = 0
+        for _, order, text in sorted(candidates, key=lambda c: c[0]):
+            tokens = estimate_tokens(text)
+            if used + tokens > token_budget:
+                continue
+            selected.append((order, text))
+            used += tokens
+        
+        return "\n".join(text for _, text in sorted(selected))
\ No newline at end of file
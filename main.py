@@ -4,16 +4,25 @@ import os
 import sys
 from dotenv import load_dotenv
 from ui.cli import CLI
+from ui.batch import run_batch
+from ui.simulate import run_simulation
+from ui.benchmark import run_benchmark, run_save_benchmark
+from ui.database import run_migrate, run_search
 from utils.logger import Logger
 
 def check_dependencies():
     """检查依赖项是否安装"""
-    required_packages = ['openai', 'python-dotenv']
+    # 包名 -> 导入名
+    required_packages = {'openai': 'openai', 'python-dotenv': 'dotenv'}
     missing_packages = []
     
-    for package in required_packages:
+    # 离线假后端不需要openai
+    if os.getenv("LLM_BACKEND", "openai").lower() == "fake":
+        del required_packages['openai']
+    
+    for package, module in required_packages.items():
         try:
-            __import__(package)
+            __import__(module)
         except ImportError:
             missing_packages.append(package)
     
@@ -31,6 +40,10 @@ def check_environment():
     """检查环境变量"""
     load_dotenv()
     
+    # 离线假后端不需要API密钥
+    if os.getenv("LLM_BACKEND", "openai").lower() == "fake":
+        return True
+    
     if not os.getenv("OPENAI_API_KEY"):
         print("错误: 未设置OPENAI_API_KEY环境变量")
         print("\n请通过以下方式之一设置API密钥：")
@@ -51,6 +64,31 @@ def create_directories():
 
 def main():
     """主函数"""
+    # 无人值守批量生成: python main.py generate --novel saves/x.xml --chapters 50
+    if len(sys.argv) > 1 and sys.argv[1] == "generate":
+        create_directories()
+        sys.exit(run_batch(sys.argv[2:]))
+    
+    # 离线模拟事件库: python main.py simulate --novel saves/x.xml --chapters 50 --seeds 100
+    if len(sys.argv) > 1 and sys.argv[1] == "simulate":
+        sys.exit(run_simulation(sys.argv[2:]))
+    
+    # 模型内存基准: python main.py benchmark-memory --characters 1000
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark-memory":
+        sys.exit(run_benchmark(sys.argv[2:]))
+    
+    # 存档写出基准: python main.py benchmark-save --chapters 1500
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark-save":
+        sys.exit(run_save_benchmark(sys.argv[2:]))
+    
+    # 存储迁移: python main.py migrate saves/x.xml saves/x.db（反向同理）
+    if len(sys.argv) > 1 and sys.argv[1] == "migrate":
+        sys.exit(run_migrate(sys.argv[2:]))
+    
+    # 全文检索: python main.py search --novel saves/x.db 关键词
+    if len(sys.argv) > 1 and sys.argv[1] == "search":
+        sys.exit(run_search(sys.argv[2:]))
+    
     print("=" * 60)
     print("基于人物驱动的小说生成系统")
     print("=" * 60)
@@ -1,26 +1,34 @@
 # middleware/chapter_manager.py - 章节管理中间件
 
-from typing import List, Dict, Optional, Any, Tuple
+from typing import Callable, List, Dict, Optional, Any, Tuple
 from core.models import Novel, Chapter, Character, Event
 from core.event_engine import EventEngine
+from core.chapter_index import get_chapter_index
+from core.focus_selector import FocusSelector, get_character_graph
+from core.reference_index import get_reference_index
 from core.narrative_generator import NarrativeGenerator
 
 class ChapterManager:
     """章节管理中间件"""
     
-    def __init__(self, narrative_generator: NarrativeGenerator, event_engine: EventEngine):
+    def __init__(self, narrative_generator: NarrativeGenerator, event_engine: EventEngine,
+                 focus_selector: Optional[FocusSelector] = None):
         self.narrative_generator = narrative_generator
         self.event_engine = event_engine
+        self.focus_selector = focus_selector or FocusSelector()
     
     def create_chapter(self, novel: Novel, title: str) -> Chapter:
         """手动创建章节"""
         chapter_number = novel.current_chapter + 1
-        chapter = Chapter.create(chapter_number, title)
+        chapter = Chapter.create(chapter_number, title, novel.rng("id"))
         chapter.user_edited = True
         
+        get_character_graph(novel).record_chapter(chapter)
+        get_reference_index(novel).add_chapter(chapter)
         novel.chapters.append(chapter)
         novel.current_chapter = chapter_number
-        novel.update_modified()
+        novel.record_change("chapter", "add", chapter.id)
+        get_chapter_index(novel).index_chapter(chapter)
         
         # 更新时间线
         novel.timeline.append({
@@ -30,34 +38,60 @@ class ChapterManager:
         
         return chapter
     
-    def generate_chapter(self, novel: Novel) -> Chapter:
-        """生成新章节"""
-        # 选择焦点角色
-        focus_characters = self._select_focus_characters(novel)
-        focus_character_ids = [char.id for char in focus_characters]
+    def generate_chapter(self, novel: Novel, use_cache: bool = True,
+                         on_content: Optional[Callable[[str], None]] = None,
+                         on_field: Optional[Callable[[str, str], None]] = None) -> Chapter:
+        """生成新章节，use_cache=False时强制重新请求LLM；提供回调时流式输出正文"""
+        focus_characters, events = self._prepare_chapter(novel)
+        
+        # 生成章节内容
+        chapter_data = self.narrative_generator.generate_chapter(novel, events, focus_characters,
+                                                                 use_cache=use_cache, on_content=on_content,
+                                                                 on_field=on_field)
         
+        return self._add_generated_chapter(novel, chapter_data, events, focus_characters)
+    
+    async def agenerate_chapter(self, novel: Novel, use_cache: bool = True,
+                                on_content: Optional[Callable[[str], None]] = None,
+                                on_field: Optional[Callable[[str, str], None]] = None) -> Chapter:
+        """异步生成新章节（经共享执行器限流）"""
+        focus_characters, events = self._prepare_chapter(novel)
+        chapter_data = await self.narrative_generator.agenerate_chapter(novel, events, focus_characters,
+                                                                        use_cache=use_cache, on_content=on_content,
+                                                                        on_field=on_field)
+        return self._add_generated_chapter(novel, chapter_data, events, focus_characters)
+    
+    def _prepare_chapter(self, novel: Novel) -> Tuple[List[Character], List[Event]]:
+        """选择新章节的焦点角色和事件"""
         # 选择章节事件
         events = self.event_engine.select_events_for_chapter(novel)
         if not events and novel.events_library:
             # 随机选择事件
-            import random
-            events = random.sample(list(novel.events_library.values()), 
-                                  min(3, len(novel.events_library)))
+            events = novel.rng("fallback_events").sample(list(novel.events_library.values()),
+                                                         min(3, len(novel.events_library)))
         
-        event_ids = [event.id for event in events]
+        # 选择焦点角色（参考事件涉及的角色）
+        focus_characters = self._select_focus_characters(novel, events)
         
-        # 生成章节内容
-        chapter_data = self.narrative_generator.generate_chapter(novel, events, focus_characters)
+        return focus_characters, events
+    
+    def _add_generated_chapter(self, novel: Novel, chapter_data: Dict[str, str],
+                               events: List[Event], focus_characters: List[Character]) -> Chapter:
+        """根据生成结果创建章节并更新小说状态"""
+        event_ids = [event.id for event in events]
+        focus_character_ids = [char.id for char in focus_characters]
         
         # 创建章节对象
         chapter_number = novel.current_chapter + 1
-        chapter = Chapter.create(chapter_number, chapter_data["title"])
+        chapter = Chapter.create(chapter_number, chapter_data["title"], novel.rng("id"))
         chapter.events = event_ids
         chapter.character_focus = focus_character_ids
         chapter.content = chapter_data["content"]
         chapter.summary = chapter_data["summary"]
         
         # 更新小说状态
+        get_character_graph(novel).record_chapter(chapter)
+        get_reference_index(novel).add_chapter(chapter)
         novel.chapters.append(chapter)
         novel.current_chapter = chapter_number
         
@@ -68,7 +102,9 @@ class ChapterManager:
             "summary": chapter.summary
         })
         
-        novel.update_modified()
+        get_chapter_index(novel).index_chapter(chapter)
+        
+        novel.record_change("chapter", "add", chapter.id)
         return chapter
     
     def update_chapter(self, novel: Novel, chapter_number: int,
@@ -92,9 +128,22 @@ class ChapterManager:
         if "events" in data:
             chapter.events = data["events"]
         
+        # 焦点角色或事件变化后，重新索引章节引用，角色出场记录需要重建
+        if "character_focus" in data or "events" in data:
+            get_reference_index(novel).add_chapter(chapter)
+            if novel.character_graph is not None:
+                novel.character_graph.recency_dirty = True
+        
         # 标记为用户编辑
         chapter.user_edited = True
         
+        # 摘要或内容变化后，所属卷的摘要需要重新压缩
+        if "summary" in data or "content" in data:
+            novel.summaries.invalidate_chapter(chapter_number)
+        
+        # 增量更新检索索引（内容未变时不会重新分词）
+        get_chapter_index(novel).index_chapter(chapter)
+        
         # 更新时间线
         for item in novel.timeline:
             if item.get("chapter") == chapter_number:
@@ -102,7 +151,7 @@ class ChapterManager:
                 item["summary"] = chapter.summary
                 break
         
-        novel.update_modified()
+        novel.record_change("chapter", "update", chapter.id, tuple(data))
         return chapter
     
     def delete_chapter(self, novel: Novel, chapter_number: int) -> bool:
@@ -111,7 +160,14 @@ class ChapterManager:
             return False
         
         # 删除章节
-        novel.chapters.pop(chapter_number - 1)
+        references = get_reference_index(novel)
+        chapter = novel.chapters.pop(chapter_number - 1)
+        deleted_id = chapter.id
+        references.remove_chapter(chapter.id)
+        get_chapter_index(novel).remove_chapter(chapter.id)
+        
+        # 后续章节重新编号，从该章所在卷起的摘要全部失效
+        novel.summaries.invalidate_from(chapter_number)
         
         # 重新编号后续章节
         for i, chapter in enumerate(novel.chapters[chapter_number - 1:], chapter_number):
@@ -119,6 +175,8 @@ class ChapterManager:
         
         # 更新当前章节
         novel.current_chapter = max(0, len(novel.chapters))
+        if novel.character_graph is not None:
+            novel.character_graph.recency_dirty = True
         
         # 更新时间线
         novel.timeline = [item for item in novel.timeline if item.get("chapter") != chapter_number]
@@ -126,7 +184,7 @@ class ChapterManager:
             if item.get("chapter") > chapter_number:
                 item["chapter"] -= 1
         
-        novel.update_modified()
+        novel.record_change("chapter", "delete", deleted_id)
         return True
     
     def get_all_chapters(self, novel: Novel) -> List[Chapter]:
@@ -139,26 +197,46 @@ class ChapterManager:
             return None
         return novel.chapters[chapter_number - 1]
     
+    def get_chapters_with_event(self, novel: Novel, event_id: str) -> List[Chapter]:
+        """使用了某事件的章节"""
+        return get_reference_index(novel).chapters_with_event(event_id)
+    
+    def get_chapters_with_character(self, novel: Novel, character_id: str) -> List[Chapter]:
+        """以某角色为焦点的章节"""
+        return get_reference_index(novel).chapters_with_character(character_id)
+    
     def search_chapters(self, novel: Novel, query: str) -> List[Tuple[int, Chapter]]:
-        """搜索章节"""
-        query = query.lower()
-        results = []
+        """搜索章节，按相关度排序"""
+        return [(result["chapter"].number, result["chapter"])
+                for result in self.search_chapter_matches(novel, query)]
+    
+    def search_chapter_matches(self, novel: Novel, query: str, limit: Optional[int] = None,
+                               snippet_chars: int = 30) -> List[Dict[str, Any]]:
+        """全文检索章节，支持引号短语，返回按相关度排序的结果及匹配片段
+        
+        每个结果为{chapter, score, matches}，matches中的每项为
+        {field, start, end, snippet}，start/end是匹配在该字段原文中的偏移。
+        """
+        chapters = {chapter.id: chapter for chapter in novel.chapters}
         
-        for i, chapter in enumerate(novel.chapters, 1):
-            if (query in chapter.title.lower() or 
-                query in chapter.content.lower() or
-                query in chapter.summary.lower()):
-                results.append((i, chapter))
+        def get_text(chapter_id: str, field: str) -> str:
+            return getattr(chapters[chapter_id], field) or ""
+        
+        results = []
+        for hit in get_chapter_index(novel).find(query, get_text, limit):
+            chapter = chapters[hit["chapter_id"]]
+            matches = []
+            for match in hit["matches"]:
+                text = get_text(chapter.id, match["field"])
+                left = max(0, match["start"] - snippet_chars)
+                right = min(len(text), match["end"] + snippet_chars)
+                snippet = text[left:right].replace("\n", " ")
+                matches.append(dict(match, snippet=("…" if left > 0 else "") + snippet +
+                                    ("…" if right < len(text) else "")))
+            results.append({"chapter": chapter, "score": hit["score"], "matches": matches})
         
         return results
     
-    def _select_focus_characters(self, novel: Novel) -> List[Character]:
+    def _select_focus_characters(self, novel: Novel, events: List[Event] = ()) -> List[Character]:
         """选择本章节的焦点角色"""
-        # 简单逻辑：随机选择2-3个角色作为焦点
-        import random
-        characters = list(novel.characters.values())
-        if not characters:
-            return []
-            
-        num_focus = min(len(characters), random.randint(2, 3))
-        return random.sample(characters, num_focus)
\ No newline at end of file
+        return self.focus_selector.select(novel, events)
\ No newline at end of file
@@ -1,9 +1,12 @@
 # middleware/character_manager.py - 角色管理中间件
 
+import asyncio
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Optional, Any
-from core.models import Character, Trait, Novel
-from core.llm_interface import LLMInterface
+from core.models import Character, Trait, Novel, intern_str
+from core.llm_interface import LLMInterface, run_sync
+from core.focus_selector import get_character_graph
+from core.reference_index import get_reference_index
 from config.prompts import CHARACTER_CREATION_PROMPT
 
 class CharacterManager:
@@ -14,27 +17,66 @@ class CharacterManager:
     
     def create_character(self, novel: Novel, name: str, age: int, gender: str, background: str) -> Character:
         """手动创建角色"""
-        character = Character.create(name, age, gender, background)
+        character = Character.create(name, age, gender, background, novel.rng("id"))
+        # 先更新关系图再写入角色表，两者大小一致时才不会全量重建
+        get_character_graph(novel).add_character(character)
         novel.characters[character.id] = character
-        novel.update_modified()
+        novel.record_change("character", "add", character.id)
         return character
     
-    def generate_character(self, novel: Novel) -> Character:
-        """使用LLM生成角色"""
+    def generate_character(self, novel: Novel, use_cache: bool = True) -> Character:
+        """使用LLM生成角色，use_cache=False时强制重新请求LLM（用户主动生成时）"""
+        prompt = self._build_character_prompt(novel)
+        
+        # 调用LLM（提示不含已有角色，以角色数区分请求，避免缓存返回同一角色）
+        response = self.llm.generate_response(prompt, use_cache=use_cache, variant=len(novel.characters))
+        
+        return self._parse_character_response(novel, response)
+    
+    async def agenerate_character(self, novel: Novel, variant: Optional[int] = None,
+                                  use_cache: bool = True) -> Character:
+        """使用LLM异步生成角色（经共享执行器限流）"""
+        if variant is None:
+            variant = len(novel.characters)
+        prompt = self._build_character_prompt(novel)
+        response = await self.llm.executor.submit(prompt, use_cache=use_cache, variant=variant)
+        return self._parse_character_response(novel, response)
+    
+    def generate_characters(self, novel: Novel, count: int, use_cache: bool = True) -> List[Character]:
+        """并发生成多个角色"""
+        return run_sync(self.agenerate_characters(novel, count, use_cache))
+    
+    async def agenerate_characters(self, novel: Novel, count: int, use_cache: bool = True) -> List[Character]:
+        """并发生成多个角色，按请求顺序加入小说（与完成顺序无关），失败的请求被跳过"""
+        base = len(novel.characters)
+        prompt = self._build_character_prompt(novel)
+        responses = await asyncio.gather(
+            *[self.llm.executor.submit(prompt, use_cache=use_cache, variant=base + i) for i in range(count)],
+            return_exceptions=True
+        )
+        characters = []
+        for response in responses:
+            if isinstance(response, Exception):
+                print(f"生成角色失败: {response}")
+            else:
+                characters.append(self._parse_character_response(novel, response))
+        return characters
+    
+    def _build_character_prompt(self, novel: Novel) -> str:
+        """构建角色生成提示"""
         # 获取上下文
         context = novel.context.global_context
         
         # 构建提示
         background_info = f"这个角色生活在{novel.setting}世界中，这是一部{novel.genre}类型的小说。"
-        prompt = CHARACTER_CREATION_PROMPT.format(
+        return CHARACTER_CREATION_PROMPT.format(
             genre=novel.genre,
             background_info=background_info,
             context=context
         )
-        
-        # 调用LLM
-        response = self.llm.generate_response(prompt)
-        
+    
+    def _parse_character_response(self, novel: Novel, response: str) -> Character:
+        """解析角色XML响应并添加到小说"""
         try:
             # 解析XML响应
             root = ET.fromstring(response)
@@ -46,14 +88,14 @@ class CharacterManager:
             appearance = root.find("appearance").text if root.find("appearance") is not None else ""
             
             # 创建角色
-            character = Character.create(name, age, gender, background)
+            character = Character.create(name, age, gender, background, novel.rng("id"))
             character.appearance = appearance
             
             # 解析性格特征
             for trait_elem in root.find("personality").findall("trait"):
                 trait_name = trait_elem.get("name")
                 trait_value = float(trait_elem.text)
-                character.personality[trait_name] = trait_value
+                character.personality[intern_str(trait_name)] = trait_value
             
             # 解析目标
             goals_elem = root.find("goals")
@@ -62,8 +104,9 @@ class CharacterManager:
                     character.goals.append(goal_elem.text)
             
             # 添加到小说
+            get_character_graph(novel).add_character(character)
             novel.characters[character.id] = character
-            novel.update_modified()
+            novel.record_change("character", "add", character.id)
             
             return character
             
@@ -71,9 +114,10 @@ class CharacterManager:
             print(f"解析角色XML时出错: {e}")
             print(f"原始响应: {response}")
             # 创建一个基本角色作为备选
-            character = Character.create("未知角色", 30, "未指定", "因解析错误生成的角色")
+            character = Character.create("未知角色", 30, "未指定", "因解析错误生成的角色", novel.rng("id"))
+            get_character_graph(novel).add_character(character)
             novel.characters[character.id] = character
-            novel.update_modified()
+            novel.record_change("character", "add", character.id)
             return character
     
     def update_character(self, novel: Novel, character_id: str, 
@@ -97,7 +141,11 @@ class CharacterManager:
         if "goals" in data:
             character.goals = data["goals"]
         
-        novel.update_modified()
+        # 名称用于匹配事件触发条件中的角色
+        if "name" in data:
+            get_character_graph(novel).update_character(character)
+        
+        novel.record_change("character", "update", character_id, tuple(data))
         return character
     
     def delete_character(self, novel: Novel, character_id: str) -> bool:
@@ -105,15 +153,27 @@ class CharacterManager:
         if character_id not in novel.characters:
             return False
         
-        # 删除角色
+        # 删除角色（先从关系图取出指向该角色的关系来源）
+        graph = get_character_graph(novel)
+        sources = list(graph.inbound.get(character_id, {}))
+        graph.remove_character(character_id)
         del novel.characters[character_id]
         
         # 删除其他角色与该角色的关系
-        for char in novel.characters.values():
-            if character_id in char.relationships:
+        for source_id in sources:
+            char = novel.characters.get(source_id)
+            if char is not None and character_id in char.relationships:
                 del char.relationships[character_id]
+                novel.record_change("character", "update", source_id, ("relationships",))
+        
+        # 从以该角色为焦点的章节中移除
+        references = get_reference_index(novel)
+        for chapter in references.chapters_with_character(character_id):
+            chapter.character_focus = [ref_id for ref_id in chapter.character_focus if ref_id != character_id]
+            references.add_chapter(chapter)
+            novel.record_change("chapter", "update", chapter.id, ("character_focus",))
         
-        novel.update_modified()
+        novel.record_change("character", "delete", character_id)
         return True
     
     def add_trait(self, novel: Novel, character_id: str, 
@@ -123,24 +183,31 @@ class CharacterManager:
             return None
         
         character = novel.characters[character_id]
-        trait = Trait.create(name, description, impact)
+        trait = Trait.create(name, description, impact, novel.rng("id"))
         character.add_trait(trait)
         
-        novel.update_modified()
+        novel.record_change("character", "update", character_id, ("traits",))
         return trait
     
     def update_relationship(self, novel: Novel, character_id: str, target_id: str,
                            rel_type: str, strength_change: float, event: str) -> bool:
-        """更新角色关系"""
+        """更新角色关系，历史记录的章节与事件效果相同（即将生成的章节）"""
         if character_id not in novel.characters or target_id not in novel.characters:
             return False
         
         character = novel.characters[character_id]
-        character.update_relationship(target_id, rel_type, strength_change, event)
+        novel.history_archive.extend(character.update_relationship(
+            target_id, rel_type, strength_change, event, novel.upcoming_chapter(), novel.history_limit))
+        get_character_graph(novel).update_edges(character, [target_id])
         
-        novel.update_modified()
+        novel.record_change("character", "update", character_id, ("relationships",))
         return True
     
+    def get_inbound_relationships(self, novel: Novel, character_id: str) -> List[Character]:
+        """与该角色有关系（关系指向该角色）的其他角色"""
+        sources = get_character_graph(novel).inbound.get(character_id, {})
+        return [novel.characters[source_id] for source_id in sources if source_id in novel.characters]
+    
     def get_all_characters(self, novel: Novel) -> List[Character]:
         """获取所有角色"""
         return list(novel.characters.values())
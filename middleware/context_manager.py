@@ -9,7 +9,7 @@ class ContextManager:
     def set_global_context(self, novel: Novel, context: str) -> bool:
         """设置全局上下文"""
         novel.context.global_context = context
-        novel.update_modified()
+        novel.record_change("context", "update", "global", ("global_context",))
         return True
     
     def get_global_context(self, novel: Novel) -> str:
@@ -19,7 +19,7 @@ class ContextManager:
     def set_chapter_context(self, novel: Novel, chapter_number: int, context: str) -> bool:
         """设置特定章节的上下文"""
         novel.context.set_chapter_context(chapter_number, context)
-        novel.update_modified()
+        novel.record_change("context", "update", str(chapter_number), ("chapter_context",))
         return True
     
     def get_chapter_context(self, novel: Novel, chapter_number: int) -> str:
@@ -30,6 +30,6 @@ class ContextManager:
         """清除特定章节的上下文"""
         if chapter_number in novel.context.chapter_context:
             del novel.context.chapter_context[chapter_number]
-            novel.update_modified()
+            novel.record_change("context", "delete", str(chapter_number), ("chapter_context",))
             return True
         return False
\ No newline at end of file
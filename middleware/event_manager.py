@@ -1,9 +1,12 @@
 # middleware/event_manager.py - 事件管理中间件
 
+import asyncio
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Optional, Any
 from core.models import Event, Novel
-from core.llm_interface import LLMInterface
+from core.llm_interface import LLMInterface, run_sync
+from core.event_engine import get_trigger_index
+from core.reference_index import get_reference_index
 from config.prompts import EVENT_GENERATION_PROMPT
 
 class EventManager:
@@ -14,13 +17,55 @@ class EventManager:
     
     def create_event(self, novel: Novel, name: str, description: str) -> Event:
         """手动创建事件"""
-        event = Event.create(name, description)
+        event = Event.create(name, description, novel.rng("id"))
+        # 先更新索引再写入事件库，索引与事件库大小一致时才不会全量重建
+        get_trigger_index(novel).add_event(event)
         novel.events_library[event.id] = event
-        novel.update_modified()
+        novel.record_change("event", "add", event.id)
         return event
     
-    def generate_events(self, novel: Novel, num_events: int = 5) -> List[Event]:
-        """使用LLM生成事件"""
+    def generate_events(self, novel: Novel, num_events: int = 5, use_cache: bool = True) -> List[Event]:
+        """使用LLM生成事件，use_cache=False时强制重新请求LLM（用户主动生成时）"""
+        prompt = self._build_events_prompt(novel, num_events)
+        
+        # 调用LLM（以事件库大小区分请求，避免缓存返回同一批事件）
+        response = self.llm.generate_response(prompt, use_cache=use_cache, variant=len(novel.events_library))
+        
+        return self._parse_events_response(novel, response)
+    
+    async def agenerate_events(self, novel: Novel, num_events: int = 5,
+                               variant: Optional[int] = None, use_cache: bool = True) -> List[Event]:
+        """使用LLM异步生成事件（经共享执行器限流）"""
+        if variant is None:
+            variant = len(novel.events_library)
+        prompt = self._build_events_prompt(novel, num_events)
+        response = await self.llm.executor.submit(prompt, use_cache=use_cache, variant=variant)
+        return self._parse_events_response(novel, response)
+    
+    def generate_event_batches(self, novel: Novel, num_batches: int, num_events: int = 5,
+                               use_cache: bool = True) -> List[Event]:
+        """并发生成多批事件"""
+        return run_sync(self.agenerate_event_batches(novel, num_batches, num_events, use_cache))
+    
+    async def agenerate_event_batches(self, novel: Novel, num_batches: int, num_events: int = 5,
+                                      use_cache: bool = True) -> List[Event]:
+        """并发生成多批事件，按请求顺序加入事件库（与完成顺序无关），失败的批次被跳过"""
+        base = len(novel.events_library)
+        prompt = self._build_events_prompt(novel, num_events)
+        responses = await asyncio.gather(
+            *[self.llm.executor.submit(prompt, use_cache=use_cache, variant=base + i) for i in range(num_batches)],
+            return_exceptions=True
+        )
+        events = []
+        for response in responses:
+            if isinstance(response, Exception):
+                print(f"生成事件失败: {response}")
+            else:
+                events.extend(self._parse_events_response(novel, response))
+        return events
+    
+    def _build_events_prompt(self, novel: Novel, num_events: int) -> str:
+        """构建事件生成提示"""
         # 提取角色信息
         characters_info = []
         for char_id, char in novel.characters.items():
@@ -31,7 +76,7 @@ class EventManager:
         context = novel.context.global_context
         
         # 构建提示
-        prompt = EVENT_GENERATION_PROMPT.format(
+        return EVENT_GENERATION_PROMPT.format(
             title=novel.title,
             genre=novel.genre,
             setting=novel.setting,
@@ -40,14 +85,14 @@ class EventManager:
             context=context,
             num_events=num_events
         )
-        
-        # 调用LLM
-        response = self.llm.generate_response(prompt)
-        
+    
+    def _parse_events_response(self, novel: Novel, response: str) -> List[Event]:
+        """解析事件XML响应并添加到小说"""
         try:
             # 解析XML响应
             root = ET.fromstring(response)
             events = []
+            rng = novel.rng("id")
             
             for event_elem in root.findall("event"):
                 event_id = event_elem.find("id").text
@@ -55,7 +100,7 @@ class EventManager:
                 description = event_elem.find("description").text
                 
                 # 创建事件
-                event = Event.create(name, description)
+                event = Event.create(name, description, rng)
                 
                 # 解析触发条件
                 triggers = {}
@@ -81,6 +126,7 @@ class EventManager:
                         })
                 
                 event.effects = effects
+                event.intern_strings()
                 
                 # 解析叙事模板
                 narrative_templates = []
@@ -90,19 +136,21 @@ class EventManager:
                 event.narrative_templates = narrative_templates
                 
                 # 添加到小说
+                get_trigger_index(novel).add_event(event)
                 novel.events_library[event.id] = event
+                novel.record_change("event", "add", event.id)
                 events.append(event)
             
-            novel.update_modified()
             return events
             
         except Exception as e:
             print(f"解析事件XML时出错: {e}")
             print(f"原始响应: {response}")
             # 创建一个基本事件作为备选
-            event = Event.create("默认事件", "因解析错误生成的事件")
+            event = Event.create("默认事件", "因解析错误生成的事件", novel.rng("id"))
+            get_trigger_index(novel).add_event(event)
             novel.events_library[event.id] = event
-            novel.update_modified()
+            novel.record_change("event", "add", event.id)
             return [event]
     
     def update_event(self, novel: Novel, event_id: str, 
@@ -126,11 +174,16 @@ class EventManager:
         if "effects" in data:
             event.effects = data["effects"]
         
+        # 触发条件和效果参与事件选择与评分，需要重新索引
+        if "triggers" in data or "effects" in data:
+            event.intern_strings()
+            get_trigger_index(novel).add_event(event)
+        
         # 更新叙事模板
         if "narrative_templates" in data:
             event.narrative_templates = data["narrative_templates"]
         
-        novel.update_modified()
+        novel.record_change("event", "update", event_id, tuple(data))
         return event
     
     def delete_event(self, novel: Novel, event_id: str) -> bool:
@@ -139,14 +192,19 @@ class EventManager:
             return False
         
         # 删除事件
+        get_trigger_index(novel).remove_event(event_id)
         del novel.events_library[event_id]
+        if novel.character_graph is not None:
+            novel.character_graph.event_cast.pop(event_id, None)
         
-        # 从章节中移除该事件
-        for chapter in novel.chapters:
-            if event_id in chapter.events:
-                chapter.events.remove(event_id)
+        # 从引用该事件的章节中移除（经反向索引，不遍历全部章节）
+        references = get_reference_index(novel)
+        for chapter in references.chapters_with_event(event_id):
+            chapter.events = [ref_id for ref_id in chapter.events if ref_id != event_id]
+            references.add_chapter(chapter)
+            novel.record_change("chapter", "update", chapter.id, ("events",))
         
-        novel.update_modified()
+        novel.record_change("event", "delete", event_id)
         return True
     
     def get_all_events(self, novel: Novel) -> List[Event]:
@@ -14,13 +14,28 @@ class OutlineManager:
     
     def create_outline(self, novel: Novel, overview: str) -> Outline:
         """手动创建大纲"""
-        outline = Outline.create(overview)
+        outline = Outline.create(overview, novel.rng("id"))
         novel.outline = outline
-        novel.update_modified()
+        novel.record_change("outline", "add", outline.id)
         return outline
     
-    def generate_outline(self, novel: Novel) -> Outline:
-        """使用LLM生成大纲"""
+    def generate_outline(self, novel: Novel, use_cache: bool = True) -> Outline:
+        """使用LLM生成大纲，use_cache=False时强制重新请求LLM（用户主动生成时）"""
+        prompt = self._build_outline_prompt(novel)
+        
+        # 调用LLM
+        response = self.llm.generate_response(prompt, use_cache=use_cache)
+        
+        return self._parse_outline_response(novel, response)
+    
+    async def agenerate_outline(self, novel: Novel, use_cache: bool = True) -> Outline:
+        """使用LLM异步生成大纲（经共享执行器限流）"""
+        prompt = self._build_outline_prompt(novel)
+        response = await self.llm.executor.submit(prompt, use_cache=use_cache)
+        return self._parse_outline_response(novel, response)
+    
+    def _build_outline_prompt(self, novel: Novel) -> str:
+        """构建大纲生成提示"""
         # 提取角色信息
         characters_info = []
         for char_id, char in novel.characters.items():
@@ -31,17 +46,16 @@ class OutlineManager:
         context = novel.context.global_context
         
         # 构建提示
-        prompt = OUTLINE_GENERATION_PROMPT.format(
+        return OUTLINE_GENERATION_PROMPT.format(
             title=novel.title,
             genre=novel.genre,
             setting=novel.setting,
             characters_info="\n".join(characters_info),
             context=context
         )
-        
-        # 调用LLM
-        response = self.llm.generate_response(prompt)
-        
+    
+    def _parse_outline_response(self, novel: Novel, response: str) -> Outline:
+        """解析大纲XML响应并更新小说"""
         try:
             # 解析XML响应
             root = ET.fromstring(response)
@@ -49,7 +63,7 @@ class OutlineManager:
             overview = root.find("overview").text
             
             # 创建大纲
-            outline = Outline.create(overview)
+            outline = Outline.create(overview, novel.rng("id"))
             
             # 解析情节弧
             for arc_elem in root.findall("arc"):
@@ -68,7 +82,7 @@ class OutlineManager:
             
             # 更新小说
             novel.outline = outline
-            novel.update_modified()
+            novel.record_change("outline", "add", outline.id)
             
             return outline
             
@@ -76,9 +90,9 @@ class OutlineManager:
             print(f"解析大纲XML时出错: {e}")
             print(f"原始响应: {response}")
             # 创建一个基本大纲作为备选
-            outline = Outline.create("生成失败的大纲")
+            outline = Outline.create("生成失败的大纲", novel.rng("id"))
             novel.outline = outline
-            novel.update_modified()
+            novel.record_change("outline", "add", outline.id)
             return outline
     
     def update_outline(self, novel: Novel, data: Dict[str, Any]) -> Optional[Outline]:
@@ -101,18 +115,19 @@ class OutlineManager:
                 )
                 novel.outline.arcs.append(arc)
         
-        novel.update_modified()
+        novel.record_change("outline", "update", novel.outline.id, tuple(data))
         return novel.outline
     
     def add_arc(self, novel: Novel, name: str, description: str) -> Optional[OutlineArc]:
         """添加情节弧"""
         if novel.outline is None:
-            novel.outline = Outline.create("默认大纲")
+            novel.outline = Outline.create("默认大纲", novel.rng("id"))
+            novel.record_change("outline", "add", novel.outline.id)
         
         arc = OutlineArc(name=name, description=description)
         novel.outline.arcs.append(arc)
         
-        novel.update_modified()
+        novel.record_change("outline", "update", novel.outline.id, ("arcs",))
         return arc
     
     def delete_arc(self, novel: Novel, arc_index: int) -> bool:
@@ -121,7 +136,7 @@ class OutlineManager:
             return False
         
         novel.outline.arcs.pop(arc_index)
-        novel.update_modified()
+        novel.record_change("outline", "update", novel.outline.id, ("arcs",))
         return True
     
     def get_outline(self, novel: Novel) -> Optional[Outline]:
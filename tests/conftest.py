@@ -0,0 +1,7 @@
+# tests/conftest.py - 测试配置
+
+import os
+import sys
+
+# 以项目根目录为导入起点，与main.py的运行方式一致
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,149 @@
+# tests/test_autosave.py - 后台自动保存测试
+
+import os
+import threading
+import pytest
+from core.models import Novel
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+from utils import autosave, file_utils
+from utils.autosave import AutosaveWorker
+from utils.file_utils import backup_path_for, load_novel_from_xml, save_novel_to_xml
+
+@pytest.fixture
+def worker():
+    worker = AutosaveWorker(interval=None, backups=2)
+    yield worker
+    worker.close()
+
+def build_novel(external: bool = False) -> Novel:
+    novel = Novel.create("自动", "奇幻", "大陆", seed=1)
+    novel.external_bodies = external
+    manager = ChapterManager(None, None)
+    manager.create_chapter(novel, "第1章")
+    manager.update_chapter(novel, 1, {"content": "第一章正文。" * 50})
+    return novel
+
+def titles(path: str):
+    return [chapter.title for chapter in load_novel_from_xml(path).chapters]
+
+def test_snapshot_isolated_from_later_edits(tmp_path, monkeypatch, worker):
+    path = str(tmp_path / "n.xml")
+    novel = build_novel()
+    started, release = threading.Event(), threading.Event()
+    write = autosave.write_save_file
+    
+    def slow_write(*args):
+        started.set()
+        release.wait(5)
+        write(*args)
+    monkeypatch.setattr(autosave, "write_save_file", slow_write)
+    
+    assert worker.request(novel, path)
+    assert started.wait(5)
+    # 写出期间继续修改：快照不受影响，修改仍为未保存
+    ChapterManager(None, None).create_chapter(novel, "第2章")
+    novel.chapters[0].title = "改名"
+    novel.characters.clear()
+    release.set()
+    worker.wait()
+    assert worker.saves == 1 and worker.error is None
+    assert titles(path) == ["第1章"]
+    assert novel.journal.dirty
+    
+    assert worker.request(novel, path)
+    worker.wait()
+    assert titles(path) == ["改名", "第2章"] and not novel.journal.dirty
+    assert not worker.request(novel, path)
+
+def test_pending_snapshot_replaced_by_newer(tmp_path, monkeypatch, worker):
+    path = str(tmp_path / "n.xml")
+    novel = build_novel()
+    release = threading.Event()
+    written = []
+    write = autosave.write_save_file
+    
+    def blocked_write(snapshot, *args):
+        release.wait(5)
+        written.append(len(snapshot.chapters))
+        write(snapshot, *args)
+    monkeypatch.setattr(autosave, "write_save_file", blocked_write)
+    
+    manager = ChapterManager(None, None)
+    worker.request(novel, path)
+    for title in ("第2章", "第3章"):
+        manager.create_chapter(novel, title)
+        worker.request(novel, path)
+    release.set()
+    worker.wait()
+    # 第一次写入可能已经开始，之后的两个请求只写出最新的一个
+    assert written[-1] == 3 and len(written) <= 2
+    assert titles(path) == ["第1章", "第2章", "第3章"] and not novel.journal.dirty
+
+def test_failed_write_keeps_previous_save(tmp_path, monkeypatch, worker):
+    path = str(tmp_path / "n.xml")
+    novel = build_novel()
+    save_novel_to_xml(novel, path)
+    with open(path, "rb") as f:
+        saved = f.read()
+    
+    def broken_xml(novel, f, **kwargs):
+        f.write("<novel><title>写到一半")
+        raise OSError("磁盘已满")
+    monkeypatch.setattr(file_utils, "write_novel_xml", broken_xml)
+    ChapterManager(None, None).create_chapter(novel, "第2章")
+    assert worker.request(novel, path)
+    worker.wait()
+    
+    assert isinstance(worker.error, OSError) and worker.saves == 0
+    with open(path, "rb") as f:
+        assert f.read() == saved
+    assert novel.journal.dirty
+    
+    monkeypatch.undo()
+    assert worker.request(novel, path)
+    worker.wait()
+    assert worker.error is None and titles(path) == ["第1章", "第2章"]
+
+def test_backups_rotated(tmp_path, worker):
+    path = str(tmp_path / "n.xml")
+    novel = build_novel()
+    manager = ChapterManager(None, None)
+    for title in ("第2章", "第3章", "第4章"):
+        worker.request(novel, path)
+        worker.wait()
+        manager.create_chapter(novel, title)
+    worker.request(novel, path)
+    worker.wait()
+    
+    assert len(titles(path)) == 4
+    assert len(titles(backup_path_for(path, 1))) == 3
+    assert len(titles(backup_path_for(path, 2))) == 2
+    assert not os.path.exists(backup_path_for(path, 3))
+
+def test_retired_body_store_removed_after_save(tmp_path, worker):
+    path = str(tmp_path / "n.xml")
+    novel = build_novel(external=True)
+    worker.request(novel, path)
+    worker.wait()
+    old_store = novel.body_store.path
+    
+    # 正文全部改写后无效数据多于有效数据，换代后旧存储在存档写出后删除
+    ChapterManager(None, None).update_chapter(novel, 1, {"content": "新正文"})
+    worker.request(novel, path)
+    worker.wait()
+    assert novel.body_store.path != old_store and not os.path.exists(old_store)
+    assert load_novel_from_xml(path).chapters[0].content == "新正文"
+
+def test_incremental_and_database_saves_in_caller(tmp_path, worker):
+    novel = build_novel()
+    CharacterManager(None).create_character(novel, "甲", 20, "男", "背景")
+    path = str(tmp_path / "n.db")
+    assert worker.request(novel, path)
+    assert worker.saves == 1 and not novel.journal.dirty
+    assert load_novel_from_xml(path).chapters[0].content == novel.chapters[0].content
+    novel.database.close()
+    
+    novel.structure_only = True
+    CharacterManager(None).create_character(novel, "乙", 20, "男", "背景")
+    assert not worker.request(novel, str(tmp_path / "m.xml"))
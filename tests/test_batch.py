@@ -0,0 +1,73 @@
+# tests/test_batch.py - 批量生成与检查点测试
+
+import json
+import pytest
+from core.event_engine import EventEngine
+from core.llm_backends import FakeLLMBackend
+from core.llm_interface import LLMInterface
+from core.models import Novel
+from core.narrative_generator import NarrativeGenerator
+from core.summarizer import Summarizer
+from middleware.chapter_manager import ChapterManager
+from ui.batch import BatchGenerator, run_batch
+from utils.file_utils import load_novel_from_xml
+
+class FailingBackend(FakeLLMBackend):
+    """生成limit章后，章节响应无法解析"""
+    
+    def __init__(self, limit: int, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.chapters = 0
+    
+    def render(self, prompt, rng):
+        if "<chapter>" in prompt:
+            self.chapters += 1
+            if self.chapters > self.limit:
+                return "不是XML"
+        return super().render(prompt, rng)
+
+def make_generator(backend) -> BatchGenerator:
+    llm = LLMInterface(backend=backend)
+    manager = ChapterManager(NarrativeGenerator(llm, Summarizer(llm)), EventEngine())
+    return BatchGenerator(manager, llm, max_retries=1)
+
+def test_run_checkpoints_and_resumes(tmp_path):
+    path = str(tmp_path / "n.xml")
+    report = str(tmp_path / "report.jsonl")
+    novel = Novel.create("批量", "奇幻", "大陆", seed=1)
+    stats = make_generator(FakeLLMBackend(seed=1, content_chars=300)).run(novel, path, 2, report)
+    assert [s["chapter"] for s in stats] == [1, 2]
+    
+    # 从检查点继续，只生成缺少的章节，报告追加写入
+    loaded = load_novel_from_xml(path)
+    assert len(loaded.chapters) == 2
+    stats = make_generator(FakeLLMBackend(seed=1, content_chars=300)).run(loaded, path, 3, report)
+    assert [s["chapter"] for s in stats] == [3]
+    assert [chapter.title for chapter in load_novel_from_xml(path).chapters][:2] == \
+        [chapter.title for chapter in novel.chapters]
+    with open(report, encoding="utf-8") as f:
+        assert [json.loads(line)["chapter"] for line in f] == [1, 2, 3]
+    assert not (tmp_path / "n.xml.tmp").exists()
+
+def test_failed_chapter_keeps_last_checkpoint(tmp_path):
+    path = str(tmp_path / "n.xml")
+    novel = Novel.create("批量", "奇幻", "大陆", seed=2)
+    generator = make_generator(FailingBackend(limit=2, seed=2, content_chars=300))
+    with pytest.raises(RuntimeError):
+        generator.run(novel, path, 4)
+    
+    # 第3章两次都解析失败，未加入小说，检查点停在第2章
+    assert len(novel.chapters) == 2
+    assert len(load_novel_from_xml(path).chapters) == 2
+
+def test_run_batch_command(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    args = ["--novel", "saves/n.xml", "--chapters", "2", "--title", "命令", "--genre", "奇幻",
+            "--setting", "大陆", "--seed", "3", "--backend", "fake", "--no-cache", "--incremental-save"]
+    assert run_batch(args) == 0
+    assert run_batch(["--novel", "saves/n.xml", "--chapters", "3", "--backend", "fake", "--no-cache"]) == 0
+    
+    novel = load_novel_from_xml("saves/n.xml")
+    assert len(novel.chapters) == 3 and novel.seed == 3 and novel.incremental_save
+    assert run_batch(["--novel", "saves/missing.xml", "--chapters", "1", "--backend", "fake"]) == 1
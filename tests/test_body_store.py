@@ -0,0 +1,100 @@
+# tests/test_body_store.py - 章节正文存储测试
+
+import os
+import pytest
+from core.body_store import BodyStore, bodies_path_for
+from core.event_engine import EventEngine
+from core.models import Novel
+from middleware.chapter_manager import ChapterManager
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml
+
+def build_novel(count: int = 4) -> Novel:
+    """正文保存在单独存储中的小说"""
+    novel = Novel.create("正文", "奇幻", "大陆", seed=1)
+    novel.external_bodies = True
+    chapters = ChapterManager(None, EventEngine())
+    for i in range(count):
+        chapters.create_chapter(novel, f"第{i + 1}章")
+        chapters.update_chapter(novel, i + 1, {"content": f"第{i + 1}章的正文。" * 20})
+    return novel
+
+def contents(novel: Novel):
+    return [chapter.content for chapter in novel.chapters]
+
+def test_bodies_loaded_on_demand(tmp_path):
+    novel = build_novel()
+    path = str(tmp_path / "n.xml")
+    assert save_novel_to_xml(novel, path)
+    assert os.path.exists(bodies_path_for(path, 0))
+    # 存档只记录正文位置
+    with open(path, encoding="utf-8") as f:
+        assert "第1章的正文" not in f.read()
+    
+    loaded = load_novel_from_xml(path)
+    store = loaded.body_store
+    assert store.loads == 0 and all(chapter.content_ref() is not None for chapter in loaded.chapters)
+    assert loaded.chapters[2].content == novel.chapters[2].content and store.loads == 1
+    assert loaded.chapters[2].content == novel.chapters[2].content and store.loads == 1
+    assert contents(loaded) == contents(novel)
+
+def test_cache_evicts_least_recently_read(tmp_path):
+    path = str(tmp_path / "n.xml")
+    save_novel_to_xml(build_novel(), path)
+    loaded = load_novel_from_xml(path)
+    store = loaded.body_store
+    store.cache_size = 2
+    first, second, third = (chapter.content_ref() for chapter in loaded.chapters[:3])
+    for ref in (first, second, first, third):
+        store.read(ref)
+    assert list(store.cache) == [first.offset, third.offset] and store.loads == 3
+
+def test_compaction_to_next_generation(tmp_path):
+    path = str(tmp_path / "n.xml")
+    novel = build_novel()
+    chapters = ChapterManager(None, EventEngine())
+    save_novel_to_xml(novel, path)
+    size = os.path.getsize(bodies_path_for(path, 0))
+    
+    # 修改后的正文追加到文件末尾，无效数据未超过有效数据前不整理
+    chapters.update_chapter(novel, 1, {"content": "改写的正文。" * 30})
+    save_novel_to_xml(novel, path)
+    assert novel.body_store.path == bodies_path_for(path, 0) and os.path.getsize(novel.body_store.path) > size
+    
+    for number in (2, 3, 4):
+        chapters.update_chapter(novel, number, {"content": f"再次改写第{number}章。" * 10})
+    save_novel_to_xml(novel, path)
+    assert novel.body_store.path == bodies_path_for(path, 1)
+    assert not os.path.exists(bodies_path_for(path, 0))
+    live = sum(chapter.content_ref().length for chapter in novel.chapters)
+    assert os.path.getsize(bodies_path_for(path, 1)) == live
+    assert contents(load_novel_from_xml(path)) == contents(novel)
+
+def test_save_as_copies_bodies(tmp_path):
+    first, second = str(tmp_path / "a.xml"), str(tmp_path / "b.xml")
+    novel = build_novel()
+    save_novel_to_xml(novel, first)
+    save_novel_to_xml(novel, second)
+    assert novel.body_store.path == bodies_path_for(second, 0)
+    
+    # 原存档仍引用自己的正文存储
+    assert contents(load_novel_from_xml(first)) == contents(load_novel_from_xml(second)) == contents(novel)
+
+def test_corrupt_body_detected(tmp_path):
+    path = str(tmp_path / "n.xml")
+    save_novel_to_xml(build_novel(), path)
+    with open(bodies_path_for(path, 0), "r+b") as f:
+        f.seek(3)
+        f.write(b"\xff")
+    loaded = load_novel_from_xml(path)
+    with pytest.raises(OSError):
+        loaded.chapters[0].content
+    assert loaded.chapters[1].content.startswith("第2章")
+
+def test_create_skips_used_generations(tmp_path):
+    base = str(tmp_path / "n.xml")
+    open(bodies_path_for(base, 0), "w").close()
+    store = BodyStore.create(base)
+    assert store.path == bodies_path_for(base, 1)
+    refs = store.append(["甲", "乙乙"])
+    assert [store.read(ref) for ref in refs] == ["甲", "乙乙"] and refs[1].offset == 3
+    store.close()
@@ -0,0 +1,85 @@
+# tests/test_change_journal.py - 变更日志测试
+
+from core.change_journal import ChangeJournal
+from core.event_engine import EventEngine
+from core.models import Novel
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+from middleware.event_manager import EventManager
+
+def test_cursors_drain_independently():
+    journal = ChangeJournal()
+    journal.record("event", "add", "e0")
+    assert journal.entries == []  # 没有游标时不保留变更
+    
+    assert journal.drain("index") == []  # 首次取出时打开游标
+    journal.open_cursor("export")
+    journal.record("character", "add", "c1")
+    journal.record("chapter", "update", "ch1", ("content", "summary"))
+    assert [change.target for change in journal.drain("index")] == ["c1", "ch1"]
+    assert journal.drain("index") == []
+    
+    journal.record("chapter", "delete", "ch1")
+    assert [change.seq for change in journal.pending("export")] == [2, 3, 4]
+    assert [change.seq for change in journal.drain("index")] == [4]
+    # 只保留尚有游标未取出的变更
+    assert [change.seq for change in journal.entries] == [2, 3, 4]
+    journal.close_cursor("export")
+    assert journal.entries == [] and journal.pending("export") == []
+
+def test_trim_keeps_slowest_cursor():
+    journal = ChangeJournal()
+    journal.open_cursor("fast")
+    journal.open_cursor("slow")
+    for i in range(5):
+        journal.record("event", "add", f"e{i}")
+        journal.drain("fast")
+    assert len(journal.entries) == 5
+    assert [change.target for change in journal.drain("slow")] == [f"e{i}" for i in range(5)]
+    assert journal.entries == []
+
+def test_subscribers_and_dirty_flag():
+    journal = ChangeJournal()
+    seen = []
+    unsubscribe = journal.subscribe(seen.append)
+    change = journal.record("context", "update", 3, ["text"])
+    assert seen == [change] and change.target == "3" and change.fields == ("text",)
+    assert change.describe() == "上下文3 修改: text"
+    unsubscribe()
+    unsubscribe()
+    journal.record("outline", "add")
+    assert len(seen) == 1
+    
+    assert journal.dirty
+    journal.mark_saved(1)
+    assert journal.dirty
+    journal.mark_saved()
+    assert not journal.dirty
+
+def test_managers_record_changes():
+    novel = Novel.create("日志", "奇幻", "大陆", seed=3)
+    journal = novel.journal
+    journal.open_cursor("test")
+    characters, events = CharacterManager(None), EventManager(None)
+    chapters = ChapterManager(None, EventEngine())
+    
+    a = characters.create_character(novel, "甲", 20, "男", "背景")
+    b = characters.create_character(novel, "乙", 20, "女", "背景")
+    event = events.create_event(novel, "相遇", "描述")
+    chapter = chapters.create_chapter(novel, "第一章")
+    chapters.update_chapter(novel, 1, {"events": [event.id], "character_focus": [b.id]})
+    characters.delete_character(novel, b.id)
+    events.delete_event(novel, event.id)
+    
+    changes = [(change.kind, change.action, change.target, change.fields) for change in journal.drain("test")]
+    assert changes == [
+        ("character", "add", a.id, ()),
+        ("character", "add", b.id, ()),
+        ("event", "add", event.id, ()),
+        ("chapter", "add", chapter.id, ()),
+        ("chapter", "update", chapter.id, ("events", "character_focus")),
+        ("chapter", "update", chapter.id, ("character_focus",)),
+        ("character", "delete", b.id, ()),
+        ("chapter", "update", chapter.id, ("events",)),
+        ("event", "delete", event.id, ()),
+    ]
@@ -0,0 +1,81 @@
+# tests/test_chapter_index.py - 章节倒排索引测试
+
+import random
+from core.models import Novel
+from core.chapter_index import ChapterIndex, split_passages
+from middleware.chapter_manager import ChapterManager
+
+def make_text(seed: int, length: int) -> str:
+    """生成没有换行和句号的随机汉字正文，段落只能在固定长度处切分"""
+    rng = random.Random(seed)
+    return "".join(chr(0x4E00 + rng.randrange(2000)) for _ in range(length))
+
+def make_novel(contents):
+    """构建只有章节正文的小说"""
+    novel = Novel.create("测试", "奇幻", "大陆", seed=1)
+    manager = ChapterManager(None, None)
+    for i, content in enumerate(contents, 1):
+        chapter = manager.create_chapter(novel, f"第{i}章")
+        manager.update_chapter(novel, chapter.number, {"content": content})
+    return novel, manager
+
+def test_phrase_across_passage_boundary():
+    text = make_text(0, 1200)
+    novel, manager = make_novel([text, make_text(1, 1200)])
+    boundary = split_passages(text, 300)[0][1]
+    
+    for query in (text[boundary - 4:boundary + 4], text[boundary - 1:boundary + 1]):
+        results = manager.search_chapter_matches(novel, query)
+        assert [result["chapter"].number for result in results] == [1]
+        match = results[0]["matches"][0]
+        assert (match["field"], match["start"], match["end"]) == ("content", text.find(query), text.find(query) + len(query))
+    
+    assert [number for number, _ in manager.search_chapters(novel, text[boundary - 4:boundary + 4])] == [1]
+
+def test_phrase_not_in_text_is_not_matched():
+    text = make_text(2, 1200)
+    novel, manager = make_novel([text])
+    boundary = split_passages(text, 300)[0][1]
+    
+    # 各词项都在正文中，但连起来的短语不在
+    query = text[boundary - 4:boundary] + text[10:14]
+    assert query not in text
+    assert manager.search_chapters(novel, query) == []
+
+def test_single_character_query_after_reload(tmp_path):
+    text = make_text(3, 900) + "。孤"
+    novel, manager = make_novel([text, make_text(4, 900)])
+    index = novel.index
+    index.save(str(tmp_path / "n.idx"))
+    loaded = ChapterIndex.load(str(tmp_path / "n.idx"))
+    
+    get_text = lambda chapter_id, field: getattr(next(c for c in novel.chapters if c.id == chapter_id), field) or ""
+    for char in (text[500], "孤"):
+        expected = sorted(c.number for c in novel.chapters if char in c.content)
+        hits = loaded.find(char, get_text)
+        assert sorted(next(c.number for c in novel.chapters if c.id == hit["chapter_id"]) for hit in hits) == expected
+
+def test_search_expands_lone_cjk_characters():
+    novel, manager = make_novel(["他住在3号楼，A君说：hello world。", make_text(5, 600)])
+    index = novel.index
+    target = novel.chapters[0].id
+    
+    # 查询中孤立的汉字在正文中位于二元组内（"号楼"、"君说"）
+    for query in ("3号", "A君", "君"):
+        results = index.search(query)
+        assert results and results[0]["chapter_id"] == target
+
+def test_substring_queries_match_like_plain_search():
+    content = "他住在3号楼，A君说：hello world。"
+    novel, manager = make_novel([content, make_text(6, 600)])
+    
+    # 孤立汉字、单词的一部分和标点都按原文子串匹配
+    for query in ("3号", "A君", "ell", "，"):
+        results = manager.search_chapter_matches(novel, query)
+        assert [result["chapter"].number for result in results] == [1]
+        start = content.lower().find(query.lower())
+        assert [(m["start"], m["end"]) for m in results[0]["matches"]] == [(start, start + len(query))]
+    
+    assert manager.search_chapters(novel, "orld。") == [(1, novel.chapters[0])]
+    assert [number for number, _ in manager.search_chapters(novel, '"ello wor"')] == [1]
+    assert manager.search_chapters(novel, "hellx") == []
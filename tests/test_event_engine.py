@@ -0,0 +1,111 @@
+# tests/test_event_engine.py - 事件引擎测试
+
+import pytest
+from core import event_engine
+from core.models import Novel, Event
+from core.event_engine import EventEngine
+from middleware.character_manager import CharacterManager
+
+@pytest.mark.parametrize("use_matrix", [True, False])
+def test_relation_effects_clamped_in_order(monkeypatch, use_matrix):
+    if not use_matrix:
+        monkeypatch.setattr(event_engine, "get_relationship_matrix", lambda novel: None)
+    novel = Novel.create("事件", "奇幻", "大陆", seed=5)
+    manager = CharacterManager(None)
+    a, b = (manager.create_character(novel, name, 20, "男", "背景") for name in ("甲", "乙"))
+    manager.update_relationship(novel, a.id, b.id, "朋友", 0.9, "相识")
+    manager.update_relationship(novel, b.id, a.id, "朋友", 0.9, "相识")
+    event = Event("e1", "和好又争吵", "先和好再争吵", {},
+                  [{"target": "character_relation", "value": 0.8}, {"target": "character_relation", "value": -0.5}], [])
+    
+    # 逐个效果截断：0.9 +0.8 -> 1.0，再 -0.5 -> 0.5（合并后只截断一次会得到1.0）
+    EventEngine().apply_event_effects(event, novel, [a, b])
+    for source, target in ((a, b), (b, a)):
+        rel = source.relationships[target.id]
+        assert rel.strength == pytest.approx(0.5)
+        assert [entry["delta"] for entry in rel.history][-2:] == [pytest.approx(0.1), pytest.approx(-0.5)]
+
+def test_manual_and_event_history_use_same_chapter():
+    novel = Novel.create("事件", "奇幻", "大陆", seed=6)
+    novel.current_chapter = 2
+    manager = CharacterManager(None)
+    a, b = (manager.create_character(novel, name, 20, "女", "背景") for name in ("甲", "乙"))
+    manager.update_relationship(novel, a.id, b.id, "朋友", 0.2, "结识")
+    event = Event("e1", "并肩", "并肩作战", {}, [{"target": "character_relation", "value": 0.1}], [])
+    EventEngine().apply_event_effects(event, novel, [a, b])
+    
+    # 手动修改和事件效果都记在即将生成的第3章
+    assert [entry["chapter"] for entry in a.relationships[b.id].history] == [3, 3]
+
+def naive_satisfied(event, facts, chapter_number):
+    """逐个检查触发条件，作为索引结果的对照"""
+    required = matched = 0
+    for trigger_type, values in event.triggers.items():
+        if trigger_type not in event_engine.TRIGGER_TYPES:
+            continue
+        required += 1
+        values = values if isinstance(values, list) else [values]
+        if trigger_type == "chapter":
+            matched += int(values[0]) <= chapter_number
+        else:
+            matched += any((trigger_type, event_engine.normalize_trigger_value(v)) in facts for v in values)
+    return required and matched == required
+
+def make_events(count):
+    triggers = [
+        {"character": ["甲"]},
+        {"character": ["丙", "乙"], "trait": ["勇敢"]},
+        {"character_relation": ["朋友"], "chapter": 3},
+        {"chapter": [10]},
+        {"trait": ["Brave "], "weather": ["雨"]},
+        {"mood": ["平静"]},
+        {},
+    ]
+    return [Event(f"e{i}", f"事件{i}", "描述", triggers[i % len(triggers)], [], []) for i in range(count)]
+
+def test_trigger_index_matches_naive_check():
+    novel = Novel.create("事件", "奇幻", "大陆", seed=7)
+    manager = CharacterManager(None)
+    a = manager.create_character(novel, "甲", 20, "男", "背景")
+    b = manager.create_character(novel, "乙", 20, "女", "背景")
+    a.personality["brave"] = 0.8
+    manager.update_relationship(novel, a.id, b.id, "朋友", 0.5, "相识")
+    events = make_events(21)
+    novel.events_library = {event.id: event for event in events}
+    
+    engine = EventEngine()
+    index = event_engine.get_trigger_index(novel)
+    facts = engine.current_facts(novel)
+    for chapter_number in (1, 3, 10):
+        expected = {event.id for event in events if naive_satisfied(event, facts, chapter_number)}
+        assert set(index.satisfied(facts, chapter_number)) == expected
+    # 只有未知类型或没有触发条件的事件是无条件事件
+    assert sorted(index.unconditional) == sorted(e.id for e in events if not any(
+        t in event_engine.TRIGGER_TYPES for t in e.triggers))
+    
+    # 增删事件后索引与全量重建一致
+    index.remove_event("e2")
+    index.remove_event("e6")
+    index.add_event(Event("e1", "改", "描述", {"chapter": 1}, [], []))
+    rebuilt = event_engine.TriggerIndex(novel.id)
+    del novel.events_library["e2"], novel.events_library["e6"]
+    novel.events_library["e1"] = Event("e1", "改", "描述", {"chapter": 1}, [], [])
+    rebuilt.rebuild(novel)
+    assert index.satisfied(facts, 10) == rebuilt.satisfied(facts, 10)
+    assert sorted(index.unconditional) == sorted(rebuilt.unconditional)
+    assert len(index) == len(novel.events_library)
+
+def test_select_returns_top_k_by_score():
+    novel = Novel.create("事件", "奇幻", "大陆", seed=8)
+    manager = CharacterManager(None)
+    manager.create_character(novel, "甲", 20, "男", "背景")
+    novel.events_library = {event.id: event for event in make_events(30)}
+    novel.current_chapter = 9
+    
+    engine = EventEngine()
+    selected = engine.select_events_for_chapter(novel, max_events=3)
+    assert len(selected) == 3 and len({event.id for event in selected}) == 3
+    # 满足触发条件的事件加分高于随机项，优先于无条件事件
+    assert all(event.triggers.get("character") == ["甲"] or event.triggers.get("chapter") for event in selected)
+    assert engine.select_events_for_chapter(novel, max_events=100)
+    assert EventEngine().select_events_for_chapter(Novel.create("空", "奇幻", "大陆")) == []
@@ -0,0 +1,125 @@
+# tests/test_event_scoring.py - 向量化事件评分测试
+
+import math
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from core.event_engine import EventEngine, get_trigger_index, normalize_trigger_value
+from core.event_scoring import FEATURES, VectorizedEventScorer
+from core.models import Novel, Event, Trait
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+
+def build_novel() -> Novel:
+    """两个角色、几种关系和若干事件的小说"""
+    novel = Novel.create("评分", "奇幻", "大陆", seed=11)
+    manager = CharacterManager(None)
+    a, b, c = (manager.create_character(novel, name, 20, "男", "背景") for name in ("甲", "乙", "丙"))
+    a.personality["brave"] = 0.7
+    b.personality["brave"] = 0.4
+    c.personality["calm"] = -0.3
+    b.add_trait(Trait.create("Cunning", "狡猾"))
+    manager.update_relationship(novel, a.id, b.id, "朋友", 0.6, "相识")
+    manager.update_relationship(novel, b.id, c.id, "朋友", 0.2, "相识")
+    manager.update_relationship(novel, c.id, a.id, "敌人", -0.4, "争执")
+    
+    triggers = [
+        {"character_relation": ["朋友"]},
+        {"character_relation": ["敌人"], "trait": ["brave"]},
+        {"trait": ["cunning"]},
+        {"trait": ["calm"]},
+        {"character": ["甲"], "chapter": 2},
+        {},
+    ]
+    effects = [[{"target": "character_relation", "value": 0.3}, {"target": "character_relation", "value": -0.2}], []]
+    novel.events_library = {f"e{i}": Event(f"e{i}", f"事件{i}", "描述", triggers[i % len(triggers)],
+                                           effects[i % 2], []) for i in range(12)}
+    return novel
+
+def naive_features(novel: Novel, event: Event, satisfied, chapter_number: int, window: int):
+    """逐个事件计算特征（不含随机项），作为向量化结果的对照"""
+    triggers = event.triggers
+    relation_strength = personality = 0.0
+    if triggers.get("character_relation"):
+        wanted = normalize_trigger_value(triggers["character_relation"][0])
+        strengths = [rel.strength for char in novel.characters.values() for rel in char.relationships.values()
+                     if normalize_trigger_value(rel.relationship_type) == wanted]
+        relation_strength = sum(strengths) / len(strengths) if strengths else 0.0
+    if triggers.get("trait"):
+        wanted = normalize_trigger_value(triggers["trait"][0])
+        for char in novel.characters.values():
+            for name, value in char.personality.items():
+                if normalize_trigger_value(name) == wanted:
+                    personality = max(personality, value)
+            if any(normalize_trigger_value(trait.name) == wanted for trait in char.traits):
+                personality = 1.0
+    used = [chapter.number for chapter in novel.chapters if event.id in chapter.events]
+    recency = math.exp(-(chapter_number - max(used)) / window) if used else 0.0
+    return [1.0, satisfied.get(event.id, 0), relation_strength, personality,
+            sum(abs(effect["value"]) for effect in event.effects), recency, math.log1p(len(used))]
+
+def check_against_naive(novel: Novel, scorer: VectorizedEventScorer):
+    chapter_number = novel.current_chapter + 1
+    index = get_trigger_index(novel)
+    satisfied = index.satisfied(EventEngine().current_facts(novel), chapter_number)
+    features = scorer.feature_matrix(novel, index, satisfied, chapter_number)
+    expected = [naive_features(novel, novel.events_library[event_id], satisfied, chapter_number, scorer.recent_window)
+                for event_id in novel.events_library]
+    np.testing.assert_allclose(features[:, :-1], expected)
+    assert ((features[:, -1] >= 0) & (features[:, -1] < 1)).all()
+    
+    # 分数为特征与权重之积（每次调用重新抽取随机项），触发条件不满足的事件为负无穷
+    scores = scorer.score(novel, index, satisfied, chapter_number)
+    eligible = np.array([event_id in satisfied or event_id in index.unconditional for event_id in novel.events_library])
+    assert np.isneginf(scores[~eligible]).all()
+    noise = scores[eligible] - (features[:, :-1] @ scorer.weights[:-1])[eligible]
+    assert ((noise >= -1e-9) & (noise < scorer.weights[-1])).all()
+
+def test_features_match_naive_scoring():
+    novel = build_novel()
+    scorer = VectorizedEventScorer()
+    chapters = ChapterManager(None, None)
+    check_against_naive(novel, scorer)
+    
+    # 章节增删改后增量更新的使用次数与逐个统计一致
+    for title, events in (("一", ["e0", "e1"]), ("二", ["e1"]), ("三", ["e4", "e0"])):
+        chapters.create_chapter(novel, title)
+        chapters.update_chapter(novel, novel.current_chapter, {"events": events})
+        check_against_naive(novel, scorer)
+    chapters.update_chapter(novel, 3, {"events": ["e2"]})
+    check_against_naive(novel, scorer)
+    chapters.delete_chapter(novel, 1)
+    check_against_naive(novel, scorer)
+    
+    # 关系变化后重新计算平均强度
+    a, b = list(novel.characters.values())[:2]
+    CharacterManager(None).update_relationship(novel, a.id, b.id, "朋友", -0.5, "误会")
+    check_against_naive(novel, scorer)
+
+def test_select_top_k_and_reproducible():
+    novel = build_novel()
+    engine = EventEngine(scorer=VectorizedEventScorer())
+    selected = [event.id for event in engine.select_events_for_chapter(novel, max_events=3)]
+    
+    index = get_trigger_index(novel)
+    satisfied = index.satisfied(engine.current_facts(novel), 1)
+    again = build_novel()
+    scores = VectorizedEventScorer().score(again, get_trigger_index(again), satisfied, 1)
+    expected = [event_id for _, event_id in sorted(zip(-scores, novel.events_library))[:3]]
+    assert selected == expected
+    
+    # 随机项权重为0时分数确定，加大关系强度的权重使朋友关系触发的事件排在最前
+    scorer = VectorizedEventScorer({"noise": 0.0, "relation_strength": 5.0})
+    top = EventEngine(scorer=scorer).select_events_for_chapter(build_novel(), max_events=1)
+    assert top[0].triggers.get("character_relation") == ["朋友"]
+
+def test_weights():
+    scorer = VectorizedEventScorer({"usage": -0.5})
+    assert scorer.get_weights()["usage"] == -0.5 and scorer.get_weights()["bias"] == 1.0
+    scorer.set_weights([0.0] * len(FEATURES))
+    assert set(scorer.get_weights().values()) == {0.0}
+    with pytest.raises(ValueError):
+        scorer.set_weights({"unknown": 1.0})
+    with pytest.raises(ValueError):
+        scorer.set_weights([1.0, 2.0])
@@ -0,0 +1,78 @@
+# tests/test_focus_selector.py - 焦点角色选择测试
+
+import pytest
+from core.event_engine import EventEngine
+from core.focus_selector import CharacterGraph, FocusSelector, get_character_graph
+from core.models import Novel, Event
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+
+def graph_state(graph: CharacterGraph):
+    """关系图中可比较的全部状态（删除关系后可能留下空的邻接表，不计入比较）"""
+    edges = {char_id: targets for char_id, targets in graph.edges.items() if targets}
+    inbound = {char_id: sources for char_id, sources in graph.inbound.items() if sources}
+    return (edges, inbound, graph.centrality, graph.ranked, graph.names, graph.by_name,
+            graph.last_seen, dict(graph.appearances), list(graph.stale_order),
+            {event_id: dict(cast) for event_id, cast in graph.event_cast.items()})
+
+def build_novel(count: int = 6) -> Novel:
+    novel = Novel.create("焦点", "奇幻", "大陆", seed=4)
+    manager = CharacterManager(None)
+    for i in range(count):
+        manager.create_character(novel, f"角色{i}", 20, "男", "背景")
+    return novel
+
+def test_incremental_graph_matches_rebuild():
+    novel = build_novel()
+    characters = CharacterManager(None)
+    chapters = ChapterManager(None, EventEngine())
+    ids = list(novel.characters)
+    characters.update_relationship(novel, ids[0], ids[1], "朋友", 0.7, "相识")
+    characters.update_relationship(novel, ids[1], ids[2], "敌人", -0.4, "争执")
+    characters.update_relationship(novel, ids[3], ids[0], "师徒", 0.33, "拜师")
+    characters.update_relationship(novel, ids[0], ids[1], "朋友", -0.2, "误会")
+    
+    for focus, events in (([ids[0], ids[1]], ["e1"]), ([ids[2]], ["e1", "e2"]), ([ids[0], ids[4]], [])):
+        chapters.create_chapter(novel, "章")
+        chapters.update_chapter(novel, novel.current_chapter, {"character_focus": focus, "events": events})
+    chapters.delete_chapter(novel, 2)
+    characters.update_character(novel, ids[4], {"name": "改名"})
+    characters.delete_character(novel, ids[1])
+    characters.create_character(novel, "新角色", 20, "女", "背景")
+    
+    graph = get_character_graph(novel)
+    rebuilt = CharacterGraph(novel.id)
+    rebuilt.rebuild(novel)
+    assert graph_state(graph) == graph_state(rebuilt)
+    assert set(graph.most_central(2)) == {ids[0], ids[3]} and graph.max_centrality() == 1330
+    assert graph.by_name["改名"] == ids[4]
+
+def test_select_prefers_event_characters():
+    novel = build_novel(10)
+    ids = list(novel.characters)
+    target = novel.characters[ids[7]]
+    event = Event("e1", "决斗", "描述", {"character": [target.name, ids[8]]}, [], [])
+    selector = FocusSelector({"noise": 0.0})
+    chosen = [char.id for char in selector.select(novel, [event])]
+    assert 2 <= len(chosen) <= 3 and len(set(chosen)) == len(chosen)
+    assert chosen[:2] == [ids[7], ids[8]] or chosen[:2] == [ids[8], ids[7]]
+
+def test_select_rotates_stale_characters():
+    novel = build_novel(8)
+    chapters = ChapterManager(None, EventEngine(), FocusSelector({"noise": 0.0, "cohesion": 0.0}))
+    seen = set()
+    for _ in range(4):
+        focus = chapters._select_focus_characters(novel)
+        # 没有关系和事件时，优先选择从未出场的角色
+        assert not seen & {char.id for char in focus}
+        seen.update(char.id for char in focus)
+        chapters._add_generated_chapter(novel, {"title": "", "content": "", "summary": ""}, [], focus)
+        if len(seen) == len(novel.characters):
+            break
+    assert len(seen) == len(novel.characters)
+
+def test_select_edge_cases():
+    assert FocusSelector().select(Novel.create("空", "奇幻", "大陆", seed=1)) == []
+    assert len(FocusSelector().select(build_novel(1))) == 1
+    with pytest.raises(ValueError):
+        FocusSelector({"unknown": 1.0})
@@ -0,0 +1,34 @@
+# tests/test_history_archive.py - 关系历史归档测试
+
+import json
+from core.models import Novel, Character
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml, export_relationship_history
+
+def add_history(novel: Novel, start: int, count: int):
+    """为角色a到b的关系添加count条历史记录，超出保留条数的进入待归档列表"""
+    for i in range(start, start + count):
+        novel.characters["a"].update_relationship("b", "朋友", 0.01, f"事件{i}", chapter=1)
+    novel.compact_history()
+
+def exported(novel: Novel, path: str, output_path: str):
+    assert export_relationship_history(novel, path, output_path)
+    with open(output_path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["description"] for line in f]
+
+def test_save_as_keeps_archived_history(tmp_path):
+    novel = Novel.create("测试", "奇幻", "大陆", seed=1)
+    novel.history_limit = 2
+    for char_id in ("a", "b"):
+        novel.characters[char_id] = Character(id=char_id, name=char_id, age=20, gender="男", background="")
+    add_history(novel, 0, 5)
+    assert save_novel_to_xml(novel, str(tmp_path / "a.xml"))
+    
+    # 加载后另存为新文件，新归档需包含原归档中的记录
+    loaded = load_novel_from_xml(str(tmp_path / "a.xml"))
+    add_history(loaded, 5, 3)
+    assert save_novel_to_xml(loaded, str(tmp_path / "b.xml"))
+    expected = [f"事件{i}" for i in range(8)]
+    assert exported(loaded, str(tmp_path / "b.xml"), str(tmp_path / "out.jsonl")) == expected
+    
+    reloaded = load_novel_from_xml(str(tmp_path / "b.xml"))
+    assert exported(reloaded, str(tmp_path / "b.xml"), str(tmp_path / "out2.jsonl")) == expected
@@ -0,0 +1,63 @@
+# tests/test_llm_backends.py - LLM后端测试
+
+import asyncio
+import pytest
+from core.llm_backends import LLMBackend, FakeLLMBackend, create_backend
+from core.llm_interface import LLMInterface, run_sync
+from core.models import Novel
+from middleware.character_manager import CharacterManager
+from middleware.event_manager import EventManager
+from middleware.outline_manager import OutlineManager
+
+MESSAGES = [{"role": "user", "content": "<character>"}]
+
+def complete(backend: FakeLLMBackend, messages=MESSAGES, variant: int = 0) -> str:
+    return run_sync(backend.acomplete("fake", messages, 0.7, 100, variant))
+
+def test_fake_backend_is_deterministic():
+    assert complete(FakeLLMBackend(seed=1)) == complete(FakeLLMBackend(seed=1))
+    assert complete(FakeLLMBackend(seed=1)) != complete(FakeLLMBackend(seed=2))
+    assert complete(FakeLLMBackend(seed=1)) != complete(FakeLLMBackend(seed=1), variant=1)
+
+def test_fake_backend_independent_of_call_order():
+    prompts = [[{"role": "user", "content": f"<summaries> 第{i}卷"}] for i in range(6)]
+    backend = FakeLLMBackend(seed=3, latency=0.01, latency_jitter=0.01, latency_distribution="uniform")
+    
+    async def run(order):
+        results = await asyncio.gather(*(backend.acomplete("fake", prompts[i], 0.7, 100) for i in order))
+        return dict(zip(order, results))
+    
+    assert run_sync(run(list(range(6)))) == run_sync(run(list(range(5, -1, -1))))
+    assert backend.request_count == 12
+
+def test_stream_joins_to_complete_response():
+    backend = FakeLLMBackend(seed=4, stream_chunk_chars=7)
+    messages = [{"role": "user", "content": "<chapter>"}]
+    
+    async def collect():
+        return [chunk async for chunk in await backend.aopen_stream("fake", messages, 0.7, 100)]
+    
+    chunks = run_sync(collect())
+    assert len(chunks) > 1 and all(len(chunk) <= 7 for chunk in chunks)
+    assert "".join(chunks) == complete(backend, messages)
+
+def test_fake_responses_parse_in_managers():
+    llm = LLMInterface(backend=FakeLLMBackend(seed=5))
+    novel = Novel.create("假后端", "奇幻", "大陆", seed=5)
+    
+    character = CharacterManager(llm).generate_character(novel)
+    assert character is not None and character.name and character.personality
+    events = EventManager(llm).generate_events(novel, 3)
+    assert len(events) == 3 and all(event.effects for event in events)
+    outline = OutlineManager(llm).generate_outline(novel)
+    assert outline is not None and len(outline.arcs) == 4
+
+def test_create_backend_from_environment(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.setenv("LLM_FAKE_SEED", "9")
+    backend = create_backend()
+    assert isinstance(backend, FakeLLMBackend) and backend.seed == 9
+    with pytest.raises(ValueError):
+        create_backend("unknown")
+    with pytest.raises(TypeError):
+        LLMBackend()
@@ -0,0 +1,55 @@
+# tests/test_llm_cache.py - LLM响应缓存测试
+
+import itertools
+from core import llm_cache
+from core.llm_cache import LLMCache
+from core.llm_interface import LLMInterface
+from test_llm_interface import CountingBackend
+
+def test_entries_persist_across_instances(tmp_path):
+    cache = LLMCache(str(tmp_path))
+    key = LLMCache.make_key("m", [{"role": "user", "content": "你好"}], 0.7, 100)
+    cache.set(key, "回答", "m")
+    
+    reopened = LLMCache(str(tmp_path))
+    assert reopened.get(key) == "回答"
+    assert reopened.get_stats()["entries"] == 1
+    assert key != LLMCache.make_key("m", [{"role": "user", "content": "你好"}], 0.7, 100, variant=1)
+
+def test_least_recently_used_entry_is_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(llm_cache.time, "time", lambda: next(clock))
+    cache = LLMCache(str(tmp_path), max_entries=2)
+    cache.set("a", "甲")
+    cache.set("b", "乙")
+    assert cache.get("a") == "甲"
+    cache.set("c", "丙")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "甲" and cache.get("c") == "丙"
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.json", "c.json"]
+
+def test_byte_limit_and_expiry(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache = LLMCache(str(tmp_path), max_bytes=200, ttl=60)
+    cache.set("a", "x" * 100)
+    now[0] += 1
+    cache.set("b", "y" * 100)
+    assert cache.get("a") is None  # 超出容量，最早的条目被淘汰
+    
+    now[0] += 61
+    assert cache.get("b") is None  # 已过期
+    assert cache.get_stats()["entries"] == 0
+
+def test_use_cache_false_skips_read_but_refreshes_entry(tmp_path):
+    backend = CountingBackend(delay=0)
+    llm = LLMInterface(cache=LLMCache(str(tmp_path)), backend=backend)
+    assert llm.generate_response("生成角色") == "生成角色"
+    assert llm.generate_response("生成角色") == "生成角色"
+    assert backend.calls == 1 and llm.get_usage()["cache_hits"] == 1
+    
+    # 用户发起的生成跳过缓存读取，每次都请求后端
+    llm.generate_response("生成角色", use_cache=False)
+    llm.generate_response("生成角色", use_cache=False)
+    assert backend.calls == 3
@@ -0,0 +1,61 @@
+# tests/test_llm_interface.py - LLM接口与请求执行器测试
+
+import asyncio
+from typing import Dict, List, Optional
+from core.llm_backends import LLMBackend
+from core.llm_interface import LLMInterface, run_sync
+
+class CountingBackend(LLMBackend):
+    """记录同时进行中的请求数的后端，每个请求等待一小段时间后返回提示本身"""
+    
+    name = "counting"
+    
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+    
+    async def acomplete(self, model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int, variant: int = 0,
+                        usage: Optional[Dict[str, int]] = None) -> str:
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return messages[-1]["content"]
+
+def test_executor_limits_concurrency():
+    backend = CountingBackend()
+    llm = LLMInterface(max_concurrency=3, backend=backend)
+    prompts = [f"提示{i}" for i in range(10)]
+    
+    results = run_sync(llm.executor.map(prompts))
+    assert results == prompts
+    assert backend.peak == 3
+    assert llm.get_usage()["requests"] == 10
+
+def test_set_max_concurrency_applies_to_next_loop():
+    backend = CountingBackend()
+    llm = LLMInterface(max_concurrency=2, backend=backend)
+    run_sync(llm.executor.map(["甲", "乙", "丙", "丁"]))
+    assert backend.peak == 2
+    
+    backend.peak = 0
+    llm.set_max_concurrency(4)
+    run_sync(llm.executor.map(["甲", "乙", "丙", "丁"]))
+    assert backend.peak == 4
+
+def test_stream_holds_one_slot_and_yields_chunks():
+    backend = CountingBackend()
+    llm = LLMInterface(max_concurrency=1, backend=backend)
+    
+    async def collect(prompt: str) -> str:
+        return "".join([chunk async for chunk in llm.executor.stream(prompt)])
+    
+    async def run():
+        return await asyncio.gather(collect("第一段"), collect("第二段"))
+    
+    assert run_sync(run()) == ["第一段", "第二段"]
+    assert backend.peak == 1
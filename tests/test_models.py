@@ -0,0 +1,94 @@
+# tests/test_models.py - 数据模型测试（槽位、驻留字符串、历史记录、延迟字段）
+
+import argparse
+import copy
+import pytest
+from dataclasses import asdict
+from core.models import SLOTS, Chapter, Character, HistoryEntry, LazyText, Novel, Relationship, intern_str
+from middleware.character_manager import CharacterManager
+from ui.benchmark import build_compact, build_legacy, measure, synthetic_spec
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml
+
+class CountingText(LazyText):
+    """记录加载次数的延迟文本"""
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.loads = 0
+    
+    def load(self) -> str:
+        self.loads += 1
+        return self.text
+
+def test_history_entry_behaves_like_dict():
+    entry = HistoryEntry("2024-01-01T00:00:00", "相识", chapter=3)
+    assert dict(entry) == {"timestamp": "2024-01-01T00:00:00", "description": "相识", "chapter": 3}
+    assert entry == {"timestamp": "2024-01-01T00:00:00", "description": "相识", "chapter": 3}
+    assert entry.get("delta") is None and "delta" not in entry and len(entry) == 3
+    with pytest.raises(KeyError):
+        entry["delta"]
+    
+    # deepcopy和asdict得到普通字典
+    assert type(copy.deepcopy(entry)) is dict
+    rel = Relationship("char_1", "朋友", 0.5, [{"timestamp": "t", "description": "d", "delta": 0.5}])
+    assert isinstance(rel.history[0], HistoryEntry)
+    assert HistoryEntry.from_mapping(rel.history[0]) is rel.history[0]
+    assert asdict(rel)["history"] == [{"timestamp": "t", "description": "d", "delta": 0.5}]
+
+def test_compact_history_folds_by_chapter():
+    rel = Relationship("char_1", "朋友", 0.0)
+    for chapter, delta in ((1, 0.1), (1, 0.2), (2, -0.1), (None, 0.3), (3, 0.05)):
+        rel.add_history_entry("变化", chapter, delta)
+    folded = rel.compact_history(2)
+    assert [entry["delta"] for entry in folded] == [0.1, 0.2, -0.1]
+    assert [entry["delta"] for entry in rel.history] == [0.3, 0.05]
+    assert rel.history_summary == [{"chapter": 1, "count": 2, "delta": pytest.approx(0.3)},
+                                   {"chapter": 2, "count": 1, "delta": -0.1}]
+    assert rel.compact_history(None) == [] and rel.compact_history(5) == []
+
+@pytest.mark.skipif(not SLOTS, reason="Python 3.10以下的dataclass不支持slots")
+def test_models_use_slots():
+    char = Character("char_1", "甲", 20, "男", "背景")
+    assert not hasattr(char, "__dict__")
+    assert not hasattr(Chapter.create(1, "章"), "__dict__")
+    assert not hasattr(HistoryEntry("t", "d"), "__dict__")
+    with pytest.raises(AttributeError):
+        char.nickname = "阿甲"
+    assert asdict(char)["name"] == "甲"
+
+def test_loaded_strings_are_interned(tmp_path):
+    novel = Novel.create("驻留", "奇幻", "大陆", seed=2)
+    manager = CharacterManager(None)
+    a, b, c = (manager.create_character(novel, name, 20, "男", "背景") for name in ("甲", "乙", "丙"))
+    manager.update_relationship(novel, a.id, b.id, "朋友", 0.5, "同行")
+    manager.update_relationship(novel, c.id, b.id, "朋友", 0.5, "同行")
+    path = str(tmp_path / "n.xml")
+    save_novel_to_xml(novel, path)
+    
+    loaded = load_novel_from_xml(path)
+    first, second = loaded.characters[a.id].relationships[b.id], loaded.characters[c.id].relationships[b.id]
+    assert first.relationship_type is second.relationship_type
+    assert first.target_id is second.target_id
+    assert first.history[0]["description"] is second.history[0]["description"]
+    assert loaded.characters[a.id].gender is loaded.characters[b.id].gender
+    assert intern_str(5) == 5
+
+def test_lazy_field_loads_on_read():
+    chapter = Chapter.create(1, "章")
+    text = CountingText("正文")
+    chapter.content = text
+    assert chapter.content_ref() is text and text.loads == 0
+    assert chapter.content == "正文" and text.loads == 1
+    
+    # 写入文本即替换引用
+    chapter.content = "新正文"
+    assert chapter.content_ref() is None and chapter.content == "新正文" and text.loads == 1
+    assert Chapter.content.raw(chapter) == "新正文"
+
+def test_compact_layout_uses_less_memory():
+    args = argparse.Namespace(characters=60, relationships=8, history=6, events=20, chapters=30, seed=1)
+    spec = synthetic_spec(args)
+    compact = build_compact(spec)
+    legacy = build_legacy(spec)
+    assert len(compact.characters) == len(legacy["characters"]) == 60
+    assert measure(build_compact, spec) < measure(build_legacy, spec)
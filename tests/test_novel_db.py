@@ -0,0 +1,117 @@
+# tests/test_novel_db.py - SQLite存储后端测试
+
+import re
+import sqlite3
+import pytest
+from core.event_engine import EventEngine
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml
+from utils.novel_db import DatabaseBody, NovelDatabase, read_database_header
+from test_xml_roundtrip import make_novel, novel_state
+
+def written_tables(statements):
+    """写语句涉及的表（不含FTS触发器内的语句）"""
+    tables = []
+    for sql in statements:
+        match = re.match(r"\s*(?:INSERT(?: OR REPLACE)? INTO|UPDATE|DELETE FROM)\s+(\w+)", sql)
+        if match and match.group(1) != "chapters_fts":
+            tables.append(match.group(1))
+    return list(dict.fromkeys(tables))
+
+def test_roundtrip(tmp_path):
+    path = str(tmp_path / "novels.db")
+    novel = make_novel()
+    assert save_novel_to_xml(novel, path)
+    expected = novel_state(novel)
+    # 保存后正文改为引用数据库中的行
+    assert all(isinstance(chapter.content_ref(), DatabaseBody) for chapter in novel.chapters)
+    
+    loaded = load_novel_from_xml(path)
+    assert loaded.chapters[0].content_ref() is not None
+    assert novel_state(loaded) == expected
+    
+    structure = load_novel_from_xml(path, bodies=False)
+    assert structure.structure_only and all(chapter.content == "" for chapter in structure.chapters)
+
+def test_saves_write_only_changed_rows(tmp_path):
+    path = str(tmp_path / "novels.db")
+    novel = make_novel()
+    save_novel_to_xml(novel, path)
+    statements = []
+    novel.database.conn.set_trace_callback(statements.append)
+    
+    # 没有修改时只更新小说行
+    save_novel_to_xml(novel, path)
+    assert written_tables(statements) == ["novels"]
+    
+    statements.clear()
+    ChapterManager(None, EventEngine()).update_chapter(novel, 2, {"notes": "新备注"})
+    save_novel_to_xml(novel, path)
+    assert written_tables(statements) == ["novels", "chapters"]
+    # 正文未变时不重写正文，也不重新建立全文索引
+    assert not any("content" in sql for sql in statements if sql.lstrip().startswith("UPDATE chapters"))
+    assert not any("chapters_fts" in sql for sql in statements)
+    
+    statements.clear()
+    CharacterManager(None).update_relationship(novel, "c1", "c3", "师徒", 0.2, "拜师")
+    save_novel_to_xml(novel, path)
+    assert sorted(set(written_tables(statements))) == ["characters", "novels", "relationships"]
+    
+    loaded = load_novel_from_xml(path)
+    assert loaded.chapters[1].notes == "新备注" and loaded.chapters[1].content == novel.chapters[1].content
+    assert loaded.characters["c1"].relationships["c3"].relationship_type == "师徒"
+
+def test_chapter_edits_and_deletes(tmp_path):
+    path = str(tmp_path / "novels.db")
+    novel = make_novel()
+    chapters = ChapterManager(None, EventEngine())
+    save_novel_to_xml(novel, path)
+    chapters.update_chapter(novel, 3, {"content": "改写的第三章"})
+    chapters.delete_chapter(novel, 1)
+    chapters.create_chapter(novel, "新章")
+    CharacterManager(None).delete_character(novel, "c3")
+    save_novel_to_xml(novel, path)
+    
+    loaded = load_novel_from_xml(path)
+    assert [(c.id, c.number) for c in loaded.chapters] == [("ch2", 1), ("ch3", 2), (novel.chapters[2].id, 3)]
+    assert loaded.chapters[1].content == "改写的第三章"
+    assert novel_state(loaded) == novel_state(novel)
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM relationships WHERE target_id = 'c3'").fetchone()[0] == 0
+
+def test_search(tmp_path):
+    path = str(tmp_path / "novels.db")
+    novel = make_novel()
+    chapters = ChapterManager(None, EventEngine())
+    chapters.update_chapter(novel, 2, {"content": "夜里，林远在城门外等候。"})
+    save_novel_to_xml(novel, path)
+    database = novel.database
+    
+    # 三个字及以上用FTS5索引（支持时），更短的逐行匹配，两者结果一致
+    assert [hit[0] for hit in database.search(novel.id, "城门外")] == [2]
+    assert [hit[0] for hit in database.search(novel.id, "城门")] == [2]
+    assert "城门外" in database.search(novel.id, "城门外")[0][2]
+    
+    # 更新后的正文重新索引
+    chapters.update_chapter(novel, 2, {"content": "清晨出发。"})
+    save_novel_to_xml(novel, path)
+    assert database.search(novel.id, "城门外") == [] and database.search(novel.id, "城门") == []
+    assert [hit[0] for hit in database.search(novel.id, "的正文")] == [1, 3] or not database.fts
+
+def test_multiple_novels(tmp_path):
+    path = str(tmp_path / "novels.db")
+    first, second = make_novel(), make_novel()
+    second.id, second.title = "novel_other", "另一部"
+    save_novel_to_xml(first, path)
+    second.last_modified = "9999-01-01T00:00:00"
+    save_novel_to_xml(second, path)
+    
+    database = NovelDatabase(path)
+    assert database.novel_ids() == ["novel_other", first.id]
+    assert database.load().title == "另一部" and database.load(first.id).title == first.title
+    with pytest.raises(ValueError):
+        database.load("missing")
+    database.close()
+    assert read_database_header(path)["novels"] == 2
+    assert load_novel_from_xml(path, novel_id=first.id).title == first.title
@@ -0,0 +1,65 @@
+# tests/test_reference_index.py - 章节引用反向索引测试
+
+from core.event_engine import EventEngine
+from core.models import Novel
+from core.reference_index import ReferenceIndex, get_reference_index
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+from middleware.event_manager import EventManager
+
+def index_state(index: ReferenceIndex):
+    return (set(index.chapters), index.event_chapters, index.focus_chapters, index.indexed)
+
+def build_novel():
+    """三个角色、三个事件和四章"""
+    novel = Novel.create("引用", "奇幻", "大陆", seed=9)
+    characters = CharacterManager(None)
+    events = EventManager(None)
+    chapters = ChapterManager(None, EventEngine())
+    char_ids = [characters.create_character(novel, name, 20, "男", "背景").id for name in ("甲", "乙", "丙")]
+    event_ids = [events.create_event(novel, name, "描述").id for name in ("相遇", "争执", "和解")]
+    for focus, used in (([0, 1], [0]), ([1], [0, 1]), ([2, 0], [2]), ([1, 2], [1, 0])):
+        chapters.create_chapter(novel, "章")
+        chapters.update_chapter(novel, novel.current_chapter, {
+            "character_focus": [char_ids[i] for i in focus], "events": [event_ids[i] for i in used]})
+    return novel, char_ids, event_ids, characters, events, chapters
+
+def numbers(chapters):
+    return [chapter.number for chapter in chapters]
+
+def test_lookups_follow_chapter_order():
+    novel, char_ids, event_ids, _, _, chapters = build_novel()
+    assert numbers(chapters.get_chapters_with_event(novel, event_ids[0])) == [1, 2, 4]
+    assert numbers(chapters.get_chapters_with_character(novel, char_ids[1])) == [1, 2, 4]
+    assert chapters.get_chapters_with_event(novel, "missing") == []
+    
+    # 删除章节后，后续章节重新编号，索引以章节ID为键不受影响
+    chapters.delete_chapter(novel, 1)
+    assert numbers(chapters.get_chapters_with_event(novel, event_ids[0])) == [1, 3]
+    assert numbers(chapters.get_chapters_with_character(novel, char_ids[0])) == [2]
+    
+    # 修改章节引用后重新索引
+    chapters.update_chapter(novel, 1, {"events": [event_ids[2]]})
+    assert numbers(chapters.get_chapters_with_event(novel, event_ids[2])) == [1, 2]
+    assert numbers(chapters.get_chapters_with_event(novel, event_ids[1])) == [3]
+
+def test_deletes_remove_references():
+    novel, char_ids, event_ids, characters, events, chapters = build_novel()
+    events.delete_event(novel, event_ids[0])
+    characters.delete_character(novel, char_ids[1])
+    assert [chapter.events for chapter in novel.chapters] == [[], [event_ids[1]], [event_ids[2]], [event_ids[1]]]
+    assert [chapter.character_focus for chapter in novel.chapters] == [[char_ids[0]], [], [char_ids[2], char_ids[0]],
+                                                                       [char_ids[2]]]
+    
+    # 增量维护的索引与全量重建一致
+    rebuilt = ReferenceIndex(novel.id)
+    rebuilt.rebuild(novel)
+    assert index_state(get_reference_index(novel)) == index_state(rebuilt)
+    assert event_ids[0] not in rebuilt.event_chapters and char_ids[1] not in rebuilt.focus_chapters
+
+def test_rebuilt_when_out_of_sync():
+    novel = build_novel()[0]
+    index = get_reference_index(novel)
+    assert get_reference_index(novel) is index
+    novel.chapters.pop()
+    assert get_reference_index(novel) is not index and len(novel.references) == 3
@@ -0,0 +1,70 @@
+# tests/test_relationship_matrix.py - 关系矩阵测试
+
+import pytest
+from core.models import Novel, Relationship
+from core.relationship_matrix import get_relationship_matrix
+from middleware.character_manager import CharacterManager
+from utils.xml_utils import novel_to_xml, xml_to_novel
+
+def make_novel(count: int = 4):
+    """构建有count个角色、第一个角色与其余角色都有关系的小说"""
+    novel = Novel.create("关系", "奇幻", "大陆", seed=3)
+    manager = CharacterManager(None)
+    chars = [manager.create_character(novel, f"角色{i}", 20, "男", "背景") for i in range(count)]
+    for char in chars[1:]:
+        manager.update_relationship(novel, chars[0].id, char.id, "朋友", 0.3, "相识")
+    return novel, manager, chars
+
+def test_deleted_slots_are_reused_in_character_order():
+    novel, manager, chars = make_novel()
+    matrix = get_relationship_matrix(novel)
+    size = len(matrix.ids)
+    for round_ in range(5):
+        victim = list(novel.characters)[1]
+        manager.delete_character(novel, victim)
+        get_relationship_matrix(novel)
+        new = manager.create_character(novel, f"新人{round_}", 20, "女", "背景")
+        manager.update_relationship(novel, chars[0].id, new.id, "朋友", 0.5, "相识")
+        get_relationship_matrix(novel)
+    
+    assert len(matrix.ids) == size
+    # 关系按角色的加入顺序遍历，与重新加载后一致
+    assert list(chars[0].relationships) == list(novel.characters)[1:]
+    loaded = xml_to_novel(novel_to_xml(novel))
+    get_relationship_matrix(loaded)
+    assert list(loaded.characters[chars[0].id].relationships) == list(chars[0].relationships)
+
+def test_strength_is_clamped():
+    novel, manager, chars = make_novel()
+    get_relationship_matrix(novel)
+    rel = chars[0].relationships[chars[1].id]
+    rel.strength = 3.0
+    assert rel.strength == 1.0
+    rel.strength = -7
+    assert rel.strength == -1.0
+    manager.update_relationship(novel, chars[0].id, chars[2].id, "朋友", 5.0, "结拜")
+    assert chars[0].relationships[chars[2].id].strength == 1.0
+
+def test_history_is_read_only():
+    novel, manager, chars = make_novel()
+    get_relationship_matrix(novel)
+    rel = chars[0].relationships[chars[1].id]
+    with pytest.raises(AttributeError):
+        rel.history.append({"description": "丢失的记录"})
+    
+    rel.add_history_entry("同行", chapter=1, delta=0.1)
+    assert [entry["description"] for entry in rel.history] == ["相识", "同行"]
+
+def test_view_of_deleted_character_does_not_allocate():
+    novel, manager, chars = make_novel()
+    matrix = get_relationship_matrix(novel)
+    view = chars[0].relationships
+    manager.delete_character(novel, chars[0].id)
+    get_relationship_matrix(novel)
+    
+    slots = dict(matrix.slots)
+    with pytest.raises(KeyError):
+        view[chars[1].id]
+    with pytest.raises(KeyError):
+        view[chars[2].id] = Relationship(chars[2].id, "敌人", -0.5)
+    assert matrix.slots == slots
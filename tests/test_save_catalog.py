@@ -0,0 +1,85 @@
+# tests/test_save_catalog.py - 存档目录测试
+
+import os
+import pytest
+from core.models import Novel
+from middleware.chapter_manager import ChapterManager
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml, list_saved_novels
+from utils.save_catalog import CATALOG_FILE, SaveCatalog
+
+def save_novel(directory, filename: str, title: str, chapters: int, genre: str = "奇幻",
+               incremental: bool = False) -> Novel:
+    novel = Novel.create(title, genre, "大陆", seed=len(title))
+    novel.incremental_save = incremental
+    manager = ChapterManager(None, None)
+    for number in range(chapters):
+        manager.create_chapter(novel, f"第{number + 1}章")
+    assert save_novel_to_xml(novel, os.path.join(str(directory), filename))
+    return novel
+
+def test_refresh_rereads_only_changed_files(tmp_path):
+    save_novel(tmp_path, "a.xml", "甲传", 1)
+    save_novel(tmp_path, "b.xml", "乙传", 2)
+    (tmp_path / "notes.txt").write_text("不是存档")
+    catalog = SaveCatalog(str(tmp_path))
+    assert catalog.refresh() == 2
+    assert catalog.refresh() == 0
+    
+    # 缓存写入目录，新的目录对象不再读取未变化的存档
+    assert (tmp_path / CATALOG_FILE).exists()
+    catalog = SaveCatalog(str(tmp_path))
+    assert catalog.refresh() == 0
+    
+    save_novel(tmp_path, "b.xml", "乙传（修订）", 3)
+    os.remove(tmp_path / "a.xml")
+    assert catalog.refresh() == 1
+    assert [(item["filename"], item["title"], item["chapters"]) for item in catalog.query()] == \
+        [("b.xml", "乙传（修订）", 3)]
+
+def test_journal_append_invalidates_entry(tmp_path):
+    path = str(tmp_path / "n.xml")
+    novel = save_novel(tmp_path, "n.xml", "日志", 1, incremental=True)
+    catalog = SaveCatalog(str(tmp_path))
+    catalog.refresh()
+    
+    # 增量保存只追加日志，目录信息取自最后一批
+    ChapterManager(None, None).create_chapter(novel, "第2章")
+    novel.title = "日志（续）"
+    assert save_novel_to_xml(novel, path)
+    assert catalog.refresh() == 1
+    info = catalog.query()[0]
+    assert (info["title"], info["chapters"]) == ("日志（续）", 2)
+    assert info["size"] == os.path.getsize(path) + os.path.getsize(f"{path}.journal")
+
+def test_unreadable_file_skipped(tmp_path):
+    save_novel(tmp_path, "good.xml", "好", 1)
+    (tmp_path / "bad.xml").write_text("<novel>")
+    catalog = SaveCatalog(str(tmp_path))
+    assert catalog.refresh() == 2
+    assert catalog.entries["bad.xml"]["info"] is None
+    assert [item["filename"] for item in catalog.query()] == ["good.xml"]
+    assert catalog.refresh() == 0
+
+def test_query_sort_filter_and_paging(tmp_path):
+    for filename, title, chapters, genre in (("c.xml", "Cat", 2, "奇幻"), ("a.xml", "apple", 5, "科幻"),
+                                             ("b.xml", "Bee", 2, "奇幻")):
+        save_novel(tmp_path, filename, title, chapters, genre)
+    directory = str(tmp_path)
+    assert [item["title"] for item in list_saved_novels(directory, "chapters")] == ["apple", "Bee", "Cat"]
+    assert [item["filename"] for item in list_saved_novels(directory, "filename", descending=True)] == \
+        ["c.xml", "b.xml", "a.xml"]
+    assert [item["title"] for item in list_saved_novels(directory, "title", query="奇幻")] == ["Bee", "Cat"]
+    assert [item["title"] for item in list_saved_novels(directory, "chapters", query="A.XML")] == ["apple"]
+    assert [item["filename"] for item in list_saved_novels(directory, "filename", offset=1, limit=1)] == ["b.xml"]
+    with pytest.raises(ValueError):
+        SaveCatalog(directory).query("size")
+
+def test_database_saves_listed(tmp_path):
+    novel = Novel.create("库", "奇幻", "大陆", seed=1)
+    ChapterManager(None, None).create_chapter(novel, "第1章")
+    path = str(tmp_path / "novels.db")
+    assert save_novel_to_xml(novel, path)
+    novel.database.close()
+    info = list_saved_novels(str(tmp_path))[0]
+    assert (info["filename"], info["title"], info["chapters"], info["novels"]) == ("novels.db", "库", 1, 1)
+    assert load_novel_from_xml(path).title == "库"
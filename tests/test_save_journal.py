@@ -0,0 +1,88 @@
+# tests/test_save_journal.py - 增量存档日志测试
+
+from core.models import Novel
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+from middleware.event_manager import EventManager
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml
+from utils.save_journal import journal_path_for, read_batches
+from utils.xml_utils import novel_to_xml
+
+def make_novel(path: str):
+    """以增量存档保存一部有三章的小说"""
+    novel = Novel.create("日志", "奇幻", "大陆", seed=1)
+    novel.incremental_save = True
+    manager = ChapterManager(None, None)
+    for number in range(1, 4):
+        manager.create_chapter(novel, f"第{number}章")
+    assert save_novel_to_xml(novel, path)
+    return novel, manager
+
+def test_edits_replayed_from_journal(tmp_path):
+    path = str(tmp_path / "n.xml")
+    novel, manager = make_novel(path)
+    manager.update_chapter(novel, 2, {"content": "第二章正文"})
+    assert save_novel_to_xml(novel, path)
+    assert len(list(read_batches(journal_path_for(path)))) == 1
+    
+    loaded = load_novel_from_xml(path)
+    assert loaded.chapters[1].content == "第二章正文"
+    assert loaded.journal_batches == novel.journal_batches
+
+def test_save_after_torn_tail_frame(tmp_path):
+    path = str(tmp_path / "n.xml")
+    novel, manager = make_novel(path)
+    manager.update_chapter(novel, 1, {"content": "第一章正文"})
+    assert save_novel_to_xml(novel, path)
+    
+    # 模拟追加中途崩溃：尾部留下不完整的帧
+    with open(journal_path_for(path), "ab") as f:
+        f.write(b"4096 12345\n<save n=")
+    
+    loaded = load_novel_from_xml(path)
+    assert loaded.chapters[0].content == "第一章正文"
+    manager.update_chapter(loaded, 3, {"content": "第三章正文"})
+    assert save_novel_to_xml(loaded, path)
+    
+    reloaded = load_novel_from_xml(path)
+    assert [chapter.content for chapter in reloaded.chapters] == ["第一章正文", "", "第三章正文"]
+    assert len(list(read_batches(journal_path_for(path)))) == 2
+
+def test_replay_matches_full_save(tmp_path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    path = str(tmp_path / "n.xml")
+    novel, manager = make_novel(path)
+    characters, events = CharacterManager(None), EventManager(None)
+    
+    # 增删改角色和事件，删除章节使后续章节重新编号
+    a = characters.create_character(novel, "甲", 20, "男", "背景")
+    b = characters.create_character(novel, "乙", 20, "女", "背景")
+    characters.update_relationship(novel, a.id, b.id, "朋友", 0.4, "相识")
+    event = events.create_event(novel, "相遇", "描述")
+    manager.update_chapter(novel, 3, {"events": [event.id], "character_focus": [a.id, b.id], "summary": "摘要"})
+    assert save_novel_to_xml(novel, path)
+    
+    manager.delete_chapter(novel, 1)
+    characters.update_character(novel, a.id, {"name": "甲改"})
+    characters.delete_character(novel, b.id)
+    manager.create_chapter(novel, "新一章")
+    assert save_novel_to_xml(novel, path)
+    assert len(list(read_batches(journal_path_for(path)))) == 2
+    
+    loaded = load_novel_from_xml(path)
+    assert [(chapter.number, chapter.title) for chapter in loaded.chapters] == [(1, "第2章"), (2, "第3章"), (3, "新一章")]
+    assert novel_to_xml(loaded) == novel_to_xml(novel)
+
+def test_large_journal_compacted_into_full_save(tmp_path):
+    path = str(tmp_path / "n.xml")
+    novel, manager = make_novel(path)
+    novel.save_journal.compact_bytes = 1
+    manager.update_chapter(novel, 1, {"content": "正文"})
+    assert save_novel_to_xml(novel, path)
+    manager.update_chapter(novel, 2, {"content": "正文二"})
+    assert save_novel_to_xml(novel, path)
+    
+    # 日志超过阈值后写入完整存档并清空日志
+    assert list(read_batches(journal_path_for(path))) == []
+    loaded = load_novel_from_xml(path)
+    assert [chapter.content for chapter in loaded.chapters] == ["正文", "正文二", ""]
@@ -0,0 +1,80 @@
+# tests/test_seeding.py - 随机种子复现测试
+
+from core.event_engine import EventEngine
+from core.llm_backends import FakeLLMBackend
+from core.llm_interface import LLMInterface
+from core.models import Novel
+from core.narrative_generator import NarrativeGenerator
+from core.summarizer import Summarizer
+from middleware.chapter_manager import ChapterManager
+from middleware.character_manager import CharacterManager
+from middleware.event_manager import EventManager
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml
+
+def make_llm() -> LLMInterface:
+    """延迟带抖动的假后端，并发请求的完成顺序与提交顺序不同"""
+    backend = FakeLLMBackend(seed=1, latency=0.01, latency_jitter=0.01, latency_distribution="uniform",
+                             content_chars=200)
+    return LLMInterface(max_concurrency=4, backend=backend)
+
+def start_novel(seed: int) -> Novel:
+    """生成角色和事件库"""
+    llm = make_llm()
+    novel = Novel.create("种子", "奇幻", "大陆", seed=seed)
+    CharacterManager(llm).generate_characters(novel, 4, use_cache=False)
+    EventManager(llm).generate_event_batches(novel, 3, use_cache=False)
+    return novel
+
+def generate(novel: Novel, chapters: int):
+    llm = make_llm()
+    manager = ChapterManager(NarrativeGenerator(llm, Summarizer(llm)), EventEngine())
+    for _ in range(chapters):
+        manager.generate_chapter(novel, use_cache=False)
+
+def story(novel: Novel):
+    """影响后续生成的全部随机决策结果"""
+    return ([(char.id, char.name) for char in novel.characters.values()], list(novel.events_library),
+            [(chapter.id, chapter.title, chapter.events, chapter.character_focus) for chapter in novel.chapters])
+
+def test_same_seed_same_story():
+    first, second = start_novel(5), start_novel(5)
+    assert first.id == second.id and story(first) == story(second)
+    generate(first, 4)
+    generate(second, 4)
+    assert story(first) == story(second)
+    
+    other = start_novel(6)
+    generate(other, 4)
+    assert story(other) != story(first)
+
+def test_resume_continues_sequence(tmp_path):
+    straight = start_novel(7)
+    generate(straight, 4)
+    
+    # 中途存档再加载，续跑结果与一次跑完相同
+    resumed = start_novel(7)
+    generate(resumed, 2)
+    path = str(tmp_path / "n.xml")
+    save_novel_to_xml(resumed, path)
+    resumed = load_novel_from_xml(path)
+    assert resumed.seed == 7 and resumed.rng_draws > 0
+    generate(resumed, 2)
+    assert story(resumed) == story(straight)
+
+def test_saves_byte_identical(tmp_path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    paths = []
+    for name in ("a.xml", "b.xml"):
+        novel = start_novel(8)
+        generate(novel, 2)
+        paths.append(tmp_path / name)
+        save_novel_to_xml(novel, str(paths[-1]))
+    assert paths[0].read_bytes() == paths[1].read_bytes()
+
+def test_unseeded_rng_not_counted():
+    novel = Novel.create("种子", "奇幻", "大陆")
+    novel.seed = None
+    novel.rng("id").random()
+    assert novel.rng_draws == 0
+    seeded = Novel.create("种子", "奇幻", "大陆", seed=3)
+    assert seeded.rng("a").random() != seeded.rng("a").random() and seeded.rng_draws == 2
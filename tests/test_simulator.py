@@ -0,0 +1,72 @@
+# tests/test_simulator.py - 离线故事模拟测试
+
+import json
+import pytest
+from core.models import Novel, Event
+from core.simulator import StorySimulator, simulate_run, _distribution
+from middleware.character_manager import CharacterManager
+from ui.simulate import run_simulation
+from utils.file_utils import save_novel_to_xml
+from utils.xml_utils import novel_to_xml
+
+def build_novel(event_count: int = 8) -> Novel:
+    """三个角色和若干带关系效果的事件"""
+    novel = Novel.create("模拟", "奇幻", "大陆", seed=1)
+    manager = CharacterManager(None)
+    a, b, c = (manager.create_character(novel, name, 20, "女", "背景") for name in ("甲", "乙", "丙"))
+    manager.update_relationship(novel, a.id, b.id, "朋友", 0.3, "相识")
+    manager.update_relationship(novel, b.id, c.id, "敌人", -0.3, "争执")
+    triggers = [{}, {"character_relation": ["朋友"]}, {"character": ["丙"]}, {"chapter": 5}]
+    novel.events_library = {f"e{i}": Event(f"e{i}", f"事件{i}", "描述", triggers[i % len(triggers)],
+                                           [{"target": "character_relation", "value": 0.2 if i % 2 else -0.2}], [])
+                            for i in range(event_count)}
+    return novel
+
+def test_process_pool_matches_sequential():
+    novel = build_novel()
+    xml_data = novel_to_xml(novel)
+    sequential = StorySimulator(chapters=12, seeds=4, max_workers=1, base_seed=7).run(novel)
+    pooled = StorySimulator(chapters=12, seeds=4, max_workers=2, base_seed=7).run(novel)
+    assert pooled == sequential
+    
+    # 模拟在副本上进行，不改变原小说
+    assert novel.chapters == [] and novel_to_xml(novel) == xml_data
+    assert sequential["runs"] == 4 and sequential["chapters"] == 12
+    assert sum(item["mean_uses"] for item in sequential["event_usage"].values()) > 0
+    assert sum(item["share"] for item in sequential["character_focus"].values()) == pytest.approx(1.0)
+
+def test_runs_reproducible_per_seed():
+    xml_data = novel_to_xml(build_novel())
+    first = simulate_run(xml_data, 10, seed=3)
+    assert simulate_run(xml_data, 10, seed=3) == first
+    assert simulate_run(xml_data, 10, seed=4) != first
+    assert sum(first["focus"].values()) >= 10
+
+@pytest.mark.parametrize("event_scoring", ["simple", "vectorized"])
+def test_run_many_splits_reports(event_scoring):
+    if event_scoring == "vectorized":
+        pytest.importorskip("numpy")
+    small, large = build_novel(4), build_novel(12)
+    large.title = "模拟（大）"
+    simulator = StorySimulator(chapters=6, seeds=3, max_workers=2, event_scoring=event_scoring)
+    reports = simulator.run_many([small, large])
+    assert [report["title"] for report in reports] == ["模拟", "模拟（大）"]
+    assert [len(report["event_usage"]) for report in reports] == [4, 12]
+    assert reports[0] == StorySimulator(chapters=6, seeds=3, max_workers=1, event_scoring=event_scoring).run(small)
+
+def test_distribution():
+    assert _distribution([]) == {"count": 0}
+    summary = _distribution([-1.0, -0.5, 0.0, 0.5, 1.0])
+    assert summary["mean"] == 0.0 and summary["p50"] == 0.0 and summary["max"] == 1.0
+    assert sum(summary["histogram"].values()) == 5
+    assert _distribution([0.3])["p90"] == 0.3
+
+def test_simulate_command(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_novel_to_xml(build_novel(), "n.xml")
+    args = ["--novel", "n.xml", "--chapters", "5", "--seeds", "2", "--workers", "1", "--output", "report.json"]
+    assert run_simulation(args) == 0
+    with open("report.json", encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["runs"] == 2 and report["chapters"] == 5
+    assert run_simulation(["--novel", "missing.xml"]) == 1
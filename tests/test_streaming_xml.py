@@ -0,0 +1,73 @@
+# tests/test_streaming_xml.py - 流式XML字段解析与流式章节生成测试
+
+from typing import AsyncIterator, Dict, List, Optional
+from core.llm_backends import LLMBackend
+from core.llm_interface import LLMInterface
+from core.models import Novel
+from core.narrative_generator import NarrativeGenerator
+from utils.xml_utils import StreamingXMLFieldParser
+
+RESPONSE = ("```xml\n<chapter><title>初遇</title><content>清晨，林远推开城门。\n他看见了苏晴。</content>"
+            "<summary>林远与苏晴初遇</summary></chapter>\n```")
+
+def test_fields_reported_as_they_arrive():
+    events = []
+    parser = StreamingXMLFieldParser(("title", "content", "summary"),
+                                     on_text=lambda field, text: events.append(("text", field)),
+                                     on_field=lambda field, value: events.append(("field", field, value)))
+    # 逐字输入，正文文本在字段闭合之前即回调
+    for char in RESPONSE:
+        parser.feed(char)
+    values = parser.finish()
+    
+    assert values == {"title": "初遇", "content": "清晨，林远推开城门。\n他看见了苏晴。", "summary": "林远与苏晴初遇"}
+    content_texts = [i for i, event in enumerate(events) if event == ("text", "content")]
+    assert len(content_texts) > 1
+    assert max(content_texts) < events.index(("field", "content", values["content"]))
+    assert events.index(("field", "title", "初遇")) < min(content_texts)
+
+def test_truncated_response_keeps_closed_fields():
+    parser = StreamingXMLFieldParser(("title", "content", "summary"))
+    parser.feed("<chapter><title>残章</title><content>写到一半")
+    assert parser.finish() == {"title": "残章"}
+
+def test_malformed_response_stops_parsing():
+    parser = StreamingXMLFieldParser(("title",))
+    parser.feed("<chapter><title>标题</title><a></b>")
+    parser.feed("<title>之后的内容</title>")
+    assert parser.error is not None
+    assert parser.finish() == {"title": "标题"}
+
+class ChunkedBackend(LLMBackend):
+    """以固定小块流式返回预设响应的后端"""
+    
+    name = "chunked"
+    
+    def __init__(self, response: str, size: int = 5):
+        self.response = response
+        self.size = size
+    
+    async def acomplete(self, model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int, variant: int = 0,
+                        usage: Optional[Dict[str, int]] = None) -> str:
+        return self.response
+    
+    async def aopen_stream(self, model: str, messages: List[Dict[str, str]],
+                           temperature: float, max_tokens: int, variant: int = 0) -> AsyncIterator[str]:
+        async def chunks():
+            for i in range(0, len(self.response), self.size):
+                yield self.response[i:i + self.size]
+        return chunks()
+
+def test_streamed_chapter_generation():
+    generator = NarrativeGenerator(LLMInterface(backend=ChunkedBackend(RESPONSE)), retrieval_budget=0)
+    novel = Novel.create("流式", "奇幻", "大陆", seed=2)
+    received = []
+    fields = {}
+    result = generator.generate_chapter(novel, [], [], use_cache=False, on_content=received.append,
+                                        on_field=fields.__setitem__)
+    
+    assert result["title"] == "初遇"
+    assert "".join(received) == result["content"] == "清晨，林远推开城门。\n他看见了苏晴。"
+    assert len(received) > 1
+    assert fields == result
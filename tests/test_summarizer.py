@@ -0,0 +1,97 @@
+# tests/test_summarizer.py - 分层摘要测试
+
+from typing import Dict, List, Optional
+from core.llm_backends import LLMBackend
+from core.llm_interface import LLMInterface
+from core.models import Novel
+from core.summarizer import Summarizer
+from middleware.chapter_manager import ChapterManager
+
+class SummaryBackend(LLMBackend):
+    """把每次压缩请求的摘要条目数写进结果，记录请求次数"""
+    
+    name = "summary"
+    
+    def __init__(self):
+        self.prompts: List[str] = []
+    
+    async def acomplete(self, model: str, messages: List[Dict[str, str]],
+                        temperature: float, max_tokens: int, variant: int = 0,
+                        usage: Optional[Dict[str, int]] = None) -> str:
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        scope = "全书" if "story summaries" in prompt else "卷"
+        return f"<summary>{scope}摘要{len(self.prompts)}</summary>"
+
+def build_novel(chapters: int) -> Novel:
+    novel = Novel.create("摘要", "奇幻", "大陆", seed=1)
+    novel.summaries.volume_size = 3
+    manager = ChapterManager(None, None)
+    for number in range(1, chapters + 1):
+        manager.create_chapter(novel, f"第{number}章")
+        novel.chapters[-1].summary = f"第{number}章发生的事"
+    return novel
+
+def make_summarizer():
+    backend = SummaryBackend()
+    return Summarizer(LLMInterface(backend=backend)), backend
+
+def test_volumes_compressed_once():
+    novel = build_novel(7)
+    summarizer, backend = make_summarizer()
+    summarizer.refresh(novel)
+    pyramid = novel.summaries
+    # 两卷完结各压缩一次，全书摘要一次；未完结的第7章不压缩
+    assert sorted(pyramid.volumes) == [0, 1] and pyramid.book_volumes == 2
+    assert len(backend.prompts) == 3
+    assert "第7章" not in "".join(backend.prompts)
+    
+    summarizer.refresh(novel)
+    assert len(backend.prompts) == 3
+    
+    # 新完结一卷时只压缩该卷，全书摘要在原有基础上并入
+    manager = ChapterManager(None, None)
+    for number in (8, 9):
+        manager.create_chapter(novel, f"第{number}章")
+        novel.chapters[-1].summary = f"第{number}章发生的事"
+    book = pyramid.book
+    summarizer.refresh(novel)
+    assert len(backend.prompts) == 5 and pyramid.book_volumes == 3
+    assert book in backend.prompts[-1] and "第4-6章" not in backend.prompts[-1]
+
+def test_edits_invalidate_affected_volumes():
+    novel = build_novel(9)
+    summarizer, backend = make_summarizer()
+    summarizer.refresh(novel)
+    manager = ChapterManager(None, None)
+    
+    manager.update_chapter(novel, 5, {"summary": "改写"})
+    assert sorted(novel.summaries.volumes) == [0, 2] and novel.summaries.book == ""
+    summarizer.refresh(novel)
+    assert len(backend.prompts) == 4 + 2
+    assert "第5章: 改写" in backend.prompts[-2]
+    
+    # 删除章节后该卷起全部失效，不再完结的卷被丢弃
+    manager.delete_chapter(novel, 2)
+    assert sorted(novel.summaries.volumes) == []
+    summarizer.refresh(novel)
+    assert sorted(novel.summaries.volumes) == [0, 1]
+
+def test_history_fits_budget_in_story_order():
+    novel = build_novel(10)
+    summarizer, _ = make_summarizer()
+    summarizer.refresh(novel)
+    
+    full = summarizer.build_history(novel, 11, token_budget=10000)
+    lines = full.split("\n")
+    assert lines[0].startswith("前情梗概") and lines[-1] == "第10章: 第10章发生的事"
+    assert [line.split(":")[0] for line in lines[1:]] == ["第1-3章", "第4-6章", "第7-9章", "第10章"]
+    
+    # 预算不足时优先保留最近的章节和卷
+    short = summarizer.build_history(novel, 11, token_budget=30)
+    assert short and "第10章" in short and len(short) < len(full)
+    
+    # 较早章节的前情不含之后的卷和全书摘要
+    assert summarizer.build_history(novel, 1) == ""
+    assert summarizer.build_history(novel, 6, token_budget=10000).split("\n") == \
+        ["第1-3章: 卷摘要1", "第4章: 第4章发生的事", "第5章: 第5章发生的事"]
@@ -0,0 +1,123 @@
+# tests/test_xml_roundtrip.py - XML存档读写往返测试
+
+from dataclasses import fields, asdict
+import pytest
+from core.models import Novel, Character, Trait, Event, Outline, OutlineArc, Chapter
+from core.body_store import store_chapter_bodies
+from utils.xml_utils import write_novel_xml, read_novel_xml, xml_to_novel
+from utils.file_utils import (flush_history_archive, history_archive_path_for, save_novel_to_xml,
+                              load_novel_from_xml)
+
+def make_novel() -> Novel:
+    """构建各部分都有存档数据的小说：关系历史超出保留条数，部分并入汇总并归档
+    
+    角色状态和故事情节不写入存档，触发条件和效果只保存文本值和数值，这里不设置。
+    """
+    novel = Novel.create("往返", "奇幻", "群山之间的王国", seed=7)
+    novel.history_limit = 3
+    for char_id, name in (("c1", "林远"), ("c2", "苏晴"), ("c3", "沈默")):
+        novel.characters[char_id] = Character(
+            id=char_id, name=name, age=20, gender="男", background=f"{name}的背景 <&>",
+            personality={"勇气": 0.7, "谨慎": 0.25}, traits=[Trait("t-" + char_id, "果断", "行事果断", {"勇气": 0.1})],
+            goals=["复仇"], notes="备注")
+    for i in range(8):
+        novel.characters["c1"].update_relationship("c2", "朋友" if i < 5 else "挚友", 0.05, f"并肩作战{i}",
+                                                   chapter=i // 2 + 1)
+    novel.characters["c2"].update_relationship("c3", "敌人", -0.3, "争吵")
+    novel.compact_history()
+    
+    novel.events_library["e1"] = Event(
+        id="e1", name="决斗", description="两人在城门决斗",
+        triggers={"location": "城门", "time": "黄昏"},
+        effects=[{"target": "c1", "value": 0.1}], narrative_templates=["{a}与{b}决斗"])
+    novel.outline = Outline("o1", "主角复仇的故事", [OutlineArc("第一幕", "出发", ["e1"])])
+    novel.context.global_context = "全局设定"
+    novel.context.set_chapter_context(2, "第二章设定")
+    for number in range(1, 4):
+        novel.chapters.append(Chapter(id=f"ch{number}", number=number, title=f"第{number}章", events=["e1"],
+                                      character_focus=["c1"], content=f"第{number}章的正文。\n" * 20,
+                                      summary=f"第{number}章摘要", notes="章节备注"))
+    novel.summaries.volume_size = 2
+    novel.summaries.volumes = {0: "第一卷摘要"}
+    novel.summaries.book = "全书摘要"
+    novel.summaries.book_volumes = 1
+    novel.timeline.append({"chapter": 1, "event": "e1", "description": "决斗"})
+    novel.current_chapter = 3
+    return novel
+
+def novel_state(novel: Novel):
+    """小说中写入存档的全部数据（运行时字段除外），正文读取时加载"""
+    state = {}
+    for f in fields(Novel):
+        if not f.compare:
+            continue
+        value = getattr(novel, f.name)
+        if f.name in ("characters", "events_library"):
+            value = {key: item.to_dict() for key, item in value.items()}
+        elif f.name == "chapters":
+            value = [chapter.to_dict() for chapter in value]
+        elif f.name in ("outline", "context", "summaries") and value is not None:
+            value = asdict(value)
+        state[f.name] = value
+    return state
+
+@pytest.mark.parametrize("external", [False, True])
+def test_roundtrip(tmp_path, external):
+    novel = make_novel()
+    path = str(tmp_path / "novel.xml")
+    flush_history_archive(novel, history_archive_path_for(path))
+    assert novel.history_archived > 0
+    assert any(rel.history_summary for char in novel.characters.values() for rel in char.relationships.values())
+    if external:
+        novel.external_bodies = True
+        store_chapter_bodies(novel, path)
+    expected = novel_state(novel)
+    
+    with open(path, "w", encoding="utf-8") as f:
+        write_novel_xml(novel, f, inline_bodies=not external)
+    with open(path, "r", encoding="utf-8") as f:
+        xml_string = f.read()
+    assert ("第1章的正文" in xml_string) != external
+    
+    with open(path, "rb") as f:
+        streamed = read_novel_xml(f, path)
+    parsed = xml_to_novel(xml_string, path)
+    for loaded in (streamed, parsed):
+        assert all((chapter.content_ref() is not None) == external for chapter in loaded.chapters)
+        assert novel_state(loaded) == expected
+
+@pytest.mark.parametrize("external", [False, True])
+def test_structure_only_load(tmp_path, external):
+    novel = make_novel()
+    path = str(tmp_path / "novel.xml")
+    novel.external_bodies = external
+    assert save_novel_to_xml(novel, path)
+    expected = novel_state(load_novel_from_xml(path))
+    
+    # 跳过全部正文，其余数据与完整加载相同
+    loaded = load_novel_from_xml(path, bodies=False)
+    assert loaded.structure_only and loaded.index is None
+    assert all(Chapter.content.raw(chapter) == "" for chapter in loaded.chapters)
+    for chapter in expected["chapters"]:
+        chapter["content"] = ""
+    assert novel_state(loaded) == expected
+    
+    # 结构加载的小说不能覆盖完整存档
+    with open(path, "rb") as f:
+        data = f.read()
+    assert not save_novel_to_xml(loaded, path)
+    with open(path, "rb") as f:
+        assert f.read() == data
+
+def test_load_and_save_byte_identical(tmp_path, monkeypatch):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    path = str(tmp_path / "novel.xml")
+    novel = make_novel()
+    save_novel_to_xml(novel, path)
+    with open(path, "rb") as f:
+        data = f.read()
+    
+    copy_path = str(tmp_path / "copy.xml")
+    assert save_novel_to_xml(load_novel_from_xml(path), copy_path)
+    with open(copy_path, "rb") as f:
+        assert f.read() == data
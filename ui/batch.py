@@ -0,0 +1,235 @@
+# ui/batch.py - 无人值守批量生成
+
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, List, Optional
+from core.models import Novel, Chapter
+from core.llm_interface import LLMInterface
+from core.llm_cache import LLMCache
+from core.llm_backends import create_backend
+from core.event_engine import EventEngine
+from core.event_scoring import VectorizedEventScorer
+from core.narrative_generator import NarrativeGenerator, FALLBACK_CONTENT
+from core.summarizer import Summarizer
+from middleware.chapter_manager import ChapterManager
+from core.body_store import remove_retired_bodies
+from utils.file_utils import (save_novel_to_xml, load_novel_from_xml, index_path_for, history_archive_path_for,
+                              fsync_directory)
+from utils.novel_db import is_database_path
+from utils.logger import Logger
+
+class BatchGenerator:
+    """批量章节生成 - 循环生成章节，每章完成后保存检查点，可从检查点继续"""
+    
+    def __init__(self, chapter_manager: ChapterManager, llm: LLMInterface,
+                 logger: Optional[Logger] = None, max_retries: int = 2):
+        self.chapter_manager = chapter_manager
+        self.llm = llm
+        self.logger = logger
+        self.max_retries = max_retries  # 单章失败后的重试次数
+    
+    def run(self, novel: Novel, path: str, target_chapters: int,
+            report_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """生成章节直到小说达到目标章节数，返回每章的统计信息"""
+        stats = []
+        
+        if len(novel.chapters) >= target_chapters:
+            self._log(f"《{novel.title}》已有{len(novel.chapters)}章，无需生成")
+            return stats
+        
+        self._log(f"从第{len(novel.chapters) + 1}章继续生成，目标{target_chapters}章")
+        
+        while len(novel.chapters) < target_chapters:
+            chapter_stats = self._generate_one(novel)
+            if chapter_stats is None:
+                raise RuntimeError(f"第{len(novel.chapters) + 1}章生成失败，已保留到上一章的检查点")
+            
+            # 保存检查点
+            save_start = time.perf_counter()
+            if not self.checkpoint(novel, path):
+                raise RuntimeError(f"保存检查点失败: {path}")
+            chapter_stats["save_seconds"] = round(time.perf_counter() - save_start, 3)
+            
+            stats.append(chapter_stats)
+            self._report(chapter_stats, report_path)
+        
+        self._log_summary(stats)
+        return stats
+    
+    def _generate_one(self, novel: Novel) -> Optional[Dict[str, Any]]:
+        """生成一章，失败时重试，返回统计信息"""
+        for attempt in range(self.max_retries + 1):
+            usage_before = self.llm.get_usage()
+            start = time.perf_counter()
+            
+            try:
+                # 重试时跳过缓存，避免再次得到同一个无法解析的响应
+                chapter = self.chapter_manager.generate_chapter(novel, use_cache=attempt == 0)
+            except Exception as e:
+                self._log(f"生成第{len(novel.chapters) + 1}章出错: {e}", error=True)
+                continue
+            
+            elapsed = time.perf_counter() - start
+            
+            if chapter.content == FALLBACK_CONTENT:
+                self._log(f"第{chapter.number}章响应解析失败，重试({attempt + 1}/{self.max_retries + 1})", error=True)
+                self.chapter_manager.delete_chapter(novel, chapter.number)
+                continue
+            
+            usage_after = self.llm.get_usage()
+            return self._chapter_stats(chapter, elapsed, attempt, usage_before, usage_after)
+        
+        return None
+    
+    def _chapter_stats(self, chapter: Chapter, elapsed: float, attempt: int,
+                       usage_before: Dict[str, int], usage_after: Dict[str, int]) -> Dict[str, Any]:
+        """构建单章统计信息"""
+        stats = {
+            "chapter": chapter.number,
+            "title": chapter.title,
+            "seconds": round(elapsed, 3),
+            "retries": attempt,
+            "content_chars": len(chapter.content)
+        }
+        for key in ["requests", "cache_hits", "prompt_tokens", "completion_tokens"]:
+            stats[key] = usage_after[key] - usage_before[key]
+        return stats
+    
+    def checkpoint(self, novel: Novel, path: str) -> bool:
+        """保存检查点：先写临时文件再替换，避免中途崩溃损坏已有检查点"""
+        if novel.incremental_save or is_database_path(path):
+            # 增量存档的日志只追加，完整存档由save_novel_to_xml先写临时文件再替换；数据库写入在事务中完成
+            return save_novel_to_xml(novel, path, history_archive_path_for(path))
+        tmp_path = f"{path}.tmp"
+        if not save_novel_to_xml(novel, tmp_path, history_archive_path_for(path), base_path=path):
+            return False
+        os.replace(tmp_path, path)
+        fsync_directory(path)
+        remove_retired_bodies(novel)
+        if os.path.exists(index_path_for(tmp_path)):
+            os.replace(index_path_for(tmp_path), index_path_for(path))
+        return True
+    
+    def _report(self, chapter_stats: Dict[str, Any], report_path: Optional[str]):
+        """输出单章统计"""
+        self._log(
+            f"第{chapter_stats['chapter']}章《{chapter_stats['title']}》: "
+            f"耗时{chapter_stats['seconds']:.2f}秒, 请求{chapter_stats['requests']}次, "
+            f"提示令牌{chapter_stats['prompt_tokens']}, 生成令牌{chapter_stats['completion_tokens']}"
+        )
+        
+        if report_path:
+            # 追加写入，续跑时沿用同一报告文件
+            with open(report_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(chapter_stats, ensure_ascii=False) + "\n")
+    
+    def _log_summary(self, stats: List[Dict[str, Any]]):
+        """输出汇总统计"""
+        if not stats:
+            return
+        
+        total_seconds = sum(s["seconds"] for s in stats)
+        self._log(
+            f"共生成{len(stats)}章, 总耗时{total_seconds:.1f}秒, 平均每章{total_seconds / len(stats):.2f}秒, "
+            f"提示令牌{sum(s['prompt_tokens'] for s in stats)}, "
+            f"生成令牌{sum(s['completion_tokens'] for s in stats)}"
+        )
+    
+    def _log(self, message: str, error: bool = False):
+        """记录日志"""
+        if self.logger is None:
+            print(message)
+        elif error:
+            self.logger.error(message)
+        else:
+            self.logger.info(message)
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """构建generate子命令的参数解析器"""
+    parser = argparse.ArgumentParser(prog="main.py generate", description="无人值守批量生成章节")
+    parser.add_argument("--novel", required=True, help="小说XML文件路径，同时作为检查点")
+    parser.add_argument("--chapters", type=int, required=True, help="目标总章节数，已有章节计入其中")
+    parser.add_argument("--title", help="文件不存在时新建小说的标题")
+    parser.add_argument("--genre", help="文件不存在时新建小说的类型")
+    parser.add_argument("--setting", help="文件不存在时新建小说的背景设定")
+    parser.add_argument("--seed", type=int, help="随机种子，新建小说时使用，已有小说时替换存档中的种子")
+    parser.add_argument("--model", default="gpt-4", help="LLM模型")
+    parser.add_argument("--backend", help="LLM后端(openai/fake)，默认取LLM_BACKEND环境变量")
+    parser.add_argument("--no-cache", action="store_true", help="不使用LLM响应缓存")
+    parser.add_argument("--retries", type=int, default=2, help="单章失败后的重试次数")
+    parser.add_argument("--report", help="以JSON Lines格式追加写入每章统计的文件")
+    parser.add_argument("--event-scoring", choices=["simple", "vectorized"], default="simple",
+                        help="事件评分方式，vectorized需要numpy")
+    parser.add_argument("--history-limit", type=int,
+                        help="每对关系保留的原始历史条数，更早的按章节汇总并移入归档文件；0表示不压缩")
+    parser.add_argument("--external-bodies", action="store_true",
+                        help="章节正文保存到单独的正文存储文件，加载时按需读取")
+    parser.add_argument("--incremental-save", action="store_true",
+                        help="检查点只向日志文件追加本章的变更，日志过大时自动写入完整存档")
+    return parser
+
+def run_batch(argv: List[str]) -> int:
+    """执行generate子命令，返回退出码"""
+    args = build_arg_parser().parse_args(argv)
+    logger = Logger()
+    
+    # 加载检查点或新建小说
+    if os.path.exists(args.novel):
+        novel = load_novel_from_xml(args.novel)
+        if novel is None:
+            logger.error(f"无法加载小说: {args.novel}")
+            return 1
+        if args.seed is not None and args.seed != novel.seed:
+            logger.info(f"随机种子由{novel.seed}改为{args.seed}")
+            novel.seed = args.seed
+            novel.rng_draws = 0
+    elif args.title and args.genre and args.setting:
+        novel = Novel.create(args.title, args.genre, args.setting, args.seed)
+    else:
+        logger.error(f"文件不存在: {args.novel}（新建小说需提供--title、--genre和--setting）")
+        return 1
+    
+    if args.history_limit is not None:
+        novel.history_limit = args.history_limit or None
+        novel.compact_history()
+    
+    if args.external_bodies:
+        novel.external_bodies = True
+    if args.incremental_save:
+        novel.incremental_save = True
+    
+    try:
+        llm = LLMInterface(
+            model=args.model,
+            cache=None if args.no_cache else LLMCache(),
+            backend=create_backend(args.backend)
+        )
+    except ValueError as e:
+        logger.error(f"初始化LLM接口失败: {e}")
+        return 1
+    
+    try:
+        scorer = VectorizedEventScorer() if args.event_scoring == "vectorized" else None
+    except ValueError as e:
+        logger.error(f"初始化事件评分器失败: {e}")
+        return 1
+    
+    directory = os.path.dirname(args.novel)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    
+    chapter_manager = ChapterManager(NarrativeGenerator(llm, Summarizer(llm)), EventEngine(scorer=scorer))
+    generator = BatchGenerator(chapter_manager, llm, logger, max_retries=args.retries)
+    
+    try:
+        generator.run(novel, args.novel, args.chapters, args.report)
+    except KeyboardInterrupt:
+        logger.info(f"已中断，进度保存在{args.novel}，重新运行相同命令即可继续")
+        return 130
+    except RuntimeError as e:
+        logger.error(str(e))
+        return 1
+    
+    return 0
\ No newline at end of file
@@ -0,0 +1,267 @@
+# ui/benchmark.py - 模型内存与存档基准命令
+
+import gc
+import os
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+from xml.dom import minidom
+from typing import Any, Callable, Dict, List, Tuple
+from core.models import Novel, Character, Trait, Relationship, Event, Chapter, HistoryEntry
+from utils.xml_utils import (header_to_xml, context_to_xml, outline_to_xml, character_to_xml, event_to_xml,
+                             chapter_to_xml, summaries_to_xml, timeline_item_to_xml, write_novel_xml,
+                             novel_to_xml, xml_to_novel)
+
+# 合成数据使用的词汇
+REL_TYPES = ["朋友", "敌人", "师徒", "恋人", "同僚", "受事件影响"]
+PERSONALITY = ["勇敢", "谨慎", "善良", "狡猾", "冷静", "冲动", "忠诚", "好奇"]
+TRAIT_NAMES = ["剑术", "医术", "谋略", "轻功", "书法", "琴艺"]
+
+class LegacyObject:
+    """字段保存在实例__dict__中的对象，与改用__slots__之前的数据类实例内存布局相同"""
+    
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+def fresh(value: str) -> str:
+    """内容相同的新字符串对象，模拟逐个解析XML得到的未驻留字符串"""
+    return (value + " ")[:-1]
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """构建benchmark-memory子命令的参数解析器"""
+    parser = argparse.ArgumentParser(prog="main.py benchmark-memory",
+                                     description="比较紧凑模型与原字典/数据类布局在合成小说上的内存占用")
+    parser.add_argument("--characters", type=int, default=1000, help="角色数")
+    parser.add_argument("--relationships", type=int, default=20, help="每个角色的关系数")
+    parser.add_argument("--history", type=int, default=20, help="每对关系的历史记录数")
+    parser.add_argument("--events", type=int, default=300, help="事件数")
+    parser.add_argument("--chapters", type=int, default=300, help="章节数")
+    parser.add_argument("--seed", type=int, default=0, help="生成合成数据的随机种子")
+    return parser
+
+def synthetic_spec(args: argparse.Namespace) -> Dict[str, Any]:
+    """生成合成小说的原始数据（两种布局据此构建相同内容）"""
+    rng = random.Random(args.seed)
+    char_ids = [f"char_{i:08x}" for i in range(args.characters)]
+    event_ids = [f"event_{i:08x}" for i in range(args.events)]
+    characters = []
+    for char_id in char_ids:
+        relationships = []
+        for target_id in rng.sample(char_ids, min(args.relationships, len(char_ids))):
+            history = [(f"2024-01-01T00:00:{rng.randrange(60):02d}.{rng.randrange(10 ** 6):06d}",
+                        f"事件'事件{rng.randrange(args.events)}'影响了关系", rng.randrange(1, args.chapters + 1),
+                        round(rng.uniform(-0.2, 0.2), 3)) for _ in range(args.history)]
+            relationships.append((target_id, rng.choice(REL_TYPES), round(rng.uniform(-1, 1), 3), history))
+        characters.append({
+            "id": char_id,
+            "name": f"角色{char_id[-4:]}",
+            "gender": rng.choice(["男", "女"]),
+            "personality": {name: round(rng.random(), 2) for name in rng.sample(PERSONALITY, 4)},
+            "traits": [(f"trait_{char_id[-8:]}_{i}", name) for i, name in enumerate(rng.sample(TRAIT_NAMES, 2))],
+            "relationships": relationships
+        })
+    events = [{"id": event_id, "name": f"事件{i}",
+               "triggers": {"character_relation": rng.choice(REL_TYPES), "trait": rng.choice(PERSONALITY)},
+               "effects": [{"target": "character_relation", "value": round(rng.uniform(-0.3, 0.3), 2)}]}
+              for i, event_id in enumerate(event_ids)]
+    chapters = [{"id": f"chapter_{number:08x}", "number": number, "events": rng.sample(event_ids, 3),
+                 "focus": rng.sample(char_ids, 3)} for number in range(1, args.chapters + 1)]
+    return {"characters": characters, "events": events, "chapters": chapters}
+
+def build_compact(spec: Dict[str, Any]) -> Novel:
+    """用当前模型构建（__slots__、驻留字符串、HistoryEntry）"""
+    novel = Novel(id="novel_bench", title="基准", genre="测试", setting="合成数据")
+    for data in spec["characters"]:
+        char = Character(id=fresh(data["id"]), name=fresh(data["name"]), age=30, gender=fresh(data["gender"]),
+                         background="", personality={fresh(k): v for k, v in data["personality"].items()})
+        char.traits = [Trait(id=fresh(trait_id), name=fresh(name), description="") for trait_id, name in data["traits"]]
+        for target_id, rel_type, strength, history in data["relationships"]:
+            rel = Relationship(target_id=fresh(target_id), relationship_type=fresh(rel_type), strength=strength,
+                               history=[HistoryEntry(fresh(ts), fresh(desc), chapter, delta)
+                                        for ts, desc, chapter, delta in history])
+            char.relationships[rel.target_id] = rel
+        novel.characters[char.id] = char
+    for data in spec["events"]:
+        event = Event(id=fresh(data["id"]), name=fresh(data["name"]), description="",
+                      triggers={fresh(k): fresh(v) for k, v in data["triggers"].items()},
+                      effects=[{fresh(k): fresh(v) if isinstance(v, str) else v for k, v in effect.items()}
+                               for effect in data["effects"]], narrative_templates=[])
+        novel.events_library[event.id] = event
+    for data in spec["chapters"]:
+        novel.chapters.append(Chapter(id=fresh(data["id"]), number=data["number"], title="",
+                                      events=[fresh(v) for v in data["events"]],
+                                      character_focus=[fresh(v) for v in data["focus"]]))
+    return novel
+
+def build_legacy(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """用原布局构建（实例__dict__、字典历史记录、每处独立的字符串）"""
+    characters = {}
+    for data in spec["characters"]:
+        relationships = {}
+        for target_id, rel_type, strength, history in data["relationships"]:
+            relationships[fresh(target_id)] = LegacyObject(
+                target_id=fresh(target_id), relationship_type=fresh(rel_type), strength=strength,
+                history=[{"timestamp": fresh(ts), "description": fresh(desc), "chapter": chapter, "delta": delta}
+                         for ts, desc, chapter, delta in history], history_summary=[])
+        characters[fresh(data["id"])] = LegacyObject(
+            id=fresh(data["id"]), name=fresh(data["name"]), age=30, gender=fresh(data["gender"]), background="",
+            appearance="", personality={fresh(k): v for k, v in data["personality"].items()},
+            traits=[LegacyObject(id=fresh(trait_id), name=fresh(name), description="", impact={})
+                    for trait_id, name in data["traits"]],
+            relationships=relationships, status={}, story_arcs=[], goals=[], notes="")
+    events = {}
+    for data in spec["events"]:
+        events[fresh(data["id"])] = LegacyObject(
+            id=fresh(data["id"]), name=fresh(data["name"]), description="",
+            triggers={fresh(k): fresh(v) for k, v in data["triggers"].items()},
+            effects=[{fresh(k): fresh(v) if isinstance(v, str) else v for k, v in effect.items()}
+                     for effect in data["effects"]], narrative_templates=[], user_editable=True, notes="")
+    chapters = [LegacyObject(id=fresh(data["id"]), number=data["number"], title="",
+                             events=[fresh(v) for v in data["events"]],
+                             character_focus=[fresh(v) for v in data["focus"]],
+                             content="", summary="", user_edited=False, notes="")
+                for data in spec["chapters"]]
+    return {"characters": characters, "events": events, "chapters": chapters}
+
+def measure(build: Callable[[Dict[str, Any]], Any], spec: Dict[str, Any]) -> int:
+    """构建结果占用的内存(字节)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build(spec)
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return used
+
+def run_benchmark(argv: List[str]) -> int:
+    """执行benchmark-memory子命令，返回退出码"""
+    args = build_arg_parser().parse_args(argv)
+    spec = synthetic_spec(args)
+    
+    legacy = measure(build_legacy, spec)
+    compact = measure(build_compact, spec)
+    
+    entries = args.characters * min(args.relationships, args.characters) * args.history
+    print(f"合成小说: {args.characters}个角色, 每人{args.relationships}个关系, 每对{args.history}条历史"
+          f"(共{entries}条), {args.events}个事件, {args.chapters}章")
+    print(f"原布局:   {legacy / 2 ** 20:8.1f} MB, 每角色{legacy / args.characters / 1024:.1f} KB")
+    print(f"紧凑模型: {compact / 2 ** 20:8.1f} MB, 每角色{compact / args.characters / 1024:.1f} KB")
+    print(f"节省:     {(legacy - compact) / 2 ** 20:8.1f} MB ({1 - compact / legacy:.0%})")
+    return 0
+
+def build_save_arg_parser() -> argparse.ArgumentParser:
+    """构建benchmark-save子命令的参数解析器"""
+    parser = argparse.ArgumentParser(prog="main.py benchmark-save",
+                                     description="比较流式XML写出与原minidom美化输出的耗时和峰值内存，并校验往返一致")
+    parser.add_argument("--characters", type=int, default=200, help="角色数")
+    parser.add_argument("--relationships", type=int, default=10, help="每个角色的关系数")
+    parser.add_argument("--history", type=int, default=5, help="每对关系的历史记录数")
+    parser.add_argument("--events", type=int, default=200, help="事件数")
+    parser.add_argument("--chapters", type=int, default=1500, help="章节数")
+    parser.add_argument("--chapter-chars", type=int, default=11000, help="每章正文字数")
+    parser.add_argument("--skip-legacy", action="store_true", help="不运行原minidom输出（大文件时很慢且占用大量内存）")
+    parser.add_argument("--seed", type=int, default=0, help="生成合成数据的随机种子")
+    return parser
+
+def build_save_novel(args: argparse.Namespace) -> Novel:
+    """构建带正文的合成小说"""
+    novel = build_compact(synthetic_spec(args))
+    rng = random.Random(args.seed)
+    sentences = [f"{rng.choice(PERSONALITY)}的{rng.choice(TRAIT_NAMES)}高手在第{i}处遇见了&<旧识>，"
+                 f"两人谈起\"{rng.choice(REL_TYPES)}\"之间的往事。\n" for i in range(200)]
+    for chapter in novel.chapters:
+        parts, size = [], 0
+        while size < args.chapter_chars:
+            sentence = rng.choice(sentences)
+            parts.append(sentence)
+            size += len(sentence)
+        chapter.title = f"第{chapter.number}章"
+        chapter.content = "".join(parts)
+        chapter.summary = chapter.content[:100]
+    return novel
+
+def legacy_novel_to_xml(novel: Novel) -> str:
+    """原存档方式：构建整棵树后再经minidom美化输出"""
+    root = ET.Element("novel")
+    header_to_xml(root, novel)
+    context_to_xml(root, novel)
+    if novel.outline:
+        outline_to_xml(root, novel)
+    characters_elem = ET.SubElement(root, "characters")
+    for char in novel.characters.values():
+        character_to_xml(characters_elem, char)
+    events_elem = ET.SubElement(root, "events_library")
+    for event in novel.events_library.values():
+        event_to_xml(events_elem, event)
+    chapters_elem = ET.SubElement(root, "chapters")
+    for chapter in novel.chapters:
+        chapter_to_xml(chapters_elem, chapter)
+    summaries_to_xml(root, novel)
+    timeline_elem = ET.SubElement(root, "timeline")
+    for item in novel.timeline:
+        timeline_item_to_xml(timeline_elem, item)
+    return minidom.parseString(ET.tostring(root, encoding="utf-8")).toprettyxml(indent="  ")
+
+def time_and_peak(save: Callable[[], None]) -> Tuple[float, int]:
+    """分别测量耗时（不跟踪内存）和峰值内存(字节)"""
+    gc.collect()
+    start = time.perf_counter()
+    save()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    try:
+        save()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+def run_save_benchmark(argv: List[str]) -> int:
+    """执行benchmark-save子命令，返回退出码（往返不一致时为1）"""
+    args = build_save_arg_parser().parse_args(argv)
+    novel = build_save_novel(args)
+    
+    fd, path = tempfile.mkstemp(suffix=".xml")
+    os.close(fd)
+    try:
+        def save_streaming():
+            with open(path, "w", encoding="utf-8") as f:
+                write_novel_xml(novel, f)
+        
+        def save_legacy():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(legacy_novel_to_xml(novel))
+        
+        results = []
+        if not args.skip_legacy:
+            results.append(("minidom", time_and_peak(save_legacy), os.path.getsize(path)))
+            with open(path, "r", encoding="utf-8") as f:
+                legacy_loaded = xml_to_novel(f.read())
+        results.append(("流式写出", time_and_peak(save_streaming), os.path.getsize(path)))
+        with open(path, "r", encoding="utf-8") as f:
+            streamed = f.read()
+    finally:
+        os.remove(path)
+    
+    print(f"合成小说: {args.characters}个角色, {args.events}个事件, {args.chapters}章, 每章约{args.chapter_chars}字")
+    for name, (elapsed, peak), size in results:
+        print(f"{name}: 文件{size / 2 ** 20:7.1f} MB, 耗时{elapsed:7.2f} 秒, 峰值内存{peak / 2 ** 20:8.1f} MB")
+    if len(results) == 2:
+        print(f"加速: {results[0][1][0] / results[1][1][0]:.1f}倍, "
+              f"峰值内存为原来的{results[1][1][1] / results[0][1][1]:.1%}")
+    
+    # 往返校验：流式存档（及原格式存档）加载后再写出应与流式存档完全相同
+    loaded = [xml_to_novel(streamed)] + ([] if args.skip_legacy else [legacy_loaded])
+    if any(item is None or novel_to_xml(item) != streamed for item in loaded):
+        print("往返校验失败: 加载后重新写出的XML与原存档不一致")
+        return 1
+    print("往返校验通过: 加载后重新写出的XML与原存档一致")
+    return 0
\ No newline at end of file
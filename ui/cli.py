@@ -2,19 +2,32 @@
 
 import os
 import sys
+import time
 from typing import Dict, Any, List, Optional
 from core.models import Novel, Character, Event, Chapter
 from core.llm_interface import LLMInterface
+from core.llm_cache import LLMCache
 from core.event_engine import EventEngine
 from core.narrative_generator import NarrativeGenerator
+from core.summarizer import Summarizer
 from middleware.character_manager import CharacterManager
 from middleware.event_manager import EventManager
 from middleware.outline_manager import OutlineManager
 from middleware.chapter_manager import ChapterManager
 from middleware.context_manager import ContextManager
-from utils.file_utils import save_novel_to_xml, load_novel_from_xml, export_to_text, list_saved_novels
+from utils.file_utils import (save_novel_to_xml, load_novel_from_xml, export_to_text, list_saved_novels,
+                              export_relationship_history)
+from utils.novel_db import is_database_path
+from utils.autosave import AutosaveWorker
+from utils.save_catalog import SORT_KEYS
 from utils.logger import Logger
 
+# 加载菜单每页显示的存档数
+LOAD_PAGE_SIZE = 20
+
+# 存档排序字段的显示名称
+SORT_NAMES = {"last_modified": "最后修改时间", "title": "标题", "chapters": "章节数", "filename": "文件名"}
+
 class CLI:
     """命令行界面"""
     
@@ -24,7 +37,8 @@ class CLI:
         
         # 初始化LLM接口
         try:
-            self.llm = LLMInterface()
+            # 缓存只在重复的确定性请求（如摘要）间复用；用户主动发起的生成和重新生成都跳过缓存读取
+            self.llm = LLMInterface(cache=LLMCache())
         except ValueError as e:
             self.logger.error(f"初始化LLM接口失败: {e}")
             print("错误: 请确保设置了OPENAI_API_KEY环境变量")
@@ -32,7 +46,7 @@ class CLI:
         
         # 初始化其他组件
         self.event_engine = EventEngine()
-        self.narrative_generator = NarrativeGenerator(self.llm)
+        self.narrative_generator = NarrativeGenerator(self.llm, Summarizer(self.llm))
         
         # 初始化中间件
         self.character_manager = CharacterManager(self.llm)
@@ -43,6 +57,10 @@ class CLI:
         
         # 当前小说
         self.current_novel = None
+        self.current_path = None  # 当前小说的存档路径（关系历史归档与之对应）
+        
+        # 自动保存（生成章节后立即保存，其余修改按间隔保存）
+        self.autosave = AutosaveWorker()
         
         # 保存目录
         self.save_dir = "saves"
@@ -59,6 +77,7 @@ class CLI:
         print("欢迎使用小说生成系统")
         
         while True:
+            self._autosave()
             self._show_main_menu()
             choice = input("请输入选项: ").strip()
             
@@ -97,11 +116,39 @@ class CLI:
             elif choice == "10":
                 self._settings_menu()
             elif choice == "0":
+                self.autosave.wait()
+                if (self.current_novel is not None and self.current_novel.journal.dirty and
+                        input("当前小说有未保存的修改，确定退出? (y/n): ").strip().lower() != 'y'):
+                    continue
+                self.autosave.close()
                 print("感谢使用，再见！")
                 break
             else:
                 print("无效选项，请重新选择")
     
+    def _autosave(self, immediate: bool = False):
+        """自动保存当前小说（immediate为False时只在超过间隔后保存）
+        
+        尚未保存过的小说保存到存档目录中以标题命名的文件，同名文件已存在时文件名附加小说ID。
+        """
+        if self.current_novel is None:
+            return
+        
+        path = self.current_path
+        if path is None:
+            filename = "".join(c for c in self.current_novel.title if c.isalnum() or c in " _-") or "novel"
+            path = os.path.join(self.save_dir, f"{filename}.xml")
+            if os.path.exists(path):
+                path = os.path.join(self.save_dir, f"{filename}-{self.current_novel.id}.xml")
+        
+        if immediate:
+            started = self.autosave.request(self.current_novel, path)
+        else:
+            started = self.autosave.tick(self.current_novel, path)
+        if started and self.current_path is None:
+            self.current_path = path
+            print(f"已自动保存到: {path}")
+    
     def _check_novel(self):
         """检查当前是否有小说"""
         if self.current_novel is None:
@@ -116,7 +163,8 @@ class CLI:
         print("="*50)
         
         if self.current_novel:
-            print(f"当前小说: 《{self.current_novel.title}》({self.current_novel.genre}) - {len(self.current_novel.chapters)}章")
+            unsaved = " (有未保存的修改)" if self.current_novel.journal.dirty else ""
+            print(f"当前小说: 《{self.current_novel.title}》({self.current_novel.genre}) - {len(self.current_novel.chapters)}章{unsaved}")
         
         print("\n1. 创建新小说")
         print("2. 加载小说")
@@ -155,9 +203,17 @@ class CLI:
             print("背景设定不能为空")
             return
         
-        self.current_novel = Novel.create(title, genre, setting)
-        self.logger.info(f"创建了新小说: {title}")
-        print(f"\n已创建新小说: 《{title}》")
+        seed = input("随机种子(整数，留空则随机): ").strip()
+        try:
+            seed = int(seed) if seed else None
+        except ValueError:
+            print("随机种子必须是整数")
+            return
+        
+        self.current_novel = Novel.create(title, genre, setting, seed)
+        self.current_path = None
+        self.logger.info(f"创建了新小说: {title}（随机种子: {self.current_novel.seed}）")
+        print(f"\n已创建新小说: 《{title}》（随机种子: {self.current_novel.seed}）")
         
         # 询问是否生成角色
         if input("\n是否立即生成角色? (y/n): ").strip().lower() == 'y':
@@ -173,39 +229,75 @@ class CLI:
         print("加载小说")
         print("="*50)
         
-        saved_novels = list_saved_novels(self.save_dir)
-        
-        if not saved_novels:
-            print("没有找到保存的小说")
-            return
-        
-        print("\n可用的小说文件:")
-        for i, novel_info in enumerate(saved_novels, 1):
-            print(f"{i}. {novel_info['title']} - {novel_info['genre']} ({novel_info['chapters']}章)")
-        
-        print("0. 返回")
-        
-        choice = input("\n请选择要加载的小说: ").strip()
-        if choice == "0":
-            return
-        
-        try:
-            index = int(choice) - 1
-            if 0 <= index < len(saved_novels):
-                filename = saved_novels[index]["filename"]
-                path = os.path.join(self.save_dir, filename)
-                
-                novel = load_novel_from_xml(path)
-                if novel:
-                    self.current_novel = novel
-                    self.logger.info(f"加载了小说: {novel.title}")
-                    print(f"已加载小说: 《{novel.title}》")
-                else:
-                    print("加载小说失败")
-            else:
+        page, sort_by, query = 0, "last_modified", None
+        while True:
+            # 多取一项判断是否还有下一页
+            saved_novels = list_saved_novels(self.save_dir, sort_by=sort_by, query=query,
+                                             offset=page * LOAD_PAGE_SIZE, limit=LOAD_PAGE_SIZE + 1)
+            has_next = len(saved_novels) > LOAD_PAGE_SIZE
+            saved_novels = saved_novels[:LOAD_PAGE_SIZE]
+            
+            if not saved_novels and page == 0 and not query:
+                print("没有找到保存的小说")
+                return
+            
+            filter_text = f"，筛选: {query}" if query else ""
+            print(f"\n可用的小说文件（第{page + 1}页，按{SORT_NAMES[sort_by]}排序{filter_text}）:")
+            for i, novel_info in enumerate(saved_novels, 1):
+                print(f"{i}. {novel_info['title']} - {novel_info['genre']} ({novel_info['chapters']}章) "
+                      f"最后修改: {novel_info['last_modified'][:19]}")
+            if not saved_novels:
+                print("没有符合条件的小说")
+            
+            if has_next:
+                print("n. 下一页")
+            if page > 0:
+                print("p. 上一页")
+            print("s. 切换排序")
+            print("f. 筛选（标题、类型或文件名）")
+            print("0. 返回")
+            
+            choice = input("\n请选择要加载的小说: ").strip().lower()
+            if choice == "0":
+                return
+            if choice == "n" and has_next:
+                page += 1
+                continue
+            if choice == "p" and page > 0:
+                page -= 1
+                continue
+            if choice == "s":
+                sort_by = SORT_KEYS[(SORT_KEYS.index(sort_by) + 1) % len(SORT_KEYS)]
+                page = 0
+                continue
+            if choice == "f":
+                query = input("请输入筛选关键词（留空取消筛选）: ").strip() or None
+                page = 0
+                continue
+            
+            try:
+                index = int(choice) - 1
+            except ValueError:
+                print("请输入有效的数字")
+                continue
+            if not 0 <= index < len(saved_novels):
                 print("无效选项")
-        except ValueError:
-            print("请输入有效的数字")
+                continue
+            
+            filename = saved_novels[index]["filename"]
+            path = os.path.join(self.save_dir, filename)
+            
+            # 等待自动保存写完，避免读到旧的存档
+            self.autosave.wait()
+            novel = load_novel_from_xml(path)
+            if novel:
+                self.current_novel = novel
+                self.current_path = path
+                self.logger.info(f"加载了小说: {novel.title}")
+                print(f"已加载小说: 《{novel.title}》")
+            else:
+                print("加载小说失败")
+            return
     
     def _manage_characters_menu(self):
         """管理角色菜单"""
@@ -293,6 +385,14 @@ class CLI:
                         target_name = self.current_novel.characters[rel.target_id].name
                         print(f"- 与{target_name}: {rel.relationship_type} (强度: {rel.strength:.2f})")
                 
+                print("\n出场章节:")
+                chapters = self.chapter_manager.get_chapters_with_character(self.current_novel, char.id)
+                if chapters:
+                    for chapter in chapters:
+                        print(f"- 第{chapter.number}章: {chapter.title}")
+                else:
+                    print("(无)")
+                
                 print("\n备注:")
                 print(char.notes or "(无)")
                 
@@ -376,15 +476,20 @@ class CLI:
         
         print("\n生成角色中...")
         
-        for i in range(num_chars):
-            try:
-                character = self.character_manager.generate_character(self.current_novel)
+        try:
+            # 并发请求，受LLM执行器的并发上限约束；用户主动生成，每次都需要新的结果，跳过缓存读取
+            characters = self.character_manager.generate_characters(self.current_novel, num_chars, use_cache=False)
+            for character in characters:
                 print(f"已生成角色: {character.name}")
-            except Exception as e:
-                self.logger.error(f"生成角色失败: {e}")
-                print(f"生成第{i+1}个角色时出错，跳过")
+            
+            if len(characters) < num_chars:
+                print(f"有{num_chars - len(characters)}个角色生成失败，已跳过")
+        except Exception as e:
+            self.logger.error(f"生成角色失败: {e}")
+            print(f"生成角色时出错: {e}")
+            return
         
-        self.logger.info(f"生成了{num_chars}个角色")
+        self.logger.info(f"生成了{len(characters)}个角色")
         print(f"\n成功生成角色")
     
     def _edit_character(self, characters: List[Character]):
@@ -658,6 +763,14 @@ class CLI:
                 else:
                     print("(无叙事模板)")
                 
+                print("\n出现章节:")
+                chapters = self.chapter_manager.get_chapters_with_event(self.current_novel, event.id)
+                if chapters:
+                    for chapter in chapters:
+                        print(f"- 第{chapter.number}章: {chapter.title}")
+                else:
+                    print("(无)")
+                
                 print("\n备注:")
                 print(event.notes or "(无)")
                 
@@ -749,7 +862,7 @@ class CLI:
         print("\n生成事件中...")
         
         try:
-            events = self.event_manager.generate_events(self.current_novel, num_events)
+            events = self.event_manager.generate_events(self.current_novel, num_events, use_cache=False)
             
             for event in events:
                 print(f"已生成事件: {event.name}")
@@ -1031,7 +1144,7 @@ class CLI:
         print("\n生成大纲中...")
         
         try:
-            outline = self.outline_manager.generate_outline(self.current_novel)
+            outline = self.outline_manager.generate_outline(self.current_novel, use_cache=False)
             
             self.logger.info("生成了大纲")
             print("\n大纲生成完成!")
@@ -1152,7 +1265,7 @@ class CLI:
                         arc.key_events.append(event)
                         print(f"已添加关键事件: {event}")
                 
-                self.current_novel.update_modified()
+                self.current_novel.record_change("outline", "update", self.current_novel.outline.id, ("arcs",))
                 self.logger.info(f"编辑了情节弧: {arc.name}")
                 print(f"\n已更新情节弧: {arc.name}")
             else:
@@ -1210,6 +1323,7 @@ class CLI:
             print("4. 编辑章节")
             print("5. 删除章节")
             print("6. 重新生成章节")
+            print("7. 搜索章节")
             print("0. 返回")
             
             choice = input("\n请输入选项: ").strip()
@@ -1226,11 +1340,32 @@ class CLI:
                 self._delete_chapter(chapters)
             elif choice == "6":
                 self._regenerate_chapter(chapters)
+            elif choice == "7":
+                self._search_chapters()
             elif choice == "0":
                 break
             else:
                 print("无效选项，请重新选择")
     
+    def _search_chapters(self):
+        """全文搜索章节"""
+        query = input("\n搜索内容(短语可用引号括起): ").strip()
+        if not query:
+            return
+        
+        results = self.chapter_manager.search_chapter_matches(self.current_novel, query, limit=20)
+        if not results:
+            print("没有找到匹配的章节")
+            return
+        
+        field_names = {"title": "标题", "summary": "摘要", "content": "正文"}
+        print(f"\n找到{len(results)}个匹配的章节:")
+        for result in results:
+            chapter = result["chapter"]
+            print(f"\n第{chapter.number}章: {chapter.title} (匹配{len(result['matches'])}处)")
+            for match in result["matches"][:3]:
+                print(f"  [{field_names[match['field']]} {match['start']}] {match['snippet']}")
+    
     def _view_chapter_content(self, chapters: List[Chapter]):
         """查看章节内容"""
         if not chapters:
@@ -1311,11 +1446,14 @@ class CLI:
                 break
             full_content.append(content)
         
-        chapter.content = "\n".join(full_content)
-        
         # 设置章节摘要
         summary = input("\n章节摘要: ").strip()
-        chapter.summary = summary
+        
+        # 经由章节管理器更新，保持时间线和检索索引同步
+        self.chapter_manager.update_chapter(self.current_novel, chapter.number, {
+            "content": "\n".join(full_content),
+            "summary": summary
+        })
         
         # 选择焦点角色
         self._select_focus_characters_for_chapter(chapter)
@@ -1326,15 +1464,35 @@ class CLI:
         self.logger.info(f"手动创建了章节: {chapter.title}")
         print(f"\n已完成第{chapter.number}章的创建")
     
+    def _stream_callbacks(self):
+        """构建流式生成的回调：标题闭合时显示标题，正文逐段打印"""
+        start_time = time.perf_counter()
+        state = {"first_text": None}
+        
+        def on_field(field: str, value: str):
+            if field == "title":
+                print(f"\n【{value.strip()}】\n")
+        
+        def on_content(text: str):
+            if state["first_text"] is None:
+                state["first_text"] = time.perf_counter() - start_time
+                self.logger.info(f"首段正文延迟: {state['first_text']:.2f}秒")
+            print(text, end="", flush=True)
+        
+        return on_content, on_field
+    
     def _generate_chapter(self):
         """生成新章节"""
         print("\n生成新章节中...")
         
         try:
-            chapter = self.chapter_manager.generate_chapter(self.current_novel)
+            on_content, on_field = self._stream_callbacks()
+            chapter = self.chapter_manager.generate_chapter(self.current_novel, use_cache=False,
+                                                            on_content=on_content, on_field=on_field)
             
             self.logger.info(f"生成了章节: {chapter.title}")
-            print(f"\n已生成第{chapter.number}章: {chapter.title}")
+            print(f"\n\n已生成第{chapter.number}章: {chapter.title}")
+            self._autosave(immediate=True)
         except Exception as e:
             self.logger.error(f"生成章节失败: {e}")
             print(f"生成章节时出错: {e}")
@@ -1479,10 +1637,15 @@ class CLI:
                     
                     # 生成新章节
                     try:
-                        new_chapter = self.chapter_manager.generate_chapter(self.current_novel)
+                        # 重新生成需要新的内容，跳过缓存
+                        on_content, on_field = self._stream_callbacks()
+                        new_chapter = self.chapter_manager.generate_chapter(self.current_novel, use_cache=False,
+                                                                            on_content=on_content,
+                                                                            on_field=on_field)
                         
                         self.logger.info(f"重新生成了章节: {new_chapter.title}")
-                        print(f"\n已重新生成第{new_chapter.number}章: {new_chapter.title}")
+                        print(f"\n\n已重新生成第{new_chapter.number}章: {new_chapter.title}")
+                        self._autosave(immediate=True)
                     except Exception as e:
                         self.logger.error(f"重新生成章节失败: {e}")
                         print(f"重新生成章节时出错: {e}")
@@ -1518,7 +1681,8 @@ class CLI:
                     focus_char_ids.append(characters[index].id)
             
             # 更新焦点角色
-            chapter.character_focus = focus_char_ids
+            self.chapter_manager.update_chapter(self.current_novel, chapter.number,
+                                                {"character_focus": focus_char_ids})
             
             # 更新角色名单
             focus_chars = [self.current_novel.characters[char_id].name 
@@ -1554,7 +1718,7 @@ class CLI:
                     event_ids.append(events[index].id)
             
             # 更新事件
-            chapter.events = event_ids
+            self.chapter_manager.update_chapter(self.current_novel, chapter.number, {"events": event_ids})
             
             # 更新事件名单
             event_names = [self.current_novel.events_library[event_id].name 
@@ -1738,8 +1902,9 @@ class CLI:
         # 移除不合法字符
         filename = "".join(c for c in filename if c.isalnum() or c in " _-")
         
-        # 保存路径
-        path = os.path.join(self.save_dir, f"{filename}.xml")
+        # 保存路径：当前小说来自SQLite数据库时仍保存到数据库
+        suffix = ".db" if self.current_path and is_database_path(self.current_path) else ".xml"
+        path = os.path.join(self.save_dir, f"{filename}{suffix}")
         
         # 检查文件是否存在
         if os.path.exists(path):
@@ -1748,8 +1913,10 @@ class CLI:
                 print("保存已取消")
                 return
         
-        # 保存小说
-        if save_novel_to_xml(self.current_novel, path):
+        # 保存小说（先等待自动保存写完，避免其覆盖本次保存）
+        self.autosave.wait()
+        if save_novel_to_xml(self.current_novel, path, backups=self.autosave.backups):
+            self.current_path = path
             self.logger.info(f"保存了小说: {self.current_novel.title} 到 {path}")
             print(f"小说已保存到: {path}")
         else:
@@ -1770,8 +1937,15 @@ class CLI:
         # 移除不合法字符
         filename = "".join(c for c in filename if c.isalnum() or c in " _-")
         
+        print("\n1. 可阅读文本")
+        print("2. 完整关系历史(JSON Lines)")
+        export_format = input("请选择导出格式 [默认: 1]: ").strip() or "1"
+        if export_format not in ("1", "2"):
+            print("无效选项")
+            return
+        
         # 导出路径
-        path = os.path.join(self.export_dir, f"{filename}.txt")
+        path = os.path.join(self.export_dir, f"{filename}.txt" if export_format == "1" else f"{filename}.history.jsonl")
         
         # 检查文件是否存在
         if os.path.exists(path):
@@ -1781,7 +1955,12 @@ class CLI:
                 return
         
         # 导出小说
-        if export_to_text(self.current_novel, path):
+        if export_format == "1":
+            exported = export_to_text(self.current_novel, path)
+        else:
+            exported = export_relationship_history(self.current_novel, self.current_path, path)
+        
+        if exported:
             self.logger.info(f"导出了小说: {self.current_novel.title} 到 {path}")
             print(f"小说已导出到: {path}")
         else:
@@ -1796,9 +1975,18 @@ class CLI:
             print("="*50)
             
             print(f"\n当前LLM模型: {self.llm.model}")
+            print(f"最大并发请求数: {self.llm.executor.max_concurrency}")
+            if self.autosave.interval:
+                print(f"自动保存: 每{self.autosave.interval / 60:g}分钟, 保留{self.autosave.backups}个备份")
+            else:
+                print(f"自动保存: 仅在生成章节后, 保留{self.autosave.backups}个备份")
             
             print("\n1. 更改LLM模型")
             print("2. 查看可用模型")
+            print("3. 设置最大并发请求数")
+            print("4. 查看LLM缓存统计")
+            print("5. 清空LLM缓存")
+            print("6. 设置自动保存")
             print("0. 返回")
             
             choice = input("\n请输入选项: ").strip()
@@ -1807,6 +1995,14 @@ class CLI:
                 self._change_llm_model()
             elif choice == "2":
                 self._view_available_models()
+            elif choice == "3":
+                self._change_max_concurrency()
+            elif choice == "4":
+                self._view_cache_stats()
+            elif choice == "5":
+                self._clear_cache()
+            elif choice == "6":
+                self._change_autosave()
             elif choice == "0":
                 break
             else:
@@ -1833,6 +2029,59 @@ class CLI:
         else:
             print("未更改模型")
     
+    def _change_max_concurrency(self):
+        """设置最大并发请求数"""
+        try:
+            value = int(input(f"\n请输入最大并发请求数 [当前: {self.llm.executor.max_concurrency}]: ").strip())
+            self.llm.set_max_concurrency(value)
+            self.logger.info(f"设置最大并发请求数: {self.llm.executor.max_concurrency}")
+        except ValueError:
+            print("请输入有效的数字")
+    
+    def _change_autosave(self):
+        """设置自动保存间隔和备份数"""
+        try:
+            interval = input(f"\n请输入自动保存间隔(分钟，0为仅在生成章节后保存) "
+                             f"[当前: {(self.autosave.interval or 0) / 60:g}]: ").strip()
+            backups = input(f"请输入保留的备份数 [当前: {self.autosave.backups}]: ").strip()
+            interval = float(interval) * 60 if interval else self.autosave.interval
+            backups = int(backups) if backups else self.autosave.backups
+        except ValueError:
+            print("请输入有效的数字")
+            return
+        if (interval or 0) < 0 or backups < 0:
+            print("请输入非负数")
+            return
+        
+        self.autosave.interval = interval
+        self.autosave.backups = backups
+        self.logger.info(f"设置自动保存: 间隔{(interval or 0) / 60:g}分钟, 备份{backups}个")
+    
+    def _view_cache_stats(self):
+        """查看LLM缓存统计"""
+        if self.llm.cache is None:
+            print("\n未启用LLM缓存")
+            return
+        
+        stats = self.llm.cache.get_stats()
+        print("\n" + "="*50)
+        print("LLM缓存统计")
+        print("="*50)
+        print(f"条目数: {stats['entries']}")
+        print(f"占用空间: {stats['bytes'] / 1024:.1f} KB")
+        print(f"命中: {stats['hits']}, 未命中: {stats['misses']}, 命中率: {stats['hit_rate']:.1%}")
+    
+    def _clear_cache(self):
+        """清空LLM缓存"""
+        if self.llm.cache is None:
+            print("\n未启用LLM缓存")
+            return
+        
+        if input("\n确定要清空LLM缓存吗? (y/n): ").strip().lower() == 'y':
+            self.llm.cache.clear()
+            self.logger.info("清空了LLM缓存")
+            print("LLM缓存已清空")
+    
     def _view_available_models(self):
         """查看可用模型"""
         print("\n" + "="*50)
@@ -0,0 +1,72 @@
+# ui/database.py - 存储迁移与全文检索命令
+
+import os
+import argparse
+from typing import List
+from utils.file_utils import save_novel_to_xml, load_novel_from_xml
+from utils.novel_db import is_database_path
+from utils.logger import Logger
+
+def build_migrate_arg_parser() -> argparse.ArgumentParser:
+    """构建migrate子命令的参数解析器"""
+    parser = argparse.ArgumentParser(prog="main.py migrate",
+                                     description="在XML存档和SQLite数据库之间迁移小说（.db/.sqlite为数据库，其余为XML）")
+    parser.add_argument("source", help="源文件路径")
+    parser.add_argument("target", help="目标文件路径，数据库中已有同一小说时整体替换")
+    parser.add_argument("--novel-id", help="源为数据库时迁移的小说ID，默认为最近修改的一部")
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的XML目标文件")
+    return parser
+
+def run_migrate(argv: List[str]) -> int:
+    """执行migrate子命令，返回退出码"""
+    args = build_migrate_arg_parser().parse_args(argv)
+    logger = Logger()
+    
+    if os.path.exists(args.target) and not is_database_path(args.target) and not args.force:
+        logger.error(f"目标文件已存在: {args.target}（使用--force覆盖）")
+        return 1
+    
+    novel = load_novel_from_xml(args.source, novel_id=args.novel_id)
+    if novel is None:
+        logger.error(f"无法加载小说: {args.source}")
+        return 1
+    
+    # 迁出到XML时写入内嵌正文的普通存档，不沿用源存档的正文存储和增量日志设置
+    if not is_database_path(args.target):
+        novel.external_bodies = False
+        novel.incremental_save = False
+    if not save_novel_to_xml(novel, args.target):
+        logger.error(f"保存失败: {args.target}")
+        return 1
+    
+    logger.info(f"已迁移《{novel.title}》: {len(novel.characters)}个角色, {len(novel.events_library)}个事件, "
+                f"{len(novel.chapters)}章 -> {args.target}")
+    return 0
+
+def build_search_arg_parser() -> argparse.ArgumentParser:
+    """构建search子命令的参数解析器"""
+    parser = argparse.ArgumentParser(prog="main.py search", description="在SQLite数据库中全文检索章节标题和正文")
+    parser.add_argument("--novel", required=True, help="数据库路径(.db/.sqlite)")
+    parser.add_argument("--novel-id", help="小说ID，默认为最近修改的一部")
+    parser.add_argument("--limit", type=int, default=10, help="最多输出的章节数")
+    parser.add_argument("query", help="检索词，3个字及以上使用FTS5索引")
+    return parser
+
+def run_search(argv: List[str]) -> int:
+    """执行search子命令，返回退出码"""
+    args = build_search_arg_parser().parse_args(argv)
+    logger = Logger()
+    
+    if not is_database_path(args.novel):
+        logger.error("全文检索需要SQLite数据库，可先用migrate命令迁移XML存档")
+        return 1
+    novel = load_novel_from_xml(args.novel, bodies=False, novel_id=args.novel_id)
+    if novel is None:
+        logger.error(f"无法加载小说: {args.novel}")
+        return 1
+    
+    hits = novel.database.search(novel.id, args.query, args.limit)
+    for number, title, snippet in hits:
+        print(f"第{number}章《{title}》: {' '.join(snippet.split())}")
+    print(f"共{len(hits)}个结果")
+    return 0
\ No newline at end of file
@@ -0,0 +1,77 @@
+# ui/simulate.py - 离线故事模拟命令
+
+import json
+import time
+import argparse
+from typing import Any, Dict, List
+from core.simulator import StorySimulator
+from utils.file_utils import load_novel_from_xml
+from utils.logger import Logger
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """构建simulate子命令的参数解析器"""
+    parser = argparse.ArgumentParser(prog="main.py simulate", description="不调用LLM模拟事件库在多章中的表现")
+    parser.add_argument("--novel", required=True, nargs="+", help="小说XML文件路径，可指定多个事件库配置")
+    parser.add_argument("--chapters", type=int, default=50, help="每次运行推进的章节数")
+    parser.add_argument("--seeds", type=int, default=20, help="运行次数（每次使用不同的随机种子）")
+    parser.add_argument("--base-seed", type=int, default=0, help="第一个随机种子")
+    parser.add_argument("--workers", type=int, help="进程数，默认为CPU核数，1表示不使用进程池")
+    parser.add_argument("--event-scoring", choices=["simple", "vectorized"], default="simple",
+                        help="事件评分方式，vectorized需要numpy")
+    parser.add_argument("--top", type=int, default=10, help="输出使用最多的事件和焦点角色的数量")
+    parser.add_argument("--output", help="将完整报告写入JSON文件")
+    return parser
+
+def print_report(report: Dict[str, Any], top: int):
+    """输出报告摘要"""
+    print(f"\n《{report['title']}》: {report['runs']}次运行 x {report['chapters']}章")
+    
+    strength = report["relationship_strength"]
+    if strength["count"]:
+        print(f"关系强度: 均值{strength['mean']:.2f}, 标准差{strength['std']:.2f}, "
+              f"P10/P50/P90 = {strength['p10']:.2f}/{strength['p50']:.2f}/{strength['p90']:.2f}")
+        for label, count in strength["histogram"].items():
+            print(f"  {label}: {count}")
+    
+    print(f"事件使用: 未使用{report['unused_events']}/{len(report['event_usage'])}个, "
+          f"熵{report['event_usage_entropy']:.2f}比特")
+    for item in list(report["event_usage"].values())[:top]:
+        print(f"  {item['name']}: 平均{item['mean_uses']:.2f}次, {item['run_share']:.0%}的运行中出现")
+    
+    print("焦点角色:")
+    for item in list(report["character_focus"].values())[:top]:
+        print(f"  {item['name']}: 平均{item['mean_chapters']:.1f}章, 占比{item['share']:.0%}")
+
+def run_simulation(argv: List[str]) -> int:
+    """执行simulate子命令，返回退出码"""
+    args = build_arg_parser().parse_args(argv)
+    logger = Logger()
+    
+    novels = []
+    for path in args.novel:
+        # 模拟只用到角色、事件和章节结构，不加载正文
+        novel = load_novel_from_xml(path, bodies=False)
+        if novel is None:
+            logger.error(f"无法加载小说: {path}")
+            return 1
+        novels.append(novel)
+    
+    simulator = StorySimulator(args.chapters, args.seeds, args.workers, args.event_scoring, args.base_seed)
+    
+    start = time.perf_counter()
+    try:
+        reports = simulator.run_many(novels)
+    except ValueError as e:
+        logger.error(f"模拟失败: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    
+    for report in reports:
+        print_report(report, args.top)
+    logger.info(f"模拟完成: {len(novels)}个配置, 共{len(novels) * args.seeds}次运行, 耗时{elapsed:.2f}秒")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports if len(reports) > 1 else reports[0], f, ensure_ascii=False, indent=2)
+    
+    return 0
\ No newline at end of file
@@ -0,0 +1,156 @@
+# utils/autosave.py - 后台自动保存
+
+import os
+import copy
+import time
+import threading
+from dataclasses import fields
+from typing import Optional
+from core.models import Novel, Character, Relationship, Chapter
+from core.change_journal import ChangeJournal
+from core.body_store import store_chapter_bodies
+from utils.file_utils import save_novel_to_xml, write_save_file, flush_history_archive, history_archive_path_for
+from utils.novel_db import is_database_path
+
+# 默认自动保存间隔（秒）和保留的备份数
+AUTOSAVE_INTERVAL = 300
+AUTOSAVE_BACKUPS = 3
+
+# 快照中置空的运行时字段（写出存档不需要，且不能在线程间共享）
+RUNTIME_FIELDS = ("index", "trigger_index", "relationship_matrix", "character_graph", "references",
+                  "save_journal", "database")
+
+def snapshot_character(character: Character) -> Character:
+    """复制角色，关系（可能由关系矩阵提供）复制为普通的Relationship，历史记录不可变，直接共享"""
+    relationships = {target_id: Relationship(rel.target_id, rel.relationship_type, rel.strength, list(rel.history),
+                                             [dict(item) for item in rel.history_summary])
+                     for target_id, rel in character.relationships.items()}
+    values = {f.name: getattr(character, f.name) for f in fields(Character) if f.name != "relationships"}
+    return Character(relationships=relationships, **copy.deepcopy(values))
+
+def snapshot_chapter(chapter: Chapter) -> Chapter:
+    """复制章节，尚未加载的正文只复制引用"""
+    values = {f.name: getattr(chapter, f.name) for f in fields(Chapter) if f.name != "content"}
+    return Chapter(content=Chapter.content.raw(chapter), **copy.deepcopy(values))
+
+def snapshot_novel(novel: Novel) -> Novel:
+    """复制写出存档所需的小说数据，之后对原小说的修改不影响快照
+    
+    文本、关系历史记录和正文引用在快照与原小说之间共享（不可变或只记录位置），其余可变对象全部复制。
+    """
+    snapshot = copy.copy(novel)
+    for name in ("events_library", "timeline", "outline", "context", "summaries"):
+        setattr(snapshot, name, copy.deepcopy(getattr(novel, name)))
+    snapshot.characters = {char_id: snapshot_character(char) for char_id, char in novel.characters.items()}
+    snapshot.chapters = [snapshot_chapter(chapter) for chapter in novel.chapters]
+    for name in RUNTIME_FIELDS:
+        setattr(snapshot, name, None)
+    snapshot.history_archive = []
+    snapshot.journal = ChangeJournal()
+    return snapshot
+
+class AutosaveWorker:
+    """自动保存 - 在调用线程（界面线程）取快照，在后台线程写入临时文件、落盘并原子替换
+    
+    生成章节后调用request立即保存，主循环中调用tick按间隔保存；写入尚未开始时，较新的快照替换较旧的。
+    数据库和增量存档只写入变化的部分，耗时取决于修改量，直接在调用线程保存。
+    """
+    
+    def __init__(self, interval: Optional[float] = AUTOSAVE_INTERVAL, backups: int = AUTOSAVE_BACKUPS):
+        self.interval = interval  # None或0表示不按间隔保存
+        self.backups = backups
+        self.condition = threading.Condition()
+        self.pending = None  # 待写入的(快照, 路径, 变更日志, 快照时的序号, 待删除的旧正文存储)
+        self.writing = False
+        self.closed = False
+        self.last_request = time.monotonic()
+        self.saves = 0  # 成功保存的次数
+        self.error: Optional[Exception] = None  # 最近一次失败的原因，成功保存后清除
+        self.thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self.thread.start()
+    
+    def request(self, novel: Novel, path: str) -> bool:
+        """保存小说到path，返回是否发起了保存（没有未保存的修改时不保存）"""
+        if not novel.journal.dirty or novel.structure_only:
+            return False
+        self.last_request = time.monotonic()
+        
+        if is_database_path(path) or novel.incremental_save:
+            # 等待之前的后台写入，避免其覆盖本次保存
+            self.wait()
+            if save_novel_to_xml(novel, path, backups=self.backups):
+                self.saves += 1
+                self.error = None
+                return True
+            return False
+        
+        # 归档和正文存储只追加，在调用线程写入；存档引用新一代正文存储后才删除旧存储
+        retired = []
+        try:
+            flush_history_archive(novel, history_archive_path_for(path))
+            if novel.external_bodies:
+                store = store_chapter_bodies(novel, path)
+                retired = list(store.retired)
+                store.retired.clear()
+        except Exception as e:
+            self.error = e
+            print(f"自动保存失败: {e}")
+            return False
+        
+        snapshot = snapshot_novel(novel)
+        with self.condition:
+            if self.pending is not None:
+                retired = self.pending[4] + retired
+            self.pending = (snapshot, path, novel.journal, novel.journal.seq, retired)
+            self.condition.notify_all()
+        return True
+    
+    def tick(self, novel: Novel, path: str) -> bool:
+        """距上次保存超过间隔时保存，返回是否发起了保存"""
+        if not self.interval or time.monotonic() - self.last_request < self.interval:
+            return False
+        return self.request(novel, path)
+    
+    def wait(self):
+        """等待已发起的保存写完"""
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait()
+    
+    def close(self):
+        """写完已发起的保存后停止后台线程"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+    
+    def _run(self):
+        """后台线程：依次写出快照"""
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.pending is None:
+                    return
+                snapshot, path, journal, seq, retired = self.pending
+                self.pending = None
+                self.writing = True
+            
+            try:
+                write_save_file(snapshot, path, self.backups)
+                for old in retired:
+                    if os.path.exists(old):
+                        os.remove(old)
+                journal.mark_saved(seq)
+                self.saves += 1
+                self.error = None
+            except Exception as e:
+                # 旧正文存储仍被磁盘上的存档引用，留待下次保存成功后删除
+                if snapshot.body_store is not None:
+                    snapshot.body_store.retired.extend(retired)
+                self.error = e
+                print(f"自动保存失败: {e}")
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
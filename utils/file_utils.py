@@ -2,33 +2,203 @@
 
 import os
 import json
+import shutil
 from typing import Optional, Dict, Any, List
 from core.models import Novel
-from utils.xml_utils import novel_to_xml, xml_to_novel
+from core.chapter_index import ChapterIndex
+from core.body_store import store_chapter_bodies, remove_retired_bodies
+from utils.xml_utils import write_novel_xml, read_novel_xml
+from utils.save_journal import SaveJournal, get_save_journal, open_save_journal
+from utils.novel_db import is_database_path, save_novel_to_db, load_novel_from_db
+from utils.save_catalog import SaveCatalog
 
-def save_novel_to_xml(novel: Novel, path: str) -> bool:
-    """保存小说到XML文件"""
+def index_path_for(path: str) -> str:
+    """小说文件对应的检索索引文件路径"""
+    return f"{path}.idx"
+
+def history_archive_path_for(path: str) -> str:
+    """小说文件对应的关系历史归档文件路径"""
+    return f"{path}.history"
+
+def copy_history_archive(source: str, path: str, count: int):
+    """将source中序号小于count的归档记录复制到path（覆盖path原有内容）"""
+    tmp_path = f"{path}.tmp"
+    with open(source, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+        for line in src:
+            if line.strip() and json.loads(line)["n"] < count:
+                dst.write(line if line.endswith("\n") else line + "\n")
+    os.replace(tmp_path, path)
+
+def flush_history_archive(novel: Novel, path: str):
+    """将已压缩的关系历史追加写入归档文件（JSON Lines，每条带递增序号n）
+    
+    归档文件与小说加载或上次保存时的不同（另存为）时，先复制原归档中已归档的记录，新归档包含完整历史。
+    """
+    source = novel.history_archive_path
+    if (novel.history_archived and source and os.path.abspath(source) != os.path.abspath(path)
+            and os.path.exists(source)):
+        copy_history_archive(source, path, novel.history_archived)
+    novel.history_archive_path = path
+    
+    if not novel.history_archive:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        for i, entry in enumerate(novel.history_archive):
+            f.write(json.dumps(dict(entry, n=novel.history_archived + i), ensure_ascii=False) + "\n")
+    novel.history_archived += len(novel.history_archive)
+    novel.history_archive.clear()
+
+def backup_path_for(path: str, n: int) -> str:
+    """存档的第n个备份路径（1为最近一次）"""
+    return f"{path}.bak.{n}"
+
+def rotate_backups(path: str, backups: int):
+    """轮换备份：依次后移已有备份，当前存档成为第1个备份，超出个数的最旧备份被覆盖"""
+    if backups <= 0 or not os.path.exists(path):
+        return
+    for n in range(backups - 1, 0, -1):
+        if os.path.exists(backup_path_for(path, n)):
+            os.replace(backup_path_for(path, n), backup_path_for(path, n + 1))
+    
+    # 硬链接保留旧文件内容，替换存档前后原路径始终存在；文件系统不支持时复制
+    first = backup_path_for(path, 1)
+    if os.path.exists(first):
+        os.remove(first)
+    try:
+        os.link(path, first)
+    except OSError:
+        shutil.copy2(path, first)
+
+def fsync_directory(path: str):
+    """同步文件所在目录，使重命名落盘（不支持打开目录的平台上跳过）"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def write_save_file(novel: Novel, path: str, backups: int = 0):
+    """写入完整存档：流式写入临时文件并落盘，轮换备份后原子替换，写出中途崩溃不会损坏已有存档"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write_novel_xml(novel, f, inline_bodies=not novel.external_bodies)
+        f.flush()
+        os.fsync(f.fileno())
+    rotate_backups(path, backups)
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+
+def save_novel_to_xml(novel: Novel, path: str, archive_path: Optional[str] = None,
+                      base_path: Optional[str] = None, backups: int = 0) -> bool:
+    """保存小说到XML文件，同时保存检索索引；已压缩的关系历史先追加到归档文件（默认与小说文件同名）
+    
+    path以.db或.sqlite结尾时保存到SQLite数据库（见utils.novel_db），只写入变化的行。
+    
+    小说启用了单独的正文存储时，正文写入base_path（默认即path）对应的正文存储文件。
+    path是之后才替换到base_path的临时文件时，替换后需调用remove_retired_bodies删除旧存储。
+    启用增量存档时，变更追加到日志（见utils.save_journal）。
+    完整存档流式写入临时文件后再替换（见write_save_file），写出中途失败不会损坏已有存档；
+    backups大于0时保留最近backups份被替换的完整存档（<path>.bak.1为最近一份）。
+    """
+    if novel.structure_only:
+        print("保存XML文件失败: 小说加载时跳过了章节正文，保存会丢失正文")
+        return False
+    
     try:
-        xml_data = novel_to_xml(novel)
+        # 归档和正文在存档之前写入：中途失败时归档中可能多出序号不小于存档记录数的条目，导出时会被忽略；
+        # 正文存储只追加，旧存档引用的正文不受影响
+        flush_history_archive(novel, archive_path or history_archive_path_for(path))
         
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(xml_data)
+        if is_database_path(path):
+            chapters_written = save_novel_to_db(novel, path)
+            novel.journal.mark_saved()
+            if novel.index is not None and (chapters_written or not os.path.exists(index_path_for(path))):
+                novel.index.save(index_path_for(path))
+            return True
+        
+        if novel.external_bodies:
+            store_chapter_bodies(novel, base_path or path)
+        
+        # 增量存档：只追加变更，完整存档和检索索引不变（加载时按指纹同步索引）
+        writer = get_save_journal(novel, base_path or path) if novel.incremental_save else None
+        if writer is not None and writer.append(novel):
+            if base_path is None:
+                remove_retired_bodies(novel)
+            novel.journal.mark_saved()
+            return True
+        
+        write_save_file(novel, path, backups)
+        
+        if novel.incremental_save:
+            # 完整存档已包含此前的全部批次，之后从空日志开始
+            writer = writer or SaveJournal(base_path or path)
+            writer.reset(novel)
+            novel.save_journal = writer
+        
+        if base_path is None:
+            remove_retired_bodies(novel)
+        novel.journal.mark_saved()
+        
+        if novel.index is not None:
+            novel.index.save(index_path_for(path))
             
         return True
     except Exception as e:
         print(f"保存XML文件失败: {e}")
         return False
 
-def load_novel_from_xml(path: str) -> Optional[Novel]:
-    """从XML文件加载小说"""
+def load_novel_from_xml(path: str, bodies: bool = True, novel_id: Optional[str] = None) -> Optional[Novel]:
+    """从XML文件流式加载小说，重放增量存档日志，存在检索索引时一并加载
+    
+    bodies为False时只加载元数据和结构（见read_novel_xml），不加载检索索引。
+    path为SQLite数据库时读取novel_id指定的小说，默认为最近修改的一部。
+    """
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            xml_data = f.read()
-            
-        return xml_to_novel(xml_data)
+        if is_database_path(path):
+            novel = load_novel_from_db(path, novel_id, bodies)
+        else:
+            with open(path, "rb") as f:
+                novel = read_novel_xml(f, path, bodies)
     except Exception as e:
         print(f"加载XML文件失败: {e}")
         return None
+    
+    if novel is not None:
+        novel.history_archive_path = history_archive_path_for(path)
+        if novel.incremental_save:
+            try:
+                open_save_journal(novel, path)
+            except Exception as e:
+                print(f"重放增量存档日志失败: {e}")
+                return None
+        if bodies:
+            novel.index = load_chapter_index(novel, index_path_for(path))
+        # 旧存档或调小保留条数后，超出部分在下次保存时归档
+        novel.compact_history()
+    return novel
+
+def load_chapter_index(novel: Novel, path: str) -> Optional[ChapterIndex]:
+    """加载检索索引并与章节同步，索引缺失或损坏时返回None（首次检索时重建）"""
+    if not os.path.exists(path):
+        return None
+    
+    try:
+        index = ChapterIndex.load(path)
+    except Exception as e:
+        print(f"加载检索索引失败: {e}")
+        return None
+    
+    if index is None or index.novel_id != novel.id:
+        return None
+    
+    # 索引保存后章节可能被外部修改，只重新索引指纹不一致的章节
+    index.sync(novel)
+    return index
 
 def export_to_text(novel: Novel, path: str) -> bool:
     """导出小说为可阅读的文本文件"""
@@ -55,29 +225,51 @@ def export_to_text(novel: Novel, path: str) -> bool:
         print(f"导出文本文件失败: {e}")
         return False
 
-def list_saved_novels(directory: str = "saves") -> List[Dict[str, Any]]:
-    """列出保存的小说文件"""
-    result = []
+def export_relationship_history(novel: Novel, path: Optional[str], output_path: str) -> bool:
+    """导出完整的关系历史（JSON Lines）：归档文件中的记录、待归档的记录和当前保留的记录，按关系分组、按时间顺序"""
+    try:
+        pairs: Dict[tuple, List[Dict[str, Any]]] = {}
+        
+        # 序号不小于存档记录数的条目来自未成功保存的运行，这些记录仍在存档中
+        archived: Dict[int, Dict[str, Any]] = {}
+        archive_path = history_archive_path_for(path) if path else None
+        if archive_path and os.path.exists(archive_path):
+            with open(archive_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry["n"] < novel.history_archived:
+                            archived[entry["n"]] = entry
+        
+        for entry in [archived[n] for n in sorted(archived)] + novel.history_archive:
+            entry = {key: value for key, value in entry.items() if key != "n"}
+            pairs.setdefault((entry["source"], entry["target"]), []).append(entry)
+        for char in novel.characters.values():
+            for rel in char.relationships.values():
+                pairs.setdefault((char.id, rel.target_id), []).extend(
+                    dict(entry, source=char.id, target=rel.target_id) for entry in rel.history)
+        
+        with open(output_path, "w", encoding="utf-8") as f:
+            for entries in pairs.values():
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return True
+    except Exception as e:
+        print(f"导出关系历史失败: {e}")
+        return False
+
+def list_saved_novels(directory: str = "saves", sort_by: str = "last_modified", descending: Optional[bool] = None,
+                      query: Optional[str] = None, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """列出保存的小说文件：filename、title、genre、chapters、characters、events、last_modified、size
     
+    信息来自存档目录缓存（见utils.save_catalog），只重新读取变化了的文件；
+    sort_by为SORT_KEYS之一，query按标题、类型和文件名筛选，offset和limit用于分页。
+    """
     # 确保目录存在
     if not os.path.exists(directory):
         os.makedirs(directory)
     
-    for filename in os.listdir(directory):
-        if filename.endswith(".xml"):
-            path = os.path.join(directory, filename)
-            try:
-                novel = load_novel_from_xml(path)
-                if novel:
-                    result.append({
-                        "filename": filename,
-                        "title": novel.title,
-                        "genre": novel.genre,
-                        "chapters": len(novel.chapters),
-                        "last_modified": novel.last_modified
-                    })
-            except Exception:
-                # 读取失败的文件跳过
-                pass
-    
-    return result
\ No newline at end of file
+    catalog = SaveCatalog(directory)
+    catalog.refresh()
+    novels = catalog.query(sort_by, descending, query)
+    return novels[offset:None if limit is None else offset + limit]
\ No newline at end of file
@@ -0,0 +1,544 @@
+# utils/novel_db.py - SQLite存储后端
+
+import os
+import json
+import zlib
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from typing import Any, Dict, List, Optional, Tuple
+from core.models import Novel, Character, Trait, Relationship, Event, Chapter, Outline, OutlineArc, LazyText
+
+# 以这些后缀结尾的存档路径使用SQLite存储，其余为XML
+DB_SUFFIXES = (".db", ".sqlite")
+
+# SQLite存储在小说变更日志(Novel.journal)中使用的游标
+DB_CURSOR = "db"
+
+SCHEMA_VERSION = 1
+
+# 各表以novel_id关联到novels，删除小说时级联删除；position保存角色、事件、章节和时间线的原有顺序
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS novels (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    setting TEXT NOT NULL,
+    current_chapter INTEGER NOT NULL,
+    creation_date TEXT NOT NULL,
+    last_modified TEXT NOT NULL,
+    seed INTEGER,
+    rng_draws INTEGER NOT NULL,
+    history_limit INTEGER,
+    history_archived INTEGER NOT NULL,
+    global_context TEXT NOT NULL,
+    outline TEXT,
+    summaries TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS context (
+    novel_id TEXT NOT NULL REFERENCES novels(id) ON DELETE CASCADE,
+    chapter INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (novel_id, chapter)
+);
+CREATE TABLE IF NOT EXISTS characters (
+    novel_id TEXT NOT NULL REFERENCES novels(id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    age INTEGER NOT NULL,
+    gender TEXT NOT NULL,
+    background TEXT NOT NULL,
+    appearance TEXT NOT NULL,
+    personality TEXT NOT NULL,
+    traits TEXT NOT NULL,
+    status TEXT NOT NULL,
+    story_arcs TEXT NOT NULL,
+    goals TEXT NOT NULL,
+    notes TEXT NOT NULL,
+    PRIMARY KEY (novel_id, id)
+);
+CREATE TABLE IF NOT EXISTS relationships (
+    novel_id TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    relationship_type TEXT NOT NULL,
+    strength REAL NOT NULL,
+    history TEXT NOT NULL,
+    history_summary TEXT NOT NULL,
+    PRIMARY KEY (novel_id, source_id, target_id),
+    FOREIGN KEY (novel_id, source_id) REFERENCES characters(novel_id, id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS relationships_target ON relationships(novel_id, target_id);
+CREATE TABLE IF NOT EXISTS events (
+    novel_id TEXT NOT NULL REFERENCES novels(id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    triggers TEXT NOT NULL,
+    effects TEXT NOT NULL,
+    narrative_templates TEXT NOT NULL,
+    user_editable INTEGER NOT NULL,
+    notes TEXT NOT NULL,
+    PRIMARY KEY (novel_id, id)
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    rowid INTEGER PRIMARY KEY,
+    novel_id TEXT NOT NULL REFERENCES novels(id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    events TEXT NOT NULL,
+    character_focus TEXT NOT NULL,
+    content TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    crc INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    user_edited INTEGER NOT NULL,
+    notes TEXT NOT NULL,
+    UNIQUE (novel_id, id)
+);
+CREATE INDEX IF NOT EXISTS chapters_position ON chapters(novel_id, position);
+CREATE TABLE IF NOT EXISTS timeline (
+    novel_id TEXT NOT NULL REFERENCES novels(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (novel_id, position)
+);
+"""
+
+# 章节标题和正文的全文索引（外部内容表，由触发器与chapters同步）；trigram分词可检索中文任意子串
+# 只更新章节元数据时SET中仍含title，更新触发器只在标题或正文确实变化时重新索引（重建触发器以升级旧数据库）
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chapters_fts USING fts5(
+    title, content, content='chapters', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS chapters_fts_insert AFTER INSERT ON chapters BEGIN
+    INSERT INTO chapters_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS chapters_fts_delete AFTER DELETE ON chapters BEGIN
+    INSERT INTO chapters_fts(chapters_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+END;
+DROP TRIGGER IF EXISTS chapters_fts_update;
+CREATE TRIGGER chapters_fts_update AFTER UPDATE OF title, content ON chapters
+WHEN old.title IS NOT new.title OR old.content IS NOT new.content BEGIN
+    INSERT INTO chapters_fts(chapters_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+    INSERT INTO chapters_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+END;
+"""
+
+# trigram分词的查询至少需要3个字符，更短的查询逐行匹配
+FTS_MIN_QUERY = 3
+
+def is_database_path(path: str) -> bool:
+    """存档路径是否使用SQLite存储"""
+    return path.lower().endswith(DB_SUFFIXES)
+
+def to_json(value: Any) -> str:
+    """JSON列的文本"""
+    return json.dumps(value, ensure_ascii=False)
+
+class DatabaseBody(LazyText):
+    """数据库中的章节正文引用，读取时按行号查询"""
+    
+    __slots__ = ("store", "rowid", "length", "crc")
+    
+    def __init__(self, store: "NovelDatabase", rowid: int, length: int, crc: int):
+        self.store = store
+        self.rowid = rowid
+        self.length = length  # UTF-8字节数
+        self.crc = crc  # UTF-8编码的CRC32，与core.chapter_index的章节指纹一致
+    
+    def load(self) -> str:
+        return self.store.read_body(self.rowid)
+
+class NovelDatabase:
+    """SQLite小说存储 - 一个数据库文件可保存多部小说
+    
+    小说首次写入时写入全部行，之后每次保存从变更日志取出上次保存以来的修改，
+    只写入变化的角色（及其关系）、事件、章节和时间线行；小说行（基本信息、大纲、摘要）每次更新。
+    章节正文按需读取。SQLite支持FTS5时，chapters_fts对章节标题和正文建立全文索引。
+    """
+    
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.lock = threading.RLock()  # 连接可能被后台线程使用
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self.conn.close()
+            raise ValueError(f"数据库版本{version}高于支持的版本{SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+        self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.fts = self._create_fts()
+        self.synced: set = set()  # 数据库中的行与变更日志游标同步的小说ID
+    
+    def _create_fts(self) -> bool:
+        """创建全文索引，SQLite不支持FTS5或trigram分词时返回False"""
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"SQLite不支持FTS5全文索引，检索将逐行匹配: {e}")
+            return False
+    
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+    
+    def novel_ids(self) -> List[str]:
+        """数据库中的小说ID，最近修改的在前"""
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT id FROM novels ORDER BY last_modified DESC")]
+    
+    def read_body(self, rowid: int) -> str:
+        """读取章节正文"""
+        with self.lock:
+            row = self.conn.execute("SELECT content FROM chapters WHERE rowid = ?", (rowid,)).fetchone()
+        if row is None:
+            raise OSError(f"数据库中不存在章节正文: {self.path} 第{rowid}行")
+        return row[0]
+    
+    def save(self, novel: Novel) -> bool:
+        """保存小说，返回是否写入了章节（用于判断是否需要保存检索索引）"""
+        with self.lock:
+            if novel.database is self and novel.id in self.synced:
+                return self._write_changes(novel)
+            self._write_novel(novel)
+            novel.journal.open_cursor(DB_CURSOR)
+            novel.journal.drain(DB_CURSOR)
+            self.synced.add(novel.id)
+            novel.database = self
+            return True
+    
+    def _write_novel(self, novel: Novel):
+        """写入小说的全部行（已有同ID的小说时整体替换）"""
+        # 正文可能引用本数据库中即将删除的行，先读出
+        chapter_rows = [self._chapter_row(novel, chapter, position)
+                        for position, chapter in enumerate(novel.chapters)]
+        bodies = []
+        with self.conn:
+            self.conn.execute("DELETE FROM novels WHERE id = ?", (novel.id,))
+            self.conn.execute("INSERT INTO novels VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              self._novel_row(novel))
+            self._write_context(novel)
+            for position, char in enumerate(novel.characters.values()):
+                self._insert_character(novel, char, position)
+            self.conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                  [self._event_row(novel, event, position)
+                                   for position, event in enumerate(novel.events_library.values())])
+            for chapter, row in zip(novel.chapters, chapter_rows):
+                bodies.append((chapter, self._insert_chapter(row)))
+            self._write_timeline(novel)
+        # 提交后章节才改为引用数据库中的正文，写入失败时保持原样
+        for chapter, body in bodies:
+            if body is not None:
+                chapter.content = body
+    
+    def _write_changes(self, novel: Novel) -> bool:
+        """只写入上次保存以来变化的行"""
+        touched: Dict[str, Dict[str, None]] = {}
+        chapters_deleted = False
+        for change in novel.journal.pending(DB_CURSOR):
+            touched.setdefault(change.kind, {})[change.target] = None
+            if change.kind == "chapter" and change.action == "delete":
+                chapters_deleted = True
+        
+        bodies = []
+        with self.conn:
+            self.conn.execute("""UPDATE novels SET title = ?, genre = ?, setting = ?, current_chapter = ?,
+                                 creation_date = ?, last_modified = ?, seed = ?, rng_draws = ?, history_limit = ?,
+                                 history_archived = ?, global_context = ?, outline = ?, summaries = ? WHERE id = ?""",
+                              self._novel_row(novel)[1:] + (novel.id,))
+            if "context" in touched:
+                self.conn.execute("DELETE FROM context WHERE novel_id = ?", (novel.id,))
+                self._write_context(novel)
+            
+            # 角色（连同其全部关系）和事件：存在的写入当前状态，不存在的删除
+            for char_id in touched.get("character", ()):
+                self.conn.execute("DELETE FROM relationships WHERE novel_id = ? AND source_id = ?",
+                                  (novel.id, char_id))
+                char = novel.characters.get(char_id)
+                if char is None:
+                    self.conn.execute("DELETE FROM characters WHERE novel_id = ? AND id = ?", (novel.id, char_id))
+                else:
+                    self._upsert_character(novel, char)
+            for event_id in touched.get("event", ()):
+                event = novel.events_library.get(event_id)
+                if event is None:
+                    self.conn.execute("DELETE FROM events WHERE novel_id = ? AND id = ?", (novel.id, event_id))
+                else:
+                    self._upsert_event(novel, event)
+            
+            # 章节：删除章节会使后续章节重新编号，此时更新全部章节的位置和编号并重写时间线
+            if "chapter" in touched:
+                positions = {chapter.id: i for i, chapter in enumerate(novel.chapters)}
+                numbers = set()
+                for chapter_id in touched["chapter"]:
+                    if chapter_id not in positions:
+                        self.conn.execute("DELETE FROM chapters WHERE novel_id = ? AND id = ?",
+                                          (novel.id, chapter_id))
+                        continue
+                    chapter = novel.chapters[positions[chapter_id]]
+                    numbers.add(chapter.number)
+                    bodies.append((chapter, self._upsert_chapter(novel, chapter, positions[chapter_id])))
+                
+                if chapters_deleted:
+                    self.conn.executemany("UPDATE chapters SET position = ?, number = ? WHERE novel_id = ? AND id = ?",
+                                          [(i, chapter.number, novel.id, chapter.id)
+                                           for i, chapter in enumerate(novel.chapters)])
+                    self.conn.execute("DELETE FROM timeline WHERE novel_id = ?", (novel.id,))
+                    self._write_timeline(novel)
+                else:
+                    self.conn.executemany("INSERT OR REPLACE INTO timeline VALUES (?, ?, ?)",
+                                          [(novel.id, i, to_json(item)) for i, item in enumerate(novel.timeline)
+                                           if item.get("chapter") in numbers])
+        
+        novel.journal.drain(DB_CURSOR)
+        for chapter, body in bodies:
+            if body is not None:
+                chapter.content = body
+        return "chapter" in touched
+    
+    def _novel_row(self, novel: Novel) -> Tuple:
+        """novels表的一行"""
+        outline = None
+        if novel.outline is not None:
+            outline = to_json(novel.outline.to_dict())
+        summaries = novel.summaries
+        return (novel.id, novel.title, novel.genre, novel.setting, novel.current_chapter, novel.creation_date,
+                novel.last_modified, novel.seed, novel.rng_draws, novel.history_limit, novel.history_archived,
+                novel.context.global_context, outline,
+                to_json({"volume_size": summaries.volume_size, "book": summaries.book,
+                         "book_volumes": summaries.book_volumes,
+                         "volumes": {str(volume): text for volume, text in sorted(summaries.volumes.items())}}))
+    
+    def _write_context(self, novel: Novel):
+        """写入章节上下文"""
+        self.conn.executemany("INSERT INTO context VALUES (?, ?, ?)",
+                              [(novel.id, chapter, text) for chapter, text in novel.context.chapter_context.items()])
+    
+    def _write_timeline(self, novel: Novel):
+        """写入全部时间线"""
+        self.conn.executemany("INSERT INTO timeline VALUES (?, ?, ?)",
+                              [(novel.id, i, to_json(item)) for i, item in enumerate(novel.timeline)])
+    
+    def _character_values(self, char: Character) -> Tuple:
+        """characters表中除novel_id、id和position以外的列"""
+        return (char.name, char.age, char.gender, char.background, char.appearance, to_json(char.personality),
+                to_json([{"id": trait.id, "name": trait.name, "description": trait.description,
+                          "impact": trait.impact} for trait in char.traits]),
+                to_json(char.status), to_json(char.story_arcs), to_json(char.goals), char.notes)
+    
+    def _insert_character(self, novel: Novel, char: Character, position: int):
+        """插入角色及其关系"""
+        self.conn.execute("INSERT INTO characters VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (novel.id, char.id, position) + self._character_values(char))
+        self._insert_relationships(novel, char)
+    
+    def _upsert_character(self, novel: Novel, char: Character):
+        """写入角色当前状态及其关系，新角色排在最后（调用前已删除其关系）"""
+        self.conn.execute("""INSERT INTO characters VALUES (?, ?,
+                                 (SELECT COALESCE(MAX(position), -1) + 1 FROM characters WHERE novel_id = ?),
+                                 ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                             ON CONFLICT(novel_id, id) DO UPDATE SET name = excluded.name, age = excluded.age,
+                                 gender = excluded.gender, background = excluded.background,
+                                 appearance = excluded.appearance, personality = excluded.personality,
+                                 traits = excluded.traits, status = excluded.status,
+                                 story_arcs = excluded.story_arcs, goals = excluded.goals, notes = excluded.notes""",
+                          (novel.id, char.id, novel.id) + self._character_values(char))
+        self._insert_relationships(novel, char)
+    
+    def _insert_relationships(self, novel: Novel, char: Character):
+        """插入角色的全部关系"""
+        self.conn.executemany("INSERT INTO relationships VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              [(novel.id, char.id, rel.target_id, position, rel.relationship_type, rel.strength,
+                                to_json([dict(entry) for entry in rel.history]),
+                                to_json([dict(item) for item in rel.history_summary]))
+                               for position, rel in enumerate(char.relationships.values())])
+    
+    def _event_row(self, novel: Novel, event: Event, position: int) -> Tuple:
+        """events表的一行"""
+        return (novel.id, event.id, position, event.name, event.description, to_json(event.triggers),
+                to_json(event.effects), to_json(event.narrative_templates), int(event.user_editable), event.notes)
+    
+    def _upsert_event(self, novel: Novel, event: Event):
+        """写入事件当前状态，新事件排在最后"""
+        row = self._event_row(novel, event, 0)
+        self.conn.execute("""INSERT INTO events VALUES (?, ?,
+                                 (SELECT COALESCE(MAX(position), -1) + 1 FROM events WHERE novel_id = ?),
+                                 ?, ?, ?, ?, ?, ?, ?)
+                             ON CONFLICT(novel_id, id) DO UPDATE SET name = excluded.name,
+                                 description = excluded.description, triggers = excluded.triggers,
+                                 effects = excluded.effects, narrative_templates = excluded.narrative_templates,
+                                 user_editable = excluded.user_editable, notes = excluded.notes""",
+                          row[:2] + (novel.id,) + row[3:])
+    
+    def _chapter_row(self, novel: Novel, chapter: Chapter, position: int) -> Dict[str, Any]:
+        """chapters表的一行（不含rowid）"""
+        content = chapter.content
+        data = content.encode("utf-8")
+        return {"novel_id": novel.id, "id": chapter.id, "position": position, "number": chapter.number,
+                "title": chapter.title, "events": to_json(chapter.events),
+                "character_focus": to_json(chapter.character_focus), "content": content, "length": len(data),
+                "crc": zlib.crc32(data), "summary": chapter.summary, "user_edited": int(chapter.user_edited),
+                "notes": chapter.notes}
+    
+    def _insert_chapter(self, row: Dict[str, Any]) -> Optional[DatabaseBody]:
+        """插入章节，返回其正文在数据库中的引用（正文为空时为None）"""
+        columns = ", ".join(row)
+        cursor = self.conn.execute(f"INSERT INTO chapters ({columns}) VALUES ({', '.join('?' * len(row))})",
+                                   tuple(row.values()))
+        return DatabaseBody(self, cursor.lastrowid, row["length"], row["crc"]) if row["content"] else None
+    
+    def _upsert_chapter(self, novel: Novel, chapter: Chapter, position: int) -> Optional[DatabaseBody]:
+        """写入章节当前状态；正文仍引用本数据库中该章的行时不重写正文"""
+        found = self.conn.execute("SELECT rowid FROM chapters WHERE novel_id = ? AND id = ?",
+                                  (novel.id, chapter.id)).fetchone()
+        if found is None:
+            return self._insert_chapter(self._chapter_row(novel, chapter, position))
+        
+        ref = chapter.content_ref()
+        if isinstance(ref, DatabaseBody) and ref.store is self and ref.rowid == found[0]:
+            self.conn.execute("""UPDATE chapters SET position = ?, number = ?, title = ?, events = ?,
+                                     character_focus = ?, summary = ?, user_edited = ?, notes = ? WHERE rowid = ?""",
+                              (position, chapter.number, chapter.title, to_json(chapter.events),
+                               to_json(chapter.character_focus), chapter.summary, int(chapter.user_edited),
+                               chapter.notes, found[0]))
+            return None
+        
+        row = self._chapter_row(novel, chapter, position)
+        del row["novel_id"], row["id"]
+        self.conn.execute(f"UPDATE chapters SET {', '.join(f'{column} = ?' for column in row)} WHERE rowid = ?",
+                          tuple(row.values()) + (found[0],))
+        return DatabaseBody(self, found[0], row["length"], row["crc"]) if row["content"] else None
+    
+    def load(self, novel_id: Optional[str] = None, bodies: bool = True) -> Novel:
+        """读取小说（未指定ID时读取最近修改的一部），章节正文在读取时才从数据库加载
+        
+        bodies为False时只加载元数据和结构（见utils.xml_utils.read_novel_xml）。
+        """
+        with self.lock:
+            if novel_id is None:
+                ids = self.novel_ids()
+                if not ids:
+                    raise ValueError(f"数据库中没有小说: {self.path}")
+                novel_id = ids[0]
+            row = self.conn.execute("""SELECT id, title, genre, setting, current_chapter, creation_date, last_modified,
+                                           seed, rng_draws, history_limit, history_archived, global_context, outline,
+                                           summaries FROM novels WHERE id = ?""", (novel_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"数据库中不存在小说: {novel_id}")
+            
+            novel = Novel(id=row[0], title=row[1], genre=row[2], setting=row[3], current_chapter=row[4],
+                          seed=row[7], rng_draws=row[8], history_limit=row[9], history_archived=row[10],
+                          creation_date=row[5], last_modified=row[6])
+            novel.context.global_context = row[11]
+            if row[12] is not None:
+                outline = json.loads(row[12])
+                novel.outline = Outline(id=outline["id"], overview=outline["overview"],
+                                        arcs=[OutlineArc(**arc) for arc in outline["arcs"]])
+            summaries = json.loads(row[13])
+            novel.summaries.volume_size = summaries["volume_size"]
+            novel.summaries.book = summaries["book"]
+            novel.summaries.book_volumes = summaries["book_volumes"]
+            novel.summaries.volumes = {int(volume): text for volume, text in summaries["volumes"].items()}
+            
+            for chapter, text in self.conn.execute("SELECT chapter, text FROM context WHERE novel_id = ?", (novel_id,)):
+                novel.context.chapter_context[chapter] = text
+            
+            for values in self.conn.execute("""SELECT id, name, age, gender, background, appearance, personality,
+                                                   traits, status, story_arcs, goals, notes FROM characters
+                                               WHERE novel_id = ? ORDER BY position""", (novel_id,)):
+                char = Character(id=values[0], name=values[1], age=values[2], gender=values[3],
+                                 background=values[4], appearance=values[5], personality=json.loads(values[6]),
+                                 traits=[Trait(**trait) for trait in json.loads(values[7])],
+                                 status=json.loads(values[8]), story_arcs=json.loads(values[9]),
+                                 goals=json.loads(values[10]), notes=values[11])
+                novel.characters[char.id] = char
+            for values in self.conn.execute("""SELECT source_id, target_id, relationship_type, strength, history,
+                                                   history_summary FROM relationships WHERE novel_id = ?
+                                               ORDER BY source_id, position""", (novel_id,)):
+                rel = Relationship(target_id=values[1], relationship_type=values[2], strength=values[3],
+                                   history=json.loads(values[4]), history_summary=json.loads(values[5]))
+                novel.characters[values[0]].relationships[rel.target_id] = rel
+            
+            for values in self.conn.execute("""SELECT id, name, description, triggers, effects, narrative_templates,
+                                                   user_editable, notes FROM events
+                                               WHERE novel_id = ? ORDER BY position""", (novel_id,)):
+                event = Event(id=values[0], name=values[1], description=values[2], triggers=json.loads(values[3]),
+                              effects=json.loads(values[4]), narrative_templates=json.loads(values[5]),
+                              user_editable=bool(values[6]), notes=values[7])
+                novel.events_library[event.id] = event
+            
+            for values in self.conn.execute("""SELECT rowid, id, number, title, events, character_focus, length, crc,
+                                                   summary, user_edited, notes FROM chapters
+                                               WHERE novel_id = ? ORDER BY position""", (novel_id,)):
+                chapter = Chapter(id=values[1], number=values[2], title=values[3], events=json.loads(values[4]),
+                                  character_focus=json.loads(values[5]), summary=values[8],
+                                  user_edited=bool(values[9]), notes=values[10])
+                if bodies and values[6]:
+                    chapter.content = DatabaseBody(self, values[0], values[6], values[7])
+                novel.chapters.append(chapter)
+            
+            novel.timeline = [json.loads(data) for (data,) in self.conn.execute(
+                "SELECT data FROM timeline WHERE novel_id = ? ORDER BY position", (novel_id,))]
+        
+        novel.structure_only = not bodies
+        novel.journal.open_cursor(DB_CURSOR)
+        self.synced.add(novel.id)
+        novel.database = self
+        return novel
+    
+    def search(self, novel_id: str, query: str, limit: int = 10) -> List[Tuple[int, str, str]]:
+        """在章节标题和正文中检索，返回(章节编号, 标题, 片段)"""
+        with self.lock:
+            if self.fts and len(query) >= FTS_MIN_QUERY:
+                phrase = '"' + query.replace('"', '""') + '"'
+                return self.conn.execute("""SELECT c.number, c.title, snippet(chapters_fts, 1, '[', ']', '…', 24)
+                                            FROM chapters_fts JOIN chapters c ON c.rowid = chapters_fts.rowid
+                                            WHERE chapters_fts MATCH ? AND c.novel_id = ?
+                                            ORDER BY rank LIMIT ?""", (phrase, novel_id, limit)).fetchall()
+            return self.conn.execute("""SELECT number, title, substr(content, max(instr(content, ?) - 24, 1), 60)
+                                        FROM chapters WHERE novel_id = ? AND (instr(title, ?) OR instr(content, ?))
+                                        ORDER BY position LIMIT ?""", (query, novel_id, query, query, limit)).fetchall()
+
+def get_novel_database(novel: Novel, path: str) -> NovelDatabase:
+    """小说当前对应该路径的数据库连接，没有时打开新连接"""
+    database = novel.database
+    if database is not None and database.path == os.path.abspath(path):
+        return database
+    return NovelDatabase(path)
+
+def save_novel_to_db(novel: Novel, path: str) -> bool:
+    """保存小说到SQLite数据库，返回是否写入了章节"""
+    return get_novel_database(novel, path).save(novel)
+
+def load_novel_from_db(path: str, novel_id: Optional[str] = None, bodies: bool = True) -> Novel:
+    """从SQLite数据库读取小说"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"数据库文件不存在: {path}")
+    return NovelDatabase(path).load(novel_id, bodies)
+
+def read_database_header(path: str) -> Dict[str, Any]:
+    """以只读方式查询最近修改的一部小说的存档目录信息（见utils.save_catalog）"""
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        row = conn.execute("""SELECT id, title, genre, last_modified,
+                                  (SELECT COUNT(*) FROM chapters WHERE novel_id = novels.id),
+                                  (SELECT COUNT(*) FROM characters WHERE novel_id = novels.id),
+                                  (SELECT COUNT(*) FROM events WHERE novel_id = novels.id),
+                                  (SELECT COUNT(*) FROM novels)
+                              FROM novels ORDER BY last_modified DESC LIMIT 1""").fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise ValueError(f"数据库中没有小说: {path}")
+    return {"id": row[0], "title": row[1], "genre": row[2], "last_modified": row[3], "chapters": row[4],
+            "characters": row[5], "events": row[6], "novels": row[7]}
\ No newline at end of file
@@ -0,0 +1,149 @@
+# utils/save_catalog.py - 存档目录
+
+import os
+import json
+from typing import Any, Dict, List, Optional
+from utils.xml_utils import header_info, read_novel_header
+from utils.save_journal import journal_path_for, read_batches
+from utils.novel_db import DB_SUFFIXES, is_database_path, read_database_header
+
+# 存档目录缓存文件（位于存档目录中）
+CATALOG_FILE = ".catalog.json"
+CATALOG_VERSION = 1
+
+# 可排序的字段，默认按最后修改时间从新到旧
+SORT_KEYS = ("last_modified", "title", "chapters", "filename")
+
+def is_save_file(filename: str) -> bool:
+    """是否为存档文件（XML或SQLite数据库）"""
+    return filename.endswith(".xml") or filename.lower().endswith(DB_SUFFIXES)
+
+def file_signature(path: str) -> List[List[Any]]:
+    """存档及其增量日志、数据库WAL文件的修改时间和大小，任一变化时需重新读取"""
+    signature = []
+    for item in (path, journal_path_for(path), f"{path}-wal"):
+        if os.path.exists(item):
+            stat = os.stat(item)
+            signature.append([item[len(path):], stat.st_mtime_ns, stat.st_size])
+    return signature
+
+def read_save_info(path: str) -> Dict[str, Any]:
+    """读取一个存档的目录信息
+    
+    XML只读开头的基本信息，增量存档再读日志中最后一批的基本信息；数据库只查询小说表；
+    没有统计的旧存档只加载结构。
+    """
+    if is_database_path(path):
+        info = read_database_header(path)
+    else:
+        with open(path, "rb") as f:
+            info = read_novel_header(f)
+        if info["journal_batches"] is not None:
+            last = None
+            for last, _ in read_batches(journal_path_for(path)):
+                pass
+            if last is not None and int(last.get("n")) > info["journal_batches"]:
+                info = header_info(last)
+    
+    if info["chapters"] is None:
+        from utils.file_utils import load_novel_from_xml
+        novel = load_novel_from_xml(path, bodies=False)
+        if novel is None:
+            raise ValueError(f"无法读取存档: {path}")
+        info.update(title=novel.title, genre=novel.genre, last_modified=novel.last_modified,
+                    chapters=len(novel.chapters), characters=len(novel.characters),
+                    events=len(novel.events_library))
+    
+    info.pop("journal_batches", None)
+    info["size"] = sum(item[2] for item in file_signature(path))
+    return info
+
+class SaveCatalog:
+    """存档目录 - 按文件名缓存各存档的标题、类型、章节数等信息
+    
+    刷新时只重新读取修改时间或大小变化的文件，未变化的存档不打开；缓存保存在目录下的.catalog.json。
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, CATALOG_FILE)
+        self.entries: Dict[str, Dict[str, Any]] = {}  # 文件名 -> {signature, info}，读取失败时info为None
+        self.reads = 0  # 上次刷新重新读取的文件数
+        self._load()
+    
+    def _load(self):
+        """读取缓存，缺失、损坏或版本不符时从空目录开始"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CATALOG_VERSION:
+            self.entries = data["entries"]
+    
+    def save(self):
+        """写入缓存（先写临时文件再替换）"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CATALOG_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"保存存档目录失败: {e}")
+    
+    def refresh(self) -> int:
+        """同步目录中的存档文件，返回重新读取的文件数"""
+        self.reads = 0
+        names = sorted(name for name in os.listdir(self.directory) if is_save_file(name))
+        changed = False
+        for name in names:
+            path = os.path.join(self.directory, name)
+            signature = file_signature(path)
+            entry = self.entries.get(name)
+            if entry is not None and entry["signature"] == signature:
+                continue
+            try:
+                info = read_save_info(path)
+            except Exception:
+                # 读取失败的文件记为无效，文件变化后再重试
+                info = None
+            self.entries[name] = {"signature": signature, "info": info}
+            self.reads += 1
+            changed = True
+        
+        for name in set(self.entries) - set(names):
+            del self.entries[name]
+            changed = True
+        if changed:
+            self.save()
+        return self.reads
+    
+    def query(self, sort_by: str = "last_modified", descending: Optional[bool] = None,
+              text: Optional[str] = None) -> List[Dict[str, Any]]:
+        """筛选并排序有效存档
+        
+        text按标题、类型和文件名筛选（不区分大小写）；descending默认对修改时间和章节数从大到小，
+        对标题和文件名从小到大。
+        """
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort_by}")
+        if descending is None:
+            descending = sort_by in ("last_modified", "chapters")
+        
+        needle = text.lower() if text else None
+        result = []
+        for name, entry in self.entries.items():
+            info = entry["info"]
+            if info is None:
+                continue
+            item = dict(info, filename=name)
+            if needle and not any(needle in (item[key] or "").lower() for key in ("title", "genre", "filename")):
+                continue
+            result.append(item)
+        
+        # 相同排序值按文件名排列，保证分页稳定
+        result.sort(key=lambda item: item["filename"])
+        result.sort(key=lambda item: item[sort_by] or (0 if sort_by == "chapters" else ""), reverse=descending)
+        return result
\ No newline at end of file
@@ -0,0 +1,264 @@
+# utils/save_journal.py - 增量存档日志
+
+import os
+import zlib
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Optional
+from core.models import Novel
+from utils.xml_utils import (header_to_xml, context_to_xml, outline_to_xml, character_to_xml, event_to_xml,
+                             chapter_to_xml, timeline_item_to_xml, parse_header, parse_context, xml_to_outline,
+                             xml_to_character, xml_to_event, xml_to_chapter, xml_to_timeline_item)
+
+# 日志超过该字节数时，下次保存写入完整存档并清空日志
+JOURNAL_COMPACT_BYTES = 4 * 1024 * 1024
+
+# 增量存档在小说变更日志(Novel.journal)中使用的游标
+JOURNAL_CURSOR = "save"
+
+def journal_path_for(path: str) -> str:
+    """小说文件对应的增量存档日志路径"""
+    return f"{path}.journal"
+
+def summary_crcs(novel: Novel) -> Dict[Any, int]:
+    """分层摘要各部分的CRC32，用于找出变化的卷"""
+    crcs = {volume: zlib.crc32(text.encode("utf-8")) for volume, text in novel.summaries.volumes.items()}
+    crcs["book"] = zlib.crc32(novel.summaries.book.encode("utf-8"))
+    crcs["meta"] = zlib.crc32(f"{novel.summaries.volume_size}:{novel.summaries.book_volumes}".encode("ascii"))
+    return crcs
+
+class SaveJournal:
+    """增量存档日志 - 完整存档之后的每次保存向日志追加一批变更，保存开销只取决于修改量
+    
+    每批是一个稀疏的小说文档(<save n="批次号">)：总是包含基本信息，其余只包含变化对象的当前状态，
+    已删除的对象记为<deleted id="..."/>。文件由若干帧组成，每帧一行"字节数 CRC32"后接一批记录和换行；
+    读取时忽略不完整或校验失败的尾部帧，批次号不大于完整存档所记录批次号的帧已并入完整存档。
+    追加前截去最后一个完整帧之后的内容（中断的追加留下的），否则之后追加的批次读取时都会被跳过。
+    """
+    
+    def __init__(self, path: str, compact_bytes: int = JOURNAL_COMPACT_BYTES):
+        self.path = os.path.abspath(path)  # 小说文件（完整存档）
+        self.journal_path = journal_path_for(path)
+        self.compact_bytes = compact_bytes
+        self.summaries: Dict[Any, int] = {}  # 已写入的分层摘要各部分的CRC32
+        self.end = self.size()  # 最后一个完整帧的结束位置
+    
+    def size(self) -> int:
+        """日志字节数"""
+        return os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+    
+    def reset(self, novel: Novel):
+        """完整存档写入后清空日志，从当前状态开始记录"""
+        with open(self.journal_path, "wb"):
+            pass
+        self.end = 0
+        novel.journal.open_cursor(JOURNAL_CURSOR)
+        novel.journal.drain(JOURNAL_CURSOR)
+        self.summaries = summary_crcs(novel)
+    
+    def build_batch(self, novel: Novel) -> ET.Element:
+        """根据上次保存以来的变更构建一批记录"""
+        external = novel.external_bodies and novel.body_store is not None
+        changes = novel.journal.drain(JOURNAL_CURSOR)
+        touched: Dict[str, Dict[str, None]] = {}
+        chapters_deleted = False
+        for change in changes:
+            touched.setdefault(change.kind, {})[change.target] = None
+            if change.kind == "chapter" and change.action == "delete":
+                chapters_deleted = True
+        
+        root = ET.Element("save")
+        root.set("n", str(novel.journal_batches + 1))
+        header_to_xml(root, novel, external)
+        
+        if "context" in touched:
+            context_to_xml(root, novel)
+        if "outline" in touched and novel.outline is not None:
+            outline_to_xml(root, novel)
+        
+        # 角色和事件：存在的写入当前状态，不存在的记为已删除
+        for kind, tag, library, to_xml in (("character", "characters", novel.characters, character_to_xml),
+                                           ("event", "events_library", novel.events_library, event_to_xml)):
+            if kind in touched:
+                parent = ET.SubElement(root, tag)
+                for obj_id in touched[kind]:
+                    if obj_id in library:
+                        to_xml(parent, library[obj_id])
+                    else:
+                        ET.SubElement(parent, "deleted").set("id", obj_id)
+        
+        # 章节：删除章节会使后续章节重新编号，此时写入全部章节的顺序和编号以及完整时间线
+        if "chapter" in touched:
+            chapters = {chapter.id: chapter for chapter in novel.chapters}
+            chapters_elem = ET.SubElement(root, "chapters")
+            numbers = set()
+            for chapter_id in touched["chapter"]:
+                if chapter_id in chapters:
+                    chapter_to_xml(chapters_elem, chapters[chapter_id], external)
+                    numbers.add(chapters[chapter_id].number)
+                else:
+                    ET.SubElement(chapters_elem, "deleted").set("id", chapter_id)
+            
+            if chapters_deleted:
+                order_elem = ET.SubElement(root, "chapter_order")
+                for chapter in novel.chapters:
+                    item_elem = ET.SubElement(order_elem, "chapter")
+                    item_elem.set("id", chapter.id)
+                    item_elem.set("number", str(chapter.number))
+                timeline_elem = ET.SubElement(root, "timeline")
+                for item in novel.timeline:
+                    timeline_item_to_xml(timeline_elem, item)
+            else:
+                timeline_elem = ET.SubElement(root, "timeline_items")
+                for item in novel.timeline:
+                    if item.get("chapter") in numbers:
+                        timeline_item_to_xml(timeline_elem, item)
+        
+        # 分层摘要由摘要器直接维护，按内容校验值找出变化的卷
+        crcs = summary_crcs(novel)
+        if crcs != self.summaries:
+            summaries_elem = ET.SubElement(root, "summaries")
+            summaries_elem.set("volume_size", str(novel.summaries.volume_size))
+            summaries_elem.set("book_volumes", str(novel.summaries.book_volumes))
+            summaries_elem.set("volumes", " ".join(str(volume) for volume in sorted(novel.summaries.volumes)))
+            if crcs["book"] != self.summaries.get("book"):
+                ET.SubElement(summaries_elem, "book").text = novel.summaries.book
+            for volume, text in sorted(novel.summaries.volumes.items()):
+                if crcs[volume] != self.summaries.get(volume):
+                    volume_elem = ET.SubElement(summaries_elem, "volume")
+                    volume_elem.set("index", str(volume))
+                    volume_elem.text = text
+            self.summaries = crcs
+        
+        return root
+    
+    def append(self, novel: Novel) -> bool:
+        """追加一批变更，日志过大或需要重写全部章节引用时返回False（应写入完整存档）"""
+        if self.size() >= self.compact_bytes or not os.path.exists(self.path):
+            return False
+        # 正文存储换代后所有章节的正文引用都变了
+        if novel.body_store is not None and novel.body_store.retired:
+            return False
+        
+        data = ET.tostring(self.build_batch(novel), encoding="utf-8")
+        with open(self.journal_path, "ab") as f:
+            if f.tell() != self.end:
+                f.truncate(self.end)
+            f.write(f"{len(data)} {zlib.crc32(data)}\n".encode("ascii"))
+            f.write(data)
+            f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self.end = f.tell()
+        novel.journal_batches += 1
+        return True
+
+def read_batches(journal_path: str):
+    """逐批读取日志，产出(批次记录, 帧结束位置)，遇到不完整或损坏的帧时停止"""
+    if not os.path.exists(journal_path):
+        return
+    with open(journal_path, "rb") as f:
+        while True:
+            line = f.readline()
+            if not line:
+                return
+            try:
+                length, crc = (int(value) for value in line.split())
+            except ValueError:
+                return
+            data = f.read(length)
+            if len(data) != length or zlib.crc32(data) != crc or f.read(1) != b"\n":
+                return
+            yield ET.fromstring(data), f.tell()
+
+def apply_batch(novel: Novel, root: ET.Element, path: str):
+    """将一批记录应用到小说"""
+    parse_header(root, novel, path)
+    
+    context_elem = root.find("context")
+    if context_elem is not None:
+        parse_context(context_elem, novel)
+    outline_elem = root.find("outline")
+    if outline_elem is not None:
+        novel.outline = xml_to_outline(outline_elem)
+    
+    for tag, library, from_xml in (("characters", novel.characters, xml_to_character),
+                                   ("events_library", novel.events_library, xml_to_event)):
+        parent = root.find(tag)
+        for elem in parent if parent is not None else ():
+            if elem.tag == "deleted":
+                library.pop(elem.get("id"), None)
+            else:
+                obj = from_xml(elem)
+                library[obj.id] = obj
+    
+    chapters_elem = root.find("chapters")
+    if chapters_elem is not None:
+        deleted = {elem.get("id") for elem in chapters_elem.findall("deleted")}
+        if deleted:
+            novel.chapters = [chapter for chapter in novel.chapters if chapter.id not in deleted]
+        positions = {chapter.id: i for i, chapter in enumerate(novel.chapters)}
+        for elem in chapters_elem.findall("chapter"):
+            chapter = xml_to_chapter(elem, novel)
+            if chapter.id in positions:
+                novel.chapters[positions[chapter.id]] = chapter
+            else:
+                positions[chapter.id] = len(novel.chapters)
+                novel.chapters.append(chapter)
+    
+    order_elem = root.find("chapter_order")
+    if order_elem is not None:
+        chapters = {chapter.id: chapter for chapter in novel.chapters}
+        novel.chapters = []
+        for item_elem in order_elem.findall("chapter"):
+            chapter = chapters[item_elem.get("id")]
+            chapter.number = int(item_elem.get("number"))
+            novel.chapters.append(chapter)
+    
+    timeline_elem = root.find("timeline")
+    if timeline_elem is not None:
+        novel.timeline = [xml_to_timeline_item(elem) for elem in timeline_elem.findall("event")]
+    items_elem = root.find("timeline_items")
+    if items_elem is not None:
+        for elem in items_elem.findall("event"):
+            item = xml_to_timeline_item(elem)
+            for i, existing in enumerate(novel.timeline):
+                if existing.get("chapter") == item.get("chapter"):
+                    novel.timeline[i] = item
+                    break
+            else:
+                novel.timeline.append(item)
+    
+    summaries_elem = root.find("summaries")
+    if summaries_elem is not None:
+        summaries = novel.summaries
+        summaries.volume_size = int(summaries_elem.get("volume_size"))
+        summaries.book_volumes = int(summaries_elem.get("book_volumes"))
+        book_elem = summaries_elem.find("book")
+        if book_elem is not None:
+            summaries.book = book_elem.text or ""
+        texts = {int(elem.get("index")): elem.text or "" for elem in summaries_elem.findall("volume")}
+        indexes = [int(volume) for volume in summaries_elem.get("volumes", "").split()]
+        summaries.volumes = {volume: texts.get(volume, summaries.volumes.get(volume, "")) for volume in indexes}
+    
+    novel.journal_batches = int(root.get("n"))
+
+def open_save_journal(novel: Novel, path: str) -> SaveJournal:
+    """加载完整存档后重放其后的日志批次，并开始记录之后的变更"""
+    writer = SaveJournal(path)
+    applied = novel.journal_batches
+    writer.end = 0
+    for batch, end in read_batches(writer.journal_path):
+        if int(batch.get("n")) > applied:
+            apply_batch(novel, batch, path)
+        writer.end = end
+    novel.journal.open_cursor(JOURNAL_CURSOR)
+    writer.summaries = summary_crcs(novel)
+    novel.save_journal = writer
+    return writer
+
+def get_save_journal(novel: Novel, path: str) -> Optional[SaveJournal]:
+    """小说当前对应该文件的增量存档日志，尚未以完整存档开始时返回None"""
+    writer = novel.save_journal
+    if writer is None or writer.path != os.path.abspath(path):
+        return None
+    return writer
\ No newline at end of file
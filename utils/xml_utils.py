@@ -1,443 +1,726 @@
 # utils/xml_utils.py - XML处理工具
 
+import io
+import os
 import xml.etree.ElementTree as ET
-from xml.dom import minidom
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Iterable, Optional, TextIO, Tuple
 from core.models import Novel
 
-def novel_to_xml(novel: Novel) -> str:
-    """将小说数据转换为XML格式"""
-    root = ET.Element("novel")
-    
-    # 基本信息
-    ET.SubElement(root, "id").text = novel.id
-    ET.SubElement(root, "title").text = novel.title
-    ET.SubElement(root, "genre").text = novel.genre
-    ET.SubElement(root, "setting").text = novel.setting
-    ET.SubElement(root, "current_chapter").text = str(novel.current_chapter)
-    ET.SubElement(root, "creation_date").text = novel.creation_date
-    ET.SubElement(root, "last_modified").text = novel.last_modified
-    
-    # 上下文
-    context_elem = ET.SubElement(root, "context")
+# 小说XML按部分构建和解析，完整存档与增量存档日志(utils.save_journal)共用同一组函数
+# 完整存档逐个元素流式写出，不在内存中构建整棵树
+
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+# 流式加载时逐项构建并释放的列表元素 -> 子元素标签
+STREAM_SECTIONS = {"characters": "character", "events_library": "event", "chapters": "chapter", "timeline": "event"}
+
+def header_to_xml(parent: ET.Element, novel: Novel, external: bool = False):
+    """写入小说基本信息、随机种子、历史保留策略和正文存储"""
+    ET.SubElement(parent, "id").text = novel.id
+    ET.SubElement(parent, "title").text = novel.title
+    ET.SubElement(parent, "genre").text = novel.genre
+    ET.SubElement(parent, "setting").text = novel.setting
+    ET.SubElement(parent, "current_chapter").text = str(novel.current_chapter)
+    ET.SubElement(parent, "creation_date").text = novel.creation_date
+    ET.SubElement(parent, "last_modified").text = novel.last_modified
+    
+    # 随机种子及已派生的生成器个数，续跑时据此复现后续的随机决策
+    if novel.seed is not None:
+        rng_elem = ET.SubElement(parent, "rng")
+        rng_elem.set("seed", str(novel.seed))
+        rng_elem.set("draws", str(novel.rng_draws))
+    
+    # 关系历史保留策略，未设置limit表示不压缩
+    history_elem = ET.SubElement(parent, "history_policy")
+    if novel.history_limit is not None:
+        history_elem.set("limit", str(novel.history_limit))
+    history_elem.set("archived", str(novel.history_archived))
+    
+    # 正文存储文件（与小说文件位于同一目录）
+    if external:
+        ET.SubElement(parent, "storage").set("bodies", os.path.basename(novel.body_store.path))
+    
+    # 增量存档：已并入本存档的最后一批日志
+    if novel.incremental_save:
+        ET.SubElement(parent, "save_journal").set("applied", str(novel.journal_batches))
+    
+    # 存档目录列出存档时只读基本信息，不必解析全文（见utils.save_catalog），加载时忽略
+    stats_elem = ET.SubElement(parent, "stats")
+    stats_elem.set("chapters", str(len(novel.chapters)))
+    stats_elem.set("characters", str(len(novel.characters)))
+    stats_elem.set("events", str(len(novel.events_library)))
+
+def context_to_xml(parent: ET.Element, novel: Novel):
+    """写入上下文"""
+    context_elem = ET.SubElement(parent, "context")
     ET.SubElement(context_elem, "global_context").text = novel.context.global_context
     chapter_context_elem = ET.SubElement(context_elem, "chapter_contexts")
     for chapter_num, context_text in novel.context.chapter_context.items():
         chapter_elem = ET.SubElement(chapter_context_elem, "chapter_context")
         chapter_elem.set("number", str(chapter_num))
         chapter_elem.text = context_text
+
+def outline_to_xml(parent: ET.Element, novel: Novel):
+    """写入大纲"""
+    outline_elem = ET.SubElement(parent, "outline")
+    ET.SubElement(outline_elem, "id").text = novel.outline.id
+    ET.SubElement(outline_elem, "overview").text = novel.outline.overview
     
-    # 大纲
-    if novel.outline:
-        outline_elem = ET.SubElement(root, "outline")
-        ET.SubElement(outline_elem, "id").text = novel.outline.id
-        ET.SubElement(outline_elem, "overview").text = novel.outline.overview
-        
-        arcs_elem = ET.SubElement(outline_elem, "arcs")
-        for arc in novel.outline.arcs:
-            arc_elem = ET.SubElement(arcs_elem, "arc")
-            ET.SubElement(arc_elem, "name").text = arc.name
-            ET.SubElement(arc_elem, "description").text = arc.description
-            
-            key_events_elem = ET.SubElement(arc_elem, "key_events")
-            for event in arc.key_events:
-                ET.SubElement(key_events_elem, "event").text = event
-    
-    # 角色
-    characters_elem = ET.SubElement(root, "characters")
-    for char_id, char in novel.characters.items():
-        char_elem = ET.SubElement(characters_elem, "character")
-        char_elem.set("id", char.id)
-        ET.SubElement(char_elem, "name").text = char.name
-        ET.SubElement(char_elem, "age").text = str(char.age)
-        ET.SubElement(char_elem, "gender").text = char.gender
-        ET.SubElement(char_elem, "background").text = char.background
-        ET.SubElement(char_elem, "appearance").text = char.appearance
-        ET.SubElement(char_elem, "notes").text = char.notes
+    arcs_elem = ET.SubElement(outline_elem, "arcs")
+    for arc in novel.outline.arcs:
+        arc_elem = ET.SubElement(arcs_elem, "arc")
+        ET.SubElement(arc_elem, "name").text = arc.name
+        ET.SubElement(arc_elem, "description").text = arc.description
         
-        # 性格
-        personality_elem = ET.SubElement(char_elem, "personality")
-        for trait, value in char.personality.items():
-            trait_elem = ET.SubElement(personality_elem, "trait")
-            trait_elem.set("name", trait)
-            trait_elem.text = str(value)
+        key_events_elem = ET.SubElement(arc_elem, "key_events")
+        for event in arc.key_events:
+            ET.SubElement(key_events_elem, "event").text = event
+
+def character_to_xml(parent: ET.Element, char):
+    """写入一个角色"""
+    char_elem = ET.SubElement(parent, "character")
+    char_elem.set("id", char.id)
+    ET.SubElement(char_elem, "name").text = char.name
+    ET.SubElement(char_elem, "age").text = str(char.age)
+    ET.SubElement(char_elem, "gender").text = char.gender
+    ET.SubElement(char_elem, "background").text = char.background
+    ET.SubElement(char_elem, "appearance").text = char.appearance
+    ET.SubElement(char_elem, "notes").text = char.notes
+    
+    # 性格
+    personality_elem = ET.SubElement(char_elem, "personality")
+    for trait, value in char.personality.items():
+        trait_elem = ET.SubElement(personality_elem, "trait")
+        trait_elem.set("name", trait)
+        trait_elem.text = str(value)
+    
+    # 特质
+    traits_elem = ET.SubElement(char_elem, "traits")
+    for trait in char.traits:
+        trait_elem = ET.SubElement(traits_elem, "trait")
+        trait_elem.set("id", trait.id)
+        ET.SubElement(trait_elem, "name").text = trait.name
+        ET.SubElement(trait_elem, "description").text = trait.description
         
-        # 特质
-        traits_elem = ET.SubElement(char_elem, "traits")
-        for trait in char.traits:
-            trait_elem = ET.SubElement(traits_elem, "trait")
-            trait_elem.set("id", trait.id)
-            ET.SubElement(trait_elem, "name").text = trait.name
-            ET.SubElement(trait_elem, "description").text = trait.description
-            
-            impact_elem = ET.SubElement(trait_elem, "impact")
-            for attr, value in trait.impact.items():
-                impact_attr = ET.SubElement(impact_elem, "attribute")
-                impact_attr.set("name", attr)
-                impact_attr.text = str(value)
+        impact_elem = ET.SubElement(trait_elem, "impact")
+        for attr, value in trait.impact.items():
+            impact_attr = ET.SubElement(impact_elem, "attribute")
+            impact_attr.set("name", attr)
+            impact_attr.text = str(value)
+    
+    # 关系
+    relationships_elem = ET.SubElement(char_elem, "relationships")
+    for rel_id, rel in char.relationships.items():
+        rel_elem = ET.SubElement(relationships_elem, "relationship")
+        rel_elem.set("target_id", rel.target_id)
+        ET.SubElement(rel_elem, "type").text = rel.relationship_type
+        ET.SubElement(rel_elem, "strength").text = str(rel.strength)
         
-        # 关系
-        relationships_elem = ET.SubElement(char_elem, "relationships")
-        for rel_id, rel in char.relationships.items():
-            rel_elem = ET.SubElement(relationships_elem, "relationship")
-            rel_elem.set("target_id", rel.target_id)
-            ET.SubElement(rel_elem, "type").text = rel.relationship_type
-            ET.SubElement(rel_elem, "strength").text = str(rel.strength)
-            
-            history_elem = ET.SubElement(rel_elem, "history")
-            for entry in rel.history:
-                entry_elem = ET.SubElement(history_elem, "entry")
-                entry_elem.set("timestamp", entry["timestamp"])
-                entry_elem.text = entry["description"]
+        history_elem = ET.SubElement(rel_elem, "history")
+        for entry in rel.history:
+            entry_elem = ET.SubElement(history_elem, "entry")
+            entry_elem.set("timestamp", entry["timestamp"])
+            if "chapter" in entry:
+                entry_elem.set("chapter", str(entry["chapter"]))
+            if "delta" in entry:
+                entry_elem.set("delta", str(entry["delta"]))
+            entry_elem.text = entry["description"]
         
-        # 目标
-        goals_elem = ET.SubElement(char_elem, "goals")
-        for goal in char.goals:
-            ET.SubElement(goals_elem, "goal").text = goal
-    
-    # 事件库
-    events_elem = ET.SubElement(root, "events_library")
-    for event_id, event in novel.events_library.items():
+        # 压缩后的早期历史
+        if rel.history_summary:
+            summary_elem = ET.SubElement(rel_elem, "history_summary")
+            for item in rel.history_summary:
+                item_elem = ET.SubElement(summary_elem, "chapter")
+                item_elem.set("number", str(item["chapter"]))
+                item_elem.set("count", str(item["count"]))
+                item_elem.set("delta", str(item["delta"]))
+    
+    # 目标
+    goals_elem = ET.SubElement(char_elem, "goals")
+    for goal in char.goals:
+        ET.SubElement(goals_elem, "goal").text = goal
+
+def event_to_xml(parent: ET.Element, event):
+    """写入一个事件"""
+    event_elem = ET.SubElement(parent, "event")
+    event_elem.set("id", event.id)
+    ET.SubElement(event_elem, "name").text = event.name
+    ET.SubElement(event_elem, "description").text = event.description
+    ET.SubElement(event_elem, "user_editable").text = str(event.user_editable)
+    ET.SubElement(event_elem, "notes").text = event.notes
+    
+    # 触发条件
+    triggers_elem = ET.SubElement(event_elem, "triggers")
+    for trigger_type, trigger_value in event.triggers.items():
+        trigger_elem = ET.SubElement(triggers_elem, "trigger")
+        trigger_elem.set("type", trigger_type)
+        trigger_elem.set("value", str(trigger_value))
+    
+    # 效果
+    effects_elem = ET.SubElement(event_elem, "effects")
+    for effect in event.effects:
+        effect_elem = ET.SubElement(effects_elem, "effect")
+        effect_elem.set("target", effect["target"])
+        effect_elem.set("value", str(effect["value"]))
+    
+    # 叙事模板
+    templates_elem = ET.SubElement(event_elem, "narrative_templates")
+    for template in event.narrative_templates:
+        ET.SubElement(templates_elem, "template").text = template
+
+def chapter_to_xml(parent: ET.Element, chapter, external: bool = False):
+    """写入一个章节，external为True时已写入正文存储的正文只记录其位置"""
+    chapter_elem = ET.SubElement(parent, "chapter")
+    chapter_elem.set("id", chapter.id)
+    chapter_elem.set("number", str(chapter.number))
+    ET.SubElement(chapter_elem, "title").text = chapter.title
+    ET.SubElement(chapter_elem, "user_edited").text = str(chapter.user_edited)
+    ET.SubElement(chapter_elem, "notes").text = chapter.notes
+    
+    events_elem = ET.SubElement(chapter_elem, "events")
+    for event_id in chapter.events:
         event_elem = ET.SubElement(events_elem, "event")
-        event_elem.set("id", event.id)
-        ET.SubElement(event_elem, "name").text = event.name
-        ET.SubElement(event_elem, "description").text = event.description
-        ET.SubElement(event_elem, "user_editable").text = str(event.user_editable)
-        ET.SubElement(event_elem, "notes").text = event.notes
-        
-        # 触发条件
-        triggers_elem = ET.SubElement(event_elem, "triggers")
-        for trigger_type, trigger_value in event.triggers.items():
-            trigger_elem = ET.SubElement(triggers_elem, "trigger")
-            trigger_elem.set("type", trigger_type)
-            trigger_elem.set("value", str(trigger_value))
-        
-        # 效果
-        effects_elem = ET.SubElement(event_elem, "effects")
-        for effect in event.effects:
-            effect_elem = ET.SubElement(effects_elem, "effect")
-            effect_elem.set("target", effect["target"])
-            effect_elem.set("value", str(effect["value"]))
-        
-        # 叙事模板
-        templates_elem = ET.SubElement(event_elem, "narrative_templates")
-        for template in event.narrative_templates:
-            ET.SubElement(templates_elem, "template").text = template
-    
-    # 章节
-    chapters_elem = ET.SubElement(root, "chapters")
-    for chapter in novel.chapters:
-        chapter_elem = ET.SubElement(chapters_elem, "chapter")
-        chapter_elem.set("id", chapter.id)
-        chapter_elem.set("number", str(chapter.number))
-        ET.SubElement(chapter_elem, "title").text = chapter.title
-        ET.SubElement(chapter_elem, "user_edited").text = str(chapter.user_edited)
-        ET.SubElement(chapter_elem, "notes").text = chapter.notes
-        
-        events_elem = ET.SubElement(chapter_elem, "events")
-        for event_id in chapter.events:
-            event_elem = ET.SubElement(events_elem, "event")
-            event_elem.text = event_id
-        
-        focus_elem = ET.SubElement(chapter_elem, "character_focus")
-        for char_id in chapter.character_focus:
-            char_elem = ET.SubElement(focus_elem, "character")
-            char_elem.text = char_id
-        
-        if chapter.content:
-            ET.SubElement(chapter_elem, "content").text = chapter.content
-        
-        if chapter.summary:
-            ET.SubElement(chapter_elem, "summary").text = chapter.summary
-    
-    # 时间线
-    timeline_elem = ET.SubElement(root, "timeline")
-    for event in novel.timeline:
-        event_elem = ET.SubElement(timeline_elem, "event")
-        for key, value in event.items():
-            ET.SubElement(event_elem, key).text = str(value)
-    
-    # 转为字符串
-    xml_string = ET.tostring(root, encoding='utf-8')
-    return minidom.parseString(xml_string).toprettyxml(indent="  ")
+        event_elem.text = event_id
+    
+    focus_elem = ET.SubElement(chapter_elem, "character_focus")
+    for char_id in chapter.character_focus:
+        char_elem = ET.SubElement(focus_elem, "character")
+        char_elem.text = char_id
+    
+    ref = chapter.content_ref() if external else None
+    if ref is not None:
+        content_elem = ET.SubElement(chapter_elem, "content")
+        content_elem.set("offset", str(ref.offset))
+        content_elem.set("length", str(ref.length))
+        content_elem.set("crc", str(ref.crc))
+    elif chapter.content:
+        ET.SubElement(chapter_elem, "content").text = chapter.content
+    
+    if chapter.summary:
+        ET.SubElement(chapter_elem, "summary").text = chapter.summary
+
+def summaries_to_xml(parent: ET.Element, novel: Novel):
+    """写入分层摘要"""
+    summaries_elem = ET.SubElement(parent, "summaries")
+    summaries_elem.set("volume_size", str(novel.summaries.volume_size))
+    summaries_elem.set("book_volumes", str(novel.summaries.book_volumes))
+    ET.SubElement(summaries_elem, "book").text = novel.summaries.book
+    for volume, summary in sorted(novel.summaries.volumes.items()):
+        volume_elem = ET.SubElement(summaries_elem, "volume")
+        volume_elem.set("index", str(volume))
+        volume_elem.text = summary
+
+def timeline_item_to_xml(parent: ET.Element, item: Dict[str, Any]):
+    """写入一条时间线"""
+    event_elem = ET.SubElement(parent, "event")
+    for key, value in item.items():
+        ET.SubElement(event_elem, key).text = str(value)
+
+def write_element(f: TextIO, elem: ET.Element, level: int = 0, indent: Optional[str] = "  "):
+    """写出一个元素及其子元素，level为缩进层级，indent为None时不缩进"""
+    if indent:
+        ET.indent(elem, indent, level)
+        f.write(indent * level)
+    ET.ElementTree(elem).write(f, encoding="unicode")
+    if indent:
+        f.write("\n")
+
+def write_section(f: TextIO, tag: str, items: Iterable, to_xml: Callable[[ET.Element, Any], None],
+                  level: int = 1, indent: Optional[str] = "  "):
+    """写出一个列表元素：逐项构建子元素并立即写出，内存中只保留当前一项"""
+    pad, newline = (indent * level, "\n") if indent else ("", "")
+    f.write(f"{pad}<{tag}>{newline}")
+    holder = ET.Element(tag)
+    for item in items:
+        to_xml(holder, item)
+        write_element(f, holder[0], level + 1, indent)
+        del holder[0]
+    f.write(f"{pad}</{tag}>{newline}")
 
-def xml_to_novel(xml_string: str) -> Optional[Novel]:
-    """从XML字符串构建小说对象"""
-    from core.models import Novel, Character, Trait, Relationship
-    from core.models import Event, Chapter, Outline, OutlineArc, Context
+def write_novel_xml(novel: Novel, f: TextIO, inline_bodies: bool = True, indent: Optional[str] = "  "):
+    """将小说数据逐个元素写入文本文件对象，内存占用取决于最大的单个角色、事件或章节
     
-    try:
-        root = ET.fromstring(xml_string)
-        
-        # 基本信息
-        novel_id = root.find("id").text
-        title = root.find("title").text
-        genre = root.find("genre").text
-        setting = root.find("setting").text
-        current_chapter = int(root.find("current_chapter").text)
-        creation_date = root.find("creation_date").text
-        last_modified = root.find("last_modified").text
-        
-        # 创建小说对象
-        novel = Novel(
-            id=novel_id,
-            title=title,
-            genre=genre,
-            setting=setting,
-            current_chapter=current_chapter,
-            creation_date=creation_date,
-            last_modified=last_modified
-        )
-        
-        # 解析上下文
-        context_elem = root.find("context")
-        if context_elem is not None:
-            global_context = context_elem.find("global_context").text or ""
-            novel.context.global_context = global_context
-            
-            chapter_contexts_elem = context_elem.find("chapter_contexts")
-            if chapter_contexts_elem is not None:
-                for chapter_context in chapter_contexts_elem.findall("chapter_context"):
-                    chapter_num = int(chapter_context.get("number"))
-                    novel.context.chapter_context[chapter_num] = chapter_context.text or ""
-        
-        # 解析大纲
-        outline_elem = root.find("outline")
-        if outline_elem is not None:
-            outline_id = outline_elem.find("id").text
-            overview = outline_elem.find("overview").text
-            
-            outline = Outline(
-                id=outline_id,
-                overview=overview
-            )
+    inline_bodies为False时，已写入正文存储的章节正文只记录其位置（见core.body_store）。
+    indent为None时不缩进，文件更小、写出更快。
+    """
+    external = not inline_bodies and novel.body_store is not None
+    newline = "\n" if indent else ""
+    f.write(f"{XML_DECLARATION}{newline}<novel>{newline}")
+    
+    head = ET.Element("novel")
+    header_to_xml(head, novel, external)
+    context_to_xml(head, novel)
+    if novel.outline:
+        outline_to_xml(head, novel)
+    for elem in head:
+        write_element(f, elem, 1, indent)
+    
+    write_section(f, "characters", novel.characters.values(), character_to_xml, 1, indent)
+    write_section(f, "events_library", novel.events_library.values(), event_to_xml, 1, indent)
+    write_section(f, "chapters", novel.chapters,
+                  lambda parent, chapter: chapter_to_xml(parent, chapter, external), 1, indent)
+    
+    tail = ET.Element("novel")
+    summaries_to_xml(tail, novel)
+    write_element(f, tail[0], 1, indent)
+    
+    write_section(f, "timeline", novel.timeline, timeline_item_to_xml, 1, indent)
+    f.write(f"</novel>{newline}")
+
+def novel_to_xml(novel: Novel, inline_bodies: bool = True, indent: Optional[str] = "  ") -> str:
+    """将小说数据转换为XML字符串（与write_novel_xml写出的内容相同）"""
+    buffer = io.StringIO()
+    write_novel_xml(novel, buffer, inline_bodies, indent)
+    return buffer.getvalue()
+
+def parse_header(root: ET.Element, novel: Novel, path: Optional[str] = None):
+    """读取基本信息、随机种子、历史保留策略和正文存储，path为小说文件路径，用于定位正文存储"""
+    from core.body_store import BodyStore
+    
+    novel.id = root.find("id").text
+    novel.title = root.find("title").text
+    novel.genre = root.find("genre").text
+    novel.setting = root.find("setting").text
+    novel.current_chapter = int(root.find("current_chapter").text)
+    novel.creation_date = root.find("creation_date").text
+    novel.last_modified = root.find("last_modified").text
+    
+    # 解析随机种子
+    rng_elem = root.find("rng")
+    if rng_elem is not None:
+        novel.seed = int(rng_elem.get("seed"))
+        novel.rng_draws = int(rng_elem.get("draws", "0"))
+    
+    # 解析历史保留策略（旧存档没有该元素，使用默认值）
+    history_elem = root.find("history_policy")
+    if history_elem is not None:
+        limit = history_elem.get("limit")
+        novel.history_limit = int(limit) if limit is not None else None
+        novel.history_archived = int(history_elem.get("archived", "0"))
+    
+    # 正文存储：章节只记录正文位置，读取正文时才打开存储文件
+    storage_elem = root.find("storage")
+    if storage_elem is not None:
+        if path is None:
+            raise ValueError("章节正文保存在正文存储中，需要提供小说文件路径")
+        bodies = os.path.join(os.path.dirname(path), storage_elem.get("bodies"))
+        if not novel.external_bodies or novel.body_store is None or novel.body_store.path != bodies:
+            novel.external_bodies = True
+            novel.body_store = BodyStore(bodies, path)
+    
+    journal_elem = root.find("save_journal")
+    if journal_elem is not None:
+        novel.incremental_save = True
+        novel.journal_batches = int(journal_elem.get("applied", "0"))
+
+def header_info(root: ET.Element) -> Dict[str, Any]:
+    """从基本信息读取存档目录所需的摘要，没有统计的旧存档对应项为None"""
+    info = {key: root.findtext(key) for key in ("id", "title", "genre", "last_modified")}
+    stats_elem = root.find("stats")
+    for key in ("chapters", "characters", "events"):
+        info[key] = int(stats_elem.get(key)) if stats_elem is not None else None
+    journal_elem = root.find("save_journal")
+    info["journal_batches"] = int(journal_elem.get("applied", "0")) if journal_elem is not None else None
+    return info
+
+def read_novel_header(source) -> Dict[str, Any]:
+    """只读取存档开头的基本信息，遇到第一个大段内容即停止，返回header_info的摘要"""
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "end":
+            depth -= 1
+            continue
+        depth += 1
+        if root is None:
+            root = elem
+        elif depth == 2 and (elem.tag in STREAM_SECTIONS or elem.tag in ("context", "outline", "summaries")):
+            break
+    if root is None:
+        raise ValueError("存档为空")
+    return header_info(root)
+
+def parse_context(context_elem: ET.Element, novel: Novel):
+    """读取上下文（替换原有上下文）"""
+    novel.context.global_context = context_elem.find("global_context").text or ""
+    novel.context.chapter_context.clear()
+    
+    chapter_contexts_elem = context_elem.find("chapter_contexts")
+    if chapter_contexts_elem is not None:
+        for chapter_context in chapter_contexts_elem.findall("chapter_context"):
+            chapter_num = int(chapter_context.get("number"))
+            novel.context.chapter_context[chapter_num] = chapter_context.text or ""
+
+def xml_to_outline(outline_elem: ET.Element):
+    """解析大纲"""
+    from core.models import Outline, OutlineArc
+    
+    outline = Outline(
+        id=outline_elem.find("id").text,
+        overview=outline_elem.find("overview").text
+    )
+    
+    arcs_elem = outline_elem.find("arcs")
+    if arcs_elem is not None:
+        for arc_elem in arcs_elem.findall("arc"):
+            name = arc_elem.find("name").text
+            description = arc_elem.find("description").text
             
-            arcs_elem = outline_elem.find("arcs")
-            if arcs_elem is not None:
-                for arc_elem in arcs_elem.findall("arc"):
-                    name = arc_elem.find("name").text
-                    description = arc_elem.find("description").text
-                    
-                    arc = OutlineArc(name=name, description=description)
-                    
-                    key_events_elem = arc_elem.find("key_events")
-                    if key_events_elem is not None:
-                        for event_elem in key_events_elem.findall("event"):
-                            arc.key_events.append(event_elem.text)
-                    
-                    outline.arcs.append(arc)
+            arc = OutlineArc(name=name, description=description)
             
-            novel.outline = outline
-        
-        # 解析角色
-        for char_elem in root.find("characters").findall("character"):
-            char_id = char_elem.get("id")
-            name = char_elem.find("name").text
-            age = int(char_elem.find("age").text)
-            gender = char_elem.find("gender").text
-            background = char_elem.find("background").text
+            key_events_elem = arc_elem.find("key_events")
+            if key_events_elem is not None:
+                for event_elem in key_events_elem.findall("event"):
+                    arc.key_events.append(event_elem.text)
             
-            character = Character(
-                id=char_id,
-                name=name,
-                age=age,
-                gender=gender,
-                background=background
+            outline.arcs.append(arc)
+    
+    return outline
+
+def xml_to_character(char_elem: ET.Element):
+    """解析一个角色"""
+    from core.models import Character, Trait, Relationship, HistoryEntry, intern_str
+    
+    character = Character(
+        id=char_elem.get("id"),
+        name=char_elem.find("name").text,
+        age=int(char_elem.find("age").text),
+        gender=char_elem.find("gender").text,
+        background=char_elem.find("background").text
+    )
+    
+    # 外貌
+    appearance_elem = char_elem.find("appearance")
+    if appearance_elem is not None and appearance_elem.text:
+        character.appearance = appearance_elem.text
+    
+    # 备注
+    notes_elem = char_elem.find("notes")
+    if notes_elem is not None and notes_elem.text:
+        character.notes = notes_elem.text
+    
+    # 解析性格
+    personality_elem = char_elem.find("personality")
+    if personality_elem is not None:
+        for trait_elem in personality_elem.findall("trait"):
+            trait_name = trait_elem.get("name")
+            character.personality[intern_str(trait_name)] = float(trait_elem.text)
+    
+    # 解析特质
+    traits_elem = char_elem.find("traits")
+    if traits_elem is not None:
+        for trait_elem in traits_elem.findall("trait"):
+            trait = Trait(
+                id=trait_elem.get("id"),
+                name=trait_elem.find("name").text,
+                description=trait_elem.find("description").text
             )
             
-            # 外貌
-            appearance_elem = char_elem.find("appearance")
-            if appearance_elem is not None and appearance_elem.text:
-                character.appearance = appearance_elem.text
-            
-            # 备注
-            notes_elem = char_elem.find("notes")
-            if notes_elem is not None and notes_elem.text:
-                character.notes = notes_elem.text
-            
-            # 解析性格
-            personality_elem = char_elem.find("personality")
-            if personality_elem is not None:
-                for trait_elem in personality_elem.findall("trait"):
-                    trait_name = trait_elem.get("name")
-                    character.personality[trait_name] = float(trait_elem.text)
-            
-            # 解析特质
-            traits_elem = char_elem.find("traits")
-            if traits_elem is not None:
-                for trait_elem in traits_elem.findall("trait"):
-                    trait_id = trait_elem.get("id")
-                    trait_name = trait_elem.find("name").text
-                    trait_desc = trait_elem.find("description").text
-                    
-                    trait = Trait(
-                        id=trait_id,
-                        name=trait_name,
-                        description=trait_desc
-                    )
-                    
-                    # 解析影响
-                    impact_elem = trait_elem.find("impact")
-                    if impact_elem is not None:
-                        for attr_elem in impact_elem.findall("attribute"):
-                            attr_name = attr_elem.get("name")
-                            attr_value = float(attr_elem.text)
-                            trait.impact[attr_name] = attr_value
-                    
-                    character.traits.append(trait)
-            
-            # 解析关系
-            rel_elem = char_elem.find("relationships")
-            if rel_elem is not None:
-                for rel in rel_elem.findall("relationship"):
-                    target_id = rel.get("target_id")
-                    rel_type = rel.find("type").text
-                    strength = float(rel.find("strength").text)
-                    
-                    relationship = Relationship(
-                        target_id=target_id,
-                        relationship_type=rel_type,
-                        strength=strength
-                    )
-                    
-                    # 解析历史
-                    history_elem = rel.find("history")
-                    if history_elem is not None:
-                        for entry_elem in history_elem.findall("entry"):
-                            timestamp = entry_elem.get("timestamp")
-                            description = entry_elem.text
-                            relationship.history.append({
-                                "timestamp": timestamp,
-                                "description": description
-                            })
-                    
-                    character.relationships[target_id] = relationship
+            # 解析影响
+            impact_elem = trait_elem.find("impact")
+            if impact_elem is not None:
+                for attr_elem in impact_elem.findall("attribute"):
+                    attr_name = attr_elem.get("name")
+                    attr_value = float(attr_elem.text)
+                    trait.impact[intern_str(attr_name)] = attr_value
             
-            # 解析目标
-            goals_elem = char_elem.find("goals")
-            if goals_elem is not None:
-                for goal_elem in goals_elem.findall("goal"):
-                    character.goals.append(goal_elem.text)
-            
-            novel.characters[char_id] = character
-        
-        # 解析事件库
-        events_elem = root.find("events_library")
-        if events_elem is not None:
-            for event_elem in events_elem.findall("event"):
-                event_id = event_elem.get("id")
-                name = event_elem.find("name").text
-                description = event_elem.find("description").text
-                
-                event = Event(
-                    id=event_id,
-                    name=name,
-                    description=description,
-                    triggers={},
-                    effects=[],
-                    narrative_templates=[]
-                )
-                
-                # 可编辑性
-                user_editable_elem = event_elem.find("user_editable")
-                if user_editable_elem is not None:
-                    event.user_editable = user_editable_elem.text.lower() == "true"
-                
-                # 备注
-                notes_elem = event_elem.find("notes")
-                if notes_elem is not None and notes_elem.text:
-                    event.notes = notes_elem.text
-                
-                # 解析触发条件
-                triggers_elem = event_elem.find("triggers")
-                if triggers_elem is not None:
-                    for trigger in triggers_elem.findall("trigger"):
-                        trigger_type = trigger.get("type")
-                        trigger_value = trigger.get("value")
-                        event.triggers[trigger_type] = trigger_value
-                
-                # 解析效果
-                effects_elem = event_elem.find("effects")
-                if effects_elem is not None:
-                    for effect in effects_elem.findall("effect"):
-                        target = effect.get("target")
-                        value = float(effect.get("value"))
-                        event.effects.append({
-                            "target": target,
-                            "value": value
-                        })
-                
-                # 解析叙事模板
-                templates_elem = event_elem.find("narrative_templates")
-                if templates_elem is not None:
-                    for template in templates_elem.findall("template"):
-                        event.narrative_templates.append(template.text)
-                
-                novel.events_library[event_id] = event
-        
-        # 解析章节
-        for chapter_elem in root.find("chapters").findall("chapter"):
-            chapter_id = chapter_elem.get("id")
-            number = int(chapter_elem.get("number"))
-            title = chapter_elem.find("title").text
-            
-            chapter = Chapter(
-                id=chapter_id,
-                number=number,
-                title=title,
-                events=[],
-                character_focus=[]
+            character.traits.append(trait)
+    
+    # 解析关系
+    rel_elem = char_elem.find("relationships")
+    if rel_elem is not None:
+        for rel in rel_elem.findall("relationship"):
+            target_id = rel.get("target_id")
+            relationship = Relationship(
+                target_id=target_id,
+                relationship_type=rel.find("type").text,
+                strength=float(rel.find("strength").text)
             )
             
-            # 用户编辑标记
-            user_edited_elem = chapter_elem.find("user_edited")
-            if user_edited_elem is not None:
-                chapter.user_edited = user_edited_elem.text.lower() == "true"
-            
-            # 备注
-            notes_elem = chapter_elem.find("notes")
-            if notes_elem is not None and notes_elem.text:
-                chapter.notes = notes_elem.text
-            
-            # 解析事件
-            events_elem = chapter_elem.find("events")
-            if events_elem is not None:
-                for event_elem in events_elem.findall("event"):
-                    chapter.events.append(event_elem.text)
-            
-            # 解析焦点角色
-            focus_elem = chapter_elem.find("character_focus")
-            if focus_elem is not None:
-                for char_elem in focus_elem.findall("character"):
-                    chapter.character_focus.append(char_elem.text)
+            # 解析历史
+            history_elem = rel.find("history")
+            if history_elem is not None:
+                for entry_elem in history_elem.findall("entry"):
+                    timestamp = entry_elem.get("timestamp")
+                    description = entry_elem.text
+                    chapter = entry_elem.get("chapter")
+                    delta = entry_elem.get("delta")
+                    relationship.history.append(HistoryEntry(
+                        timestamp, description,
+                        int(chapter) if chapter is not None else None,
+                        float(delta) if delta is not None else None
+                    ))
             
-            # 内容
-            content_elem = chapter_elem.find("content")
-            if content_elem is not None and content_elem.text:
-                chapter.content = content_elem.text
+            summary_elem = rel.find("history_summary")
+            if summary_elem is not None:
+                for item_elem in summary_elem.findall("chapter"):
+                    relationship.history_summary.append({
+                        "chapter": int(item_elem.get("number")),
+                        "count": int(item_elem.get("count")),
+                        "delta": float(item_elem.get("delta"))
+                    })
             
-            # 摘要
-            summary_elem = chapter_elem.find("summary")
-            if summary_elem is not None and summary_elem.text:
-                chapter.summary = summary_elem.text
-            
-            novel.chapters.append(chapter)
+            character.relationships[target_id] = relationship
+    
+    # 解析目标
+    goals_elem = char_elem.find("goals")
+    if goals_elem is not None:
+        for goal_elem in goals_elem.findall("goal"):
+            character.goals.append(goal_elem.text)
+    
+    return character
+
+def xml_to_event(event_elem: ET.Element):
+    """解析一个事件"""
+    from core.models import Event
+    
+    event = Event(
+        id=event_elem.get("id"),
+        name=event_elem.find("name").text,
+        description=event_elem.find("description").text,
+        triggers={},
+        effects=[],
+        narrative_templates=[]
+    )
+    
+    # 可编辑性
+    user_editable_elem = event_elem.find("user_editable")
+    if user_editable_elem is not None:
+        event.user_editable = user_editable_elem.text.lower() == "true"
+    
+    # 备注
+    notes_elem = event_elem.find("notes")
+    if notes_elem is not None and notes_elem.text:
+        event.notes = notes_elem.text
+    
+    # 解析触发条件
+    triggers_elem = event_elem.find("triggers")
+    if triggers_elem is not None:
+        for trigger in triggers_elem.findall("trigger"):
+            event.triggers[trigger.get("type")] = trigger.get("value")
+    
+    # 解析效果
+    effects_elem = event_elem.find("effects")
+    if effects_elem is not None:
+        for effect in effects_elem.findall("effect"):
+            event.effects.append({
+                "target": effect.get("target"),
+                "value": float(effect.get("value"))
+            })
+    
+    event.intern_strings()
+    
+    # 解析叙事模板
+    templates_elem = event_elem.find("narrative_templates")
+    if templates_elem is not None:
+        for template in templates_elem.findall("template"):
+            event.narrative_templates.append(template.text)
+    
+    return event
+
+def xml_to_chapter(chapter_elem: ET.Element, novel: Novel):
+    """解析一个章节，正文位于正文存储时得到延迟加载的引用"""
+    from core.models import Chapter, intern_str
+    from core.body_store import ChapterBody
+    
+    chapter = Chapter(
+        id=chapter_elem.get("id"),
+        number=int(chapter_elem.get("number")),
+        title=chapter_elem.find("title").text,
+        events=[],
+        character_focus=[]
+    )
+    
+    # 用户编辑标记
+    user_edited_elem = chapter_elem.find("user_edited")
+    if user_edited_elem is not None:
+        chapter.user_edited = user_edited_elem.text.lower() == "true"
+    
+    # 备注
+    notes_elem = chapter_elem.find("notes")
+    if notes_elem is not None and notes_elem.text:
+        chapter.notes = notes_elem.text
+    
+    # 解析事件
+    events_elem = chapter_elem.find("events")
+    if events_elem is not None:
+        for event_elem in events_elem.findall("event"):
+            chapter.events.append(intern_str(event_elem.text))
+    
+    # 解析焦点角色
+    focus_elem = chapter_elem.find("character_focus")
+    if focus_elem is not None:
+        for char_elem in focus_elem.findall("character"):
+            chapter.character_focus.append(intern_str(char_elem.text))
+    
+    # 内容
+    content_elem = chapter_elem.find("content")
+    if content_elem is not None and content_elem.get("offset") is not None:
+        chapter.content = ChapterBody(novel.body_store, int(content_elem.get("offset")),
+                                      int(content_elem.get("length")), int(content_elem.get("crc")))
+    elif content_elem is not None and content_elem.text:
+        chapter.content = content_elem.text
+    
+    # 摘要
+    summary_elem = chapter_elem.find("summary")
+    if summary_elem is not None and summary_elem.text:
+        chapter.summary = summary_elem.text
+    
+    return chapter
+
+def parse_summaries(summaries_elem: ET.Element, novel: Novel):
+    """读取分层摘要（替换原有摘要）"""
+    novel.summaries.volume_size = int(summaries_elem.get("volume_size", novel.summaries.volume_size))
+    novel.summaries.book_volumes = int(summaries_elem.get("book_volumes", 0))
+    book_elem = summaries_elem.find("book")
+    novel.summaries.book = book_elem.text or "" if book_elem is not None else ""
+    novel.summaries.volumes.clear()
+    for volume_elem in summaries_elem.findall("volume"):
+        novel.summaries.volumes[int(volume_elem.get("index"))] = volume_elem.text or ""
+
+def xml_to_timeline_item(event_elem: ET.Element) -> Dict[str, Any]:
+    """解析一条时间线"""
+    item = {}
+    for elem in event_elem:
+        if elem.tag == "chapter":
+            item[elem.tag] = int(elem.text)
+        else:
+            item[elem.tag] = elem.text
+    return item
+
+def read_novel_xml(source, path: Optional[str] = None, bodies: bool = True) -> Optional[Novel]:
+    """用iterparse流式加载小说：角色、事件、章节在元素闭合时构建并立即从树中移除，
+    峰值内存取决于最大的单个元素而不是整个文件
+    
+    source为文件路径或文件对象，path为小说文件路径，用于定位正文存储。
+    bodies为False时只加载元数据和结构，章节正文（包括正文存储中的引用）一律跳过，
+    得到的小说标记为structure_only，不能保存。
+    """
+    try:
+        novel = Novel(id="", title="", genre="", setting="")
+        stack = []
+        header_done = False
         
-        # 解析时间线
-        timeline_elem = root.find("timeline")
-        if timeline_elem is not None:
-            for event_elem in timeline_elem.findall("event"):
-                event = {}
-                for elem in event_elem:
-                    tag = elem.tag
-                    if tag == "chapter":
-                        event[tag] = int(elem.text)
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                stack.append(elem)
+                # 基本信息都在列表元素之前，章节解析需要其中的正文存储
+                if len(stack) == 2 and elem.tag in STREAM_SECTIONS and not header_done:
+                    parse_header(stack[0], novel, path)
+                    header_done = True
+                continue
+            
+            depth = len(stack)
+            stack.pop()
+            if depth == 4 and not bodies and elem.tag == "content" and stack[1].tag == "chapters":
+                # 正文元素闭合时就丢弃，章节闭合前不必同时保留
+                elem.text = None
+                elem.attrib.clear()
+            elif depth == 3 and stack[1].tag in STREAM_SECTIONS:
+                section = stack[1].tag
+                if elem.tag == STREAM_SECTIONS[section]:
+                    if section == "characters":
+                        character = xml_to_character(elem)
+                        novel.characters[character.id] = character
+                    elif section == "events_library":
+                        event_obj = xml_to_event(elem)
+                        novel.events_library[event_obj.id] = event_obj
+                    elif section == "chapters":
+                        novel.chapters.append(xml_to_chapter(elem, novel))
                     else:
-                        event[tag] = elem.text
-                novel.timeline.append(event)
+                        novel.timeline.append(xml_to_timeline_item(elem))
+                stack[1].remove(elem)
+            elif depth == 2 and elem.tag not in STREAM_SECTIONS:
+                if elem.tag == "context":
+                    parse_context(elem, novel)
+                elif elem.tag == "outline":
+                    novel.outline = xml_to_outline(elem)
+                elif elem.tag == "summaries":
+                    parse_summaries(elem, novel)
+                else:
+                    # 基本信息元素留在根元素下，供parse_header读取
+                    continue
+                stack[0].remove(elem)
+            elif depth == 2:
+                stack[0].remove(elem)
+            elif depth == 1 and not header_done:
+                parse_header(elem, novel, path)
         
+        novel.structure_only = not bodies
         return novel
         
     except Exception as e:
         print(f"解析XML时出错: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def xml_to_novel(xml_string: str, path: Optional[str] = None, bodies: bool = True) -> Optional[Novel]:
+    """从XML字符串构建小说对象，path为小说文件路径，用于定位正文存储"""
+    return read_novel_xml(io.StringIO(xml_string), path, bodies)
+
+class StreamingXMLFieldParser:
+    """增量XML字段解析器 - 边接收边解析LLM流式输出的XML，在字段闭合时立即回调"""
+    
+    def __init__(self, fields: Tuple[str, ...],
+                 on_text: Optional[Callable[[str, str], None]] = None,
+                 on_field: Optional[Callable[[str, str], None]] = None):
+        self.fields = fields
+        self.on_text = on_text  # (字段名, 新增文本)，文本到达即回调
+        self.on_field = on_field  # (字段名, 完整文本)，字段闭合时回调
+        self.values: Dict[str, str] = {}
+        self.error: Optional[Exception] = None
+        
+        # expat的增量feed接口会在数据到达时立即回调target，
+        # 而XMLPullParser要等元素闭合才能拿到text
+        self._parser = ET.XMLParser(target=self)
+        self._stack = []
+        self._buffer = []
+        self._started = False
+    
+    def feed(self, chunk: str):
+        """输入一段文本"""
+        if self.error is not None:
+            return
+        
+        if not self._started:
+            # 跳过XML之前的多余内容（如代码块标记）
+            index = chunk.find("<")
+            if index < 0:
+                return
+            chunk = chunk[index:]
+            self._started = True
+        
+        try:
+            self._parser.feed(chunk)
+        except ET.ParseError as e:
+            self.error = e
+    
+    def finish(self) -> Dict[str, str]:
+        """结束解析，返回已闭合的字段"""
+        if self.error is None and self._started:
+            try:
+                self._parser.close()
+            except ET.ParseError as e:
+                # 根元素之后的多余内容不影响已解析的字段
+                self.error = e
+        return self.values
+    
+    # 以下为XMLParser的target回调
+    
+    def start(self, tag, attrib):
+        self._stack.append(tag)
+        if tag in self.fields and len(self._stack) == 2:
+            self._buffer = []
+    
+    def end(self, tag):
+        if tag in self.fields and len(self._stack) == 2:
+            value = "".join(self._buffer)
+            self.values[tag] = value
+            if self.on_field:
+                self.on_field(tag, value)
+        self._stack.pop()
+    
+    def data(self, text):
+        if len(self._stack) == 2 and self._stack[-1] in self.fields:
+            self._buffer.append(text)
+            if self.on_text:
+                self.on_text(self._stack[-1], text)
\ No newline at end of file